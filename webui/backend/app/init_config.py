@@ -69,32 +69,45 @@ def sync_from_s3():
     logger.info(f"📦 Syncing configuration from S3 bucket: {bucket_name}")
 
     terraform_dir = Path(os.environ.get('TERRAFORM_DIR', '/app/terraform'))
-    instances_dir = terraform_dir / 'instances'
 
     s3_manager = S3ConfigManager(bucket_name)
 
-    # Download root terraform.tfvars
-    root_success = s3_manager.download_root_tfvars(terraform_dir)
-    if root_success:
-        logger.info("✓ Downloaded root terraform.tfvars from S3")
+    # Root and instance tfvars in one paginated listing and one parallel round of downloads
+    stats = s3_manager.sync_config(terraform_dir, direction="pull")
+
+    if stats.transferred > 0:
+        logger.info(f"✓ Downloaded {stats.transferred} tfvars files from S3")
+    elif stats.listed == 0:
+        logger.debug("No tfvars found in S3 (may not exist yet)")
     else:
-        logger.debug("Root terraform.tfvars not found in S3 (may not exist yet)")
+        logger.info("✓ Local tfvars already match S3")
 
-    # Download all instance terraform.tfvars
-    results = s3_manager.sync_all_instances_from_s3(instances_dir)
+    return stats.listed > stats.failed
 
-    success_count = sum(1 for success in results.values() if success)
-    if success_count > 0:
-        logger.info(f"✓ Downloaded {success_count} instance tfvars from S3")
-    else:
-        logger.debug("No instance tfvars found in S3 (may not exist yet)")
 
-    return root_success or success_count > 0
+def _list_state_keys(bucket_name: str, region: str) -> set:
+    import boto3
+    try:
+        s3_client = boto3.client('s3', region_name=region)
+        paginator = s3_client.get_paginator('list_objects_v2')
+        state_keys = set()
+        for page in paginator.paginate(Bucket=bucket_name, Prefix='instances/'):
+            for obj in page.get('Contents', []):
+                key = obj['Key']
+                if key.endswith('/terraform.tfstate'):
+                    parts = key.split('/')
+                    if len(parts) == 3:
+                        state_keys.add(parts[1])
+        return state_keys
+    except Exception as e:
+        logger.debug(f"Could not list S3 state files: {e}")
+        return set()
 
 
 def regenerate_backend_files():
+    from concurrent.futures import ThreadPoolExecutor
     from app.services.config_manager import ConfigManager
-    from app.services.backend_manager import BackendManager
+    from app.services.backend_manager import StepTimings, write_backend_files
     from app.services.instance_discovery import get_resource_id_for_instance
 
     terraform_dir = Path(os.environ.get('TERRAFORM_DIR', '/app/terraform'))
@@ -103,6 +116,16 @@ def regenerate_backend_files():
     if not instances_dir.exists():
         return
 
+    timings = StepTimings()
+    with timings.step("scan"):
+        missing = [
+            d for d in instances_dir.iterdir()
+            if d.is_dir() and (d / "main.tf").exists() and not (d / "backend.tf").exists()
+        ]
+    if not missing:
+        logger.debug("All instances already have backend.tf")
+        return
+
     config_manager = ConfigManager(terraform_dir=str(terraform_dir))
     name_prefix = config_manager._get_name_prefix_from_tfvars()
 
@@ -114,54 +137,25 @@ def regenerate_backend_files():
     table_name = config_manager.generate_dynamodb_table_name()
     region = config_manager._get_region()
 
-    import boto3
-    try:
-        s3_client = boto3.client('s3', region_name=region)
-        paginator = s3_client.get_paginator('list_objects_v2')
-        s3_state_keys = {}
-        for page in paginator.paginate(Bucket=bucket_name, Prefix='instances/'):
-            for obj in page.get('Contents', []):
-                key = obj['Key']
-                if key.endswith('/terraform.tfstate'):
-                    parts = key.split('/')
-                    if len(parts) == 3:
-                        s3_state_keys[parts[1]] = parts[1]
-    except Exception as e:
-        logger.debug(f"Could not list S3 state files: {e}")
-        s3_state_keys = {}
-
-    manager = BackendManager(region=region)
-    count = 0
-
-    for instance_dir in sorted(instances_dir.iterdir()):
-        if not instance_dir.is_dir() or not (instance_dir / "main.tf").exists():
-            continue
-
-        backend_tf = instance_dir / "backend.tf"
-        if backend_tf.exists():
-            continue
-
-        resource_id = get_resource_id_for_instance(instance_dir)
-        dir_name = instance_dir.name
-
-        if resource_id in s3_state_keys:
-            instance_name = resource_id
-        elif dir_name in s3_state_keys:
-            instance_name = dir_name
-        else:
-            instance_name = resource_id
-
-        backend_content = manager.generate_backend_config(
-            bucket_name=bucket_name,
-            instance_name=instance_name,
-            table_name=table_name
-        )
-        backend_tf.write_text(backend_content, encoding="utf-8")
-        count += 1
-        logger.info(f"Regenerated backend.tf for {dir_name} (key: instances/{instance_name}/terraform.tfstate)")
-
-    if count > 0:
-        logger.info(f"✓ Regenerated {count} backend.tf files")
+    # Resolve resource ids while the state listing is in flight
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        state_keys_future = pool.submit(_list_state_keys, bucket_name, region)
+        with timings.step("resolve_ids"):
+            resource_ids = {d.name: get_resource_id_for_instance(d) for d in missing}
+        with timings.step("list_state"):
+            s3_state_keys = state_keys_future.result()
+
+    def instance_name_for(instance_dir: Path) -> str:
+        resource_id = resource_ids.get(instance_dir.name) or get_resource_id_for_instance(instance_dir)
+        if resource_id not in s3_state_keys and instance_dir.name in s3_state_keys:
+            return instance_dir.name
+        return resource_id
+
+    with timings.step("render"):
+        written = write_backend_files(instances_dir, bucket_name, table_name, region, instance_name_for)
+
+    if written:
+        logger.info(f"✓ Regenerated {len(written)} backend.tf files ({timings.to_dict()})")
 
 
 def restore_key_from_parameter_store():
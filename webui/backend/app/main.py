@@ -2,15 +2,17 @@ import asyncio
 import os
 from contextlib import asynccontextmanager
 
-from fastapi import FastAPI
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
 import logging
 
 if not os.environ.get("AWS_PROFILE", "").strip():
     os.environ.pop("AWS_PROFILE", None)
 
-from app.routes import terraform, ssh, backend, keys, danger_zone, eks_manage
+from app.routes import terraform, ssh, backend, keys, danger_zone, eks_manage, admin, events
 from app.services.credential_manager import credential_manager
+from app.services import metrics, profiler, session_recorder, tracing
+from app.services.drift_scanner import DRIFT_SCAN_ENABLED
 
 log_level = os.environ.get('LOG_LEVEL', 'INFO').upper()
 logging.basicConfig(
@@ -20,13 +22,21 @@ logging.basicConfig(
 for _noisy in ('botocore', 'boto3', 'urllib3', 's3transfer'):
     logging.getLogger(_noisy).setLevel(logging.WARNING)
 
+tracing.configure_tracing()
+
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     terraform.parser.build_s3_status_cache()
+    terraform.parser.variable_schemas.all()
     eks_manage.preset_manager.initialize_local_cache()
+    session_recorder.finalize_stale_recordings()
     asyncio.create_task(terraform.runner.warmup_provider_cache())
+    if os.environ.get("TF_INIT_ALL_ON_STARTUP", "true").lower() == "true":
+        terraform.start_init_all()
     asyncio.create_task(credential_manager.background_refresh_loop())
+    if DRIFT_SCAN_ENABLED:
+        terraform.drift_scanner.start()
     yield
 
 
@@ -44,6 +54,10 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+if os.environ.get("METRICS_ENABLED", "true").lower() == "true":
+    app.add_middleware(metrics.MetricsMiddleware)
+if profiler.PROFILING_ENABLED:
+    app.add_middleware(profiler.ProfilingMiddleware)
 
 app.include_router(terraform.router)
 app.include_router(ssh.router)
@@ -51,6 +65,9 @@ app.include_router(backend.router)
 app.include_router(keys.router)
 app.include_router(danger_zone.router)
 app.include_router(eks_manage.router)
+if profiler.PROFILING_ENABLED:
+    app.include_router(admin.router)
+app.include_router(events.router)
 
 
 @app.get("/")
@@ -67,6 +84,11 @@ async def health():
     return {"status": "healthy"}
 
 
+@app.get("/metrics", include_in_schema=False)
+async def prometheus_metrics():
+    return Response(content=metrics.registry.render(), media_type=metrics.CONTENT_TYPE)
+
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
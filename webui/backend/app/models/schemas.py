@@ -30,6 +30,7 @@ class TerraformResource(BaseModel):
     line_end: int
     status: ResourceStatus
     description: Optional[str] = None
+    drifted: Optional[bool] = None  # None until a drift scan has completed
 
 
 class TerraformVariable(BaseModel):
@@ -0,0 +1,43 @@
+from fastapi import APIRouter, Depends, Header, HTTPException
+from fastapi.responses import PlainTextResponse
+from typing import Optional
+import logging
+
+from app.services import profiler
+
+logger = logging.getLogger(__name__)
+
+
+async def require_profile_token(x_profile_token: Optional[str] = Header(default=None)):
+    if not profiler.token_matches(x_profile_token):
+        raise HTTPException(status_code=403, detail="Invalid or missing X-Profile-Token")
+
+
+# Mounted by app.main only when PROFILING_ENABLED is set
+router = APIRouter(prefix="/api/admin", tags=["admin"], dependencies=[Depends(require_profile_token)])
+
+
+@router.get("/profiles")
+async def list_profiles():
+    return {
+        "enabled": profiler.PROFILING_ENABLED,
+        "keep": profiler.profile_store.keep,
+        "profiles": [record.summary() for record in profiler.profile_store.list()],
+    }
+
+
+@router.get("/profiles/{profile_id}", response_class=PlainTextResponse)
+async def get_profile(profile_id: str):
+    record = profiler.profile_store.get(profile_id)
+    if not record:
+        raise HTTPException(status_code=404, detail="Profile not found or evicted")
+    return PlainTextResponse(
+        record.collapsed,
+        headers={"Content-Disposition": f'inline; filename="profile-{record.id}.collapsed"'},
+    )
+
+
+@router.delete("/profiles")
+async def clear_profiles():
+    profiler.profile_store.clear()
+    return {"success": True}
@@ -5,11 +5,12 @@ Endpoints for automatic S3 backend configuration
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
 from typing import Optional
+import asyncio
 import logging
 import os
 from pathlib import Path
 
-from app.services.backend_manager import BackendManager
+from app.services.backend_manager import BackendManager, write_backend_files
 from app.services.config_manager import ConfigManager
 from app.services.instance_discovery import get_resource_directory_map
 
@@ -62,7 +63,8 @@ async def setup_backend(request: BackendSetupRequest):
         manager = BackendManager(region=request.region)
 
         # Create infrastructure
-        result = manager.setup_backend_infrastructure(
+        result = await asyncio.to_thread(
+            manager.setup_backend_infrastructure,
             bucket_name=request.bucket_name,
             table_name=request.table_name
         )
@@ -249,28 +251,4 @@ def _generate_backend_files(
     region: str
 ) -> int:
     """Generate backend.tf files for all instances"""
-    manager = BackendManager(region=region)
-    count = 0
-
-    for instance_dir in instances_dir.iterdir():
-        if not instance_dir.is_dir():
-            continue
-        if not (instance_dir / "main.tf").exists():
-            continue
-
-        backend_file = instance_dir / "backend.tf"
-        if backend_file.exists():
-            logger.info(f"Skipping {instance_dir.name} - backend.tf already exists")
-            continue
-
-        backend_content = manager.generate_backend_config(
-            bucket_name=bucket_name,
-            instance_name=instance_dir.name,
-            table_name=table_name
-        )
-
-        backend_file.write_text(backend_content, encoding="utf-8")
-        logger.info(f"Generated backend.tf for {instance_dir.name}")
-        count += 1
-
-    return count
+    return len(write_backend_files(instances_dir, bucket_name, table_name, region))
@@ -1,41 +1,46 @@
 import asyncio
-import base64
 import json
 import logging
 import os
 import re
-import time
 from pathlib import Path
 from typing import AsyncIterator, Dict, List, Optional
 
-import boto3
-from botocore.signers import RequestSigner
-from fastapi import APIRouter, HTTPException, Body
+from fastapi import APIRouter, HTTPException, Body, Request, Response
 from fastapi.responses import StreamingResponse
 
 from app.models.schemas import ResourceType
+from app.services import http_cache
 from app.services.eks_preset_manager import EKSPresetManager
+from app.services.preset_pipeline import DEFAULT_MAX_CONCURRENCY, DeployPipeline, STATUS_SUCCEEDED, resolve_deploy_graph
+from app.services.kubeconfig_manager import kubeconfig_manager
+from app.services.kube_client import KubeClientUnavailable, kube_client, parse_kubectl_command
 from app.services.terraform_parser import TerraformParser
 from app.services.terraform_runner import TerraformRunner
 from app.services.instance_discovery import get_resource_id_for_instance, get_resource_type_from_dir
+from app.services.state_index import has_redacted_outputs
 
 router = APIRouter(prefix="/api/terraform/eks/manage", tags=["eks-manage"])
 logger = logging.getLogger(__name__)
 
 TERRAFORM_DIR = os.environ.get("TERRAFORM_DIR", "/terraform")
 EXIT_SENTINEL_PREFIX = "__TF_EXIT__:"
-KUBECONFIG_PATH = Path.home() / ".kube" / "config"
-TOKEN_EXPIRY_SECONDS = 900
 
 preset_manager = EKSPresetManager(TERRAFORM_DIR)
 parser = TerraformParser(TERRAFORM_DIR)
 runner = TerraformRunner(TERRAFORM_DIR)
 
-_deploy_lock = asyncio.Lock()
+preset_locks: Dict[str, asyncio.Lock] = {}
 
 _TEMPLATE_RE = re.compile(r'\{\{(\w+)\}\}')
 
 
+def get_preset_lock(name: str) -> asyncio.Lock:
+    if name not in preset_locks:
+        preset_locks[name] = asyncio.Lock()
+    return preset_locks[name]
+
+
 def _resolve_template_vars(command: str) -> str:
     root_tfvars = parser._read_tfvars_to_map(Path(TERRAFORM_DIR) / "terraform.tfvars")
     def _replacer(m):
@@ -91,6 +96,9 @@ def _parse_cluster_info(outputs: Dict) -> Dict:
 
 async def _get_cluster_info_async(resource_id: str, resource_dir: Path) -> Dict:
     try:
+        outputs = await asyncio.to_thread(parser.state_index.outputs, resource_dir.name)
+        if outputs and not has_redacted_outputs(outputs):
+            return _parse_cluster_info(outputs)
         aws_env = parser.get_aws_env()
         await runner.ensure_terraform_init(resource_dir, env_extra=aws_env)
         success, raw_output = await runner.output(resource_id, env_extra=aws_env)
@@ -102,88 +110,9 @@ async def _get_cluster_info_async(resource_id: str, resource_dir: Path) -> Dict:
     return {}
 
 
-def _get_eks_token(cluster_name: str, region: str) -> str:
-    session = boto3.Session(region_name=region)
-    sts_client = session.client("sts", region_name=region)
-    service_id = sts_client.meta.service_model.service_id
-
-    signer = RequestSigner(
-        service_id, region, "sts", "v4",
-        session.get_credentials(),
-        session._session.get_component("event_emitter"),
-    )
-
-    params = {
-        "method": "GET",
-        "url": f"https://sts.{region}.amazonaws.com/?Action=GetCallerIdentity&Version=2011-06-15",
-        "body": {},
-        "headers": {"x-k8s-aws-id": cluster_name},
-        "context": {},
-    }
-
-    signed_url = signer.generate_presigned_url(
-        params, region_name=region, expires_in=TOKEN_EXPIRY_SECONDS, operation_name="",
-    )
-    return "k8s-aws-v1." + base64.urlsafe_b64encode(signed_url.encode("utf-8")).decode("utf-8").rstrip("=")
-
-
-def _configure_kubeconfig(cluster_name: str, region: str) -> tuple[bool, str]:
-    try:
-        eks_client = boto3.client("eks", region_name=region)
-        cluster = eks_client.describe_cluster(name=cluster_name)["cluster"]
-
-        endpoint = cluster["endpoint"]
-        ca_data = cluster["certificateAuthority"]["data"]
-        token = _get_eks_token(cluster_name, region)
-
-        kubeconfig = {
-            "apiVersion": "v1",
-            "kind": "Config",
-            "clusters": [{"name": cluster_name, "cluster": {"server": endpoint, "certificate-authority-data": ca_data}}],
-            "contexts": [{"name": cluster_name, "context": {"cluster": cluster_name, "user": cluster_name}}],
-            "current-context": cluster_name,
-            "users": [{"name": cluster_name, "user": {"token": token}}],
-        }
-
-        KUBECONFIG_PATH.parent.mkdir(parents=True, exist_ok=True)
-        KUBECONFIG_PATH.write_text(json.dumps(kubeconfig, indent=2))
-        logger.debug(f"Kubeconfig written to {KUBECONFIG_PATH} for cluster {cluster_name}")
-        return True, f"Kubeconfig configured for {cluster_name} at {endpoint}"
-    except Exception as e:
-        logger.warning(f"Failed to configure kubeconfig: {e}")
-        return False, str(e)
-
-
 async def _setup_kubeconfig(resource_id: Optional[str], resource_dir: Optional[Path],
                             force: bool = False) -> tuple[bool, list[str]]:
-    lines = []
-
-    if not force and KUBECONFIG_PATH.exists() and KUBECONFIG_PATH.stat().st_size > 0:
-        age = time.time() - KUBECONFIG_PATH.stat().st_mtime
-        if age < TOKEN_EXPIRY_SECONDS:
-            return True, lines
-        logger.debug("Kubeconfig token expired (age=%.0fs), refreshing", age)
-
-    if resource_dir and resource_id:
-        lines.append("Resolving EKS cluster info from Terraform outputs...\n")
-        cluster_info = await _get_cluster_info_async(resource_id, resource_dir)
-        cluster_name = cluster_info.get("cluster_name")
-        region = cluster_info.get("region")
-
-        if cluster_name:
-            lines.append(f"Cluster: {cluster_name} (region: {region})\n")
-            lines.append("Configuring kubeconfig...\n")
-            success, output = _configure_kubeconfig(cluster_name, region)
-            lines.append(output + "\n")
-            if not success:
-                lines.append("Error: Failed to configure kubeconfig\n")
-                lines.append(f"{EXIT_SENTINEL_PREFIX}1\n")
-                return False, lines
-        else:
-            lines.append("Warning: Could not resolve cluster name from outputs. Using existing kubeconfig.\n")
-    else:
-        lines.append("Warning: EKS resource not found. Using existing kubeconfig.\n")
-    return True, lines
+    return await kubeconfig_manager.ensure(resource_id, resource_dir, _get_cluster_info_async, force=force)
 
 
 async def _stream_shell(cmd_str: str, cwd: str = None) -> AsyncIterator[str]:
@@ -230,15 +159,18 @@ async def _execute_commands(commands: List[str], preset_dir: str) -> AsyncIterat
 @router.post("/presets/refresh")
 async def refresh_presets():
     try:
-        preset_manager.refresh_from_s3()
-        return {"success": True}
+        stats = preset_manager.refresh_from_s3()
+        return {"success": True, "stats": stats}
     except Exception as e:
         logger.error(f"Failed to refresh presets from S3: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @router.get("/layout")
-async def get_layout():
+async def get_layout(request: Request, response: Response):
+    not_modified = http_cache.conditional(request, response, preset_manager.index_generation())
+    if not_modified is not None:
+        return not_modified
     try:
         layout = preset_manager.get_layout()
         return {"layout": layout}
@@ -259,7 +191,10 @@ async def save_layout(body: dict = Body(...)):
 
 
 @router.get("/presets")
-async def list_presets():
+async def list_presets(request: Request, response: Response):
+    not_modified = http_cache.conditional(request, response, preset_manager.index_generation())
+    if not_modified is not None:
+        return not_modified
     try:
         presets = preset_manager.list_presets()
         return {"presets": presets}
@@ -284,6 +219,14 @@ async def get_preset_file(name: str, filename: str):
     return {"filename": filename, "content": content}
 
 
+def _validate_depends_on(name: str, depends_on) -> List[str]:
+    if not isinstance(depends_on, list) or not all(isinstance(d, str) and d for d in depends_on):
+        raise HTTPException(status_code=400, detail="depends_on must be a list of preset names")
+    if name in depends_on:
+        raise HTTPException(status_code=400, detail="A preset cannot depend on itself")
+    return depends_on
+
+
 @router.post("/presets")
 async def create_preset(body: dict = Body(...)):
     name = body.get("name", "").strip()
@@ -304,6 +247,7 @@ async def create_preset(body: dict = Body(...)):
         update_commands=body.get("update_commands", []),
         undeploy_commands=body.get("undeploy_commands", []),
         files=body.get("files", {}),
+        depends_on=_validate_depends_on(name, body.get("depends_on", [])),
     )
     if not success:
         raise HTTPException(status_code=500, detail="Failed to create preset")
@@ -341,7 +285,9 @@ async def update_preset_manifest(name: str, body: dict = Body(...)):
     if preset.get("built_in"):
         raise HTTPException(status_code=403, detail="OOTB presets are read-only. Clone it first.")
 
-    for key in ("description", "type", "deploy_commands", "update_commands", "undeploy_commands"):
+    if "depends_on" in body:
+        body["depends_on"] = _validate_depends_on(name, body["depends_on"])
+    for key in ("description", "type", "deploy_commands", "update_commands", "undeploy_commands", "depends_on"):
         if key in body:
             preset[key] = body[key]
 
@@ -403,11 +349,15 @@ async def _stream_action(action_label: str, name: str, commands: List[str],
 
     yield f"\n{action_label} from: {preset_dir}\n"
 
+    lock = get_preset_lock(name)
+    if lock.locked():
+        yield f"Waiting for another operation on preset {name} to finish...\n"
     success = True
-    async for line in _execute_commands(commands, str(preset_dir)):
-        if line.startswith(EXIT_SENTINEL_PREFIX) and "1" in line:
-            success = False
-        yield line
+    async with lock:
+        async for line in _execute_commands(commands, str(preset_dir)):
+            if line.startswith(EXIT_SENTINEL_PREFIX) and "1" in line:
+                success = False
+            yield line
 
     if success and on_success:
         try:
@@ -444,6 +394,66 @@ async def deploy_preset(name: str):
     )
 
 
+@router.post("/pipeline/deploy")
+async def deploy_presets_pipeline(body: dict = Body(...)):
+    names = body.get("presets") or []
+    if not isinstance(names, list) or not names:
+        raise HTTPException(status_code=400, detail="presets must be a non-empty list of preset names")
+    max_concurrency = body.get("max_concurrency", DEFAULT_MAX_CONCURRENCY)
+    if not isinstance(max_concurrency, int) or max_concurrency < 1:
+        raise HTTPException(status_code=400, detail="max_concurrency must be a positive integer")
+
+    all_presets = {p["name"]: p for p in preset_manager.list_presets()}
+    try:
+        graph = resolve_deploy_graph(names, all_presets, preset_manager.get_deployments().keys())
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    missing_commands = [n for n in graph if not all_presets[n].get("deploy_commands")]
+    if missing_commands:
+        raise HTTPException(
+            status_code=400,
+            detail=f"No deploy commands defined for: {', '.join(sorted(missing_commands))}",
+        )
+
+    resource_id, resource_dir = _get_eks_resource_info()
+
+    async def _run_preset(name: str) -> AsyncIterator[str]:
+        preset_dir = await asyncio.to_thread(preset_manager.sync_preset_to_local, name)
+        if not preset_dir:
+            yield "Error: Failed to sync preset files to local\n"
+            yield f"{EXIT_SENTINEL_PREFIX}1\n"
+            return
+        async with get_preset_lock(name):
+            async for line in _execute_commands(all_presets[name].get("deploy_commands", []), str(preset_dir)):
+                yield line
+
+    pipeline = DeployPipeline(graph, _run_preset, max_concurrency=max_concurrency)
+
+    async def _stream():
+        yield "=== EKS Preset Pipeline Deploy ===\n"
+        yield f"Run: {pipeline.run_id}\n"
+        yield f"Order: {' -> '.join(pipeline.order)} (max concurrency {pipeline.max_concurrency})\n\n"
+
+        ok, lines = await _setup_kubeconfig(resource_id, resource_dir)
+        for line in lines:
+            yield line
+        if not ok:
+            return
+
+        async for line in pipeline.stream():
+            yield line
+
+        summary = pipeline.summary()
+        succeeded = [n for n, r in pipeline.results.items() if r.status == STATUS_SUCCEEDED]
+        try:
+            await asyncio.to_thread(preset_manager.mark_deployed_many, succeeded, summary)
+        except Exception as e:
+            logger.warning(f"Failed to record pipeline {pipeline.run_id} deployments: {e}")
+        logger.info(f"Preset pipeline {pipeline.run_id} finished: {summary['status']} in {summary['duration']}s")
+
+    return StreamingResponse(_stream(), media_type="text/plain")
+
+
 @router.post("/presets/{name}/update")
 async def update_preset_deploy(name: str):
     preset = preset_manager.get_preset(name)
@@ -518,6 +528,14 @@ async def run_kubectl(body: dict = Body(...)):
             return
 
         yield f"$ {command}\n"
+        plan = parse_kubectl_command(command)
+        if plan is not None:
+            try:
+                async for line in kube_client.run(plan):
+                    yield line
+                return
+            except KubeClientUnavailable as e:
+                logger.debug(f"Native Kubernetes client unavailable, falling back to kubectl: {e}")
         async for line in _stream_shell(command):
             yield line
 
@@ -530,7 +548,7 @@ async def kubeconfig_status():
     if not resource_dir:
         return {"configured": False, "cluster_name": None, "message": "EKS resource not found"}
 
-    cluster_info = await _get_cluster_info_async(resource_id, resource_dir)
+    cluster_info = await kubeconfig_manager.get_cluster_info(resource_id, resource_dir, _get_cluster_info_async)
     cluster_name = cluster_info.get("cluster_name")
     if not cluster_name:
         return {"configured": False, "cluster_name": None, "message": "Cluster not deployed or outputs unavailable"}
@@ -540,4 +558,5 @@ async def kubeconfig_status():
         "cluster_name": cluster_name,
         "region": cluster_info.get("region"),
         "kubeconfig_command": cluster_info.get("kubeconfig_command"),
+        "token": kubeconfig_manager.get_status(),
     }
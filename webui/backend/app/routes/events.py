@@ -0,0 +1,98 @@
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect
+from typing import Iterable, List, Optional
+import asyncio
+import json
+import logging
+
+from app.services import metrics
+from app.services.event_bus import EVENT_TYPES, event_bus
+
+router = APIRouter(prefix="/api/events", tags=["events"])
+logger = logging.getLogger(__name__)
+
+metrics.QUEUE_DEPTH.set_function(lambda: len(event_bus), queue="event_subscribers")
+
+
+def _split(value) -> List[str]:
+    if not value:
+        return []
+    if isinstance(value, str):
+        value = value.split(",")
+    return [v.strip() for v in value if v and v.strip()]
+
+
+def _unknown_types(types: Iterable[str]) -> List[str]:
+    return [t for t in types if t not in EVENT_TYPES]
+
+
+@router.websocket("/ws")
+async def events_websocket(websocket: WebSocket, types: Optional[str] = None, resources: Optional[str] = None):
+    """Push channel for state changes.
+
+    Filters come from the `types`/`resources` query parameters (comma separated)
+    and can be replaced later with `{"type": "subscribe", "types": [...],
+    "resources": [...]}`. Events without a resource id (credentials, presets)
+    pass any resource filter.
+    """
+    await websocket.accept()
+
+    event_types, resource_ids = _split(types), _split(resources)
+    unknown = _unknown_types(event_types)
+    if unknown:
+        await websocket.send_text(json.dumps({'type': 'error', 'data': f"Unknown event types: {', '.join(unknown)}"}))
+        await websocket.close(code=1008)
+        return
+
+    subscription = event_bus.subscribe(event_types, resource_ids)
+    logger.info(f"Event subscriber connected ({len(event_bus)} total)")
+
+    async def _ack():
+        await websocket.send_text(json.dumps({
+            'type': 'subscribed',
+            'types': sorted(subscription.types) or list(EVENT_TYPES),
+            'resources': sorted(subscription.resources),
+        }))
+
+    async def push_events():
+        while True:
+            event = await subscription.get()
+            dropped = subscription.take_dropped()
+            if dropped:
+                # The client fell behind; it should refetch rather than trust its state
+                await websocket.send_text(json.dumps({'type': 'overflow', 'dropped': dropped}))
+            await websocket.send_text(json.dumps(event.to_dict()))
+
+    async def receive_filters():
+        while True:
+            text = await websocket.receive_text()
+            try:
+                message = json.loads(text)
+                if message.get('type') != 'subscribe':
+                    continue
+                new_types, new_resources = _split(message.get('types')), _split(message.get('resources'))
+            except (ValueError, AttributeError, TypeError):
+                await websocket.send_text(json.dumps({'type': 'error', 'data': "Invalid subscribe message"}))
+                continue
+            unknown = _unknown_types(new_types)
+            if unknown:
+                await websocket.send_text(json.dumps({'type': 'error', 'data': f"Unknown event types: {', '.join(unknown)}"}))
+                continue
+            subscription.update(new_types, new_resources)
+            await _ack()
+
+    tasks = []
+    try:
+        await _ack()
+        tasks = [asyncio.create_task(push_events()), asyncio.create_task(receive_filters())]
+        done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            task.result()
+    except WebSocketDisconnect:
+        pass
+    except Exception as e:
+        logger.error(f"Event WebSocket error: {e}")
+    finally:
+        for task in tasks:
+            task.cancel()
+        event_bus.unsubscribe(subscription)
+        logger.info(f"Event subscriber disconnected ({len(event_bus)} total)")
@@ -1,4 +1,5 @@
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect, HTTPException
+from fastapi.responses import StreamingResponse
 from typing import Dict, List, Optional
 import asyncio
 import paramiko
@@ -10,6 +11,7 @@ from io import StringIO
 
 from app.services.key_manager import LocalKeyManager
 from app.services.config_manager import ConfigManager
+from app.services import metrics, session_recorder, tracing
 
 router = APIRouter(prefix="/api/ssh", tags=["ssh"])
 logger = logging.getLogger(__name__)
@@ -17,6 +19,7 @@ logger = logging.getLogger(__name__)
 TERRAFORM_DIR = os.environ.get("TERRAFORM_DIR", "/app/terraform")
 local_key_manager = LocalKeyManager(keys_dir=str(Path(TERRAFORM_DIR) / "keys"))
 active_connections: Dict[str, dict] = {}
+metrics.QUEUE_DEPTH.set_function(lambda: len(active_connections), queue="ssh_connections")
 
 
 def _terraform_root() -> Path:
@@ -157,16 +160,28 @@ async def ssh_websocket(websocket: WebSocket, connection_id: str):
             logger.info(f"Reusing existing SSH session for {connection_id}")
             channel = existing_connection['channel']
             
-            try:
-                channel.send('\n')
+            transport = existing_connection['ssh'].get_transport()
+            if channel.closed or transport is None or not transport.is_active():
+                logger.debug(f"Existing connection is dead, creating new one for {connection_id}")
+                recorder = existing_connection.get('recorder')
+                if recorder:
+                    await asyncio.to_thread(recorder.close)
+                del active_connections[connection_id]
+                existing_connection = None
+            else:
                 await websocket.send_text(json.dumps({
                     'type': 'connected',
                     'data': f'Reconnected to {username}@{hostname}'
                 }))
-            except Exception as e:
-                logger.debug(f"Existing connection is dead, creating new one for {connection_id}: {e}")
-                del active_connections[connection_id]
-                existing_connection = None
+                recorder = existing_connection.get('recorder')
+                if recorder:
+                    scrollback = await asyncio.to_thread(
+                        recorder.scrollback, session_recorder.scrollback_bytes(params.get('scrollback_kb')))
+                    if scrollback:
+                        await websocket.send_text(json.dumps({
+                            'type': 'output',
+                            'data': scrollback
+                        }))
         
         if not existing_connection:
             pkey = _load_pkey(key_path)
@@ -190,8 +205,8 @@ async def ssh_websocket(websocket: WebSocket, connection_id: str):
                     'type': 'status',
                     'data': f'Connecting to {username}@{hostname}...'
                 }))
-                loop = asyncio.get_event_loop()
-                await loop.run_in_executor(None, lambda: ssh.connect(**connect_kw))
+                with tracing.span("ssh.connect", resource=hostname, username=username):
+                    await asyncio.to_thread(ssh.connect, **connect_kw)
                 
                 init_cols = params.get('cols', 80)
                 init_rows = params.get('rows', 24)
@@ -207,7 +222,10 @@ async def ssh_websocket(websocket: WebSocket, connection_id: str):
                     'channel': channel,
                     'hostname': hostname,
                     'username': username,
-                    'websockets': []
+                    'websockets': [],
+                    'recorder': await asyncio.to_thread(
+                        session_recorder.create_recorder, connection_id, hostname, username, init_cols, init_rows
+                    ),
                 }
                 
                 await websocket.send_text(json.dumps({
@@ -241,21 +259,39 @@ async def ssh_websocket(websocket: WebSocket, connection_id: str):
         active_connections[connection_id]['websockets'].append(websocket)
         
         channel = active_connections[connection_id]['channel']
+        recorder = active_connections[connection_id].get('recorder')
+        relayed = {"in": 0, "out": 0}
         
         async def read_from_channel():
+            try:
+                await _relay_channel_output()
+            finally:
+                # The channel is gone (or unreadable); nothing more will be recorded
+                if recorder:
+                    await asyncio.to_thread(recorder.close)
+
+        async def _relay_channel_output():
             while True:
                 try:
                     if channel.recv_ready():
                         data = channel.recv(4096)
-                        if data:
-                            for ws in active_connections[connection_id].get('websockets', []):
-                                try:
-                                    await ws.send_text(json.dumps({
-                                        'type': 'output',
-                                        'data': data.decode('utf-8', errors='ignore')
-                                    }))
-                                except Exception as e:
-                                    logger.debug(f"Failed to send WebSocket output for connection {connection_id}: {e}")
+                        if not data:
+                            break
+                        metrics.SSH_BYTES.inc(len(data), direction="out")
+                        relayed["out"] += len(data)
+                        text = data.decode('utf-8', errors='ignore')
+                        if recorder:
+                            recorder.record_output(text)
+                        for ws in active_connections[connection_id].get('websockets', []):
+                            try:
+                                await ws.send_text(json.dumps({
+                                    'type': 'output',
+                                    'data': text
+                                }))
+                            except Exception as e:
+                                logger.debug(f"Failed to send WebSocket output for connection {connection_id}: {e}")
+                    elif channel.closed or channel.exit_status_ready():
+                        break
                     else:
                         await asyncio.sleep(0.01)
                 except Exception as e:
@@ -271,20 +307,31 @@ async def ssh_websocket(websocket: WebSocket, connection_id: str):
                     if msg_data.get('type') == 'input':
                         input_data = msg_data.get('data', '')
                         channel.send(input_data)
+                        sent = len(input_data.encode('utf-8', errors='ignore'))
+                        metrics.SSH_BYTES.inc(sent, direction="in")
+                        relayed["in"] += sent
                     elif msg_data.get('type') == 'resize':
                         cols = msg_data.get('cols', 80)
                         rows = msg_data.get('rows', 24)
                         channel.resize_pty(width=cols, height=rows)
+                        if recorder:
+                            recorder.record_resize(cols, rows)
                 except WebSocketDisconnect:
                     break
                 except Exception as e:
                     logger.error(f"Error writing to channel: {e}")
                     break
         
-        await asyncio.gather(
-            read_from_channel(),
-            write_to_channel()
-        )
+        with tracing.span("ssh.session", resource=active_connections[connection_id].get('hostname'),
+                          connection_id=connection_id) as span:
+            try:
+                await asyncio.gather(
+                    read_from_channel(),
+                    write_to_channel()
+                )
+            finally:
+                span.set_metric("ssh.bytes_in", relayed["in"])
+                span.set_metric("ssh.bytes_out", relayed["out"])
         
     except WebSocketDisconnect:
         logger.info(f"WebSocket disconnected for {connection_id}")
@@ -327,8 +374,30 @@ async def close_connection(connection_id: str):
                 conn['ssh'].close()
             except Exception:
                 pass
+        if conn.get('recorder'):
+            await asyncio.to_thread(conn['recorder'].close)
         del active_connections[connection_id]
         logger.info(f"Closed connection {connection_id}")
         return {"success": True, "message": "Connection closed"}
     else:
         raise HTTPException(status_code=404, detail="Connection not found")
+
+
+@router.get("/recordings")
+async def get_recordings():
+    recordings = await asyncio.to_thread(session_recorder.list_recordings)
+    return {"recordings": recordings}
+
+
+@router.get("/recordings/{recording_id}")
+async def replay_recording(recording_id: str, speed: float = 1.0, since: float = 0.0):
+    recording_dir = session_recorder.get_recording_dir(recording_id)
+    if recording_dir is None:
+        raise HTTPException(status_code=404, detail="Recording not found")
+    if speed <= 0:
+        raise HTTPException(status_code=400, detail="speed must be greater than 0")
+    return StreamingResponse(
+        session_recorder.iter_asciicast(recording_dir, speed=speed, since=since),
+        media_type="application/x-asciicast",
+        headers={"Content-Disposition": f'attachment; filename="{recording_id}.cast"'},
+    )
@@ -1,5 +1,5 @@
 from dataclasses import dataclass, field
-from fastapi import APIRouter, HTTPException, Query, Body
+from fastapi import APIRouter, HTTPException, Query, Body, Request, Response
 from fastapi.responses import StreamingResponse
 from typing import List, Dict, Optional
 from pathlib import Path
@@ -13,15 +13,24 @@ import boto3
 from botocore.exceptions import ClientError, ProfileNotFound
 
 from app.models.schemas import (
+    ResourceStatus,
     ResourceType,
     TerraformResource,
     TerraformStateResponse,
     TerraformVariable
 )
 from app.services.terraform_parser import TerraformParser
-from app.services.terraform_runner import TerraformRunner
+from app.services.terraform_runner import TerraformRunner, module_addresses, scope_args
+from app.services.terraform_init import check_init, write_init_fingerprint
+from app.services import http_cache, metrics
+from app.services.process_monitor import ProcessUsage
 from app.services.instance_discovery import get_resource_id_for_instance, get_resource_type_from_dir
 from app.services.credential_manager import credential_manager
+from app.services.drift_scanner import DriftScanner
+from app.services.event_bus import OPERATION_FINISHED, OPERATION_STARTED, event_bus
+from app.services.kubeconfig_manager import kubeconfig_manager
+from app.services.variable_schema import DEFAULT_FROM_FILE
+from app.services.state_index import has_redacted_outputs
 
 router = APIRouter(prefix="/api/terraform", tags=["terraform"])
 logger = logging.getLogger(__name__)
@@ -40,9 +49,55 @@ class TerraformOperation:
     status: str = "running"
     output: List[str] = field(default_factory=list)
     exit_code: Optional[int] = None
+    usage: List[ProcessUsage] = field(default_factory=list)
+    targets: List[str] = field(default_factory=list)
+    refresh: bool = True
+
+    def usage_dict(self) -> List[Dict]:
+        return [u.to_dict() for u in self.usage]
 
 
 active_operations: Dict[str, TerraformOperation] = {}
+metrics.QUEUE_DEPTH.set_function(
+    lambda: sum(1 for op in active_operations.values() if op.status == "running"), queue="terraform_operations")
+metrics.QUEUE_DEPTH.set_function(lambda: len(runner.get_running_usage()), queue="terraform_processes")
+metrics.QUEUE_DEPTH.set_function(lambda: runner.init_all_pending(), queue="terraform_init_all")
+
+
+def _drift_targets() -> List[str]:
+    return [r.id for r in parser.parse_all_resources() if r.status == ResourceStatus.ENABLED]
+
+
+def _is_busy(resource_id: str) -> bool:
+    op = active_operations.get(resource_id)
+    return (op is not None and op.status == "running") or get_resource_lock(resource_id).locked()
+
+
+def _invalidate_kubeconfig(resource_id: str, dir_name: Optional[str]) -> None:
+    # Only an EKS apply/destroy can change the cluster the cached token was signed for
+    if dir_name and get_resource_type_from_dir(dir_name) == ResourceType.EKS:
+        kubeconfig_manager.invalidate(resource_id)
+
+
+async def _check_drift(resource_id: str) -> tuple[int, str]:
+    aws_env = await asyncio.to_thread(parser.get_aws_env)
+    return await runner.plan_refresh_only(resource_id, var_files=_var_files_for_resource(resource_id),
+                                          env_extra=aws_env)
+
+
+drift_scanner = DriftScanner(_check_drift, _drift_targets, is_busy=_is_busy)
+
+
+def _with_drift(resources: List[TerraformResource]) -> List[TerraformResource]:
+    for resource in resources:
+        resource.drifted = drift_scanner.store.drifted(resource.id)
+    return resources
+
+
+def _resources_generation() -> Optional[tuple]:
+    generation = parser.resources_generation()
+    return generation and (generation, drift_scanner.store.version)
+
 
 _CREDENTIAL_ERROR_KEYWORDS = [
     "token has expired", "token retrieval", "no credentials",
@@ -195,27 +250,10 @@ def _extract_eks_config_from_outputs(outputs: Dict) -> tuple[Dict, List[str]]:
     return config, missing
 
 
-def _build_sts_client():
-    aws_env = parser.get_aws_env()
-    region = aws_env.get("AWS_REGION", "ap-northeast-2")
-    access_key = os.environ.get("AWS_ACCESS_KEY_ID")
-    secret_key = os.environ.get("AWS_SECRET_ACCESS_KEY")
-    session_token = os.environ.get("AWS_SESSION_TOKEN")
-    if access_key and secret_key:
-        return boto3.client(
-            "sts", region_name=region,
-            aws_access_key_id=access_key,
-            aws_secret_access_key=secret_key,
-            aws_session_token=session_token,
-        )
-    return boto3.client("sts", region_name=region)
-
-
 @router.get("/credentials/check")
 async def check_credentials():
     try:
-        sts = _build_sts_client()
-        identity = await asyncio.to_thread(sts.get_caller_identity)
+        identity = await asyncio.to_thread(credential_manager.get_identity)
         return {
             "valid": True,
             "account": identity.get("Account", ""),
@@ -237,8 +275,7 @@ async def check_credentials():
         refreshed = await asyncio.to_thread(credential_manager.try_refresh_credentials)
         if refreshed:
             try:
-                sts = _build_sts_client()
-                identity = await asyncio.to_thread(sts.get_caller_identity)
+                identity = await asyncio.to_thread(credential_manager.get_identity)
                 return {
                     "valid": True,
                     "account": identity.get("Account", ""),
@@ -315,12 +352,29 @@ async def provider_cache_status():
     return runner.get_cache_status()
 
 
+def start_init_all():
+    return runner.start_init_all(env_extra=parser.get_aws_env(), is_busy=_is_busy)
+
+
+@router.post("/init-all")
+async def terraform_init_all():
+    job = start_init_all()
+    return job.to_dict()
+
+
 def get_resource_lock(resource_id: str) -> asyncio.Lock:
     if resource_id not in resource_locks:
         resource_locks[resource_id] = asyncio.Lock()
     return resource_locks[resource_id]
 
 
+def _validate_scope(targets: List[str], refresh: bool) -> None:
+    try:
+        scope_args(targets, refresh)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
 async def _run_apply_background(
     op: TerraformOperation,
     auto_approve: bool,
@@ -330,12 +384,16 @@ async def _run_apply_background(
     resource_lock = get_resource_lock(op.resource_id)
     async with resource_lock:
         logger.info(f"Background apply started for {op.resource_id}")
+        event_bus.publish(OPERATION_STARTED, op.resource_id, operation=op.operation)
         try:
             async for chunk in runner.stream_apply(
                 resource_id=op.resource_id,
                 auto_approve=auto_approve,
                 var_files=var_files,
                 env_extra=aws_env,
+                on_usage=op.usage.append,
+                targets=op.targets,
+                refresh=op.refresh,
             ):
                 op.output.append(chunk)
                 if chunk.startswith("__TF_EXIT__:"):
@@ -352,6 +410,10 @@ async def _run_apply_background(
                 res_dir = runner.get_resource_directory(op.resource_id)
                 dir_name = res_dir.name if res_dir else None
                 parser.invalidate_s3_status(dir_name)
+                _invalidate_kubeconfig(op.resource_id, dir_name)
+                drift_scanner.store.forget(op.resource_id)
+            event_bus.publish(OPERATION_FINISHED, op.resource_id, operation=op.operation,
+                              status=op.status, exit_code=op.exit_code)
 
 
 async def _run_destroy_background(
@@ -363,12 +425,14 @@ async def _run_destroy_background(
     resource_lock = get_resource_lock(op.resource_id)
     async with resource_lock:
         logger.info(f"Background destroy started for {op.resource_id}")
+        event_bus.publish(OPERATION_STARTED, op.resource_id, operation=op.operation)
         try:
             async for chunk in runner.stream_destroy(
                 resource_id=op.resource_id,
                 auto_approve=auto_approve,
                 var_files=var_files,
                 env_extra=aws_env,
+                on_usage=op.usage.append,
             ):
                 op.output.append(chunk)
                 if chunk.startswith("__TF_EXIT__:"):
@@ -385,6 +449,10 @@ async def _run_destroy_background(
                 res_dir = runner.get_resource_directory(op.resource_id)
                 dir_name = res_dir.name if res_dir else None
                 parser.invalidate_s3_status(dir_name)
+                _invalidate_kubeconfig(op.resource_id, dir_name)
+                drift_scanner.store.forget(op.resource_id)
+            event_bus.publish(OPERATION_FINISHED, op.resource_id, operation=op.operation,
+                              status=op.status, exit_code=op.exit_code)
 
 
 async def _stream_operation_output(op: TerraformOperation):
@@ -421,8 +489,13 @@ async def terraform_init_status(resource_id: str):
     resource_dir = runner.get_resource_directory(resource_id)
     if not resource_dir or not resource_dir.exists():
         raise HTTPException(status_code=404, detail="Resource directory not found")
-    initialized = (resource_dir / ".terraform").exists()
-    return {"initialized": initialized, "resource_id": resource_id}
+    check = await asyncio.to_thread(check_init, resource_dir)
+    return {
+        "initialized": check.current,
+        "changed": list(check.changed) if check.initialized else [],
+        "reconfigure": check.reconfigure,
+        "resource_id": resource_id,
+    }
 
 
 @router.get("/init/stream/{resource_id}")
@@ -437,19 +510,26 @@ async def terraform_init_stream(resource_id: str):
         from app.services.terraform_runner import EXIT_SENTINEL_PREFIX
         env = {**os.environ, **(aws_env or {})}
         try:
-            process = await asyncio.create_subprocess_exec(
-                "terraform", "init", "-no-color", "-input=false",
-                stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.STDOUT,
-                cwd=str(resource_dir),
-                env=env
-            )
-            while True:
-                line = await process.stdout.readline()
-                if not line:
-                    break
-                yield line.decode()
-            code = (await process.wait()) or 0
+            lock = runner._get_init_lock(resource_dir)
+            if lock.locked():
+                yield "Waiting for background terraform init...\n"
+            async with lock:
+                check = await asyncio.to_thread(check_init, resource_dir)
+                process = await asyncio.create_subprocess_exec(
+                    *check.init_args(),
+                    stdout=asyncio.subprocess.PIPE,
+                    stderr=asyncio.subprocess.STDOUT,
+                    cwd=str(resource_dir),
+                    env=env
+                )
+                while True:
+                    line = await process.stdout.readline()
+                    if not line:
+                        break
+                    yield line.decode()
+                code = (await process.wait()) or 0
+                if code == 0:
+                    await asyncio.to_thread(write_init_fingerprint, resource_dir)
             yield f"{EXIT_SENTINEL_PREFIX}{0 if code == 0 else 1}\n"
         except Exception as e:
             logger.error(f"Error streaming terraform init: {e}")
@@ -473,24 +553,28 @@ async def terraform_init_resource(resource_id: str):
         aws_env = parser.get_aws_env()
         env = {**os.environ, **(aws_env or {})}
         logger.info(f"Force running terraform init in {resource_dir}")
-        process = await asyncio.create_subprocess_exec(
-            "terraform", "init", "-no-color", "-input=false",
-            stdout=asyncio.subprocess.PIPE,
-            stderr=asyncio.subprocess.STDOUT,
-            cwd=str(resource_dir),
-            env=env
-        )
-        
-        lines = []
-        while True:
-            line = await process.stdout.readline()
-            if not line:
-                break
-            lines.append(line.decode())
-        
-        await process.wait()
+        async with runner._get_init_lock(resource_dir):
+            check = await asyncio.to_thread(check_init, resource_dir)
+            process = await asyncio.create_subprocess_exec(
+                *check.init_args(),
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.STDOUT,
+                cwd=str(resource_dir),
+                env=env
+            )
+
+            lines = []
+            while True:
+                line = await process.stdout.readline()
+                if not line:
+                    break
+                lines.append(line.decode())
+
+            await process.wait()
+            success = process.returncode == 0
+            if success:
+                await asyncio.to_thread(write_init_fingerprint, resource_dir)
         output = "".join(lines)
-        success = process.returncode == 0
         
         if success:
             logger.info(f"Successfully initialized terraform in {resource_dir}")
@@ -736,9 +820,12 @@ async def get_onboarding_status():
 
 
 @router.get("/resources", response_model=List[TerraformResource])
-async def get_resources():
+async def get_resources(request: Request, response: Response):
+    not_modified = http_cache.conditional(request, response, _resources_generation())
+    if not_modified is not None:
+        return not_modified
     try:
-        resources = parser.parse_all_resources()
+        resources = _with_drift(parser.parse_all_resources())
         logger.info(f"Loaded {len(resources)} resources with current states")
         return resources
     except ProfileNotFound:
@@ -788,7 +875,10 @@ async def refresh_resource_status(resource_id: str):
 
 
 @router.get("/variables", response_model=List[TerraformVariable])
-async def get_variables():
+async def get_variables(request: Request, response: Response):
+    not_modified = http_cache.conditional(request, response, parser.variables_generation())
+    if not_modified is not None:
+        return not_modified
     try:
         variables = parser.parse_variables()
         return variables
@@ -886,6 +976,16 @@ async def sync_tfvars_to_instances():
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.post("/onboarding/sync-config")
+async def sync_config_with_s3(direction: str = "both", dry_run: bool = False):
+    if direction not in ("both", "pull", "push"):
+        raise HTTPException(status_code=400, detail="direction must be one of: both, pull, push")
+    stats = await asyncio.to_thread(parser.sync_config_with_s3, direction, dry_run)
+    if stats is None:
+        raise HTTPException(status_code=503, detail="S3 config bucket not available")
+    return {"success": stats["failed"] == 0, "stats": stats}
+
+
 @router.get("/check-name-prefix/{prefix}")
 async def check_name_prefix(prefix: str):
     try:
@@ -929,61 +1029,71 @@ async def restore_resource_variables(resource_id: str):
 
 
 @router.get("/resources/{resource_id}/variables", response_model=List[TerraformVariable])
-async def get_resource_variables(resource_id: str):
+async def get_resource_variables(resource_id: str, request: Request, response: Response):
+    generation = (resource_id, parser.variables_generation(), parser.instances_generation())
+    not_modified = http_cache.conditional(request, response, generation)
+    if not_modified is not None:
+        return not_modified
     try:
-        from app.config import (
-            is_common_variable,
-            is_excluded_variable,
-            get_resource_type_for_variables,
-            get_resource_variables as get_resource_variable_configs,
-        )
-
-        var_names = parser.get_resource_variables(resource_id)
-        all_variables = parser.parse_variables()
-        resource_vars = [
-            v for v in all_variables
-            if v.name in var_names
-            and not is_excluded_variable(v.name)
-            and not is_common_variable(v.name)
-        ]
-        resource = parser.get_resource_by_id(resource_id)
-        if resource:
-            effective_type = get_resource_type_for_variables(resource.type.value, resource.id)
-            configs = get_resource_variable_configs(effective_type)
-            returned_names = {v.name for v in resource_vars}
-            for config in configs:
-                if config.name in var_names and config.name not in returned_names and not is_excluded_variable(config.name):
-                    default_val = config.default_value
-                    if isinstance(default_val, bool):
-                        value = "true" if default_val else "false"
-                    else:
-                        value = str(default_val) if default_val is not None else ""
-                    sensitive = any(k in config.name.lower() for k in ["password", "key", "secret", "token"])
-                    resource_vars.append(TerraformVariable(
-                        name=config.name,
-                        value=value,
-                        description=config.description,
-                        sensitive=sensitive,
-                        is_common=False,
-                    ))
-                    returned_names.add(config.name)
-        instance_defaults = parser.parse_instance_variable_defaults(resource_id)
-        for v in resource_vars:
-            if v.name in instance_defaults:
-                raw = instance_defaults[v.name]
-                v.value = "***" if (v.sensitive and raw) else raw
-
-        instance_map = parser.get_instance_tfvars_map(resource_id)
-        for v in resource_vars:
-            if v.name in instance_map:
-                raw = instance_map[v.name]
-                v.value = "***" if (v.sensitive and raw) else raw
+        from app.config import get_resource_only_variable_names
+
+        schema = parser.variable_schema(resource_id)
+        if not schema:
+            return []
+        root_map = parser._read_tfvars_to_map(parser._root_tfvars_path())
+        instance_map = parser._read_tfvars_to_map(parser.instances_dir / schema.dir_name / "terraform.tfvars")
+
+        resource_only = get_resource_only_variable_names()
+        resource_vars = []
+        for spec in schema.variables:
+            # Declared-only variables are listed once they have a root value, as in the root panel
+            if not spec.configured and (spec.name not in root_map or spec.name in resource_only):
+                continue
+            # Config defaults are shown as-is; anything read from a file is masked when sensitive
+            masked = spec.sensitive
+            if spec.name in instance_map:
+                raw = instance_map[spec.name]
+            elif spec.has_default or spec.configured:
+                raw = spec.default_display
+                masked = masked and spec.default_source == DEFAULT_FROM_FILE
+            else:
+                raw = root_map[spec.name]
+            resource_vars.append(TerraformVariable(
+                name=spec.name,
+                value="***" if (masked and raw) else raw,
+                description=spec.description or None,
+                sensitive=spec.sensitive,
+                is_common=False,
+            ))
         return resource_vars
     except Exception as e:
         logger.error(f"Error getting resource variables: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.get("/resources/{resource_id}/addresses")
+async def get_resource_addresses(resource_id: str):
+    """Addresses in the instance's state, plus their module paths, for targeted plan/apply."""
+    resource_dir = runner.get_resource_directory(resource_id)
+    if not resource_dir:
+        raise HTTPException(status_code=404, detail="Resource not found")
+    indexed = await asyncio.to_thread(parser.state_index.resources, resource_dir.name)
+    if indexed:
+        addresses = [r["address"] for r in indexed]
+    else:
+        aws_env = await asyncio.to_thread(parser.get_aws_env)
+        success, addresses = await runner.state_addresses(resource_id, env_extra=aws_env)
+        if not success:
+            raise HTTPException(status_code=500, detail=addresses[0] if addresses else "terraform state list failed")
+    drift = drift_scanner.store.get(resource_id)
+    return {
+        "resource_id": resource_id,
+        "addresses": addresses,
+        "modules": module_addresses(addresses),
+        "drifted": [c["address"] for c in drift.changes if c.get("address")] if drift else [],
+    }
+
+
 @router.get("/resources/{resource_id}/description")
 async def get_resource_description(resource_id: str):
     try:
@@ -1002,9 +1112,14 @@ async def get_resource_description(resource_id: str):
 
 
 @router.get("/state", response_model=TerraformStateResponse)
-async def get_state():
+async def get_state(request: Request, response: Response):
+    resources_generation = _resources_generation()
+    generation = resources_generation and (resources_generation, parser.variables_generation())
+    not_modified = http_cache.conditional(request, response, generation)
+    if not_modified is not None:
+        return not_modified
     try:
-        resources = parser.parse_all_resources()
+        resources = _with_drift(parser.parse_all_resources())
         variables = parser.parse_variables()
         return TerraformStateResponse(resources=resources, variables=variables)
     except Exception as e:
@@ -1013,7 +1128,9 @@ async def get_state():
 
 
 @router.get("/plan/stream/{resource_id}")
-async def terraform_plan_stream_resource(resource_id: str):
+async def terraform_plan_stream_resource(resource_id: str, target: List[str] = Query(default=[]),
+                                         refresh: bool = True):
+    _validate_scope(target, refresh)
     try:
         target_resource = parser.get_resource_by_id(resource_id)
         
@@ -1025,7 +1142,8 @@ async def terraform_plan_stream_resource(resource_id: str):
         async def stream_generator():
             logger.info(f"Starting plan for resource {resource_id}")
             try:
-                async for chunk in runner.stream_plan(resource_id=resource_id, var_files=var_files, env_extra=aws_env):
+                async for chunk in runner.stream_plan(resource_id=resource_id, var_files=var_files, env_extra=aws_env,
+                                                      targets=target, refresh=refresh):
                     yield chunk
             finally:
                 logger.info(f"Completed plan for resource {resource_id}")
@@ -1040,12 +1158,14 @@ async def terraform_plan_stream_resource(resource_id: str):
 
 
 @router.get("/apply/stream/{resource_id}")
-async def terraform_apply_stream_resource(resource_id: str, auto_approve: bool = False):
+async def terraform_apply_stream_resource(resource_id: str, auto_approve: bool = False,
+                                          target: List[str] = Query(default=[]), refresh: bool = True):
     existing = active_operations.get(resource_id)
     if existing and existing.status == "running":
         logger.info(f"Reconnecting to running apply for {resource_id}")
         return StreamingResponse(_stream_operation_output(existing), media_type="text/plain")
 
+    _validate_scope(target, refresh)
     try:
         target_resource = parser.get_resource_by_id(resource_id)
         if not target_resource:
@@ -1092,7 +1212,7 @@ async def terraform_apply_stream_resource(resource_id: str, auto_approve: bool =
                             logger.error(f"Failed to update IP in tfvars: {e}")
 
         aws_env = parser.get_aws_env()
-        op = TerraformOperation(resource_id=resource_id, operation="apply")
+        op = TerraformOperation(resource_id=resource_id, operation="apply", targets=target, refresh=refresh)
         active_operations[resource_id] = op
         asyncio.create_task(_run_apply_background(op, auto_approve, var_files, aws_env))
         return StreamingResponse(_stream_operation_output(op), media_type="text/plain")
@@ -1141,15 +1261,57 @@ async def terraform_destroy_stream_resource(resource_id: str, auto_approve: bool
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.get("/drift")
+async def get_drift():
+    return await asyncio.to_thread(drift_scanner.status)
+
+
+@router.post("/drift/scan")
+async def scan_drift(resource_id: Optional[str] = None):
+    if resource_id is not None and not runner.get_resource_directory(resource_id):
+        raise HTTPException(status_code=404, detail="Resource not found")
+    started = drift_scanner.start_scan([resource_id] if resource_id else None)
+    return {"started": started, "scanning": drift_scanner.scanning}
+
+
+@router.get("/drift/{resource_id}")
+async def get_resource_drift(resource_id: str):
+    result = await asyncio.to_thread(drift_scanner.store.get, resource_id)
+    if not result:
+        raise HTTPException(status_code=404, detail="No drift check recorded for this resource")
+    return result.to_dict()
+
+
 @router.get("/operations/active")
 async def get_active_operations():
     return {
-        rid: {"operation": op.operation, "status": op.status}
+        rid: {"operation": op.operation, "status": op.status, "targets": op.targets, "refresh": op.refresh,
+              "usage": op.usage_dict()}
         for rid, op in active_operations.items()
         if op.status == "running"
     }
 
 
+@router.get("/operations/{resource_id}/usage")
+async def get_operation_usage(resource_id: str):
+    op = active_operations.get(resource_id)
+    if not op:
+        raise HTTPException(status_code=404, detail="No operation recorded for this resource")
+    return {"resource_id": resource_id, "operation": op.operation, "status": op.status, "usage": op.usage_dict()}
+
+
+@router.get("/usage/running")
+async def get_running_usage():
+    return {"processes": runner.get_running_usage()}
+
+
+@router.get("/usage/{resource_id}")
+async def get_resource_usage(resource_id: str, limit: int = Query(50, ge=1, le=500), operation: Optional[str] = None):
+    history = await asyncio.to_thread(runner.usage_store.history, resource_id, limit, operation)
+    summary = await asyncio.to_thread(runner.usage_store.summary, resource_id)
+    return {"resource_id": resource_id, "summary": summary, "history": history}
+
+
 @router.get("/output")
 async def terraform_output(resource_id: Optional[str] = None):
     try:
@@ -1161,6 +1323,60 @@ async def terraform_output(resource_id: Optional[str] = None):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.get("/resources/{resource_id}/outputs")
+async def get_resource_outputs(resource_id: str):
+    resource_dir = runner.get_resource_directory(resource_id)
+    if not resource_dir:
+        raise HTTPException(status_code=404, detail="Resource not found")
+    outputs = await asyncio.to_thread(parser.state_index.outputs, resource_dir.name)
+    if outputs is None:
+        raise HTTPException(status_code=404, detail=f"No indexed state for {resource_id}")
+    return {"resource_id": resource_id, "outputs": outputs}
+
+
+@router.get("/state-index")
+async def get_state_index():
+    stats = await asyncio.to_thread(parser.state_index.stats)
+    return {**stats, "indexed_instances": await asyncio.to_thread(parser.state_index.instances)}
+
+
+@router.get("/public-ips")
+async def list_public_ips():
+    return {"public_ips": await asyncio.to_thread(parser.state_index.public_ips)}
+
+
+@router.get("/lookup/ip/{ip}")
+async def lookup_ip(ip: str):
+    """Which instance directory owns a public IP (EC2 instance, EIP or ENI association)."""
+    matches = await asyncio.to_thread(parser.state_index.find_by_ip, ip)
+    if not matches:
+        raise HTTPException(status_code=404, detail=f"No indexed resource has public IP {ip}")
+    return {"ip": ip, "matches": matches}
+
+
+@router.get("/search")
+async def search_resources(
+    type: Optional[str] = None,
+    id: Optional[str] = None,
+    tag: List[str] = Query(default=[]),
+    attr: Optional[str] = None,
+    value: Optional[str] = None,
+    instance: Optional[str] = None,
+    include_data: bool = False,
+    limit: int = Query(100, ge=1, le=1000),
+):
+    """Search resources in every indexed state by type, AWS id/ARN, tag (Key or Key=Value),
+    attribute path and value prefix; filters combine with AND."""
+    if not any([type, id, tag, attr, value, instance]):
+        raise HTTPException(status_code=400, detail="At least one of type, id, tag, attr, value or instance is required")
+    started = time.perf_counter()
+    result = await asyncio.to_thread(
+        parser.state_index.search, resource_type=type, cloud_id=id, tags=tag, attribute=attr, value=value,
+        instance=instance, include_data=include_data, limit=limit,
+    )
+    return {**result, "count": len(result["results"]), "took_ms": round((time.perf_counter() - started) * 1000, 2)}
+
+
 @router.get("/eks/config")
 async def get_eks_config():
     try:
@@ -1174,16 +1390,18 @@ async def get_eks_config():
             if local_config:
                 return local_config
 
-        aws_env = parser.get_aws_env()
-        init_ok, init_out = await runner.ensure_terraform_init(resource_dir, env_extra=aws_env)
-        if not init_ok:
-            logger.debug(f"Terraform init failed for {resource_id}: {init_out}")
-            return {"error": "Terraform init failed for EKS resource"}
-        success, output = await runner.output(resource_id=resource_id, env_extra=aws_env)
-        if not success:
-            logger.debug(f"Terraform output unavailable for {resource_id}: {output}")
-            return {"error": "Failed to read terraform output for EKS resource"}
-        outputs = _parse_terraform_output_json(output)
+        outputs = await asyncio.to_thread(parser.state_index.outputs, resource_dir.name)
+        if outputs is None or has_redacted_outputs(outputs):
+            aws_env = parser.get_aws_env()
+            init_ok, init_out = await runner.ensure_terraform_init(resource_dir, env_extra=aws_env, resource_id=resource_id)
+            if not init_ok:
+                logger.debug(f"Terraform init failed for {resource_id}: {init_out}")
+                return {"error": "Terraform init failed for EKS resource"}
+            success, output = await runner.output(resource_id=resource_id, env_extra=aws_env)
+            if not success:
+                logger.debug(f"Terraform output unavailable for {resource_id}: {output}")
+                return {"error": "Failed to read terraform output for EKS resource"}
+            outputs = _parse_terraform_output_json(output)
         if not outputs:
             logger.debug(f"Terraform output for {resource_id} was empty or invalid JSON")
             return {"error": "Terraform output for EKS resource is empty or invalid"}
@@ -1358,7 +1576,8 @@ async def _apply_docker_agent_via_ssh(resource_dir: Path, resolved_command: str,
     from io import StringIO
 
     aws_env = parser.get_aws_env()
-    init_ok, init_out = await runner.ensure_terraform_init(resource_dir, env_extra=aws_env)
+    init_ok, init_out = await runner.ensure_terraform_init(resource_dir, env_extra=aws_env,
+                                                          resource_id=_DOCKER_AGENT_RESOURCE_ID)
     if not init_ok:
         logger.warning(f"Terraform init failed for docker agent SSH apply: {init_out}")
         return {"success": False, "message": "Terraform init failed. Check credentials.", "mode": "ssh"}
@@ -1446,6 +1665,16 @@ def _sg_ensure_defaults(ingress_rules: list) -> list:
     return ingress_rules
 
 
+def _sg_rules_from_state(rules: List[Dict]) -> List[Dict]:
+    return [{
+        "description": r.get("description", ""),
+        "from_port": r.get("from_port", 0),
+        "to_port": r.get("to_port", 0),
+        "protocol": r.get("protocol", "tcp"),
+        "cidr_blocks": r.get("cidr_blocks", []),
+    } for r in rules]
+
+
 @router.get("/security-group/rules")
 async def get_security_group_rules():
     try:
@@ -1465,6 +1694,13 @@ async def get_security_group_rules():
                     "egress_rules": saved.get("egress_rules", []),
                 }
 
+        attributes = await asyncio.to_thread(parser.state_index.security_group_attributes, resource_dir.name) \
+            if resource_dir else None
+        if attributes is not None:
+            logger.debug("Reading SG rules from state index: %s", resource_dir.name)
+            ingress_rules = _sg_ensure_defaults(_sg_rules_from_state(attributes.get("ingress", [])))
+            return {"ingress_rules": ingress_rules, "egress_rules": _sg_rules_from_state(attributes.get("egress", []))}
+
         state_file = (resource_dir / "terraform.tfstate") if resource_dir else None
         if state_file and state_file.exists():
             logger.debug("Reading SG rules from state: %s", state_file)
@@ -1481,21 +1717,8 @@ async def get_security_group_rules():
                         continue
                     attributes = instances[0].get("attributes", {})
 
-                    ingress_rules = [{
-                        "description": r.get("description", ""),
-                        "from_port": r.get("from_port", 0),
-                        "to_port": r.get("to_port", 0),
-                        "protocol": r.get("protocol", "tcp"),
-                        "cidr_blocks": r.get("cidr_blocks", []),
-                    } for r in attributes.get("ingress", [])]
-
-                    egress_rules = [{
-                        "description": r.get("description", ""),
-                        "from_port": r.get("from_port", 0),
-                        "to_port": r.get("to_port", 0),
-                        "protocol": r.get("protocol", "tcp"),
-                        "cidr_blocks": r.get("cidr_blocks", []),
-                    } for r in attributes.get("egress", [])]
+                    ingress_rules = _sg_rules_from_state(attributes.get("ingress", []))
+                    egress_rules = _sg_rules_from_state(attributes.get("egress", []))
 
                     ingress_rules = _sg_ensure_defaults(ingress_rules)
                     logger.debug("Loaded %d ingress / %d egress rules from state", len(ingress_rules), len(egress_rules))
@@ -0,0 +1,222 @@
+"""
+AWS Profile Resolver
+Parses ~/.aws/config and the SSO token cache once per file change (keyed by mtime)
+and exposes typed SSO profile and token views
+"""
+import configparser
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+AWS_CONFIG_PATH = Path(os.environ.get("AWS_CONFIG_FILE", os.path.expanduser("~/.aws/config")))
+AWS_SSO_CACHE_DIR = Path(os.path.expanduser("~/.aws/sso/cache"))
+
+FileKey = Tuple[int, int]
+
+
+@dataclass(frozen=True)
+class SSOConfig:
+    start_url: str
+    sso_region: str
+    account_id: str
+    role_name: str
+    session_name: str = ""
+
+    @property
+    def cache_key(self) -> str:
+        return hashlib.sha1((self.session_name or self.start_url).encode("utf-8")).hexdigest()
+
+
+@dataclass(frozen=True)
+class SSOToken:
+    access_token: str
+    expires_at: Optional[float]
+    start_url: str = ""
+    region: str = ""
+
+    def expires_in(self) -> Optional[float]:
+        return None if self.expires_at is None else self.expires_at - time.time()
+
+    def is_valid(self) -> bool:
+        return bool(self.access_token) and (self.expires_at is None or self.expires_at > time.time())
+
+
+def parse_sso_timestamp(value: str) -> float:
+    normalized = value.replace("UTC", "+00:00").replace("Z", "+00:00")
+    return datetime.fromisoformat(normalized).timestamp()
+
+
+def _file_key(path: Path) -> Optional[FileKey]:
+    try:
+        st = path.stat()
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+class AWSProfileResolver:
+    """Caches the parsed AWS config and SSO token files until they change on disk.
+
+    Each lookup costs one stat() of the file; the file is re-read and re-parsed
+    only when its mtime or size differs from the cached copy. Tokens written
+    through write_sso_token prime the cache directly.
+    """
+
+    def __init__(self, config_path: Path = AWS_CONFIG_PATH, sso_cache_dir: Path = AWS_SSO_CACHE_DIR):
+        self.config_path = config_path
+        self.sso_cache_dir = sso_cache_dir
+        self._lock = threading.Lock()
+        self._config_key: Optional[FileKey] = None
+        self._profiles: Dict[str, Optional[SSOConfig]] = {}
+        self._config: Optional[configparser.ConfigParser] = None
+        self._tokens: Dict[Path, Tuple[FileKey, Optional[SSOToken]]] = {}
+
+    def _load_config(self) -> Optional[configparser.ConfigParser]:
+        key = _file_key(self.config_path)
+        if key is None:
+            self._config_key = None
+            self._config = None
+            self._profiles.clear()
+            return None
+        if key != self._config_key:
+            config = configparser.ConfigParser()
+            try:
+                config.read(str(self.config_path))
+            except configparser.Error as e:
+                logger.warning(f"Failed to parse AWS config {self.config_path}: {e}")
+                config = configparser.ConfigParser()
+            self._config = config
+            self._config_key = key
+            self._profiles.clear()
+            logger.debug(f"AWS config parsed from {self.config_path}")
+        return self._config
+
+    def get_sso_config(self, profile: Optional[str] = None) -> Optional[SSOConfig]:
+        aws_profile = profile if profile is not None else os.environ.get("AWS_PROFILE", "")
+        if not aws_profile:
+            logger.debug("No AWS_PROFILE set, SSO config unavailable")
+            return None
+
+        with self._lock:
+            config = self._load_config()
+            if config is None:
+                logger.debug(f"AWS config file not found at {self.config_path}")
+                return None
+            if aws_profile not in self._profiles:
+                self._profiles[aws_profile] = self._resolve_profile(config, aws_profile)
+            return self._profiles[aws_profile]
+
+    @staticmethod
+    def _resolve_profile(config: configparser.ConfigParser, aws_profile: str) -> Optional[SSOConfig]:
+        section = f"profile {aws_profile}"
+        if section not in config:
+            logger.debug(f"Profile section '{section}' not found in AWS config")
+            return None
+
+        profile = config[section]
+        start_url = profile.get("sso_start_url", "")
+        sso_region = profile.get("sso_region", "")
+
+        sso_session_name = profile.get("sso_session")
+        if sso_session_name:
+            sso_section = f"sso-session {sso_session_name}"
+            if sso_section in config:
+                sso_session = config[sso_section]
+                start_url = sso_session.get("sso_start_url", start_url)
+                sso_region = sso_session.get("sso_region", sso_region)
+
+        account_id = profile.get("sso_account_id", "")
+        role_name = profile.get("sso_role_name", "")
+
+        if not all([start_url, sso_region, account_id, role_name]):
+            logger.debug(f"Incomplete SSO config for profile '{aws_profile}': "
+                         f"start_url={bool(start_url)}, region={bool(sso_region)}, "
+                         f"account={bool(account_id)}, role={bool(role_name)}")
+            return None
+
+        logger.debug(f"SSO config loaded for profile '{aws_profile}': "
+                     f"start_url={start_url}, region={sso_region}, account={account_id}, "
+                     f"role={role_name}, session={sso_session_name or '(none)'}")
+        return SSOConfig(start_url=start_url, sso_region=sso_region,
+                         account_id=account_id, role_name=role_name,
+                         session_name=sso_session_name or "")
+
+    def get_sso_cache_path(self, sso_config: SSOConfig) -> Path:
+        return self.sso_cache_dir / f"{sso_config.cache_key}.json"
+
+    def read_sso_token(self, sso_config: SSOConfig, include_expired: bool = False) -> Optional[SSOToken]:
+        cache_path = self.get_sso_cache_path(sso_config)
+        key = _file_key(cache_path)
+        if key is None:
+            logger.debug(f"SSO cache file not found: {cache_path}")
+            with self._lock:
+                self._tokens.pop(cache_path, None)
+            return None
+
+        with self._lock:
+            cached = self._tokens.get(cache_path)
+        if cached and cached[0] == key:
+            token = cached[1]
+        else:
+            token = self._parse_token_file(cache_path)
+            with self._lock:
+                self._tokens[cache_path] = (key, token)
+
+        if token is None:
+            return None
+        if not include_expired and not token.is_valid():
+            logger.debug("SSO cache token expired")
+            return None
+        return token
+
+    @staticmethod
+    def _parse_token_file(cache_path: Path) -> Optional[SSOToken]:
+        try:
+            with open(cache_path, "r") as f:
+                data = json.load(f)
+            expires_at = data.get("expiresAt", "")
+            return SSOToken(
+                access_token=data.get("accessToken", ""),
+                expires_at=parse_sso_timestamp(expires_at) if expires_at else None,
+                start_url=data.get("startUrl", ""),
+                region=data.get("region", ""),
+            )
+        except Exception as e:
+            logger.debug(f"Failed to read SSO cache: {e}")
+            return None
+
+    def write_sso_token(self, sso_config: SSOConfig, access_token: str, expires_in: int) -> SSOToken:
+        self.sso_cache_dir.mkdir(parents=True, exist_ok=True)
+        cache_path = self.get_sso_cache_path(sso_config)
+        expires_at = datetime.now(timezone.utc) + timedelta(seconds=expires_in)
+        data = {
+            "startUrl": sso_config.start_url,
+            "region": sso_config.sso_region,
+            "accessToken": access_token,
+            "expiresAt": expires_at.strftime("%Y-%m-%dT%H:%M:%SZ"),
+        }
+        tmp = cache_path.with_name(f".{cache_path.name}.tmp")
+        with open(tmp, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp, cache_path)
+
+        token = SSOToken(access_token=access_token, expires_at=parse_sso_timestamp(data["expiresAt"]),
+                         start_url=sso_config.start_url, region=sso_config.sso_region)
+        key = _file_key(cache_path)
+        if key is not None:
+            with self._lock:
+                self._tokens[cache_path] = (key, token)
+        logger.debug(f"SSO token cached at {cache_path}, expires at {expires_at}")
+        return token
+
+
+aws_profile_resolver = AWSProfileResolver()
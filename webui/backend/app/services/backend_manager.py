@@ -4,11 +4,103 @@ Handles automatic setup of S3 backend and DynamoDB for Terraform state managemen
 """
 import boto3
 import logging
-from typing import Optional, Dict
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path
+from string import Template
+from typing import Callable, Optional, Dict, List
 from botocore.exceptions import ClientError
 
 logger = logging.getLogger(__name__)
 
+BUCKET_WAITER_CONFIG = {"Delay": 1, "MaxAttempts": 30}
+TABLE_WAITER_CONFIG = {"Delay": 2, "MaxAttempts": 60}
+CONFLICT_RETRIES = 3
+
+BACKEND_TEMPLATE = Template('''# S3 Backend Configuration
+# Auto-generated by WebUI
+# Each instance has a unique S3 key for independent locking
+
+terraform {
+  backend "s3" {
+    bucket         = "$bucket"
+    key            = "instances/$instance_name/terraform.tfstate"
+    region         = "$region"
+    dynamodb_table = "$table"
+    encrypt        = true
+  }
+}
+''')
+
+
+def render_backend_config(bucket_name: str, instance_name: str, region: str,
+                          table_name: str = "terraform-state-locks") -> str:
+    return BACKEND_TEMPLATE.substitute(
+        bucket=bucket_name, instance_name=instance_name, region=region, table=table_name,
+    )
+
+
+def write_backend_files(
+    instances_dir: Path,
+    bucket_name: str,
+    table_name: str,
+    region: str,
+    instance_name_for: Optional[Callable[[Path], str]] = None,
+) -> List[str]:
+    """
+    Render backend.tf for every instance directory that lacks one
+
+    The bucket/region/table part of the template is bound once and only the
+    state key varies per instance.
+
+    Args:
+        instances_dir: Instances directory path
+        bucket_name: State bucket name
+        table_name: Lock table name
+        region: Backend region
+        instance_name_for: Maps an instance directory to its state key name
+            (defaults to the directory name)
+
+    Returns:
+        Names of the directories that received a backend.tf
+    """
+    bound = Template(BACKEND_TEMPLATE.safe_substitute(bucket=bucket_name, region=region, table=table_name))
+    written = []
+    for instance_dir in sorted(instances_dir.iterdir()):
+        if not instance_dir.is_dir() or not (instance_dir / "main.tf").exists():
+            continue
+        backend_tf = instance_dir / "backend.tf"
+        if backend_tf.exists():
+            continue
+        instance_name = instance_name_for(instance_dir) if instance_name_for else instance_dir.name
+        backend_tf.write_text(bound.substitute(instance_name=instance_name), encoding="utf-8")
+        written.append(instance_dir.name)
+        logger.info(f"Generated backend.tf for {instance_dir.name} (key: instances/{instance_name}/terraform.tfstate)")
+    return written
+
+
+class StepTimings:
+    """Thread-safe wall-clock timings of named bootstrap steps"""
+
+    def __init__(self):
+        self.steps: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._started = time.time()
+
+    @contextmanager
+    def step(self, name: str):
+        started = time.time()
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.steps[name] = round(time.time() - started, 3)
+
+    def to_dict(self) -> Dict[str, float]:
+        return {**self.steps, "total": round(time.time() - self._started, 3)}
+
 
 class BackendManager:
     def __init__(self, region: str = "ap-northeast-2"):
@@ -31,8 +123,11 @@ class BackendManager:
         """
         Create S3 bucket and DynamoDB table for Terraform backend
 
+        The bucket and the table are provisioned concurrently; readiness is
+        polled with boto3 waiters and each step's duration is reported.
+
         Returns:
-            dict: Status and configuration details
+            dict: Status, configuration details and per-step timings
         """
         result = {
             "success": False,
@@ -40,25 +135,29 @@ class BackendManager:
             "dynamodb": {"created": False, "name": table_name},
             "errors": []
         }
+        timings = StepTimings()
 
-        # Create S3 bucket
-        try:
-            bucket_created = self._create_state_bucket(bucket_name)
-            result["bucket"]["created"] = bucket_created
-            result["bucket"]["exists"] = True
-        except Exception as e:
-            logger.error(f"Failed to create S3 bucket: {e}")
-            result["errors"].append(f"S3 bucket error: {str(e)}")
-            return result
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            bucket_future = pool.submit(self._create_state_bucket, bucket_name, timings)
+            table_future = pool.submit(self._create_lock_table, table_name, timings)
 
-        # Create DynamoDB table
-        try:
-            table_created = self._create_lock_table(table_name)
-            result["dynamodb"]["created"] = table_created
-            result["dynamodb"]["exists"] = True
-        except Exception as e:
-            logger.error(f"Failed to create DynamoDB table: {e}")
-            result["errors"].append(f"DynamoDB error: {str(e)}")
+            try:
+                result["bucket"]["created"] = bucket_future.result()
+                result["bucket"]["exists"] = True
+            except Exception as e:
+                logger.error(f"Failed to create S3 bucket: {e}")
+                result["errors"].append(f"S3 bucket error: {str(e)}")
+
+            try:
+                result["dynamodb"]["created"] = table_future.result()
+                result["dynamodb"]["exists"] = True
+            except Exception as e:
+                logger.error(f"Failed to create DynamoDB table: {e}")
+                result["errors"].append(f"DynamoDB error: {str(e)}")
+
+        result["timings"] = timings.to_dict()
+        logger.info(f"Backend bootstrap finished in {result['timings']['total']}s: {result['timings']}")
+        if result["errors"]:
             return result
 
         result["success"] = True
@@ -87,117 +186,145 @@ class BackendManager:
         except ClientError:
             return False
 
-    def _create_state_bucket(self, bucket_name: str) -> bool:
+    def _create_state_bucket(self, bucket_name: str, timings: Optional[StepTimings] = None) -> bool:
         """Create S3 bucket with proper configuration for Terraform state"""
-        # Check if already exists
-        if self._bucket_exists(bucket_name):
-            logger.info(f"S3 bucket {bucket_name} already exists")
-            return False
+        timings = timings or StepTimings()
 
-        # Create bucket
-        try:
-            if self.region == 'us-east-1':
-                self.s3_client.create_bucket(Bucket=bucket_name)
-            else:
-                self.s3_client.create_bucket(
-                    Bucket=bucket_name,
-                    CreateBucketConfiguration={'LocationConstraint': self.region}
-                )
-            logger.info(f"Created S3 bucket: {bucket_name}")
-        except ClientError as e:
-            if e.response['Error']['Code'] == 'BucketAlreadyOwnedByYou':
-                logger.info(f"Bucket {bucket_name} already owned by you")
+        # Check if already exists
+        with timings.step("bucket.check"):
+            if self._bucket_exists(bucket_name):
+                logger.info(f"S3 bucket {bucket_name} already exists")
                 return False
-            raise
 
-        # Enable versioning
-        self.s3_client.put_bucket_versioning(
-            Bucket=bucket_name,
-            VersioningConfiguration={'Status': 'Enabled'}
-        )
-
-        # Enable encryption
-        self.s3_client.put_bucket_encryption(
-            Bucket=bucket_name,
-            ServerSideEncryptionConfiguration={
-                'Rules': [{
-                    'ApplyServerSideEncryptionByDefault': {
-                        'SSEAlgorithm': 'AES256'
-                    }
-                }]
-            }
-        )
-
-        # Block public access
-        self.s3_client.put_public_access_block(
-            Bucket=bucket_name,
-            PublicAccessBlockConfiguration={
-                'BlockPublicAcls': True,
-                'IgnorePublicAcls': True,
-                'BlockPublicPolicy': True,
-                'RestrictPublicBuckets': True
-            }
-        )
+        # Create bucket
+        with timings.step("bucket.create"):
+            try:
+                if self.region == 'us-east-1':
+                    self.s3_client.create_bucket(Bucket=bucket_name)
+                else:
+                    self.s3_client.create_bucket(
+                        Bucket=bucket_name,
+                        CreateBucketConfiguration={'LocationConstraint': self.region}
+                    )
+                logger.info(f"Created S3 bucket: {bucket_name}")
+            except ClientError as e:
+                if e.response['Error']['Code'] == 'BucketAlreadyOwnedByYou':
+                    logger.info(f"Bucket {bucket_name} already owned by you")
+                    return False
+                raise
+
+        with timings.step("bucket.wait"):
+            self.s3_client.get_waiter('bucket_exists').wait(
+                Bucket=bucket_name, WaiterConfig=BUCKET_WAITER_CONFIG,
+            )
+
+        # The bucket settings are independent of each other, so apply them concurrently
+        settings = {
+            "bucket.versioning": lambda: self.s3_client.put_bucket_versioning(
+                Bucket=bucket_name,
+                VersioningConfiguration={'Status': 'Enabled'}
+            ),
+            "bucket.encryption": lambda: self.s3_client.put_bucket_encryption(
+                Bucket=bucket_name,
+                ServerSideEncryptionConfiguration={
+                    'Rules': [{
+                        'ApplyServerSideEncryptionByDefault': {
+                            'SSEAlgorithm': 'AES256'
+                        }
+                    }]
+                }
+            ),
+            "bucket.public_access_block": lambda: self.s3_client.put_public_access_block(
+                Bucket=bucket_name,
+                PublicAccessBlockConfiguration={
+                    'BlockPublicAcls': True,
+                    'IgnorePublicAcls': True,
+                    'BlockPublicPolicy': True,
+                    'RestrictPublicBuckets': True
+                }
+            ),
+            "bucket.lifecycle": lambda: self.s3_client.put_bucket_lifecycle_configuration(
+                Bucket=bucket_name,
+                LifecycleConfiguration={
+                    'Rules': [
+                        {
+                            'ID': 'delete-old-versions',
+                            'Status': 'Enabled',
+                            'Filter': {'Prefix': ''},
+                            'NoncurrentVersionExpiration': {'NoncurrentDays': 90}
+                        },
+                        {
+                            'ID': 'abort-incomplete-uploads',
+                            'Status': 'Enabled',
+                            'Filter': {'Prefix': ''},
+                            'AbortIncompleteMultipartUpload': {'DaysAfterInitiation': 7}
+                        }
+                    ]
+                }
+            ),
+            "bucket.tagging": lambda: self.s3_client.put_bucket_tagging(
+                Bucket=bucket_name,
+                Tagging={
+                    'TagSet': [
+                        {'Key': 'Name', 'Value': 'Terraform State Bucket'},
+                        {'Key': 'Purpose', 'Value': 'Remote state storage'},
+                        {'Key': 'ManagedBy', 'Value': 'WebUI'}
+                    ]
+                }
+            ),
+        }
 
-        # Add lifecycle rule
-        self.s3_client.put_bucket_lifecycle_configuration(
-            Bucket=bucket_name,
-            LifecycleConfiguration={
-                'Rules': [
-                    {
-                        'ID': 'delete-old-versions',
-                        'Status': 'Enabled',
-                        'Filter': {'Prefix': ''},
-                        'NoncurrentVersionExpiration': {'NoncurrentDays': 90}
-                    },
-                    {
-                        'ID': 'abort-incomplete-uploads',
-                        'Status': 'Enabled',
-                        'Filter': {'Prefix': ''},
-                        'AbortIncompleteMultipartUpload': {'DaysAfterInitiation': 7}
-                    }
-                ]
-            }
-        )
+        def apply(name: str, call: Callable[[], object]) -> None:
+            with timings.step(name):
+                self._retry_conflicts(call)
 
-        # Add tags
-        self.s3_client.put_bucket_tagging(
-            Bucket=bucket_name,
-            Tagging={
-                'TagSet': [
-                    {'Key': 'Name', 'Value': 'Terraform State Bucket'},
-                    {'Key': 'Purpose', 'Value': 'Remote state storage'},
-                    {'Key': 'ManagedBy', 'Value': 'WebUI'}
-                ]
-            }
-        )
+        with ThreadPoolExecutor(max_workers=len(settings)) as pool:
+            futures = [pool.submit(apply, name, call) for name, call in settings.items()]
+            for future in futures:
+                future.result()
 
         logger.info(f"Configured S3 bucket {bucket_name} for Terraform state")
         return True
 
-    def _create_lock_table(self, table_name: str) -> bool:
+    @staticmethod
+    def _retry_conflicts(call: Callable[[], object]) -> object:
+        """S3 may reject overlapping bucket sub-resource updates with OperationAborted"""
+        for attempt in range(CONFLICT_RETRIES):
+            try:
+                return call()
+            except ClientError as e:
+                if e.response['Error']['Code'] != 'OperationAborted' or attempt == CONFLICT_RETRIES - 1:
+                    raise
+                time.sleep(0.5 * (attempt + 1))
+
+    def _create_lock_table(self, table_name: str, timings: Optional[StepTimings] = None) -> bool:
         """Create DynamoDB table for state locking"""
+        timings = timings or StepTimings()
+
         # Check if already exists
-        if self._table_exists(table_name):
-            logger.info(f"DynamoDB table {table_name} already exists")
-            return False
+        with timings.step("table.check"):
+            if self._table_exists(table_name):
+                logger.info(f"DynamoDB table {table_name} already exists")
+                return False
 
         # Create table
-        self.dynamodb_client.create_table(
-            TableName=table_name,
-            KeySchema=[{'AttributeName': 'LockID', 'KeyType': 'HASH'}],
-            AttributeDefinitions=[{'AttributeName': 'LockID', 'AttributeType': 'S'}],
-            BillingMode='PAY_PER_REQUEST',
-            Tags=[
-                {'Key': 'Name', 'Value': 'Terraform State Locks'},
-                {'Key': 'Purpose', 'Value': 'State locking'},
-                {'Key': 'ManagedBy', 'Value': 'WebUI'}
-            ]
-        )
+        with timings.step("table.create"):
+            self.dynamodb_client.create_table(
+                TableName=table_name,
+                KeySchema=[{'AttributeName': 'LockID', 'KeyType': 'HASH'}],
+                AttributeDefinitions=[{'AttributeName': 'LockID', 'AttributeType': 'S'}],
+                BillingMode='PAY_PER_REQUEST',
+                Tags=[
+                    {'Key': 'Name', 'Value': 'Terraform State Locks'},
+                    {'Key': 'Purpose', 'Value': 'State locking'},
+                    {'Key': 'ManagedBy', 'Value': 'WebUI'}
+                ]
+            )
 
         # Wait for table to be active
-        waiter = self.dynamodb_client.get_waiter('table_exists')
-        waiter.wait(TableName=table_name)
+        with timings.step("table.wait"):
+            waiter = self.dynamodb_client.get_waiter('table_exists')
+            waiter.wait(TableName=table_name, WaiterConfig=TABLE_WAITER_CONFIG)
 
         logger.info(f"Created DynamoDB table: {table_name}")
         return True
@@ -209,20 +336,7 @@ class BackendManager:
         table_name: str = "terraform-state-locks"
     ) -> str:
         """Generate backend.tf content for an instance"""
-        return f'''# S3 Backend Configuration
-# Auto-generated by WebUI
-# Each instance has a unique S3 key for independent locking
-
-terraform {{
-  backend "s3" {{
-    bucket         = "{bucket_name}"
-    key            = "instances/{instance_name}/terraform.tfstate"
-    region         = "{self.region}"
-    dynamodb_table = "{table_name}"
-    encrypt        = true
-  }}
-}}
-'''
+        return render_backend_config(bucket_name, instance_name, self.region, table_name)
 
     def get_backend_status(self, bucket_name: str, table_name: str) -> Dict[str, any]:
         """Get detailed status of backend infrastructure"""
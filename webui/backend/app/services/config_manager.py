@@ -6,6 +6,9 @@ import re
 from typing import Dict, Optional
 from pathlib import Path
 
+from app.services.credential_manager import credential_manager
+from app.services.ssm_gateway import SSMGateway
+
 logger = logging.getLogger(__name__)
 
 
@@ -16,7 +19,13 @@ class ConfigManager:
     def __init__(self, terraform_dir: str = None):
         self.terraform_dir = Path(terraform_dir) if terraform_dir else Path(os.environ.get('TERRAFORM_DIR', '/app/terraform'))
         self._boto3_client = None
+        self._ssm_gateway = None
         self._parameter_name_cache = None
+        credential_manager.subscribe(self._reset_client)
+
+    def _reset_client(self):
+        self._boto3_client = None
+        self._ssm_gateway = None
 
     def _read_tfvar(self, key: str, default: str = "default") -> str:
         tfvars_path = self.terraform_dir / 'terraform.tfvars'
@@ -88,6 +97,12 @@ class ConfigManager:
                 return None
         return self._boto3_client
 
+    @property
+    def ssm(self) -> SSMGateway:
+        if self._ssm_gateway is None:
+            self._ssm_gateway = SSMGateway(lambda: self.ssm_client, self._get_region())
+        return self._ssm_gateway
+
     def check_name_prefix_available(self, prefix: str) -> Dict:
         if not self.ssm_client:
             return {"available": True, "error": "SSM client not available, skipping check"}
@@ -112,7 +127,7 @@ class ConfigManager:
             return False
         try:
             config_json = json.dumps(variables, indent=2)
-            self.ssm_client.put_parameter(
+            self.ssm.put_parameter(
                 Name=self.parameter_name,
                 Value=config_json,
                 Type='SecureString',
@@ -134,36 +149,32 @@ class ConfigManager:
 
         if tfvars_path.exists():
             try:
-                response = self.ssm_client.get_parameter(Name=self.parameter_name, WithDecryption=True)
-                variables = json.loads(response['Parameter']['Value'])
+                parameter = self.ssm.get_parameter(self.parameter_name)
+                if parameter is None:
+                    logger.info(f"Parameter not found: {self.parameter_name}")
+                    return None
+                variables = json.loads(parameter['Value'])
                 logger.info(f"Loaded {len(variables)} variables from Parameter Store: {self.parameter_name}")
                 return variables
-            except self.ssm_client.exceptions.ParameterNotFound:
-                logger.info(f"Parameter not found: {self.parameter_name}")
-                return None
             except Exception as e:
                 logger.error(f"Failed to load config from Parameter Store: {e}")
                 return None
 
         logger.info("terraform.tfvars not found, attempting auto-discovery...")
         try:
-            creds_hash = self._get_credentials_hash()
-            paginator = self.ssm_client.get_paginator('describe_parameters')
-            for page in paginator.paginate(
-                ParameterFilters=[{
-                    'Key': 'Name',
-                    'Option': 'BeginsWith',
-                    'Values': ['/dogstac-'],
-                }],
-            ):
-                for param in page.get('Parameters', []):
-                    name = param['Name']
-                    if f"/{creds_hash}/" in name and name.endswith('/config/variables'):
-                        logger.debug(f"Auto-discovery matched: {name}")
-                        resp = self.ssm_client.get_parameter(Name=name, WithDecryption=True)
-                        variables = json.loads(resp['Parameter']['Value'])
-                        logger.info(f"Auto-discovered config at: {name} ({len(variables)} variables)")
-                        return variables
+            suffix = f"/{self._get_credentials_hash()}/config/variables"
+            # Filter server-side on the identity hash instead of paging through every /dogstac-* parameter
+            matches = self.ssm.describe_parameters([{
+                'Key': 'Name',
+                'Option': 'Contains',
+                'Values': [suffix],
+            }])
+            names = [p['Name'] for p in matches if p['Name'].startswith('/dogstac-') and p['Name'].endswith(suffix)]
+            for name, parameter in self.ssm.get_parameters(names).items():
+                logger.debug(f"Auto-discovery matched: {name}")
+                variables = json.loads(parameter['Value'])
+                logger.info(f"Auto-discovered config at: {name} ({len(variables)} variables)")
+                return variables
             logger.info("No matching parameters found during auto-discovery")
             return None
         except Exception as e:
@@ -175,7 +186,7 @@ class ConfigManager:
             logger.warning("SSM client not available")
             return False
         try:
-            self.ssm_client.delete_parameter(Name=self.parameter_name)
+            self.ssm.delete_parameter(self.parameter_name)
             logger.info(f"Deleted config from Parameter Store: {self.parameter_name}")
             return True
         except self.ssm_client.exceptions.ParameterNotFound:
@@ -197,7 +208,7 @@ class ConfigManager:
                 value = json.dumps({"key_name": key_name, "private_key": private_key_content})
             size_kb = len(value.encode('utf-8')) / 1024
             tier = "Advanced" if size_kb > 4 else "Standard"
-            self.ssm_client.put_parameter(
+            self.ssm.put_parameter(
                 Name=self.key_parameter_name,
                 Value=value,
                 Type='SecureString',
@@ -216,8 +227,11 @@ class ConfigManager:
             logger.warning("SSM client not available, cannot load key")
             return None
         try:
-            response = self.ssm_client.get_parameter(Name=self.key_parameter_name, WithDecryption=True)
-            raw = response['Parameter']['Value']
+            parameter = self.ssm.get_parameter(self.key_parameter_name)
+            if parameter is None:
+                logger.debug(f"Key not found in Parameter Store: {self.key_parameter_name}")
+                return None
+            raw = parameter['Value']
             try:
                 data = json.loads(raw)
                 logger.info(f"Loaded key '{data.get('key_name', '')}' from Parameter Store: {self.key_parameter_name}")
@@ -225,10 +239,7 @@ class ConfigManager:
             except json.JSONDecodeError:
                 return {"key_name": "", "private_key": raw}
         except Exception as e:
-            if "ParameterNotFound" in str(type(e).__name__) or "ParameterNotFound" in str(e):
-                logger.debug(f"Key not found in Parameter Store: {self.key_parameter_name}")
-            else:
-                logger.warning(f"Failed to load key from Parameter Store: {e}")
+            logger.warning(f"Failed to load key from Parameter Store: {e}")
             return None
 
     def generate_bucket_name(self, name_prefix: str) -> str:
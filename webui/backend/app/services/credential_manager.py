@@ -1,31 +1,40 @@
 import asyncio
-import configparser
-import hashlib
-import json
 import logging
 import os
+import threading
 import time
 import uuid
-from pathlib import Path
-from typing import Dict, Optional
+import weakref
+from typing import Callable, Dict, List, Optional
 
 import boto3
 from botocore.exceptions import ClientError
 
-logger = logging.getLogger(__name__)
+from app.services import metrics
+from app.services.aws_profile_resolver import SSOConfig, SSOToken, aws_profile_resolver
+from app.services.event_bus import CREDENTIAL_HEALTH, event_bus
 
-AWS_CONFIG_PATH = Path(os.environ.get("AWS_CONFIG_FILE", os.path.expanduser("~/.aws/config")))
-AWS_SSO_CACHE_DIR = Path(os.path.expanduser("~/.aws/sso/cache"))
+logger = logging.getLogger(__name__)
 
 CREDENTIAL_HEALTH_INTERVAL = 300
 CREDENTIAL_EXPIRY_BUFFER = 600
+IDENTITY_CACHE_TTL = 300
+REFRESH_WAIT_TIMEOUT = 60
+MAX_REFRESH_SLEEP = 3600
+
+STATE_UNKNOWN = "unknown"
+STATE_VALID = "valid"
+STATE_EXPIRING = "expiring_soon"
+STATE_EXPIRED = "expired"
+STATE_REFRESHING = "refreshing"
 
 
 class SSOSession:
     def __init__(self, session_id: str, client_id: str, client_secret: str,
                  device_code: str, verification_uri: str, user_code: str,
                  expires_at: float, interval: int, sso_region: str,
-                 start_url: str, account_id: str, role_name: str):
+                 start_url: str, account_id: str, role_name: str,
+                 sso_config: Optional[SSOConfig] = None):
         self.session_id = session_id
         self.client_id = client_id
         self.client_secret = client_secret
@@ -38,118 +47,204 @@ class SSOSession:
         self.start_url = start_url
         self.account_id = account_id
         self.role_name = role_name
+        self.sso_config = sso_config
         self.status = "pending"
 
 
-class SSOConfig:
-    def __init__(self, start_url: str, sso_region: str, account_id: str,
-                 role_name: str, session_name: str = ""):
-        self.start_url = start_url
-        self.sso_region = sso_region
-        self.account_id = account_id
-        self.role_name = role_name
-        self.session_name = session_name
+class _RefreshFlight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = False
 
 
 class CredentialManager:
-    def __init__(self):
-        self._sso_sessions: Dict[str, SSOSession] = {}
+    """Tracks AWS credential state for the process.
 
-    def get_sso_config(self) -> Optional[SSOConfig]:
-        aws_profile = os.environ.get("AWS_PROFILE", "")
-        if not aws_profile:
-            logger.debug("No AWS_PROFILE set, SSO config unavailable")
-            return None
+    The verified caller identity is cached together with the credential expiry,
+    refreshes are single-flight (concurrent callers wait for and share the one
+    in-flight result), and subscribers are notified whenever the credentials in
+    os.environ change so they can drop clients built from the old ones.
+    """
 
-        if not AWS_CONFIG_PATH.exists():
-            logger.debug(f"AWS config file not found at {AWS_CONFIG_PATH}")
-            return None
+    def __init__(self, profiles=aws_profile_resolver):
+        self._profiles = profiles
+        self._sso_sessions: Dict[str, SSOSession] = {}
+        self._lock = threading.Lock()
+        self._state = STATE_UNKNOWN
+        self._identity: Optional[Dict] = None
+        self._identity_checked_at = 0.0
+        self._credentials_expire_at: Optional[float] = None
+        self._refresh_flight: Optional[_RefreshFlight] = None
+        self._subscribers: List = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self.generation = 0
+
+    @property
+    def state(self) -> str:
+        return self._state
+
+    @property
+    def credentials_expire_at(self) -> Optional[float]:
+        return self._credentials_expire_at
+
+    def _set_state(self, state: str) -> None:
+        if state == self._state:
+            return
+        previous, self._state = self._state, state
+        event_bus.publish(CREDENTIAL_HEALTH, state=state, previous=previous)
+
+    def subscribe(self, callback: Callable[[], None]) -> None:
+        """Register a callback for credentials-changed events.
+
+        Bound methods are held weakly so short-lived objects (e.g. per-request
+        managers holding boto3 clients) do not leak through the subscriber list.
+        """
+        ref = weakref.WeakMethod(callback) if hasattr(callback, "__self__") else (lambda: callback)
+        with self._lock:
+            self._subscribers.append(ref)
+
+    def _publish_credentials_changed(self) -> None:
+        with self._lock:
+            self.generation += 1
+            self._identity = None
+            self._identity_checked_at = 0.0
+            live = [(ref, ref()) for ref in self._subscribers]
+            self._subscribers = [ref for ref, cb in live if cb is not None]
+        logger.debug(f"Credentials changed (generation {self.generation}), notifying {len(self._subscribers)} subscribers")
+        for _, callback in live:
+            if callback is None:
+                continue
+            try:
+                callback()
+            except Exception as e:
+                logger.warning(f"Credentials-changed subscriber failed: {e}")
+        self._wake_refresh_loop()
 
-        config = configparser.ConfigParser()
-        config.read(str(AWS_CONFIG_PATH))
+    def _wake_refresh_loop(self) -> None:
+        if self._loop is not None and self._wakeup is not None:
+            try:
+                self._loop.call_soon_threadsafe(self._wakeup.set)
+            except RuntimeError:
+                pass
 
-        section = f"profile {aws_profile}"
-        if section not in config:
-            logger.debug(f"Profile section '{section}' not found in AWS config")
-            return None
+    def _apply_role_credentials(self, role_creds: Dict) -> None:
+        with self._lock:
+            os.environ["AWS_ACCESS_KEY_ID"] = role_creds["accessKeyId"]
+            os.environ["AWS_SECRET_ACCESS_KEY"] = role_creds["secretAccessKey"]
+            if role_creds.get("sessionToken"):
+                os.environ["AWS_SESSION_TOKEN"] = role_creds["sessionToken"]
+            else:
+                os.environ.pop("AWS_SESSION_TOKEN", None)
+            expiration = role_creds.get("expiration")
+            self._credentials_expire_at = expiration / 1000 if expiration else None
+            self._set_state(STATE_UNKNOWN)
+        self._publish_credentials_changed()
+
+    def _build_sts_client(self):
+        region = os.environ.get("AWS_REGION", "ap-northeast-2")
+        access_key = os.environ.get("AWS_ACCESS_KEY_ID")
+        secret_key = os.environ.get("AWS_SECRET_ACCESS_KEY")
+        session_token = os.environ.get("AWS_SESSION_TOKEN")
+        if access_key and secret_key:
+            return boto3.client(
+                "sts", region_name=region,
+                aws_access_key_id=access_key,
+                aws_secret_access_key=secret_key,
+                aws_session_token=session_token,
+            )
+        return boto3.client("sts", region_name=region)
 
-        profile = config[section]
+    def _session_credentials_expiry(self) -> Optional[float]:
+        if os.environ.get("AWS_ACCESS_KEY_ID"):
+            return self._credentials_expire_at
+        try:
+            creds = boto3.Session().get_credentials()
+            expiry = getattr(creds, "_expiry_time", None)
+            return expiry.timestamp() if expiry else None
+        except Exception:
+            return None
 
-        sso_session_name = profile.get("sso_session")
-        if sso_session_name:
-            sso_section = f"sso-session {sso_session_name}"
-            if sso_section in config:
-                sso_session = config[sso_section]
-                start_url = sso_session.get("sso_start_url", profile.get("sso_start_url", ""))
-                sso_region = sso_session.get("sso_region", profile.get("sso_region", ""))
+    def _state_for_expiry(self, expire_at: Optional[float]) -> str:
+        if expire_at is None:
+            return STATE_VALID
+        remaining = expire_at - time.time()
+        if remaining <= 0:
+            return STATE_EXPIRED
+        if remaining < CREDENTIAL_EXPIRY_BUFFER:
+            return STATE_EXPIRING
+        return STATE_VALID
+
+    def get_identity(self, force: bool = False) -> Dict:
+        """Return the cached STS caller identity, verifying it again only when stale.
+
+        Raises the underlying boto3 exception when the credentials are invalid.
+        """
+        with self._lock:
+            identity = self._identity
+            if self._credentials_expire_at is not None:
+                # Known expiry: the identity stays verified until the credentials expire
+                fresh = identity is not None and time.time() < self._credentials_expire_at
             else:
-                start_url = profile.get("sso_start_url", "")
-                sso_region = profile.get("sso_region", "")
-        else:
-            start_url = profile.get("sso_start_url", "")
-            sso_region = profile.get("sso_region", "")
-
-        account_id = profile.get("sso_account_id", "")
-        role_name = profile.get("sso_role_name", "")
-
-        if not all([start_url, sso_region, account_id, role_name]):
-            logger.debug(f"Incomplete SSO config for profile '{aws_profile}': "
-                         f"start_url={bool(start_url)}, region={bool(sso_region)}, "
-                         f"account={bool(account_id)}, role={bool(role_name)}")
-            return None
+                fresh = identity is not None and time.time() - self._identity_checked_at < IDENTITY_CACHE_TTL
+            generation = self.generation
+        if fresh and not force:
+            return identity
 
-        logger.debug(f"SSO config loaded for profile '{aws_profile}': "
-                     f"start_url={start_url}, region={sso_region}, account={account_id}, "
-                     f"role={role_name}, session={sso_session_name or '(none)'}")
-        return SSOConfig(start_url=start_url, sso_region=sso_region,
-                         account_id=account_id, role_name=role_name,
-                         session_name=sso_session_name or "")
-
-    def _get_sso_cache_key(self, sso_config: "SSOConfig") -> str:
-        if sso_config.session_name:
-            return hashlib.sha1(sso_config.session_name.encode("utf-8")).hexdigest()
-        return hashlib.sha1(sso_config.start_url.encode("utf-8")).hexdigest()
-
-    def _get_sso_cache_path(self, sso_config: "SSOConfig") -> Path:
-        return AWS_SSO_CACHE_DIR / f"{self._get_sso_cache_key(sso_config)}.json"
-
-    def _read_sso_cache(self, sso_config: "SSOConfig") -> Optional[dict]:
-        cache_path = self._get_sso_cache_path(sso_config)
-        if not cache_path.exists():
-            logger.debug(f"SSO cache file not found: {cache_path}")
-            return None
         try:
-            with open(cache_path, "r") as f:
-                data = json.load(f)
-            expires_at = data.get("expiresAt", "")
-            if expires_at:
-                from datetime import datetime, timezone
-                normalized = expires_at.replace("UTC", "+00:00").replace("Z", "+00:00")
-                expiry = datetime.fromisoformat(normalized)
-                if expiry.timestamp() < time.time():
-                    logger.debug("SSO cache token expired")
-                    return None
-            return data
-        except Exception as e:
-            logger.debug(f"Failed to read SSO cache: {e}")
-            return None
+            identity = self._build_sts_client().get_caller_identity()
+        except Exception:
+            with self._lock:
+                if generation == self.generation:
+                    self._identity = None
+                    self._set_state(STATE_EXPIRED)
+            raise
+
+        expire_at = self._session_credentials_expiry()
+        with self._lock:
+            if generation == self.generation:
+                self._identity = identity
+                self._identity_checked_at = time.time()
+                self._credentials_expire_at = expire_at
+                self._set_state(self._state_for_expiry(expire_at))
+        return identity
+
+    def get_sso_config(self) -> Optional[SSOConfig]:
+        return self._profiles.get_sso_config()
 
-    def _write_sso_cache(self, sso_config: "SSOConfig", access_token: str, expires_in: int):
-        AWS_SSO_CACHE_DIR.mkdir(parents=True, exist_ok=True)
-        cache_path = self._get_sso_cache_path(sso_config)
-        from datetime import datetime, timezone, timedelta
-        expires_at = datetime.now(timezone.utc) + timedelta(seconds=expires_in)
-        data = {
-            "startUrl": sso_config.start_url,
-            "region": sso_config.sso_region,
-            "accessToken": access_token,
-            "expiresAt": expires_at.strftime("%Y-%m-%dT%H:%M:%SZ"),
-        }
-        with open(cache_path, "w") as f:
-            json.dump(data, f)
-        logger.debug(f"SSO token cached at {cache_path}, expires at {expires_at}")
+    def _read_sso_cache(self, sso_config: SSOConfig) -> Optional[SSOToken]:
+        return self._profiles.read_sso_token(sso_config)
 
     def try_refresh_credentials(self) -> bool:
+        with self._lock:
+            flight = self._refresh_flight
+            leader = flight is None
+            if leader:
+                flight = self._refresh_flight = _RefreshFlight()
+                previous_state = self._state
+                self._set_state(STATE_REFRESHING)
+
+        if not leader:
+            logger.debug("Credential refresh already in progress, waiting for its result")
+            flight.done.wait(timeout=REFRESH_WAIT_TIMEOUT)
+            metrics.CREDENTIAL_REFRESH.inc(outcome="joined")
+            return flight.result
+
+        try:
+            flight.result = self._refresh_credentials()
+            metrics.CREDENTIAL_REFRESH.inc(outcome="success" if flight.result else "failure")
+        except Exception:
+            metrics.CREDENTIAL_REFRESH.inc(outcome="error")
+            raise
+        finally:
+            with self._lock:
+                self._refresh_flight = None
+                if self._state == STATE_REFRESHING:
+                    self._set_state(STATE_EXPIRED if previous_state == STATE_EXPIRED else STATE_UNKNOWN)
+            flight.done.set()
+        return flight.result
+
+    def _refresh_credentials(self) -> bool:
         sso_config = self.get_sso_config()
         if not sso_config:
             logger.debug("No SSO config available, cannot refresh")
@@ -160,7 +255,7 @@ class CredentialManager:
             logger.debug("No valid SSO cache token, cannot refresh")
             return False
 
-        access_token = cached.get("accessToken")
+        access_token = cached.access_token
         if not access_token:
             logger.debug("SSO cache missing accessToken")
             return False
@@ -172,11 +267,7 @@ class CredentialManager:
                 accountId=sso_config.account_id,
                 accessToken=access_token,
             )
-            role_creds = creds["roleCredentials"]
-            os.environ["AWS_ACCESS_KEY_ID"] = role_creds["accessKeyId"]
-            os.environ["AWS_SECRET_ACCESS_KEY"] = role_creds["secretAccessKey"]
-            if role_creds.get("sessionToken"):
-                os.environ["AWS_SESSION_TOKEN"] = role_creds["sessionToken"]
+            self._apply_role_credentials(creds["roleCredentials"])
             logger.info("AWS credentials refreshed via SSO token")
             return True
         except ClientError as e:
@@ -222,6 +313,7 @@ class CredentialManager:
                 start_url=sso_config.start_url,
                 account_id=sso_config.account_id,
                 role_name=sso_config.role_name,
+                sso_config=sso_config,
             )
             self._sso_sessions[session_id] = session
             logger.info(f"SSO device auth started, session_id={session_id}, "
@@ -256,9 +348,8 @@ class CredentialManager:
             access_token = token_response["accessToken"]
             expires_in = token_response.get("expiresIn", 28800)
 
-            sso_config = self.get_sso_config()
-            if sso_config:
-                self._write_sso_cache(sso_config, access_token, expires_in)
+            if session.sso_config:
+                self._profiles.write_sso_token(session.sso_config, access_token, expires_in)
 
             try:
                 sso_client = boto3.client("sso", region_name=session.sso_region)
@@ -267,11 +358,7 @@ class CredentialManager:
                     accountId=session.account_id,
                     accessToken=access_token,
                 )
-                role_creds = creds["roleCredentials"]
-                os.environ["AWS_ACCESS_KEY_ID"] = role_creds["accessKeyId"]
-                os.environ["AWS_SECRET_ACCESS_KEY"] = role_creds["secretAccessKey"]
-                if role_creds.get("sessionToken"):
-                    os.environ["AWS_SESSION_TOKEN"] = role_creds["sessionToken"]
+                self._apply_role_credentials(creds["roleCredentials"])
                 logger.info("SSO login complete, credentials updated")
             except Exception as e:
                 logger.warning(f"SSO token obtained but failed to get role credentials: {e}")
@@ -292,65 +379,79 @@ class CredentialManager:
             logger.error(f"SSO token poll error: {e}")
             return {"status": "error", "message": str(e)}
 
-    def get_credential_health(self) -> dict:
+    def get_credential_health(self, force: bool = False) -> dict:
         aws_profile = os.environ.get("AWS_PROFILE", "")
         sso_config = self.get_sso_config()
         sso_configured = sso_config is not None
 
         try:
-            region = os.environ.get("AWS_REGION", "ap-northeast-2")
-            access_key = os.environ.get("AWS_ACCESS_KEY_ID")
-            secret_key = os.environ.get("AWS_SECRET_ACCESS_KEY")
-            session_token = os.environ.get("AWS_SESSION_TOKEN")
-            if access_key and secret_key:
-                sts = boto3.client(
-                    "sts", region_name=region,
-                    aws_access_key_id=access_key,
-                    aws_secret_access_key=secret_key,
-                    aws_session_token=session_token,
-                )
-            else:
-                sts = boto3.client("sts", region_name=region)
-            identity = sts.get_caller_identity()
+            identity = self.get_identity(force=force)
 
             result = {
-                "status": "valid",
+                "status": STATE_VALID,
                 "account": identity.get("Account", ""),
                 "arn": identity.get("Arn", ""),
                 "sso_configured": sso_configured,
                 "sso_profile": aws_profile,
             }
 
+            expire_at = self._credentials_expire_at
+            if expire_at is not None:
+                result["credentials_expire_in"] = max(0, int(expire_at - time.time()))
+                result["status"] = self._state_for_expiry(expire_at)
+
             if sso_configured and sso_config:
                 cached = self._read_sso_cache(sso_config)
-                if cached and cached.get("expiresAt"):
-                    from datetime import datetime, timezone
-                    expiry = datetime.fromisoformat(
-                        cached["expiresAt"].replace("UTC", "+00:00").replace("Z", "+00:00")
-                    )
-                    remaining = expiry.timestamp() - time.time()
+                remaining = cached.expires_in() if cached else None
+                if remaining is not None:
                     result["sso_token_expires_in"] = max(0, int(remaining))
                     if remaining < CREDENTIAL_EXPIRY_BUFFER:
-                        result["status"] = "expiring_soon"
+                        result["status"] = STATE_EXPIRING
 
             return result
 
         except Exception as e:
             logger.debug(f"Credential health check failed: {e}")
             return {
-                "status": "expired",
+                "status": STATE_EXPIRED,
                 "sso_configured": sso_configured,
                 "sso_profile": aws_profile,
                 "message": str(e),
             }
 
+    def _seconds_until_refresh(self) -> float:
+        expire_at = self._credentials_expire_at
+        if expire_at is None:
+            return MAX_REFRESH_SLEEP
+        return min(max(expire_at - CREDENTIAL_EXPIRY_BUFFER - time.time(), 0), MAX_REFRESH_SLEEP)
+
     async def background_refresh_loop(self):
+        """Refresh credentials shortly before they expire.
+
+        Sleeps until the known credential expiry (minus CREDENTIAL_EXPIRY_BUFFER)
+        instead of polling STS, and wakes early whenever credentials change.
+        """
         logger.info("Credential background refresh loop started")
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        try:
+            await asyncio.to_thread(self.get_identity)
+        except Exception as e:
+            logger.debug(f"Initial credential check failed: {e}")
         while True:
-            await asyncio.sleep(CREDENTIAL_HEALTH_INTERVAL)
+            delay = self._seconds_until_refresh()
+            if self._state == STATE_EXPIRED:
+                delay = min(delay, CREDENTIAL_HEALTH_INTERVAL)
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=max(delay, 1))
+                logger.debug("Credential refresh loop woken by credentials change")
+                continue
+            except asyncio.TimeoutError:
+                pass
             try:
-                health = await asyncio.to_thread(self.get_credential_health)
-                if health["status"] in ("expired", "expiring_soon"):
+                health = await asyncio.to_thread(self.get_credential_health, True)
+                if health["status"] in (STATE_EXPIRED, STATE_EXPIRING):
                     logger.info(f"Credential status: {health['status']}, attempting auto-refresh")
                     refreshed = await asyncio.to_thread(self.try_refresh_credentials)
                     if refreshed:
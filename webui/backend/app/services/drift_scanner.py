@@ -0,0 +1,270 @@
+"""
+Drift Scanner
+Periodic `terraform plan -refresh-only -detailed-exitcode -lock=false` for every
+enabled instance, catching changes made outside terraform (console edits,
+reclaimed spot instances) before someone runs plan by hand
+
+Scans run with bounded concurrency on a jittered interval, never take the state
+lock, and skip instances with an interactive operation in flight. The latest
+result per instance is persisted as JSON.
+"""
+import asyncio
+import json
+import logging
+import os
+import random
+import threading
+import time
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+from app.services import metrics
+from app.services.event_bus import RESOURCE_DRIFT, event_bus
+
+logger = logging.getLogger(__name__)
+
+DRIFT_SCAN_ENABLED = os.environ.get("DRIFT_SCAN_ENABLED", "true").lower() == "true"
+DRIFT_SCAN_INTERVAL = float(os.environ.get("DRIFT_SCAN_INTERVAL", 3600))
+DRIFT_SCAN_JITTER = float(os.environ.get("DRIFT_SCAN_JITTER", 0.2))
+DRIFT_SCAN_CONCURRENCY = int(os.environ.get("DRIFT_SCAN_CONCURRENCY", 2))
+DRIFT_RESULTS_PATH = Path(os.environ.get(
+    "DRIFT_RESULTS_PATH",
+    str(Path(os.environ.get("TERRAFORM_DIR", "/app/terraform")) / ".tf-drift.json"),
+))
+
+DRIFT_CLEAN = "clean"
+DRIFT_DRIFTED = "drifted"
+DRIFT_ERROR = "error"
+DRIFT_SKIPPED = "skipped"
+
+# terraform plan -detailed-exitcode
+EXIT_NO_CHANGES = 0
+EXIT_CHANGES = 2
+
+
+@dataclass
+class DriftResult:
+    resource_id: str
+    status: str
+    checked_at: float = field(default_factory=time.time)
+    duration: float = 0.0
+    changes: List[Dict] = field(default_factory=list)
+    error: Optional[str] = None
+
+    @property
+    def drifted(self) -> Optional[bool]:
+        """True/False once a scan completed, None when the last attempt failed."""
+        if self.status == DRIFT_DRIFTED:
+            return True
+        if self.status == DRIFT_CLEAN:
+            return False
+        return None
+
+    def to_dict(self) -> Dict:
+        return {**asdict(self), "drifted": self.drifted}
+
+
+def parse_refresh_plan(exit_code: int, output: str) -> Tuple[str, List[Dict], Optional[str]]:
+    """Map a `plan -refresh-only -json` run to (status, drifted resources, error)."""
+    changes: List[Dict] = []
+    errors: List[str] = []
+    for line in output.splitlines():
+        try:
+            message = json.loads(line)
+        except ValueError:
+            continue
+        if not isinstance(message, dict):
+            continue
+        if message.get("type") == "resource_drift":
+            change = message.get("change") or {}
+            resource = change.get("resource") or {}
+            changes.append({
+                "address": resource.get("addr"),
+                "resource_type": resource.get("resource_type"),
+                "action": change.get("action"),
+            })
+        elif message.get("type") == "diagnostic":
+            diagnostic = message.get("diagnostic") or {}
+            if diagnostic.get("severity") == "error":
+                errors.append(diagnostic.get("summary") or message.get("@message", ""))
+
+    if exit_code == EXIT_NO_CHANGES:
+        return DRIFT_CLEAN, [], None
+    if exit_code == EXIT_CHANGES:
+        return DRIFT_DRIFTED, changes, None
+    if not errors:
+        tail = [line for line in output.strip().splitlines() if line.strip()]
+        errors.append(tail[-1] if tail else f"terraform plan exited with {exit_code}")
+    return DRIFT_ERROR, changes, "; ".join(errors)
+
+
+class DriftStore:
+    """Latest drift result per resource, kept in memory and mirrored to a JSON file."""
+
+    def __init__(self, path: Path = DRIFT_RESULTS_PATH):
+        self.path = Path(path)
+        self.version = 0
+        self._results: Optional[Dict[str, DriftResult]] = None
+        self._lock = threading.Lock()
+
+    def _load(self) -> Dict[str, DriftResult]:
+        if self._results is None:
+            results = {}
+            try:
+                for rid, raw in json.loads(self.path.read_text(encoding="utf-8")).items():
+                    raw.pop("drifted", None)
+                    results[rid] = DriftResult(**raw)
+            except (OSError, ValueError, TypeError):
+                pass
+            self._results = results
+        return self._results
+
+    def _persist(self) -> None:
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.path.with_suffix(".tmp")
+            tmp.write_text(json.dumps({rid: r.to_dict() for rid, r in self._results.items()}, sort_keys=True),
+                           encoding="utf-8")
+            os.replace(tmp, self.path)
+        except OSError as e:
+            logger.warning(f"Could not persist drift results: {e}")
+
+    def get(self, resource_id: str) -> Optional[DriftResult]:
+        with self._lock:
+            return self._load().get(resource_id)
+
+    def all(self) -> Dict[str, DriftResult]:
+        with self._lock:
+            return dict(self._load())
+
+    def drifted(self, resource_id: str) -> Optional[bool]:
+        result = self.get(resource_id)
+        return result.drifted if result else None
+
+    def record(self, result: DriftResult) -> bool:
+        """Store ``result``; returns whether the resource's drifted flag changed."""
+        with self._lock:
+            results = self._load()
+            previous = results.get(result.resource_id)
+            results[result.resource_id] = result
+            self.version += 1
+            self._persist()
+        return (previous.drifted if previous else None) != result.drifted
+
+    def forget(self, resource_id: str) -> None:
+        with self._lock:
+            if self._load().pop(resource_id, None) is not None:
+                self.version += 1
+                self._persist()
+
+
+CheckFn = Callable[[str], Awaitable[Tuple[int, str]]]
+
+
+class DriftScanner:
+    """Runs drift checks through ``check_fn`` (returning exit code and output) for ``targets_fn()``.
+
+    ``is_busy`` is consulted before and after waiting for a slot, so instances
+    with an apply/destroy in flight are skipped rather than queued behind it.
+    """
+
+    def __init__(self, check_fn: CheckFn, targets_fn: Callable[[], List[str]],
+                 is_busy: Callable[[str], bool] = lambda resource_id: False,
+                 store: Optional[DriftStore] = None,
+                 interval: float = DRIFT_SCAN_INTERVAL, jitter: float = DRIFT_SCAN_JITTER,
+                 max_concurrency: int = DRIFT_SCAN_CONCURRENCY):
+        self.store = store or DriftStore()
+        self.interval = interval
+        self.jitter = jitter
+        self.max_concurrency = max(1, max_concurrency)
+        self.last_scan_started: Optional[float] = None
+        self.last_scan_finished: Optional[float] = None
+        self.next_scan_at: Optional[float] = None
+        self._check_fn = check_fn
+        self._targets_fn = targets_fn
+        self._is_busy = is_busy
+        self._scan_task: Optional[asyncio.Task] = None
+        self._loop_task: Optional[asyncio.Task] = None
+
+    @property
+    def scanning(self) -> bool:
+        return self._scan_task is not None and not self._scan_task.done()
+
+    def _next_delay(self) -> float:
+        return max(1.0, self.interval * (1 + random.uniform(-self.jitter, self.jitter)))
+
+    async def scan_one(self, resource_id: str, semaphore: Optional[asyncio.Semaphore] = None) -> DriftResult:
+        semaphore = semaphore or asyncio.Semaphore(1)
+        if self._is_busy(resource_id):
+            return DriftResult(resource_id, DRIFT_SKIPPED, error="operation in progress")
+        async with semaphore:
+            if self._is_busy(resource_id):
+                return DriftResult(resource_id, DRIFT_SKIPPED, error="operation in progress")
+            started = time.monotonic()
+            try:
+                exit_code, output = await self._check_fn(resource_id)
+                status, changes, error = parse_refresh_plan(exit_code, output)
+            except Exception as e:
+                status, changes, error = DRIFT_ERROR, [], str(e)
+            result = DriftResult(resource_id, status, duration=round(time.monotonic() - started, 1),
+                                 changes=changes, error=error)
+        metrics.DRIFT_SCANS.inc(result=status)
+        if await asyncio.to_thread(self.store.record, result):
+            event_bus.publish(RESOURCE_DRIFT, resource_id, drifted=result.drifted, changes=result.changes)
+        if status == DRIFT_DRIFTED:
+            logger.info(f"Drift detected in {resource_id}: {len(changes)} resource(s) changed outside terraform")
+        elif status == DRIFT_ERROR:
+            logger.warning(f"Drift check failed for {resource_id}: {error}")
+        return result
+
+    async def scan(self, resource_ids: Optional[Iterable[str]] = None) -> Dict[str, int]:
+        """One pass over ``resource_ids`` (default: every enabled instance); returns counts by status."""
+        if resource_ids is None:
+            resource_ids = await asyncio.to_thread(self._targets_fn)
+        resource_ids = list(resource_ids)
+        self.last_scan_started = time.time()
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        results = await asyncio.gather(*(self.scan_one(rid, semaphore) for rid in resource_ids))
+        self.last_scan_finished = time.time()
+        counts: Dict[str, int] = {}
+        for result in results:
+            counts[result.status] = counts.get(result.status, 0) + 1
+        logger.info(f"Drift scan of {len(resource_ids)} instances finished in "
+                    f"{self.last_scan_finished - self.last_scan_started:.1f}s: {counts}")
+        return counts
+
+    def start_scan(self, resource_ids: Optional[Iterable[str]] = None) -> bool:
+        """Start a pass in the background unless one is already running."""
+        if self.scanning:
+            return False
+        self._scan_task = asyncio.create_task(self.scan(resource_ids))
+        return True
+
+    async def _run_forever(self) -> None:
+        delay = random.uniform(0, self.interval * self.jitter) if self.jitter else self.interval
+        while True:
+            self.next_scan_at = time.time() + delay
+            await asyncio.sleep(delay)
+            if self.start_scan():
+                try:
+                    await self._scan_task
+                except Exception as e:
+                    logger.error(f"Drift scan failed: {e}")
+            delay = self._next_delay()
+
+    def start(self) -> None:
+        if self._loop_task is None or self._loop_task.done():
+            self._loop_task = asyncio.create_task(self._run_forever())
+            logger.info(f"Drift scanner started (every ~{self.interval:.0f}s, concurrency {self.max_concurrency})")
+
+    def status(self) -> Dict:
+        return {
+            "enabled": self._loop_task is not None and not self._loop_task.done(),
+            "scanning": self.scanning,
+            "interval": self.interval,
+            "last_scan_started": self.last_scan_started,
+            "last_scan_finished": self.last_scan_finished,
+            "next_scan_at": self.next_scan_at,
+            "results": {rid: r.to_dict() for rid, r in sorted(self.store.all().items())},
+        }
@@ -4,11 +4,15 @@ import os
 from pathlib import Path
 from typing import Dict, List, Optional
 
+from app.services.event_bus import PRESET_DEPLOYED, PRESET_UNDEPLOYED, event_bus
+from app.services.http_cache import file_generation
+
 logger = logging.getLogger(__name__)
 
 S3_PRESET_PREFIX = "eks-presets"
 S3_LAYOUT_KEY = f"{S3_PRESET_PREFIX}/_layout.json"
 S3_DEPLOYMENTS_KEY = f"{S3_PRESET_PREFIX}/_deployments.json"
+SYNC_INDEX_FILE = "_sync_index.json"
 OOTB_SOURCE_DIR = Path("/app/terraform-source/eks")
 
 
@@ -18,7 +22,10 @@ class EKSPresetManager:
         self.terraform_dir = Path(terraform_dir)
         self.eks_dir = self.terraform_dir / "eks"
         self._cached_s3_manager = None
+        self._sync_engine = None
         self._cache_initialized = False
+        self.last_sync_stats: Optional[Dict] = None
+        self.index_version = 0
 
     def _get_s3_manager(self):
         from app.services.s3_config_manager import S3ConfigManager
@@ -29,6 +36,15 @@ class EKSPresetManager:
             self._cached_s3_manager = S3ConfigManager(bucket_name)
         return self._cached_s3_manager
 
+    def _get_sync_engine(self):
+        from app.services.s3_sync import S3SyncEngine
+        s3 = self._get_s3_manager()
+        if not s3:
+            return None
+        if self._sync_engine is None or self._sync_engine.s3 is not s3:
+            self._sync_engine = S3SyncEngine(s3, self.eks_dir / SYNC_INDEX_FILE)
+        return self._sync_engine
+
     def _get_s3_bucket_name(self) -> Optional[str]:
         try:
             from app.services.config_manager import ConfigManager
@@ -124,6 +140,19 @@ class EKSPresetManager:
             logger.warning(f"Failed to scan S3 presets: {e}")
         return presets
 
+    def index_generation(self) -> Optional[tuple]:
+        """Version of the local preset index, or None while listing still goes to S3."""
+        if not self._cache_initialized:
+            return None
+        entries = []
+        if self.eks_dir.exists():
+            with os.scandir(self.eks_dir) as it:
+                for entry in it:
+                    if entry.is_dir():
+                        entries.append((entry.name, entry.stat().st_mtime_ns,
+                                        file_generation(Path(entry.path) / "manifest.json")))
+        return (self.index_version, file_generation(self.eks_dir / "_layout.json"), tuple(sorted(entries)))
+
     def list_presets(self) -> List[Dict]:
         local = self._scan_local_presets()
         s3_presets = self._scan_s3_presets()
@@ -149,6 +178,7 @@ class EKSPresetManager:
                 local_manifest = preset_dir / "manifest.json"
                 local_manifest.parent.mkdir(parents=True, exist_ok=True)
                 if s3.download_file(manifest_key, local_manifest):
+                    self.index_version += 1
                     manifest = self._read_manifest(preset_dir)
 
         if not manifest:
@@ -188,6 +218,7 @@ class EKSPresetManager:
         preset_dir = self.eks_dir / name
         preset_dir.mkdir(parents=True, exist_ok=True)
         local_path = preset_dir / filename
+        self.index_version += 1
 
         try:
             local_path.write_text(content)
@@ -207,6 +238,7 @@ class EKSPresetManager:
         preset_dir = self.eks_dir / name
         preset_dir.mkdir(parents=True, exist_ok=True)
         manifest_path = preset_dir / "manifest.json"
+        self.index_version += 1
 
         try:
             manifest_path.write_text(json.dumps(manifest, indent=2) + "\n")
@@ -224,7 +256,8 @@ class EKSPresetManager:
     def create_preset(self, name: str, description: str = "", preset_type: str = "kubectl",
                       deploy_commands: List[Dict] = None, update_commands: List[Dict] = None,
                       undeploy_commands: List[Dict] = None,
-                      files: Dict[str, str] = None) -> bool:
+                      files: Dict[str, str] = None,
+                      depends_on: List[str] = None) -> bool:
         preset_dir = self.eks_dir / name
         if (preset_dir / "manifest.json").exists():
             logger.warning(f"Preset already exists: {name}")
@@ -238,6 +271,7 @@ class EKSPresetManager:
             "deploy_commands": deploy_commands or [],
             "update_commands": update_commands or [],
             "undeploy_commands": undeploy_commands or [],
+            "depends_on": depends_on or [],
             "files": list((files or {}).keys()),
         }
 
@@ -256,6 +290,7 @@ class EKSPresetManager:
             return False
 
         preset_dir = self.eks_dir / name
+        self.index_version += 1
         if preset_dir.exists():
             import shutil
             shutil.rmtree(preset_dir)
@@ -270,6 +305,7 @@ class EKSPresetManager:
                     logger.debug(f"Deleted S3 key: {key}")
                 except Exception as e:
                     logger.warning(f"Failed to delete S3 key {key}: {e}")
+            self._get_sync_engine().forget(f"{S3_PRESET_PREFIX}/{name}/")
 
         return True
 
@@ -307,18 +343,11 @@ class EKSPresetManager:
             logger.debug(f"Preset '{name}' already cached locally, skipping S3 sync")
             return preset_dir
 
-        s3 = self._get_s3_manager()
-        if s3:
-            keys = s3.list_files(f"{S3_PRESET_PREFIX}/{name}/")
-            for key in keys:
-                filename = key.rsplit("/", 1)[-1]
-                if not filename:
-                    continue
-                local_path = preset_dir / filename
-                if local_path.exists():
-                    logger.debug(f"Skipping already cached file: {local_path}")
-                    continue
-                s3.download_file(key, local_path)
+        engine = self._get_sync_engine()
+        if engine:
+            stats = engine.pull(f"{S3_PRESET_PREFIX}/{name}/", preset_dir)
+            self.index_version += 1
+            logger.debug(f"Preset '{name}' synced from S3: {stats.transferred} downloaded, {stats.skipped} unchanged")
 
         if preset_dir.exists() and any(preset_dir.iterdir()):
             return preset_dir
@@ -382,6 +411,7 @@ class EKSPresetManager:
             return False
         local_path = self.eks_dir / "_layout.json"
         local_path.parent.mkdir(parents=True, exist_ok=True)
+        self.index_version += 1
         try:
             local_path.write_text(json.dumps(layout, indent=2) + "\n")
             s3.upload_file(local_path, S3_LAYOUT_KEY)
@@ -395,56 +425,51 @@ class EKSPresetManager:
         if not preset_dir.exists():
             return False
 
-        s3 = self._get_s3_manager()
-        if not s3:
+        engine = self._get_sync_engine()
+        if not engine:
             return False
 
-        success = True
-        for f in preset_dir.iterdir():
-            if not f.is_file():
-                continue
-            s3_key = f"{S3_PRESET_PREFIX}/{name}/{f.name}"
-            if not s3.upload_file(f, s3_key):
-                success = False
-        return success
+        stats = engine.push(preset_dir, f"{S3_PRESET_PREFIX}/{name}/")
+        logger.debug(f"Preset '{name}' synced to S3: {stats.transferred} uploaded "
+                     f"({stats.bytes_transferred} bytes), {stats.skipped} unchanged")
+        return stats.failed == 0
 
-    def initialize_local_cache(self) -> None:
-        s3 = self._get_s3_manager()
-        if not s3:
+    @staticmethod
+    def _is_cached_preset_file(rel: str) -> bool:
+        return not rel.startswith("_") or rel == S3_LAYOUT_KEY.rsplit("/", 1)[-1]
+
+    def initialize_local_cache(self) -> Optional[Dict]:
+        engine = self._get_sync_engine()
+        if not engine:
             logger.warning("S3 not available, skipping EKS preset cache initialization")
             self._cache_initialized = True
-            return
+            return None
 
         self.eks_dir.mkdir(parents=True, exist_ok=True)
 
         try:
-            local_path = self.eks_dir / "_layout.json"
-            if s3.download_file(S3_LAYOUT_KEY, local_path):
-                logger.debug("Cached _layout.json from S3")
-
-            keys = s3.list_files(f"{S3_PRESET_PREFIX}/")
-            downloaded = 0
-            for key in keys:
-                if key.endswith("/"):
-                    continue
-                rel = key[len(S3_PRESET_PREFIX) + 1:]
-                if rel.startswith("_"):
-                    continue
-                local_file = self.eks_dir / rel
-                local_file.parent.mkdir(parents=True, exist_ok=True)
-                if s3.download_file(key, local_file):
-                    downloaded += 1
-
-            logger.info(f"EKS preset cache initialized: {downloaded} files downloaded from S3")
+            stats = engine.pull(
+                f"{S3_PRESET_PREFIX}/", self.eks_dir,
+                include=self._is_cached_preset_file, delete_missing=True,
+            )
+            self.last_sync_stats = stats.to_dict()
+            if stats.error:
+                logger.warning(f"EKS preset cache left as is, S3 listing failed: {stats.error}")
+            else:
+                logger.info(f"EKS preset cache initialized: {stats.transferred} files downloaded "
+                            f"({stats.bytes_transferred} bytes), {stats.skipped} unchanged, "
+                            f"{stats.deleted} removed in {stats.duration}s")
         except Exception as e:
             logger.warning(f"Failed to initialize EKS preset cache: {e}")
 
+        self.index_version += 1
         self._cache_initialized = True
+        return self.last_sync_stats
 
-    def refresh_from_s3(self) -> None:
+    def refresh_from_s3(self) -> Optional[Dict]:
         logger.info("Refreshing EKS preset cache from S3")
         self._cache_initialized = False
-        self.initialize_local_cache()
+        return self.initialize_local_cache()
 
     def _deployments_path(self) -> Path:
         return self.eks_dir / "_deployments.json"
@@ -478,12 +503,24 @@ class EKSPresetManager:
                 return self._read_deployments()
         return {}
 
-    def mark_deployed(self, name: str) -> None:
+    def mark_deployed(self, name: str, run: Optional[Dict] = None) -> None:
+        self.mark_deployed_many([name], run)
+
+    def mark_deployed_many(self, names: List[str], run: Optional[Dict] = None) -> None:
         from datetime import datetime, timezone
+        if not names:
+            return
         deployments = self._read_deployments()
-        deployments[name] = {"deployed_at": datetime.now(timezone.utc).isoformat()}
+        deployed_at = datetime.now(timezone.utc).isoformat()
+        for name in names:
+            entry = {"deployed_at": deployed_at}
+            if run:
+                entry["run"] = run
+            deployments[name] = entry
         self._save_deployments(deployments)
-        logger.debug(f"Marked preset as deployed: {name}")
+        logger.debug(f"Marked presets as deployed: {', '.join(names)}")
+        for name in names:
+            event_bus.publish(PRESET_DEPLOYED, preset=name, deployed_at=deployed_at)
 
     def mark_undeployed(self, name: str) -> None:
         deployments = self._read_deployments()
@@ -491,3 +528,4 @@ class EKSPresetManager:
             del deployments[name]
             self._save_deployments(deployments)
             logger.debug(f"Marked preset as undeployed: {name}")
+            event_bus.publish(PRESET_UNDEPLOYED, preset=name)
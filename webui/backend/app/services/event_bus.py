@@ -0,0 +1,131 @@
+"""
+Event Bus
+In-process publish/subscribe for state changes pushed to the UI over
+/api/events/ws (resource status and drift, operations, tfvars, presets, credentials)
+
+publish() may be called from any thread (mutation points often run under
+asyncio.to_thread); events are handed to each subscriber's event loop. With no
+subscribers connected, publish() returns before building the event.
+"""
+import asyncio
+import itertools
+import logging
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+RESOURCE_STATUS = "resource.status"
+RESOURCE_DRIFT = "resource.drift"
+OPERATION_STARTED = "operation.started"
+OPERATION_FINISHED = "operation.finished"
+TFVARS_CHANGED = "tfvars.changed"
+PRESET_DEPLOYED = "preset.deployed"
+PRESET_UNDEPLOYED = "preset.undeployed"
+CREDENTIAL_HEALTH = "credentials.health"
+
+EVENT_TYPES = (
+    RESOURCE_STATUS, RESOURCE_DRIFT, OPERATION_STARTED, OPERATION_FINISHED, TFVARS_CHANGED,
+    PRESET_DEPLOYED, PRESET_UNDEPLOYED, CREDENTIAL_HEALTH,
+)
+MAX_QUEUED_EVENTS = 256
+
+
+@dataclass
+class Event:
+    type: str
+    seq: int
+    resource_id: Optional[str] = None
+    data: Dict = field(default_factory=dict)
+    ts: float = field(default_factory=time.time)
+
+    def to_dict(self) -> Dict:
+        return {"type": self.type, "seq": self.seq, "ts": self.ts,
+                "resource_id": self.resource_id, "data": self.data}
+
+
+class Subscription:
+    """One client's filtered view of the bus; queued events are dropped oldest-first on overflow."""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, types: Optional[Iterable[str]] = None,
+                 resources: Optional[Iterable[str]] = None, max_queued: int = MAX_QUEUED_EVENTS):
+        self.loop = loop
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_queued)
+        self.dropped = 0
+        self.types: Set[str] = set()
+        self.resources: Set[str] = set()
+        self.update(types, resources)
+
+    def update(self, types: Optional[Iterable[str]] = None, resources: Optional[Iterable[str]] = None) -> None:
+        """Replace the filters; an empty filter matches everything."""
+        self.types = set(types or ())
+        self.resources = set(resources or ())
+
+    def matches(self, event: Event) -> bool:
+        if self.types and event.type not in self.types:
+            return False
+        if self.resources and event.resource_id is not None and event.resource_id not in self.resources:
+            return False
+        return True
+
+    def _offer(self, event: Event) -> None:
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(event)
+
+    async def get(self) -> Event:
+        return await self.queue.get()
+
+    def take_dropped(self) -> int:
+        dropped, self.dropped = self.dropped, 0
+        return dropped
+
+
+class EventBus:
+    def __init__(self):
+        self._subscriptions: Set[Subscription] = set()
+        self._lock = threading.Lock()
+        self._seq = itertools.count(1)
+
+    def __len__(self) -> int:
+        return len(self._subscriptions)
+
+    def subscribe(self, types: Optional[Iterable[str]] = None,
+                  resources: Optional[Iterable[str]] = None) -> Subscription:
+        """Must be called from the event loop that will consume the subscription."""
+        subscription = Subscription(asyncio.get_running_loop(), types, resources)
+        with self._lock:
+            self._subscriptions.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        with self._lock:
+            self._subscriptions.discard(subscription)
+
+    def publish(self, event_type: str, resource_id: Optional[str] = None, **data) -> None:
+        if not self._subscriptions:
+            return
+        with self._lock:
+            subscriptions = list(self._subscriptions)
+        event = Event(type=event_type, seq=next(self._seq), resource_id=resource_id, data=data)
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        for subscription in subscriptions:
+            if not subscription.matches(event):
+                continue
+            if subscription.loop is running:
+                subscription._offer(event)
+                continue
+            try:
+                subscription.loop.call_soon_threadsafe(subscription._offer, event)
+            except RuntimeError:
+                logger.debug("Dropping event for subscriber on a closed loop")
+                self.unsubscribe(subscription)
+
+
+event_bus = EventBus()
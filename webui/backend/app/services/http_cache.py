@@ -0,0 +1,54 @@
+"""
+HTTP Cache
+Strong ETags for polled read endpoints, derived from the generation of the data
+behind them (file mtimes, status cache version, preset index version)
+
+A handler computes its generation before doing any work; when the client's
+If-None-Match already names it, a bodyless 304 is returned instead of rescanning
+and re-serializing the payload.
+"""
+import hashlib
+import os
+from pathlib import Path
+from typing import Optional, Tuple
+
+from fastapi import Request, Response
+
+CACHE_CONTROL = "private, no-cache"
+
+
+def etag_for(generation) -> str:
+    digest = hashlib.sha1(repr(generation).encode()).hexdigest()[:32]
+    return f'"{digest}"'
+
+
+def file_generation(path: Path) -> Optional[Tuple[int, int]]:
+    """(mtime_ns, size) of ``path``, or None when it does not exist."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+def _matches(if_none_match: str, etag: str) -> bool:
+    if if_none_match.strip() == "*":
+        return True
+    candidates = (tag.strip() for tag in if_none_match.split(","))
+    return any(tag.removeprefix("W/") == etag for tag in candidates)
+
+
+def conditional(request: Request, response: Response, generation) -> Optional[Response]:
+    """Return a 304 when the client already holds ``generation``, else stamp ``response``.
+
+    A ``None`` generation means the data can't be versioned right now (e.g. no
+    status cache yet), so no ETag is sent.
+    """
+    if generation is None:
+        return None
+    etag = etag_for(generation)
+    headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL}
+    if _matches(request.headers.get("if-none-match", ""), etag):
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return None
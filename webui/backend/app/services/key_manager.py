@@ -7,6 +7,9 @@ import logging
 from typing import Optional, List, Dict
 from botocore.exceptions import ClientError, ProfileNotFound
 
+from app.services.credential_manager import credential_manager
+from app.services.ssm_gateway import SSMGateway
+
 logger = logging.getLogger(__name__)
 
 
@@ -16,8 +19,13 @@ class ParameterStoreKeyManager:
     def __init__(self, region: str = "ap-northeast-2"):
         self.region = region
         self.key_prefix = "/ec2/keypairs"
+        self.ssm = SSMGateway(lambda: self.ssm_client, region)
+        self._create_client()
+        credential_manager.subscribe(self._create_client)
+
+    def _create_client(self):
         try:
-            self.ssm_client = boto3.client('ssm', region_name=region)
+            self.ssm_client = boto3.client('ssm', region_name=self.region)
         except (ProfileNotFound, Exception) as e:
             logger.warning(f"Failed to create SSM client: {e}")
             self.ssm_client = None
@@ -42,7 +50,7 @@ class ParameterStoreKeyManager:
             tier = "Standard"
 
         try:
-            self.ssm_client.put_parameter(
+            self.ssm.put_parameter(
                 Name=parameter_name,
                 Description=description or f"SSH private key for EC2: {key_name}",
                 Value=private_key_content,
@@ -67,48 +75,40 @@ class ParameterStoreKeyManager:
         parameter_name = f"{self.key_prefix}/{key_name}"
 
         try:
-            response = self.ssm_client.get_parameter(
-                Name=parameter_name,
-                WithDecryption=True
-            )
-            return response['Parameter']['Value']
-
-        except ClientError as e:
-            if e.response['Error']['Code'] == 'ParameterNotFound':
+            parameter = self.ssm.get_parameter(parameter_name)
+            if parameter is None:
                 logger.debug(f"Key {key_name} not found in Parameter Store")
                 return None
+            return parameter['Value']
+
+        except ClientError as e:
             logger.error(f"Failed to get key {key_name}: {e}")
             raise
 
+    def _describe_keys(self) -> List[Dict]:
+        return self.ssm.describe_parameters([
+            {
+                'Key': 'Name',
+                'Option': 'BeginsWith',
+                'Values': [self.key_prefix]
+            }
+        ])
+
+    def _key_metadata(self, param: Dict) -> Dict[str, any]:
+        return {
+            "name": param['Name'].replace(f"{self.key_prefix}/", ""),
+            "full_path": param['Name'],
+            "description": param.get('Description', ''),
+            "last_modified": param.get('LastModifiedDate'),
+            "version": param.get('Version', 1),
+            "tier": param.get('Tier', 'Standard')
+        }
+
     def list_keys(self) -> List[Dict[str, any]]:
         self._require_client()
-        keys = []
 
         try:
-            paginator = self.ssm_client.get_paginator('describe_parameters')
-            page_iterator = paginator.paginate(
-                ParameterFilters=[
-                    {
-                        'Key': 'Name',
-                        'Option': 'BeginsWith',
-                        'Values': [self.key_prefix]
-                    }
-                ]
-            )
-
-            for page in page_iterator:
-                for param in page['Parameters']:
-                    key_name = param['Name'].replace(f"{self.key_prefix}/", "")
-                    keys.append({
-                        "name": key_name,
-                        "full_path": param['Name'],
-                        "description": param.get('Description', ''),
-                        "last_modified": param.get('LastModifiedDate'),
-                        "version": param.get('Version', 1),
-                        "tier": param.get('Tier', 'Standard')
-                    })
-
-            return keys
+            return [self._key_metadata(param) for param in self._describe_keys()]
 
         except ClientError as e:
             logger.error(f"Failed to list keys: {e}")
@@ -119,7 +119,7 @@ class ParameterStoreKeyManager:
         parameter_name = f"{self.key_prefix}/{key_name}"
 
         try:
-            self.ssm_client.delete_parameter(Name=parameter_name)
+            self.ssm.delete_parameter(parameter_name)
             logger.info(f"Deleted key {key_name} from Parameter Store")
             return True
 
@@ -132,18 +132,9 @@ class ParameterStoreKeyManager:
 
     def key_exists(self, key_name: str) -> bool:
         self._require_client()
-        parameter_name = f"{self.key_prefix}/{key_name}"
 
         try:
-            self.ssm_client.describe_parameters(
-                ParameterFilters=[
-                    {
-                        'Key': 'Name',
-                        'Values': [parameter_name]
-                    }
-                ]
-            )
-            return True
+            return self.get_key_info(key_name) is not None
 
         except ClientError:
             return False
@@ -152,27 +143,11 @@ class ParameterStoreKeyManager:
         self._require_client()
         parameter_name = f"{self.key_prefix}/{key_name}"
 
+        # Served from the cached prefix listing shared with list_keys
         try:
-            response = self.ssm_client.describe_parameters(
-                ParameterFilters=[
-                    {
-                        'Key': 'Name',
-                        'Values': [parameter_name]
-                    }
-                ]
-            )
-
-            if response['Parameters']:
-                param = response['Parameters'][0]
-                return {
-                    "name": key_name,
-                    "full_path": param['Name'],
-                    "description": param.get('Description', ''),
-                    "last_modified": param.get('LastModifiedDate'),
-                    "version": param.get('Version', 1),
-                    "tier": param.get('Tier', 'Standard')
-                }
-
+            for param in self._describe_keys():
+                if param['Name'] == parameter_name:
+                    return self._key_metadata(param)
             return None
 
         except ClientError as e:
@@ -193,7 +168,7 @@ class ParameterStoreKeyManager:
             info = self.get_key_info(key_name)
             tier = info.get('tier', 'Standard') if info else 'Standard'
 
-            self.ssm_client.put_parameter(
+            self.ssm.put_parameter(
                 Name=parameter_name,
                 Description=description,
                 Value=current,
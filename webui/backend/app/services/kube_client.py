@@ -0,0 +1,425 @@
+"""
+Kubernetes API Client
+Serves read-only kubectl get commands in-process over a pooled HTTPS session
+"""
+import asyncio
+import base64
+import json
+import logging
+import shlex
+import tempfile
+import threading
+import time
+from dataclasses import dataclass
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from app.services.kubeconfig_manager import kubeconfig_manager
+from app.services.terraform_runner import EXIT_SENTINEL_PREFIX
+
+logger = logging.getLogger(__name__)
+
+TABLE_ACCEPT = "application/json;as=Table;v=1;g=meta.k8s.io,application/json"
+DISCOVERY_TTL = 600
+REQUEST_TIMEOUT = (5, 30)
+WATCH_TIMEOUT_SECONDS = 1800
+
+# describe is left to kubectl: its per-kind layouts are not worth re-implementing
+SUPPORTED_VERBS = {"get"}
+
+
+class KubeClientUnavailable(Exception):
+    """The native path cannot serve this command; the caller should fall back to kubectl."""
+
+
+class KubeApiError(Exception):
+    def __init__(self, message: str):
+        super().__init__(message)
+        self.message = message
+
+
+@dataclass
+class KubectlPlan:
+    verb: str
+    resource: str
+    name: Optional[str] = None
+    namespace: str = "default"
+    all_namespaces: bool = False
+    selector: Optional[str] = None
+    wide: bool = False
+    watch: bool = False
+
+
+@dataclass
+class ApiResource:
+    group_version: str
+    plural: str
+    kind: str
+    namespaced: bool
+
+
+def parse_kubectl_command(command: str) -> Optional[KubectlPlan]:
+    """Parse a kubectl command into a plan, or return None if it needs the real binary."""
+    try:
+        tokens = shlex.split(command)
+    except ValueError:
+        return None
+    if len(tokens) < 3 or tokens[0] != "kubectl" or tokens[1] not in SUPPORTED_VERBS:
+        return None
+
+    plan = KubectlPlan(verb=tokens[1], resource="")
+    positionals: List[str] = []
+    it = iter(tokens[2:])
+    for tok in it:
+        if tok in ("-n", "--namespace"):
+            plan.namespace = next(it, "")
+        elif tok.startswith("--namespace="):
+            plan.namespace = tok.split("=", 1)[1]
+        elif tok in ("-A", "--all-namespaces"):
+            plan.all_namespaces = True
+        elif tok in ("-l", "--selector"):
+            plan.selector = next(it, "")
+        elif tok.startswith(("--selector=", "-l=")):
+            plan.selector = tok.split("=", 1)[1]
+        elif tok in ("-w", "--watch"):
+            plan.watch = True
+        elif tok in ("-o", "--output"):
+            if next(it, "") != "wide":
+                return None
+            plan.wide = True
+        elif tok in ("-owide", "-o=wide", "--output=wide"):
+            plan.wide = True
+        elif tok.startswith("-"):
+            return None
+        else:
+            positionals.append(tok)
+
+    if not positionals or not plan.namespace or plan.selector == "":
+        return None
+    resource = positionals[0]
+    if "," in resource:
+        return None
+    if "/" in resource:
+        resource, _, name = resource.partition("/")
+        positionals.insert(1, name)
+    if len(positionals) > 2:
+        return None
+    plan.resource = resource.lower()
+    plan.name = positionals[1] if len(positionals) == 2 else None
+
+    if plan.name and (plan.all_namespaces or plan.selector):
+        return None
+    return plan
+
+
+def _format_cell(value) -> str:
+    if value is None:
+        return "<none>"
+    if isinstance(value, (list, dict)):
+        return json.dumps(value)
+    return str(value)
+
+
+def _table_columns(table: Dict, wide: bool) -> List[Tuple[int, str]]:
+    return [
+        (i, col["name"].upper())
+        for i, col in enumerate(table.get("columnDefinitions", []))
+        if wide or col.get("priority", 0) == 0
+    ]
+
+
+def _table_rows(table: Dict, columns: List[Tuple[int, str]], with_namespace: bool) -> List[List[str]]:
+    rows = []
+    for row in table.get("rows", []):
+        cells = row.get("cells", [])
+        values = [_format_cell(cells[i]) if i < len(cells) else "" for i, _ in columns]
+        if with_namespace:
+            namespace = (row.get("object") or {}).get("metadata", {}).get("namespace", "")
+            values.insert(0, namespace)
+        rows.append(values)
+    return rows
+
+
+def _align(rows: List[List[str]], widths: List[int]) -> List[str]:
+    lines = []
+    for row in rows:
+        padded = [cell.ljust(widths[i]) if i < len(row) - 1 else cell for i, cell in enumerate(row)]
+        lines.append("   ".join(padded).rstrip() + "\n")
+    return lines
+
+
+def format_table(table: Dict, wide: bool = False, with_namespace: bool = False) -> Tuple[List[str], List[int]]:
+    """Render a meta.k8s.io Table the way kubectl does; also returns column widths for watch rows."""
+    columns = _table_columns(table, wide)
+    header = [name for _, name in columns]
+    if with_namespace:
+        header.insert(0, "NAMESPACE")
+    rows = _table_rows(table, columns, with_namespace)
+    widths = [max(len(r[i]) for r in [header] + rows) for i in range(len(header))]
+    return _align([header] + rows, widths), widths
+
+
+class KubeClient:
+    """In-process Kubernetes API client backed by the cached kubeconfig credentials.
+
+    A single requests.Session keeps TLS connections to the API server alive
+    between commands, and API discovery results are cached so resolving
+    ``pods`` or ``deploy`` does not cost a round trip per command.
+    """
+
+    def __init__(self):
+        self._session: Optional[requests.Session] = None
+        self._session_key: Optional[Tuple[str, str]] = None
+        self._ca_file = None
+        self._session_lock = threading.Lock()
+        self._resources: Dict[str, ApiResource] = {}
+        self._pending_group_versions: Optional[List[str]] = None
+        self._discovery_expires_at = 0.0
+        self._discovery_epoch = 0
+        self._discovery_lock = threading.Lock()
+
+    def _connection(self) -> Tuple[requests.Session, str, str]:
+        conn = kubeconfig_manager.get_connection()
+        if conn is None:
+            raise KubeClientUnavailable("No valid EKS token cached")
+        endpoint, ca_data, token = conn
+        with self._session_lock:
+            if self._session is None or self._session_key != (endpoint, ca_data):
+                self._reset_session()
+                self._ca_file = tempfile.NamedTemporaryFile(prefix="eks-ca-", suffix=".crt")
+                self._ca_file.write(base64.b64decode(ca_data))
+                self._ca_file.flush()
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=2, pool_maxsize=16)
+                session.mount("https://", adapter)
+                session.verify = self._ca_file.name
+                self._session = session
+                self._session_key = (endpoint, ca_data)
+                with self._discovery_lock:
+                    self._reset_discovery()
+            return self._session, endpoint.rstrip("/"), token
+
+    def _reset_session(self) -> None:
+        if self._session is not None:
+            self._session.close()
+        if self._ca_file is not None:
+            self._ca_file.close()
+        self._session = None
+        self._ca_file = None
+
+    def _request(self, path: str, params: Optional[Dict] = None, accept: str = "application/json",
+                 stream: bool = False, timeout=REQUEST_TIMEOUT) -> requests.Response:
+        session, endpoint, token = self._connection()
+        try:
+            resp = session.get(
+                f"{endpoint}{path}",
+                params=params,
+                headers={"Authorization": f"Bearer {token}", "Accept": accept},
+                stream=stream,
+                timeout=timeout,
+            )
+        except requests.RequestException as e:
+            raise KubeClientUnavailable(f"Kubernetes API request failed: {e}") from e
+        if resp.status_code == 401:
+            raise KubeClientUnavailable("Kubernetes API rejected the cached token")
+        if resp.status_code >= 400:
+            try:
+                status = resp.json()
+                message = f"Error from server ({status.get('reason', resp.reason)}): {status.get('message', '')}"
+            except ValueError:
+                message = f"Error from server: {resp.status_code} {resp.reason}"
+            raise KubeApiError(message)
+        return resp
+
+    def _discover_group_version(self, group_version: str, into: Dict[str, ApiResource]) -> None:
+        base = "/api/v1" if group_version == "v1" else f"/apis/{group_version}"
+        data = self._request(base).json()
+        for res in data.get("resources", []):
+            plural = res.get("name", "")
+            if "/" in plural or "get" not in res.get("verbs", []):
+                continue
+            info = ApiResource(group_version, plural, res.get("kind", ""), res.get("namespaced", False))
+            aliases = {plural, res.get("singularName") or "", info.kind.lower(), *res.get("shortNames", [])}
+            group = group_version.split("/")[0] if "/" in group_version else ""
+            for alias in filter(None, aliases):
+                into.setdefault(alias, info)
+                if group:
+                    into.setdefault(f"{alias}.{group}", info)
+
+    def _preferred_group_versions(self) -> List[str]:
+        groups = self._request("/apis").json().get("groups", [])
+        preferred = [g["preferredVersion"]["groupVersion"] for g in groups if g.get("preferredVersion")]
+        preferred.sort(key=lambda gv: (not gv.startswith("apps/"), "." in gv.split("/")[0]))
+        return ["v1"] + preferred
+
+    def _reset_discovery(self) -> None:
+        self._resources.clear()
+        self._pending_group_versions = None
+        self._discovery_epoch += 1
+
+    def resolve(self, resource: str) -> ApiResource:
+        """Map a kubectl resource name or alias to its API resource.
+
+        Discovery requests run outside ``_discovery_lock`` (which only guards
+        the cache), so a slow API server does not block commands for resources
+        that are already known. Group versions are fetched lazily, stopping at
+        the first one that serves ``resource``.
+        """
+        with self._discovery_lock:
+            if time.time() > self._discovery_expires_at:
+                self._reset_discovery()
+                self._discovery_expires_at = time.time() + DISCOVERY_TTL
+            if resource in self._resources:
+                return self._resources[resource]
+            epoch = self._discovery_epoch
+            pending = None if self._pending_group_versions is None else list(self._pending_group_versions)
+
+        if pending is None:
+            pending = self._preferred_group_versions()
+        found: Dict[str, ApiResource] = {}
+        while pending and resource not in found:
+            self._discover_group_version(pending.pop(0), found)
+
+        with self._discovery_lock:
+            if epoch == self._discovery_epoch:
+                for alias, info in found.items():
+                    self._resources.setdefault(alias, info)
+                # Another caller may have walked further down the same list meanwhile
+                if self._pending_group_versions is None or len(pending) < len(self._pending_group_versions):
+                    self._pending_group_versions = pending
+            info = self._resources.get(resource) or found.get(resource)
+        if info is None:
+            raise KubeApiError(f'error: the server doesn\'t have a resource type "{resource}"')
+        return info
+
+    def _path(self, info: ApiResource, plan: KubectlPlan) -> str:
+        base = "/api/v1" if info.group_version == "v1" else f"/apis/{info.group_version}"
+        if info.namespaced and not plan.all_namespaces:
+            base = f"{base}/namespaces/{plan.namespace}"
+        path = f"{base}/{info.plural}"
+        return f"{path}/{plan.name}" if plan.name else path
+
+    def _list_params(self, plan: KubectlPlan) -> Dict:
+        params = {}
+        if plan.selector:
+            params["labelSelector"] = plan.selector
+        if plan.name:
+            params["fieldSelector"] = f"metadata.name={plan.name}"
+        return params
+
+    def get_lines(self, plan: KubectlPlan) -> List[str]:
+        info = self.resolve(plan.resource)
+        params = None if plan.name else self._list_params(plan)
+        table = self._request(self._path(info, plan), params=params, accept=TABLE_ACCEPT).json()
+        if table.get("kind") != "Table":
+            raise KubeClientUnavailable("API server did not return a Table response")
+        if not table.get("rows"):
+            scope = "" if plan.all_namespaces or not info.namespaced else f" in {plan.namespace} namespace"
+            return [f"No resources found{scope}.\n"]
+        lines, _ = format_table(table, plan.wide, with_namespace=plan.all_namespaces and info.namespaced)
+        return lines
+
+    def watch_lines(self, plan: KubectlPlan, stop: threading.Event, holder: Dict):
+        info = self.resolve(plan.resource)
+        path = self._path(info, plan)
+        if plan.name:
+            path = path.rsplit("/", 1)[0]
+        with_namespace = plan.all_namespaces and info.namespaced
+        params = self._list_params(plan)
+
+        table = self._request(path, params=params, accept=TABLE_ACCEPT).json()
+        if table.get("kind") != "Table":
+            raise KubeClientUnavailable("API server did not return a Table response")
+        lines, widths = format_table(table, plan.wide, with_namespace=with_namespace)
+        columns = _table_columns(table, plan.wide)
+        yield from lines
+
+        params.update({
+            "watch": "1",
+            "resourceVersion": table.get("metadata", {}).get("resourceVersion", ""),
+            "timeoutSeconds": str(WATCH_TIMEOUT_SECONDS),
+            "allowWatchBookmarks": "false",
+        })
+        resp = self._request(path, params=params, accept=TABLE_ACCEPT, stream=True,
+                             timeout=(REQUEST_TIMEOUT[0], WATCH_TIMEOUT_SECONDS + 30))
+        holder["response"] = resp
+        try:
+            for raw in resp.iter_lines():
+                if stop.is_set():
+                    break
+                if not raw:
+                    continue
+                event = json.loads(raw)
+                if event.get("type") == "ERROR":
+                    yield f"Error from server: {event.get('object', {}).get('message', '')}\n"
+                    break
+                rows = _table_rows(event.get("object", {}), columns, with_namespace)
+                yield from _align(rows, widths)
+        finally:
+            resp.close()
+
+    async def run(self, plan: KubectlPlan) -> AsyncIterator[str]:
+        """Stream command output followed by the exit sentinel.
+
+        KubeClientUnavailable is only raised before anything has been yielded,
+        so callers can safely fall back to the kubectl subprocess.
+        """
+        if plan.watch:
+            async for line in self._run_watch(plan):
+                yield line
+            return
+
+        try:
+            lines = await asyncio.to_thread(self.get_lines, plan)
+        except KubeApiError as e:
+            yield e.message + "\n"
+            yield f"{EXIT_SENTINEL_PREFIX}1\n"
+            return
+        for line in lines:
+            yield line
+        yield f"{EXIT_SENTINEL_PREFIX}0\n"
+
+    async def _run_watch(self, plan: KubectlPlan) -> AsyncIterator[str]:
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+        stop = threading.Event()
+        holder: Dict = {}
+        done = object()
+
+        def _produce():
+            try:
+                for line in self.watch_lines(plan, stop, holder):
+                    loop.call_soon_threadsafe(queue.put_nowait, line)
+            except Exception as e:
+                loop.call_soon_threadsafe(queue.put_nowait, e)
+            finally:
+                loop.call_soon_threadsafe(queue.put_nowait, done)
+
+        producer = loop.run_in_executor(None, _produce)
+        started = False
+        try:
+            while True:
+                item = await queue.get()
+                if item is done:
+                    break
+                if isinstance(item, KubeClientUnavailable) and not started:
+                    raise item
+                if isinstance(item, Exception):
+                    message = item.message if isinstance(item, KubeApiError) else f"Error: {item}"
+                    yield message + "\n"
+                    yield f"{EXIT_SENTINEL_PREFIX}1\n"
+                    return
+                started = True
+                yield item
+            yield f"{EXIT_SENTINEL_PREFIX}0\n"
+        finally:
+            stop.set()
+            resp = holder.get("response")
+            if resp is not None:
+                resp.close()
+            producer.cancel()
+
+
+kube_client = KubeClient()
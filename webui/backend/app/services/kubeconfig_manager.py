@@ -0,0 +1,248 @@
+"""
+EKS Kubeconfig Manager
+Caches cluster endpoints and the EKS bearer token in memory and refreshes the
+token in the background before it expires
+"""
+import asyncio
+import base64
+import json
+import logging
+import os
+import time
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from app.services import tracing
+from app.services.credential_manager import credential_manager
+from app.services.terraform_runner import EXIT_SENTINEL_PREFIX
+
+logger = logging.getLogger(__name__)
+
+KUBECONFIG_PATH = Path.home() / ".kube" / "config"
+TOKEN_EXPIRY_SECONDS = 900
+TOKEN_REFRESH_MARGIN = 120
+TOKEN_MIN_REMAINING = 60
+CLUSTER_INFO_TTL = 600
+IDLE_REFRESH_STOP = 1800
+REFRESH_RETRY_SECONDS = 30
+
+ClusterInfoLoader = Callable[[str, Path], Awaitable[Dict]]
+
+
+def generate_eks_token(cluster_name: str, region: str) -> str:
+    import boto3
+    from botocore.signers import RequestSigner
+
+    session = boto3.Session(region_name=region)
+    sts_client = session.client("sts", region_name=region)
+    service_id = sts_client.meta.service_model.service_id
+
+    signer = RequestSigner(
+        service_id, region, "sts", "v4",
+        session.get_credentials(),
+        session._session.get_component("event_emitter"),
+    )
+
+    params = {
+        "method": "GET",
+        "url": f"https://sts.{region}.amazonaws.com/?Action=GetCallerIdentity&Version=2011-06-15",
+        "body": {},
+        "headers": {"x-k8s-aws-id": cluster_name},
+        "context": {},
+    }
+
+    signed_url = signer.generate_presigned_url(
+        params, region_name=region, expires_in=TOKEN_EXPIRY_SECONDS, operation_name="",
+    )
+    return "k8s-aws-v1." + base64.urlsafe_b64encode(signed_url.encode("utf-8")).decode("utf-8").rstrip("=")
+
+
+def describe_cluster_endpoint(cluster_name: str, region: str) -> Tuple[str, str]:
+    import boto3
+
+    eks_client = boto3.client("eks", region_name=region)
+    cluster = eks_client.describe_cluster(name=cluster_name)["cluster"]
+    return cluster["endpoint"], cluster["certificateAuthority"]["data"]
+
+
+class KubeconfigManager:
+    """Keeps a ready-to-use kubeconfig for the active EKS cluster.
+
+    Cluster info resolved from Terraform outputs and the endpoint/CA returned by
+    describe_cluster are cached per resource and per cluster. The bearer token
+    lives in memory and is re-signed by a background task shortly before expiry,
+    so callers on the hot path only pay for a timestamp comparison.
+    """
+
+    def __init__(self, kubeconfig_path: Path = KUBECONFIG_PATH):
+        self.kubeconfig_path = kubeconfig_path
+        self._cluster_info: Dict[str, Tuple[float, Dict]] = {}
+        self._endpoints: Dict[Tuple[str, str], Tuple[str, str]] = {}
+        self._token: Optional[str] = None
+        self._token_cluster: Optional[Tuple[str, str]] = None
+        self._token_expires_at = 0.0
+        self._last_used = 0.0
+        self._lock = asyncio.Lock()
+        self._refresh_task: Optional[asyncio.Task] = None
+
+    def is_fresh(self) -> bool:
+        return (
+            self._token is not None
+            and time.time() < self._token_expires_at - TOKEN_MIN_REMAINING
+            and self.kubeconfig_path.exists()
+        )
+
+    def get_connection(self) -> Optional[Tuple[str, str, str]]:
+        """Return (endpoint, ca_data, token) for the active cluster while the token is valid."""
+        if not self.is_fresh() or self._token_cluster not in self._endpoints:
+            return None
+        endpoint, ca_data = self._endpoints[self._token_cluster]
+        return endpoint, ca_data, self._token
+
+    def get_status(self) -> Dict:
+        cluster_name, region = self._token_cluster or (None, None)
+        return {
+            "cluster_name": cluster_name,
+            "region": region,
+            "token_valid": self.is_fresh(),
+            "token_expires_in": max(0, int(self._token_expires_at - time.time())) if self._token else 0,
+            "background_refresh": self._refresh_task is not None and not self._refresh_task.done(),
+        }
+
+    def invalidate(self, resource_id: Optional[str] = None) -> None:
+        """Forget cached cluster info (all, or one resource's) and always drop the token.
+
+        The token is cleared even when nothing was cached for ``resource_id``:
+        the cluster it was signed for may be the one that just changed.
+        """
+        if resource_id is None:
+            self._cluster_info.clear()
+            self._endpoints.clear()
+        else:
+            cached = self._cluster_info.pop(resource_id, None)
+            if cached is not None:
+                info = cached[1]
+                self._endpoints.pop((info.get("cluster_name"), info.get("region")), None)
+        self._token = None
+        self._token_cluster = None
+        self._token_expires_at = 0.0
+        logger.debug(f"Kubeconfig cache invalidated (resource={resource_id or 'all'})")
+
+    def on_credentials_changed(self) -> None:
+        """Tokens are presigned with the old credentials; force a re-sign on next use."""
+        self._token_expires_at = 0.0
+
+    async def get_cluster_info(self, resource_id: str, resource_dir: Path,
+                               loader: ClusterInfoLoader) -> Dict:
+        cached = self._cluster_info.get(resource_id)
+        if cached and time.time() - cached[0] < CLUSTER_INFO_TTL:
+            return cached[1]
+        info = await loader(resource_id, resource_dir)
+        if info.get("cluster_name"):
+            self._cluster_info[resource_id] = (time.time(), info)
+        return info
+
+    async def ensure(self, resource_id: Optional[str], resource_dir: Optional[Path],
+                     loader: ClusterInfoLoader, force: bool = False) -> Tuple[bool, List[str]]:
+        self._last_used = time.time()
+        if not force and self.is_fresh():
+            return True, []
+
+        async with self._lock:
+            if not force and self.is_fresh():
+                return True, []
+            lines: List[str] = []
+
+            if not (resource_dir and resource_id):
+                lines.append("Warning: EKS resource not found. Using existing kubeconfig.\n")
+                return True, lines
+
+            if resource_id not in self._cluster_info:
+                lines.append("Resolving EKS cluster info from Terraform outputs...\n")
+            cluster_info = await self.get_cluster_info(resource_id, resource_dir, loader)
+            cluster_name = cluster_info.get("cluster_name")
+            region = cluster_info.get("region")
+
+            if not cluster_name:
+                lines.append("Warning: Could not resolve cluster name from outputs. Using existing kubeconfig.\n")
+                return True, lines
+
+            lines.append(f"Cluster: {cluster_name} (region: {region})\n")
+            lines.append("Configuring kubeconfig...\n")
+            success, output = await asyncio.to_thread(self._configure, cluster_name, region)
+            lines.append(output + "\n")
+            if not success:
+                lines.append("Error: Failed to configure kubeconfig\n")
+                lines.append(f"{EXIT_SENTINEL_PREFIX}1\n")
+                return False, lines
+
+            self._ensure_refresh_loop()
+            return True, lines
+
+    def _configure(self, cluster_name: str, region: str) -> Tuple[bool, str]:
+        with tracing.span("kubeconfig.configure", resource=cluster_name, region=region) as span:
+            success, message = self._write_kubeconfig(cluster_name, region)
+            if not success:
+                tracing.mark_error(span, message)
+            return success, message
+
+    def _write_kubeconfig(self, cluster_name: str, region: str) -> Tuple[bool, str]:
+        try:
+            key = (cluster_name, region)
+            if key not in self._endpoints:
+                self._endpoints[key] = describe_cluster_endpoint(cluster_name, region)
+            endpoint, ca_data = self._endpoints[key]
+            issued_at = time.time()
+            token = generate_eks_token(cluster_name, region)
+
+            kubeconfig = {
+                "apiVersion": "v1",
+                "kind": "Config",
+                "clusters": [{"name": cluster_name, "cluster": {"server": endpoint, "certificate-authority-data": ca_data}}],
+                "contexts": [{"name": cluster_name, "context": {"cluster": cluster_name, "user": cluster_name}}],
+                "current-context": cluster_name,
+                "users": [{"name": cluster_name, "user": {"token": token}}],
+            }
+
+            self.kubeconfig_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.kubeconfig_path.with_name(f".{self.kubeconfig_path.name}.tmp")
+            tmp.write_text(json.dumps(kubeconfig, indent=2))
+            os.replace(tmp, self.kubeconfig_path)
+
+            self._token = token
+            self._token_cluster = key
+            self._token_expires_at = issued_at + TOKEN_EXPIRY_SECONDS
+            creds_expire_at = credential_manager.credentials_expire_at
+            if creds_expire_at is not None:
+                # A presigned token stops working when the signing credentials expire
+                self._token_expires_at = min(self._token_expires_at, creds_expire_at)
+            logger.debug(f"Kubeconfig written to {self.kubeconfig_path} for cluster {cluster_name}")
+            return True, f"Kubeconfig configured for {cluster_name} at {endpoint}"
+        except Exception as e:
+            self._endpoints.pop((cluster_name, region), None)
+            logger.warning(f"Failed to configure kubeconfig: {e}")
+            return False, str(e)
+
+    def _ensure_refresh_loop(self) -> None:
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.create_task(self._refresh_loop())
+
+    async def _refresh_loop(self) -> None:
+        logger.debug("Kubeconfig token refresh loop started")
+        while True:
+            delay = max(self._token_expires_at - TOKEN_REFRESH_MARGIN - time.time(), REFRESH_RETRY_SECONDS)
+            await asyncio.sleep(delay)
+            if time.time() - self._last_used > IDLE_REFRESH_STOP:
+                logger.debug("Kubeconfig idle, stopping token refresh loop")
+                return
+            cluster = self._token_cluster
+            if cluster is None:
+                return
+            async with self._lock:
+                success, output = await asyncio.to_thread(self._configure, *cluster)
+            if not success:
+                logger.warning(f"Background kubeconfig token refresh failed: {output}")
+
+
+kubeconfig_manager = KubeconfigManager()
+credential_manager.subscribe(kubeconfig_manager.on_credentials_changed)
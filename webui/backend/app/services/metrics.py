@@ -0,0 +1,297 @@
+"""
+Metrics Registry
+Counters, gauges and histograms rendered in the Prometheus text exposition format
+
+Writes go to a per-thread shard, so recording a sample never takes a lock;
+shards are only summed when /metrics is scraped.
+"""
+import abc
+import bisect
+import logging
+import math
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+TERRAFORM_BUCKETS = (1.0, 5.0, 15.0, 30.0, 60.0, 120.0, 300.0, 600.0, 1200.0, 1800.0)
+
+LabelValues = Tuple[str, ...]
+
+
+class _Shards:
+    """One dict per writer thread; registration is the only locked step."""
+
+    def __init__(self):
+        self._local = threading.local()
+        self._all: List[Dict] = []
+        self._lock = threading.Lock()
+
+    def mine(self) -> Dict:
+        try:
+            return self._local.values
+        except AttributeError:
+            values: Dict = {}
+            with self._lock:
+                self._all.append(values)
+            self._local.values = values
+            return values
+
+    def snapshot(self) -> List[Dict]:
+        with self._lock:
+            shards = list(self._all)
+        return [shard.copy() for shard in shards]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(f'{extra[0]}="{extra[1]}"')
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric(abc.ABC):
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+    @abc.abstractmethod
+    def render(self) -> List[str]:
+        """Exposition lines for this metric, starting with its HELP/TYPE header."""
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._shards = _Shards()
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        shard = self._shards.mine()
+        key = self._key(labels)
+        shard[key] = shard.get(key, 0.0) + amount
+
+    def values(self) -> Dict[LabelValues, float]:
+        totals: Dict[LabelValues, float] = {}
+        for shard in self._shards.snapshot():
+            for key, value in shard.items():
+                totals[key] = totals.get(key, 0.0) + value
+        return totals
+
+    def render(self) -> List[str]:
+        lines = self._header()
+        for key, value in sorted(self.values().items()):
+            lines.append(f"{self.name}_total{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+
+class Gauge(_Metric):
+    """Point-in-time values, either set directly or computed by a callback at scrape time."""
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+        self._functions: Dict[LabelValues, Callable[[], float]] = {}
+
+    def set(self, value: float, **labels: str) -> None:
+        self._values[self._key(labels)] = value
+
+    def set_function(self, fn: Callable[[], float], **labels: str) -> None:
+        self._functions[self._key(labels)] = fn
+
+    def values(self) -> Dict[LabelValues, float]:
+        values = dict(self._values)
+        for key, fn in list(self._functions.items()):
+            try:
+                values[key] = float(fn())
+            except Exception as e:
+                logger.debug(f"Gauge callback for {self.name}{key} failed: {e}")
+        return values
+
+    def render(self) -> List[str]:
+        lines = self._header()
+        for key, value in sorted(self.values().items()):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Iterable[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._shards = _Shards()
+
+    def observe(self, value: float, **labels: str) -> None:
+        shard = self._shards.mine()
+        key = self._key(labels)
+        # Per-bucket (non-cumulative) counts, then +Inf, count and sum
+        series = shard.get(key)
+        if series is None:
+            series = shard[key] = [0] * (len(self.buckets) + 1) + [0.0]
+        series[bisect.bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def time(self, **labels: str) -> "_Timer":
+        return _Timer(self, labels)
+
+    def snapshot(self) -> Dict[LabelValues, Tuple[List[int], float]]:
+        totals: Dict[LabelValues, Tuple[List[int], float]] = {}
+        for shard in self._shards.snapshot():
+            for key, series in shard.items():
+                series = list(series)
+                counts, total = totals.get(key, ([0] * (len(self.buckets) + 1), 0.0))
+                totals[key] = ([a + b for a, b in zip(counts, series[:-1])], total + series[-1])
+        return totals
+
+    def render(self) -> List[str]:
+        lines = self._header()
+        for key, (counts, total) in sorted(self.snapshot().items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                labels = _format_labels(self.labelnames, key, ("le", _format_value(bound)))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+        return lines
+
+
+class _Timer:
+    def __init__(self, histogram: Histogram, labels: Dict[str, str]):
+        self._histogram = histogram
+        self._labels = labels
+
+    def __enter__(self):
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self._histogram.observe(time.perf_counter() - self._started, **self._labels)
+        return False
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Iterable[float] = LATENCY_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+HTTP_REQUEST_DURATION = registry.histogram(
+    "webui_http_request_duration_seconds",
+    "Time until the response starts, by route template",
+    ("method", "route", "status"),
+)
+S3_STATUS_CACHE = registry.counter(
+    "webui_s3_status_cache", "S3 resource status cache lookups", ("result",))
+S3_STATUS_FETCH_DURATION = registry.histogram(
+    "webui_s3_status_fetch_duration_seconds", "Time spent fetching resource status from S3 state", ("scope",))
+TFVARS_PARSE = registry.counter(
+    "webui_tfvars_parse", "tfvars files parsed", ("scope",))
+VARIABLE_SCHEMA_COMPILE = registry.counter(
+    "webui_variable_schema_compile", "Instance variable schemas compiled from variables.tf")
+TERRAFORM_COMMAND_DURATION = registry.histogram(
+    "webui_terraform_command_duration_seconds", "Wall time of terraform subprocesses",
+    ("command", "exit_code"), buckets=TERRAFORM_BUCKETS,
+)
+SSH_BYTES = registry.counter(
+    "webui_ssh_relayed_bytes", "Bytes relayed between WebSocket clients and SSH channels", ("direction",))
+QUEUE_DEPTH = registry.gauge(
+    "webui_queue_depth", "Work waiting or in progress, by queue", ("queue",))
+CREDENTIAL_REFRESH = registry.counter(
+    "webui_credential_refresh", "AWS credential refresh attempts by outcome", ("outcome",))
+DRIFT_SCANS = registry.counter(
+    "webui_drift_scans", "Refresh-only drift checks by result", ("result",))
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording request latency by route template.
+
+    Latency is measured to the start of the response, so long-running
+    streams (plan/apply output) report time-to-first-byte.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        recorded = False
+
+        def _record(status: int) -> None:
+            route = scope.get("route")
+            HTTP_REQUEST_DURATION.observe(
+                time.perf_counter() - started,
+                method=scope["method"],
+                route=getattr(route, "path", "unmatched"),
+                status=str(status),
+            )
+
+        async def _send(message):
+            nonlocal recorded
+            if message["type"] == "http.response.start" and not recorded:
+                recorded = True
+                _record(message["status"])
+            await send(message)
+
+        try:
+            await self.app(scope, receive, _send)
+        except Exception:
+            if not recorded:
+                _record(500)
+            raise
@@ -0,0 +1,182 @@
+"""
+EKS Preset Deployment Pipeline
+Deploys presets concurrently in dependency order declared by manifest ``depends_on``
+"""
+import asyncio
+import logging
+import time
+import uuid
+from dataclasses import asdict, dataclass
+from typing import AsyncIterator, Callable, Dict, Iterable, List, Optional
+
+from app.services.terraform_runner import EXIT_SENTINEL_PREFIX
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_CONCURRENCY = 3
+
+STATUS_PENDING = "pending"
+STATUS_SUCCEEDED = "succeeded"
+STATUS_FAILED = "failed"
+STATUS_SKIPPED = "skipped"
+
+
+@dataclass
+class PresetRunResult:
+    name: str
+    status: str = STATUS_PENDING
+    duration: float = 0.0
+    error: Optional[str] = None
+
+    def to_dict(self) -> Dict:
+        return asdict(self)
+
+
+def get_dependencies(manifest: Dict) -> List[str]:
+    deps = manifest.get("depends_on") or []
+    if not isinstance(deps, list) or not all(isinstance(d, str) for d in deps):
+        raise ValueError(f"depends_on of preset '{manifest.get('name')}' must be a list of preset names")
+    return deps
+
+
+def topological_order(graph: Dict[str, List[str]]) -> List[str]:
+    remaining = {name: set(deps) for name, deps in graph.items()}
+    order: List[str] = []
+    while remaining:
+        ready = sorted(name for name, deps in remaining.items() if not deps)
+        if not ready:
+            raise ValueError(f"Dependency cycle between presets: {', '.join(sorted(remaining))}")
+        for name in ready:
+            order.append(name)
+            del remaining[name]
+        for deps in remaining.values():
+            deps.difference_update(ready)
+    return order
+
+
+def resolve_deploy_graph(requested: List[str], presets: Dict[str, Dict],
+                         deployed: Iterable[str] = ()) -> Dict[str, List[str]]:
+    """Build the dependency graph for a deploy run.
+
+    Dependencies that are not requested but already deployed are treated as
+    satisfied; any other missing dependency is pulled into the run.
+    """
+    requested_set = set(requested)
+    deployed_set = set(deployed)
+    graph: Dict[str, List[str]] = {}
+    stack = list(requested)
+    while stack:
+        name = stack.pop()
+        if name in graph:
+            continue
+        manifest = presets.get(name)
+        if manifest is None:
+            raise ValueError(f"Preset not found: {name}")
+        deps = [d for d in get_dependencies(manifest) if d in requested_set or d not in deployed_set]
+        graph[name] = deps
+        stack.extend(deps)
+    topological_order(graph)
+    return graph
+
+
+class DeployPipeline:
+    """Runs one command stream per preset, starting each as soon as its dependencies succeed.
+
+    Output lines are prefixed with the preset name and interleaved into a single
+    stream; a preset whose dependency failed is skipped rather than run.
+    """
+
+    def __init__(self, graph: Dict[str, List[str]],
+                 run_preset: Callable[[str], AsyncIterator[str]],
+                 max_concurrency: int = DEFAULT_MAX_CONCURRENCY):
+        self.graph = graph
+        self.run_id = uuid.uuid4().hex[:12]
+        self.order = topological_order(graph)
+        self.max_concurrency = max(1, max_concurrency)
+        self.results: Dict[str, PresetRunResult] = {name: PresetRunResult(name) for name in graph}
+        self._run_preset = run_preset
+        self.started_at = 0.0
+        self.duration = 0.0
+
+    @property
+    def status(self) -> str:
+        statuses = {r.status for r in self.results.values()}
+        if statuses == {STATUS_SUCCEEDED}:
+            return STATUS_SUCCEEDED
+        if STATUS_SUCCEEDED in statuses:
+            return "partial"
+        return STATUS_FAILED
+
+    def summary(self) -> Dict:
+        return {
+            "run_id": self.run_id,
+            "status": self.status,
+            "duration": self.duration,
+            "presets": {name: self.results[name].to_dict() for name in self.order},
+        }
+
+    async def _run_one(self, name: str, queue: asyncio.Queue, semaphore: asyncio.Semaphore,
+                       done: Dict[str, asyncio.Event]) -> None:
+        result = self.results[name]
+        try:
+            for dep in self.graph[name]:
+                await done[dep].wait()
+            failed = [d for d in self.graph[name] if self.results[d].status != STATUS_SUCCEEDED]
+            if failed:
+                result.status = STATUS_SKIPPED
+                result.error = f"dependency failed: {', '.join(failed)}"
+                await queue.put(f"[{name}] Skipped ({result.error})\n")
+                return
+
+            async with semaphore:
+                started = time.time()
+                await queue.put(f"[{name}] Started\n")
+                exit_code = None
+                try:
+                    async for chunk in self._run_preset(name):
+                        if chunk.startswith(EXIT_SENTINEL_PREFIX):
+                            exit_code = int(chunk.strip().split(":")[1])
+                            continue
+                        for line in chunk.splitlines():
+                            await queue.put(f"[{name}] {line}\n")
+                except Exception as e:
+                    logger.error(f"Preset '{name}' failed in pipeline {self.run_id}: {e}")
+                    result.error = str(e)
+                    await queue.put(f"[{name}] Error: {e}\n")
+                result.duration = round(time.time() - started, 1)
+                result.status = STATUS_SUCCEEDED if exit_code == 0 and result.error is None else STATUS_FAILED
+                await queue.put(f"[{name}] {result.status.capitalize()} in {result.duration}s\n")
+        finally:
+            done[name].set()
+
+    async def stream(self) -> AsyncIterator[str]:
+        self.started_at = time.time()
+        queue: asyncio.Queue = asyncio.Queue()
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        done = {name: asyncio.Event() for name in self.graph}
+        tasks = [asyncio.create_task(self._run_one(name, queue, semaphore, done)) for name in self.order]
+
+        async def _close_when_done():
+            await asyncio.gather(*tasks, return_exceptions=True)
+            await queue.put(None)
+
+        closer = asyncio.create_task(_close_when_done())
+        try:
+            while True:
+                line = await queue.get()
+                if line is None:
+                    break
+                yield line
+        finally:
+            for task in tasks + [closer]:
+                if not task.done():
+                    task.cancel()
+
+        self.duration = round(time.time() - self.started_at, 1)
+        yield "\n=== Deployment Summary ===\n"
+        for name in self.order:
+            r = self.results[name]
+            detail = f" ({r.error})" if r.error else ""
+            yield f"{name}: {r.status} {r.duration}s{detail}\n"
+        yield f"Overall: {self.status} in {self.duration}s\n"
+        yield f"{EXIT_SENTINEL_PREFIX}{0 if self.status == STATUS_SUCCEEDED else 1}\n"
@@ -0,0 +1,250 @@
+"""
+Terraform Process Monitor
+Samples the /proc process tree of each terraform subprocess (RSS, CPU time, wall time,
+provider plugin children) and persists the totals per resource as JSON lines
+"""
+import asyncio
+import json
+import logging
+import os
+import re
+import threading
+import time
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+PROC_DIR = Path("/proc")
+SAMPLE_INTERVAL = float(os.environ.get("TF_USAGE_SAMPLE_INTERVAL", 1.0))
+TF_USAGE_DIR = Path(os.environ.get(
+    "TF_USAGE_DIR",
+    str(Path(os.environ.get("TERRAFORM_DIR", "/app/terraform")) / ".tf-usage"),
+))
+MAX_RECORDS_PER_RESOURCE = int(os.environ.get("TF_USAGE_MAX_RECORDS", 200))
+
+_CLK_TCK = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+_SAFE_ID_RE = re.compile(r"[^A-Za-z0-9_.-]")
+_MB = 1024 * 1024
+
+
+def proc_available() -> bool:
+    return (PROC_DIR / "self" / "stat").exists()
+
+
+def _read_stat(pid: int) -> Optional[Tuple[int, float, int]]:
+    """Return (ppid, cpu_seconds, rss_bytes) for ``pid`` from /proc/<pid>/stat."""
+    try:
+        raw = (PROC_DIR / str(pid) / "stat").read_text()
+    except OSError:
+        return None
+    # The command name is parenthesized and may contain spaces, so split after the last ')'
+    fields = raw[raw.rfind(")") + 2:].split()
+    try:
+        ppid = int(fields[1])
+        cpu = (int(fields[11]) + int(fields[12])) / _CLK_TCK
+        rss = int(fields[21]) * _PAGE_SIZE
+    except (IndexError, ValueError):
+        return None
+    return ppid, cpu, rss
+
+
+def _read_command(pid: int) -> str:
+    try:
+        argv0 = (PROC_DIR / str(pid) / "cmdline").read_bytes().split(b"\0", 1)[0]
+    except OSError:
+        return ""
+    return os.path.basename(argv0.decode(errors="replace"))
+
+
+def _process_tree(root_pid: int) -> Dict[int, Tuple[float, int]]:
+    """Map every live pid in ``root_pid``'s tree to (cpu_seconds, rss_bytes)."""
+    stats: Dict[int, Tuple[int, float, int]] = {}
+    for entry in PROC_DIR.iterdir():
+        if entry.name.isdigit():
+            stat = _read_stat(int(entry.name))
+            if stat:
+                stats[int(entry.name)] = stat
+    if root_pid not in stats:
+        return {}
+
+    children: Dict[int, List[int]] = {}
+    for pid, (ppid, _, _) in stats.items():
+        children.setdefault(ppid, []).append(pid)
+    tree, stack = {}, [root_pid]
+    while stack:
+        pid = stack.pop()
+        _, cpu, rss = stats[pid]
+        tree[pid] = (cpu, rss)
+        stack.extend(children.get(pid, []))
+    return tree
+
+
+@dataclass
+class ProcessUsage:
+    """Resource usage of one terraform subprocess and its descendants.
+
+    Values are sampled, so CPU time spent by a child after its last sample
+    (and by processes shorter than the sampling interval) is not counted.
+    """
+    resource_id: Optional[str]
+    operation: str
+    pid: int
+    command: str
+    started_at: float = field(default_factory=time.time)
+    finished_at: Optional[float] = None
+    wall_seconds: float = 0.0
+    cpu_seconds: float = 0.0
+    rss_bytes: int = 0
+    peak_rss_bytes: int = 0
+    peak_processes: int = 0
+    children: List[str] = field(default_factory=list)
+    samples: int = 0
+    exit_code: Optional[int] = None
+
+    @property
+    def running(self) -> bool:
+        return self.finished_at is None
+
+    def to_dict(self) -> Dict:
+        data = asdict(self)
+        data["running"] = self.running
+        data["wall_seconds"] = round(self.wall_seconds, 2)
+        data["cpu_seconds"] = round(self.cpu_seconds, 2)
+        data["peak_rss_mb"] = round(self.peak_rss_bytes / _MB, 1)
+        return data
+
+
+class ProcessMonitor:
+    """Samples a subprocess tree from /proc until stopped. A no-op where /proc is unavailable."""
+
+    def __init__(self, pid: int, operation: str, resource_id: Optional[str] = None,
+                 command: str = "", interval: float = SAMPLE_INTERVAL):
+        self.usage = ProcessUsage(resource_id=resource_id, operation=operation, pid=pid, command=command)
+        self.interval = interval
+        self._cpu_by_pid: Dict[int, float] = {}
+        self._commands: Dict[int, str] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._started = time.monotonic()
+
+    def sample(self) -> None:
+        tree = _process_tree(self.usage.pid)
+        if not tree:
+            return
+        for pid, (cpu, _) in tree.items():
+            self._cpu_by_pid[pid] = max(cpu, self._cpu_by_pid.get(pid, 0.0))
+            if pid != self.usage.pid and pid not in self._commands:
+                self._commands[pid] = _read_command(pid)
+
+        usage = self.usage
+        usage.samples += 1
+        usage.rss_bytes = sum(rss for _, rss in tree.values())
+        usage.peak_rss_bytes = max(usage.peak_rss_bytes, usage.rss_bytes)
+        usage.peak_processes = max(usage.peak_processes, len(tree))
+        usage.cpu_seconds = sum(self._cpu_by_pid.values())
+        usage.children = sorted({name for name in self._commands.values() if name})
+        usage.wall_seconds = time.monotonic() - self._started
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.to_thread(self.sample)
+            except Exception as e:
+                logger.debug(f"Process sample failed for pid {self.usage.pid}: {e}")
+            await asyncio.sleep(self.interval)
+
+    def start(self) -> "ProcessMonitor":
+        if proc_available():
+            self._task = asyncio.create_task(self._run())
+        return self
+
+    async def stop(self, exit_code: Optional[int] = None) -> ProcessUsage:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self.usage.wall_seconds = time.monotonic() - self._started
+        self.usage.finished_at = time.time()
+        self.usage.exit_code = exit_code
+        self.usage.rss_bytes = 0
+        return self.usage
+
+
+class UsageStore:
+    """Keeps the most recent usage records per resource in ``<dir>/<resource_id>.jsonl``."""
+
+    def __init__(self, base_dir: Path = TF_USAGE_DIR, max_records: int = MAX_RECORDS_PER_RESOURCE):
+        self.base_dir = Path(base_dir)
+        self.max_records = max_records
+        self._lock = threading.Lock()
+
+    def _path(self, resource_id: str) -> Path:
+        return self.base_dir / f"{_SAFE_ID_RE.sub('_', resource_id)}.jsonl"
+
+    def _read(self, path: Path) -> List[Dict]:
+        records = []
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        records.append(json.loads(line))
+                    except ValueError:
+                        continue
+        except OSError:
+            pass
+        return records
+
+    def record(self, usage: ProcessUsage) -> None:
+        if not usage.resource_id:
+            return
+        path = self._path(usage.resource_id)
+        line = json.dumps(usage.to_dict(), sort_keys=True) + "\n"
+        with self._lock:
+            try:
+                path.parent.mkdir(parents=True, exist_ok=True)
+                with open(path, "a", encoding="utf-8") as f:
+                    f.write(line)
+                records = self._read(path)
+                if len(records) > self.max_records:
+                    tmp = path.with_suffix(".jsonl.tmp")
+                    tmp.write_text("".join(json.dumps(r, sort_keys=True) + "\n" for r in records[-self.max_records:]),
+                                   encoding="utf-8")
+                    os.replace(tmp, path)
+            except OSError as e:
+                logger.warning(f"Could not persist terraform usage for {usage.resource_id}: {e}")
+
+    def history(self, resource_id: str, limit: int = 50, operation: Optional[str] = None) -> List[Dict]:
+        records = self._read(self._path(resource_id))
+        if operation:
+            records = [r for r in records if r.get("operation") == operation]
+        return records[-limit:] if limit > 0 else records
+
+    def summary(self, resource_id: str) -> Dict[str, Dict]:
+        """Per-operation count and average/max wall time, CPU time and peak RSS."""
+        by_operation: Dict[str, List[Dict]] = {}
+        for record in self._read(self._path(resource_id)):
+            by_operation.setdefault(record.get("operation", "unknown"), []).append(record)
+
+        summary = {}
+        for operation, records in sorted(by_operation.items()):
+            walls = [r.get("wall_seconds", 0.0) for r in records]
+            cpus = [r.get("cpu_seconds", 0.0) for r in records]
+            peaks = [r.get("peak_rss_bytes", 0) / _MB for r in records]
+            summary[operation] = {
+                "count": len(records),
+                "failed": sum(1 for r in records if r.get("exit_code") not in (0, None)),
+                "avg_wall_seconds": round(sum(walls) / len(walls), 1),
+                "max_wall_seconds": round(max(walls), 1),
+                "avg_cpu_seconds": round(sum(cpus) / len(cpus), 1),
+                "avg_peak_rss_mb": round(sum(peaks) / len(peaks), 1),
+                "max_peak_rss_mb": round(max(peaks), 1),
+                "last_run": max(r.get("started_at", 0.0) for r in records),
+            }
+        return summary
+
+
+usage_store = UsageStore()
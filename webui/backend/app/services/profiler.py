@@ -0,0 +1,249 @@
+"""
+Request Profiler
+Opt-in sampling profiler for individual API requests, keeping collapsed-stack
+profiles of the slowest recent requests in memory
+
+A request is profiled when profiling is enabled (PROFILING_ENABLED) and it carries
+an `X-Profile: 1` header or `?profile=1` query flag (plus `X-Profile-Token` when
+PROFILING_TOKEN is set; the same token guards the /api/admin/profiles endpoints,
+which are only mounted when profiling is enabled). Stacks are sampled from every thread, so work offloaded
+with asyncio.to_thread is included; requests running concurrently on the event
+loop will show up in each other's profiles.
+"""
+import asyncio
+import heapq
+import hmac
+import itertools
+import logging
+import os
+import sys
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+from urllib.parse import parse_qs
+
+logger = logging.getLogger(__name__)
+
+PROFILING_ENABLED = os.environ.get("PROFILING_ENABLED", "false").lower() == "true"
+PROFILING_TOKEN = os.environ.get("PROFILING_TOKEN", "")
+PROFILE_INTERVAL = float(os.environ.get("PROFILING_INTERVAL", 0.002))
+PROFILE_KEEP = int(os.environ.get("PROFILING_KEEP", 20))
+PROFILE_MAX_AGE = float(os.environ.get("PROFILING_MAX_AGE", 3600))
+
+PROFILE_HEADER = b"x-profile"
+TOKEN_HEADER = b"x-profile-token"
+MAX_STACK_DEPTH = 128
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    module = frame.f_globals.get("__name__", "?")
+    return f"{module}:{code.co_name}:{frame.f_lineno}"
+
+
+class StackSampler:
+    """Samples the Python stacks of all threads on a background thread."""
+
+    def __init__(self, interval: float = PROFILE_INTERVAL):
+        self.interval = interval
+        self.stacks: Dict[str, int] = {}
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _sample_once(self) -> None:
+        names = {t.ident: t.name for t in threading.enumerate()}
+        own = threading.get_ident()
+        for ident, frame in sys._current_frames().items():
+            if ident == own:
+                continue
+            labels = []
+            while frame is not None and len(labels) < MAX_STACK_DEPTH:
+                labels.append(_frame_label(frame))
+                frame = frame.f_back
+            if not labels:
+                continue
+            labels.append(names.get(ident, f"thread-{ident}"))
+            key = ";".join(reversed(labels))
+            self.stacks[key] = self.stacks.get(key, 0) + 1
+        self.samples += 1
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                self._sample_once()
+            except Exception as e:
+                logger.debug(f"Stack sample failed: {e}")
+
+    def start(self) -> "StackSampler":
+        self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def collapsed(self, idle: bool = False) -> str:
+        """Render stacks in the collapsed format read by flamegraph.pl and speedscope.
+
+        Threads parked in the selector or a worker queue are dropped unless ``idle``.
+        """
+        lines = []
+        for stack, count in sorted(self.stacks.items(), key=lambda kv: -kv[1]):
+            if not idle and _is_idle(stack):
+                continue
+            lines.append(f"{stack} {count}")
+        return "\n".join(lines) + ("\n" if lines else "")
+
+
+_IDLE_LEAVES = ("selectors:select:", "threading:wait:", "queue:get:", "concurrent.futures.thread:_worker:")
+
+
+def _is_idle(stack: str) -> bool:
+    leaf = stack.rsplit(";", 1)[-1]
+    return leaf.startswith(_IDLE_LEAVES)
+
+
+@dataclass
+class ProfileRecord:
+    method: str
+    path: str
+    duration: float
+    status: int
+    samples: int
+    collapsed: str
+    route: str = ""
+    id: str = field(default_factory=lambda: uuid.uuid4().hex[:12])
+    started_at: float = field(default_factory=time.time)
+
+    def summary(self) -> Dict:
+        top = [line.rsplit(" ", 1) for line in self.collapsed.splitlines()[:5]]
+        return {
+            "id": self.id,
+            "method": self.method,
+            "path": self.path,
+            "route": self.route,
+            "status": self.status,
+            "duration_ms": round(self.duration * 1000, 1),
+            "samples": self.samples,
+            "started_at": self.started_at,
+            "top_stacks": [{"leaf": stack.rsplit(";", 1)[-1], "samples": int(count)} for stack, count in top],
+        }
+
+
+class ProfileStore:
+    """Keeps the ``keep`` slowest profiles recorded within the last ``max_age`` seconds."""
+
+    def __init__(self, keep: int = PROFILE_KEEP, max_age: float = PROFILE_MAX_AGE):
+        self.keep = keep
+        self.max_age = max_age
+        self._heap: List = []
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+
+    def _expire(self) -> None:
+        cutoff = time.time() - self.max_age
+        if any(entry[2].started_at < cutoff for entry in self._heap):
+            self._heap = [entry for entry in self._heap if entry[2].started_at >= cutoff]
+            heapq.heapify(self._heap)
+
+    def add(self, record: ProfileRecord) -> bool:
+        """Store ``record`` if it is among the slowest; returns whether it was kept."""
+        entry = (record.duration, next(self._seq), record)
+        with self._lock:
+            self._expire()
+            if len(self._heap) < self.keep:
+                heapq.heappush(self._heap, entry)
+                return True
+            if record.duration > self._heap[0][0]:
+                heapq.heapreplace(self._heap, entry)
+                return True
+            return False
+
+    def list(self) -> List[ProfileRecord]:
+        with self._lock:
+            self._expire()
+            return [entry[2] for entry in sorted(self._heap, reverse=True)]
+
+    def get(self, profile_id: str) -> Optional[ProfileRecord]:
+        return next((r for r in self.list() if r.id == profile_id), None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._heap.clear()
+
+
+profile_store = ProfileStore()
+
+
+def token_matches(token: Optional[str]) -> bool:
+    """True when no PROFILING_TOKEN is configured or ``token`` equals it."""
+    if not PROFILING_TOKEN:
+        return True
+    return hmac.compare_digest((token or "").encode(), PROFILING_TOKEN.encode())
+
+
+def _wants_profile(scope) -> bool:
+    headers = dict(scope.get("headers") or [])
+    if not token_matches(headers.get(TOKEN_HEADER, b"").decode(errors="ignore")):
+        return False
+    if headers.get(PROFILE_HEADER, b"").lower() in (b"1", b"true"):
+        return True
+    query = parse_qs(scope.get("query_string", b"").decode())
+    return query.get("profile", [""])[0].lower() in ("1", "true")
+
+
+class ProfilingMiddleware:
+    """ASGI middleware that samples flagged requests and records them in ``store``.
+
+    The profile id is returned in the `X-Profile-Id` response header; the
+    collapsed stacks are served by /api/admin/profiles/{id}. Streaming
+    responses are profiled until their last body chunk is sent.
+    """
+
+    def __init__(self, app, store: ProfileStore = profile_store, interval: float = PROFILE_INTERVAL):
+        self.app = app
+        self.store = store
+        self.interval = interval
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not _wants_profile(scope):
+            await self.app(scope, receive, send)
+            return
+
+        profile_id = uuid.uuid4().hex[:12]
+        status = 500
+        sampler = StackSampler(self.interval).start()
+        started = time.perf_counter()
+
+        async def _send(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                message = {**message, "headers": list(message.get("headers", [])) +
+                           [(b"x-profile-id", profile_id.encode())]}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, _send)
+        finally:
+            duration = time.perf_counter() - started
+            await asyncio.to_thread(sampler.stop)
+            route = scope.get("route")
+            record = ProfileRecord(
+                id=profile_id,
+                method=scope["method"],
+                path=scope["path"],
+                route=getattr(route, "path", ""),
+                duration=duration,
+                status=status,
+                samples=sampler.samples,
+                collapsed=sampler.collapsed(),
+            )
+            kept = self.store.add(record)
+            logger.info(f"Profiled {record.method} {record.path} in {duration * 1000:.1f}ms "
+                        f"({record.samples} samples, id={profile_id}{'' if kept else ', not kept'})")
@@ -4,18 +4,45 @@ Stores tfvars files in S3 for persistence across container restarts
 """
 import logging
 import os
+import re
+import uuid
 from pathlib import Path
 from typing import Optional, List, Dict
 
+from botocore.exceptions import ClientError
+
+from app.services.credential_manager import credential_manager
+from app.services.s3_sync import (
+    DIRECTION_BOTH, DIRECTION_PUSH, S3ListingError, S3SyncEngine, SyncStats, file_md5,
+)
+
 logger = logging.getLogger(__name__)
 
+MULTIPART_THRESHOLD = 16 * 1024 * 1024
+MULTIPART_CHUNKSIZE = 16 * 1024 * 1024
+TRANSFER_MAX_CONCURRENCY = 8
+MAX_POOL_CONNECTIONS = 32
+MD5_METADATA_KEY = "content-md5"
+VERIFY_MD5 = os.environ.get("S3_VERIFY_MD5", "false").lower() == "true"
+
+CONFIG_PREFIX = "config/"
+CONFIG_SYNC_INDEX_FILE = ".s3-config-sync.json"
+_CONFIG_KEY_RE = re.compile(r"^(terraform\.tfvars|instances/[^/]+/terraform\.tfvars)$")
+
 
 class S3ConfigManager:
     """Manages terraform configuration files in S3"""
 
-    def __init__(self, bucket_name: str, region: str = None):
+    def __init__(self, bucket_name: str, region: str = None, verify_md5: bool = VERIFY_MD5):
         self.bucket_name = bucket_name
         self.region = region or 'ap-northeast-2'
+        self.verify_md5 = verify_md5
+        self._s3_client = None
+        self._transfer_config = None
+        credential_manager.subscribe(self._reset_client)
+
+    def _reset_client(self):
+        """Drop the cached client so the next call picks up refreshed credentials"""
         self._s3_client = None
 
     @property
@@ -24,19 +51,37 @@ class S3ConfigManager:
         if self._s3_client is None:
             try:
                 import boto3
-                self._s3_client = boto3.client('s3', region_name=self.region)
+                from botocore.config import Config
+                self._s3_client = boto3.client(
+                    's3', region_name=self.region,
+                    config=Config(max_pool_connections=MAX_POOL_CONNECTIONS),
+                )
             except Exception as e:
                 logger.warning(f"Failed to create S3 client: {e}")
                 return None
         return self._s3_client
 
-    def upload_file(self, local_path: Path, s3_key: str) -> bool:
+    @property
+    def transfer_config(self):
+        """Multipart settings shared by streaming uploads and downloads"""
+        if self._transfer_config is None:
+            from boto3.s3.transfer import TransferConfig
+            self._transfer_config = TransferConfig(
+                multipart_threshold=MULTIPART_THRESHOLD,
+                multipart_chunksize=MULTIPART_CHUNKSIZE,
+                max_concurrency=TRANSFER_MAX_CONCURRENCY,
+            )
+        return self._transfer_config
+
+    def upload_file(self, local_path: Path, s3_key: str, verify_md5: Optional[bool] = None) -> bool:
         """
-        Upload a file to S3
+        Stream a file to S3, switching to multipart uploads above MULTIPART_THRESHOLD
 
         Args:
             local_path: Local file path
             s3_key: S3 object key (e.g., "config/terraform.tfvars")
+            verify_md5: Store the file MD5 as object metadata so downloads can be
+                verified (defaults to S3_VERIFY_MD5)
 
         Returns:
             True if successful, False otherwise
@@ -49,29 +94,47 @@ class S3ConfigManager:
             logger.warning(f"Local file does not exist: {local_path}")
             return False
 
+        verify = self.verify_md5 if verify_md5 is None else verify_md5
         try:
+            extra_args = {"Metadata": {MD5_METADATA_KEY: file_md5(local_path)}} if verify else None
             with open(local_path, 'rb') as f:
-                self.s3_client.put_object(
-                    Bucket=self.bucket_name,
-                    Key=s3_key,
-                    Body=f.read()
+                self.s3_client.upload_fileobj(
+                    f, self.bucket_name, s3_key,
+                    ExtraArgs=extra_args,
+                    Config=self.transfer_config,
                 )
             logger.info(f"✓ Uploaded {local_path.name} to s3://{self.bucket_name}/{s3_key}")
             return True
-        except self.s3_client.exceptions.NoSuchBucket:
-            logger.debug(f"S3 bucket does not exist yet: {self.bucket_name}")
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") == "NoSuchBucket":
+                logger.debug(f"S3 bucket does not exist yet: {self.bucket_name}")
+                return False
+            logger.error(f"Failed to upload {local_path} to S3: {e}")
             return False
         except Exception as e:
             logger.error(f"Failed to upload {local_path} to S3: {e}")
             return False
 
-    def download_file(self, s3_key: str, local_path: Path) -> bool:
+    def _expected_md5(self, s3_key: str) -> Optional[str]:
+        head = self.s3_client.head_object(Bucket=self.bucket_name, Key=s3_key)
+        expected = head.get('Metadata', {}).get(MD5_METADATA_KEY)
+        if expected:
+            return expected
+        # Single-part uploads without SSE-KMS use the MD5 as ETag
+        etag = head.get('ETag', '').strip('"')
+        if etag and '-' not in etag and head.get('ServerSideEncryption') != 'aws:kms':
+            return etag
+        return None
+
+    def download_file(self, s3_key: str, local_path: Path, verify_md5: Optional[bool] = None) -> bool:
         """
-        Download a file from S3
+        Stream an object from S3 into a temp file and move it into place atomically
 
         Args:
             s3_key: S3 object key
             local_path: Local destination path
+            verify_md5: Compare the downloaded file against the stored MD5 before
+                replacing local_path (defaults to S3_VERIFY_MD5)
 
         Returns:
             True if successful, False otherwise
@@ -80,56 +143,87 @@ class S3ConfigManager:
             logger.warning("S3 client not available")
             return False
 
+        verify = self.verify_md5 if verify_md5 is None else verify_md5
+        tmp_path = local_path.with_name(f".{local_path.name}.{uuid.uuid4().hex[:8]}.part")
         try:
             # Create parent directories if needed
             local_path.parent.mkdir(parents=True, exist_ok=True)
 
-            response = self.s3_client.get_object(
-                Bucket=self.bucket_name,
-                Key=s3_key
-            )
+            with open(tmp_path, 'wb') as f:
+                self.s3_client.download_fileobj(
+                    self.bucket_name, s3_key, f,
+                    Config=self.transfer_config,
+                )
 
-            with open(local_path, 'wb') as f:
-                f.write(response['Body'].read())
+            if verify:
+                expected = self._expected_md5(s3_key)
+                actual = file_md5(tmp_path)
+                if expected and expected != actual:
+                    logger.error(f"MD5 mismatch for s3://{self.bucket_name}/{s3_key}: "
+                                 f"expected {expected}, got {actual}")
+                    return False
 
+            os.replace(tmp_path, local_path)
             logger.info(f"✓ Downloaded s3://{self.bucket_name}/{s3_key} to {local_path}")
             return True
-        except self.s3_client.exceptions.NoSuchKey:
-            logger.debug(f"S3 key not found: {s3_key}")
-            return False
         except Exception as e:
+            code = getattr(e, 'response', {}).get('Error', {}).get('Code', '')
+            if code in ('404', 'NoSuchKey'):
+                logger.debug(f"S3 key not found: {s3_key}")
+                return False
             logger.error(f"Failed to download {s3_key} from S3: {e}")
             return False
+        finally:
+            tmp_path.unlink(missing_ok=True)
 
-    def list_files(self, prefix: str) -> List[str]:
+    def list_objects(self, prefix: str) -> List[Dict]:
         """
-        List files in S3 with given prefix
+        List objects in S3 with given prefix, following pagination
 
         Args:
-            prefix: S3 key prefix (e.g., "config/instances/")
+            prefix: S3 key prefix (e.g., "eks-presets/")
 
         Returns:
-            List of S3 keys
+            List of dicts with "key", "etag" (without quotes) and "size"
+
+        Raises:
+            S3ListingError: If the prefix could not be listed
         """
         if not self.s3_client:
-            logger.warning("S3 client not available")
-            return []
+            raise S3ListingError("S3 client not available")
 
+        objects = []
         try:
-            response = self.s3_client.list_objects_v2(
-                Bucket=self.bucket_name,
-                Prefix=prefix
-            )
-
-            if 'Contents' not in response:
-                return []
-
-            return [obj['Key'] for obj in response['Contents']]
+            paginator = self.s3_client.get_paginator('list_objects_v2')
+            for page in paginator.paginate(Bucket=self.bucket_name, Prefix=prefix):
+                for obj in page.get('Contents', []):
+                    objects.append({
+                        "key": obj['Key'],
+                        "etag": obj.get('ETag', '').strip('"'),
+                        "size": obj.get('Size', 0),
+                    })
+            return objects
         except self.s3_client.exceptions.NoSuchBucket:
             logger.debug(f"S3 bucket does not exist yet: {self.bucket_name}")
             return []
         except Exception as e:
             logger.error(f"Failed to list S3 objects with prefix {prefix}: {e}")
+            raise S3ListingError(f"Failed to list s3://{self.bucket_name}/{prefix}: {e}") from e
+
+    def list_files(self, prefix: str) -> List[str]:
+        """
+        List files in S3 with given prefix
+
+        Args:
+            prefix: S3 key prefix (e.g., "config/instances/")
+
+        Returns:
+            List of S3 keys (empty if the prefix could not be listed)
+        """
+        try:
+            return [obj["key"] for obj in self.list_objects(prefix)]
+        except S3ListingError as e:
+            logger.warning(str(e))
             return []
 
     def file_exists(self, s3_key: str) -> bool:
@@ -210,65 +304,82 @@ class S3ConfigManager:
         s3_key = f"config/instances/{instance_name}/terraform.tfvars"
         return self.download_file(s3_key, tfvars_path)
 
-    def sync_all_instances_from_s3(self, instances_dir: Path) -> Dict[str, bool]:
+    def _config_engine(self, terraform_dir: Path) -> S3SyncEngine:
+        return S3SyncEngine(self, terraform_dir / CONFIG_SYNC_INDEX_FILE)
+
+    def sync_config(self, terraform_dir: Path, direction: str = DIRECTION_BOTH,
+                    dry_run: bool = False, instances_only: bool = False) -> SyncStats:
         """
-        Download all instance tfvars from S3
+        Sync root and instance tfvars under config/ with the terraform directory
+
+        Only instances with a local directory take part; the listing is
+        paginated and all transfers run in one parallel round.
 
         Args:
-            instances_dir: Instances directory path
+            terraform_dir: Terraform directory path
+            direction: "both", "pull" or "push" (see S3SyncEngine.sync)
+            dry_run: Report planned transfers without performing them
+            instances_only: Leave the root terraform.tfvars out of the sync
 
         Returns:
-            Dictionary mapping instance_name -> success status
+            SyncStats for the run
         """
+        instances_dir = terraform_dir / "instances"
+
+        def include(rel: str) -> bool:
+            if not _CONFIG_KEY_RE.match(rel):
+                return False
+            if rel == "terraform.tfvars":
+                return not instances_only
+            return (instances_dir / rel.split("/")[1]).is_dir()
+
+        local_files = ["terraform.tfvars"]
+        if instances_dir.exists():
+            local_files += [f"instances/{d.name}/terraform.tfvars" for d in instances_dir.iterdir() if d.is_dir()]
+
+        stats = self._config_engine(terraform_dir).sync(
+            CONFIG_PREFIX, terraform_dir, local_files=local_files, include=include,
+            direction=direction, prefer=DIRECTION_PUSH, dry_run=dry_run,
+        )
+        logger.info(f"Config sync ({direction}{', dry-run' if dry_run else ''}): "
+                    f"{stats.transferred} transferred, {stats.skipped} unchanged, "
+                    f"{stats.failed} failed in {stats.duration}s")
+        return stats
+
+    @staticmethod
+    def _instance_results(stats: SyncStats) -> Dict[str, bool]:
         results = {}
+        for action in stats.actions:
+            parts = action["key"].split("/")
+            if len(parts) == 4:
+                results[parts[2]] = action.get("ok", False)
+        return results
 
-        # List all instance tfvars in S3
-        s3_keys = self.list_files("config/instances/")
-
-        for s3_key in s3_keys:
-            if not s3_key.endswith("/terraform.tfvars"):
-                continue
-
-            # Extract instance name from key: "config/instances/{name}/terraform.tfvars"
-            parts = s3_key.split('/')
-            if len(parts) != 4:
-                continue
-
-            instance_name = parts[2]
-            instance_dir = instances_dir / instance_name
-
-            if not instance_dir.exists():
-                logger.warning(f"Instance directory does not exist: {instance_dir}")
-                results[instance_name] = False
-                continue
+    def sync_all_instances_from_s3(self, instances_dir: Path) -> Dict[str, bool]:
+        """
+        Download instance tfvars that changed in S3
 
-            success = self.download_instance_tfvars(instance_dir, instance_name)
-            results[instance_name] = success
+        Args:
+            instances_dir: Instances directory path
 
-        return results
+        Returns:
+            Dictionary mapping instance_name -> success status for transferred files
+        """
+        stats = self.sync_config(instances_dir.parent, direction="pull", instances_only=True)
+        return self._instance_results(stats)
 
     def sync_all_instances_to_s3(self, instances_dir: Path) -> Dict[str, bool]:
         """
-        Upload all instance tfvars to S3
+        Upload instance tfvars that changed locally
 
         Args:
             instances_dir: Instances directory path
 
         Returns:
-            Dictionary mapping instance_name -> success status
+            Dictionary mapping instance_name -> success status for transferred files
         """
-        results = {}
-
         if not instances_dir.exists():
             logger.warning(f"Instances directory does not exist: {instances_dir}")
-            return results
-
-        for instance_dir in instances_dir.iterdir():
-            if not instance_dir.is_dir():
-                continue
-
-            instance_name = instance_dir.name
-            success = self.upload_instance_tfvars(instance_dir, instance_name)
-            results[instance_name] = success
-
-        return results
+            return {}
+        stats = self.sync_config(instances_dir.parent, direction="push", instances_only=True)
+        return self._instance_results(stats)
@@ -0,0 +1,393 @@
+"""
+S3 Sync Engine
+Delta-based, concurrent synchronization between an S3 prefix and a local directory
+"""
+import copy
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_WORKERS = 8
+
+DIRECTION_PULL = "pull"
+DIRECTION_PUSH = "push"
+DIRECTION_BOTH = "both"
+
+
+class S3ListingError(Exception):
+    """Raised when a prefix cannot be listed, so callers never mistake a failure for an empty prefix."""
+
+
+@dataclass
+class SyncStats:
+    listed: int = 0
+    transferred: int = 0
+    skipped: int = 0
+    deleted: int = 0
+    failed: int = 0
+    bytes_transferred: int = 0
+    duration: float = 0.0
+    dry_run: bool = False
+    error: Optional[str] = None
+    actions: List[Dict] = field(default_factory=list)
+
+    def to_dict(self) -> Dict:
+        return asdict(self)
+
+
+def file_md5(path: Path) -> str:
+    digest = hashlib.md5()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class S3SyncEngine:
+    """Syncs S3 prefixes against local directories, transferring only changed objects.
+
+    A JSON index records the ETag, size and local mtime of every object last
+    synced, so unchanged files are skipped without hashing or downloading them.
+    Local files are only hashed when the index cannot vouch for them.
+
+    Args:
+        s3_manager: S3ConfigManager used for listing and transfers
+        index_path: Local path of the sync index file
+        max_workers: Maximum number of concurrent transfers
+    """
+
+    def __init__(self, s3_manager, index_path: Path, max_workers: int = DEFAULT_MAX_WORKERS):
+        self.s3 = s3_manager
+        self.index_path = index_path
+        self.max_workers = max_workers
+        self._lock = threading.Lock()
+        self._index: Optional[Dict[str, Dict]] = None
+
+    def _load_index(self) -> Dict[str, Dict]:
+        if self._index is None:
+            self._index = {}
+            if self.index_path.exists():
+                try:
+                    data = json.loads(self.index_path.read_text())
+                    if data.get("bucket") == self.s3.bucket_name:
+                        self._index = data.get("objects", {})
+                except Exception as e:
+                    logger.warning(f"Failed to read sync index {self.index_path}: {e}")
+        return self._index
+
+    def _save_index(self) -> None:
+        try:
+            self.index_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.index_path.with_name(f"{self.index_path.name}.tmp")
+            tmp.write_text(json.dumps({"bucket": self.s3.bucket_name, "objects": self._index}))
+            os.replace(tmp, self.index_path)
+        except Exception as e:
+            logger.warning(f"Failed to write sync index {self.index_path}: {e}")
+
+    @staticmethod
+    def _local_path(local_dir: Path, rel: str) -> Optional[Path]:
+        if not rel or rel.endswith("/") or ".." in rel.split("/"):
+            return None
+        return local_dir / rel
+
+    def _run(self, jobs: List[Callable[[], bool]]) -> List[bool]:
+        if not jobs:
+            return []
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(jobs))) as pool:
+            return list(pool.map(lambda job: job(), jobs))
+
+    def _list_remote(self, prefix: str, stats: SyncStats,
+                     include: Optional[Callable[[str], bool]] = None) -> Optional[Dict[str, Dict]]:
+        """Remote objects under prefix by key, or None (recorded in stats) when the listing failed."""
+        try:
+            objects = self.s3.list_objects(prefix)
+        except Exception as e:
+            logger.warning(f"Skipping sync of {prefix}: listing failed: {e}")
+            stats.failed += 1
+            stats.error = str(e)
+            return None
+        return {
+            obj["key"]: obj for obj in objects
+            if include is None or include(obj["key"][len(prefix):])
+        }
+
+    def pull(self, prefix: str, local_dir: Path,
+             include: Optional[Callable[[str], bool]] = None,
+             delete_missing: bool = False) -> SyncStats:
+        """
+        Download objects under prefix whose ETag/size differ from the index
+
+        Args:
+            prefix: S3 key prefix, ending with "/"
+            local_dir: Local directory that mirrors the prefix
+            include: Optional filter called with the path relative to prefix
+            delete_missing: Remove local files previously synced from S3 that no longer exist remotely
+
+        Returns:
+            SyncStats for the run; if the listing fails nothing is downloaded or
+            deleted and the error is reported in ``error``
+        """
+        started = time.time()
+        stats = SyncStats()
+        remote = self._list_remote(prefix, stats, include)
+        if remote is None:
+            return stats
+        stats.listed = len(remote)
+
+        with self._lock:
+            index = self._load_index()
+            pending = []
+            for key, obj in remote.items():
+                local_path = self._local_path(local_dir, key[len(prefix):])
+                if local_path is None:
+                    continue
+                entry = index.get(key)
+                if entry and entry.get("size") == obj["size"] and local_path.exists():
+                    st = local_path.stat()
+                    if entry.get("etag") == obj["etag"] and st.st_size == obj["size"]:
+                        stats.skipped += 1
+                        continue
+                    if entry.get("etag") is None and entry.get("mtime_ns") == st.st_mtime_ns:
+                        # Uploaded by us; adopt the ETag S3 assigned to it
+                        entry["etag"] = obj["etag"]
+                        stats.skipped += 1
+                        continue
+                pending.append((key, obj, local_path))
+
+            results = self._run([
+                (lambda k=key, p=local_path: self.s3.download_file(k, p))
+                for key, _, local_path in pending
+            ])
+            for (key, obj, local_path), ok in zip(pending, results):
+                if not ok:
+                    stats.failed += 1
+                    continue
+                stats.transferred += 1
+                stats.bytes_transferred += obj["size"]
+                index[key] = {
+                    "etag": obj["etag"],
+                    "size": obj["size"],
+                    "mtime_ns": local_path.stat().st_mtime_ns,
+                }
+
+            if delete_missing:
+                for key in [k for k in index if k.startswith(prefix) and k not in remote]:
+                    local_path = self._local_path(local_dir, key[len(prefix):])
+                    if include is not None and not include(key[len(prefix):]):
+                        continue
+                    if local_path is not None and local_path.exists():
+                        local_path.unlink()
+                        stats.deleted += 1
+                    del index[key]
+
+            self._save_index()
+
+        stats.duration = round(time.time() - started, 3)
+        return stats
+
+    def push(self, local_dir: Path, prefix: str,
+             include: Optional[Callable[[str], bool]] = None) -> SyncStats:
+        """
+        Upload local files whose content differs from the object in S3
+
+        Args:
+            local_dir: Local directory to upload
+            prefix: Destination S3 key prefix, ending with "/"
+            include: Optional filter called with the path relative to local_dir
+
+        Returns:
+            SyncStats for the run
+        """
+        started = time.time()
+        stats = SyncStats()
+        if not local_dir.exists():
+            return stats
+        remote = self._list_remote(prefix, stats)
+        if remote is None:
+            return stats
+
+        with self._lock:
+            index = self._load_index()
+            pending = []
+            for path in sorted(local_dir.rglob("*")):
+                if not path.is_file():
+                    continue
+                rel = path.relative_to(local_dir).as_posix()
+                if include is not None and not include(rel):
+                    continue
+                stats.listed += 1
+                key = f"{prefix}{rel}"
+                st = path.stat()
+                entry = index.get(key)
+                remote_obj = remote.get(key)
+                if (entry and remote_obj and entry.get("size") == st.st_size == remote_obj["size"]
+                        and entry.get("mtime_ns") == st.st_mtime_ns
+                        and entry.get("etag") in (None, remote_obj["etag"])):
+                    entry["etag"] = remote_obj["etag"]
+                    stats.skipped += 1
+                    continue
+                if remote_obj and remote_obj["etag"] == file_md5(path):
+                    index[key] = {"etag": remote_obj["etag"], "size": st.st_size, "mtime_ns": st.st_mtime_ns}
+                    stats.skipped += 1
+                    continue
+                pending.append((key, path, st))
+
+            results = self._run([
+                (lambda k=key, p=path: self.s3.upload_file(p, k))
+                for key, path, _ in pending
+            ])
+            for (key, path, st), ok in zip(pending, results):
+                if not ok:
+                    stats.failed += 1
+                    continue
+                stats.transferred += 1
+                stats.bytes_transferred += st.st_size
+                # The ETag is only known after the next listing (it is not an MD5 under SSE-KMS)
+                index[key] = {"etag": None, "size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+            self._save_index()
+
+        stats.duration = round(time.time() - started, 3)
+        return stats
+
+    def sync(self, prefix: str, local_dir: Path, local_files: Optional[Iterable[str]] = None,
+             include: Optional[Callable[[str], bool]] = None, direction: str = DIRECTION_BOTH,
+             prefer: str = DIRECTION_PUSH, dry_run: bool = False) -> SyncStats:
+        """
+        Reconcile a prefix with a local directory in one round of parallel transfers
+
+        Each key is compared with the index entry from the last sync to tell
+        which side changed. With direction "both" the changed side wins and
+        ``prefer`` settles keys changed on both sides; "pull" and "push" make
+        the remote or local copy authoritative. Nothing is deleted on either side.
+
+        Args:
+            prefix: S3 key prefix, ending with "/"
+            local_dir: Local directory that mirrors the prefix
+            local_files: Paths relative to local_dir to consider (defaults to walking local_dir)
+            include: Optional filter called with the path relative to prefix
+            direction: "both", "pull" or "push"
+            prefer: Side that wins when both changed ("pull" for remote, "push" for local)
+            dry_run: Plan only; report the actions without transferring or touching the index
+
+        Returns:
+            SyncStats for the run, with one entry per planned transfer in ``actions``
+        """
+        if direction not in (DIRECTION_BOTH, DIRECTION_PULL, DIRECTION_PUSH):
+            raise ValueError(f"Invalid sync direction: {direction}")
+        started = time.time()
+        stats = SyncStats(dry_run=dry_run)
+        remote = self._list_remote(prefix, stats, include)
+        if remote is None:
+            return stats
+        if local_files is None:
+            local_files = [p.relative_to(local_dir).as_posix() for p in local_dir.rglob("*") if p.is_file()]
+        local = {}
+        for rel in local_files:
+            path = self._local_path(local_dir, rel)
+            if path is None or not path.is_file() or (include is not None and not include(rel)):
+                continue
+            if path.parent == self.index_path.parent and path.name.startswith(self.index_path.name):
+                continue
+            local[f"{prefix}{rel}"] = path
+
+        with self._lock:
+            index = self._load_index()
+            # _plan_key adopts ETags into the index; a dry run plans against a throwaway copy
+            plan_index = copy.deepcopy(index) if dry_run else index
+            downloads, uploads = [], []
+            stats.listed = len(remote)
+            for key in sorted(set(remote) | set(local)):
+                action = self._plan_key(plan_index, key, remote.get(key), local.get(key), direction, prefer)
+                if action == DIRECTION_PULL:
+                    downloads.append((key, remote[key], local.get(key) or self._local_path(local_dir, key[len(prefix):])))
+                elif action == DIRECTION_PUSH:
+                    uploads.append((key, local[key], local[key].stat()))
+                else:
+                    stats.skipped += 1
+
+            for key, obj, _ in downloads:
+                stats.actions.append({"action": "download", "key": key, "size": obj["size"]})
+            for key, _, st in uploads:
+                stats.actions.append({"action": "upload", "key": key, "size": st.st_size})
+
+            if dry_run:
+                stats.transferred = len(stats.actions)
+                stats.bytes_transferred = sum(a["size"] for a in stats.actions)
+                stats.duration = round(time.time() - started, 3)
+                return stats
+
+            results = self._run(
+                [(lambda k=key, p=path: self.s3.download_file(k, p)) for key, _, path in downloads]
+                + [(lambda k=key, p=path: self.s3.upload_file(p, k)) for key, path, _ in uploads]
+            )
+            for action, ok in zip(stats.actions, results):
+                action["ok"] = ok
+            for (key, obj, path), ok in zip(downloads, results[:len(downloads)]):
+                if not ok:
+                    stats.failed += 1
+                    continue
+                stats.transferred += 1
+                stats.bytes_transferred += obj["size"]
+                index[key] = {"etag": obj["etag"], "size": obj["size"], "mtime_ns": path.stat().st_mtime_ns}
+            for (key, path, st), ok in zip(uploads, results[len(downloads):]):
+                if not ok:
+                    stats.failed += 1
+                    continue
+                stats.transferred += 1
+                stats.bytes_transferred += st.st_size
+                index[key] = {"etag": None, "size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+            self._save_index()
+
+        stats.duration = round(time.time() - started, 3)
+        return stats
+
+    @staticmethod
+    def _plan_key(index: Dict[str, Dict], key: str, remote_obj: Optional[Dict], path: Optional[Path],
+                  direction: str, prefer: str) -> Optional[str]:
+        """Return "pull", "push" or None (in sync / nothing to do) for one key."""
+        entry = index.get(key)
+        if remote_obj is None:
+            return DIRECTION_PUSH if direction != DIRECTION_PULL else None
+        if path is None:
+            return DIRECTION_PULL if direction != DIRECTION_PUSH else None
+
+        st = path.stat()
+        if entry is not None:
+            local_changed = entry.get("size") != st.st_size or entry.get("mtime_ns") != st.st_mtime_ns
+            remote_changed = (entry.get("size") != remote_obj["size"]
+                              or entry.get("etag") not in (None, remote_obj["etag"]))
+            if not local_changed and not remote_changed:
+                entry["etag"] = remote_obj["etag"]
+                return None
+        else:
+            local_changed = remote_changed = True
+
+        if local_changed and remote_changed and st.st_size == remote_obj["size"] \
+                and file_md5(path) == remote_obj["etag"]:
+            index[key] = {"etag": remote_obj["etag"], "size": st.st_size, "mtime_ns": st.st_mtime_ns}
+            return None
+
+        if direction != DIRECTION_BOTH:
+            return direction
+        if local_changed and remote_changed:
+            return prefer
+        return DIRECTION_PUSH if local_changed else DIRECTION_PULL
+
+    def forget(self, prefix: str) -> None:
+        """Drop index entries under prefix (e.g. after the objects were deleted)."""
+        with self._lock:
+            index = self._load_index()
+            for key in [k for k in index if k.startswith(prefix)]:
+                del index[key]
+            self._save_index()
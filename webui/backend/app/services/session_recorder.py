@@ -0,0 +1,369 @@
+"""
+SSH Session Recorder
+Records terminal output to bounded, gzip-compressed asciicast v2 segments on disk
+"""
+import gzip
+import json
+import logging
+import os
+import queue
+import re
+import shutil
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+SSH_RECORDING_DIR = Path(os.environ.get(
+    "SSH_RECORDING_DIR",
+    str(Path(os.environ.get("TERRAFORM_DIR", "/app/terraform")) / ".ssh-recordings"),
+))
+SEGMENT_BYTES = int(os.environ.get("SSH_RECORDING_SEGMENT_BYTES", 256 * 1024))
+MAX_SEGMENTS = int(os.environ.get("SSH_RECORDING_MAX_SEGMENTS", 16))
+MAX_RECORDINGS = int(os.environ.get("SSH_RECORDING_MAX_RECORDINGS", 50))
+DEFAULT_SCROLLBACK_BYTES = 64 * 1024
+MAX_SCROLLBACK_BYTES = 1024 * 1024
+
+_CURRENT_SEGMENT = "current.cast"
+_INDEX_FILE = "index.json"
+_SAFE_ID_RE = re.compile(r"[^A-Za-z0-9_.-]")
+
+
+def scrollback_bytes(kb) -> int:
+    """Scrollback size requested by a client in KB, clamped to ``MAX_SCROLLBACK_BYTES``."""
+    try:
+        requested = int(kb)
+    except (TypeError, ValueError):
+        return DEFAULT_SCROLLBACK_BYTES
+    return max(0, min(requested * 1024, MAX_SCROLLBACK_BYTES))
+
+
+def _segment_name(seq: int) -> str:
+    return f"{seq:06d}.cast.gz"
+
+
+def _read_index(recording_dir: Path) -> Optional[Dict]:
+    try:
+        return json.loads((recording_dir / _INDEX_FILE).read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+
+
+def _write_index(recording_dir: Path, index: Dict) -> None:
+    tmp = recording_dir / f"{_INDEX_FILE}.tmp"
+    tmp.write_text(json.dumps(index), encoding="utf-8")
+    os.replace(tmp, recording_dir / _INDEX_FILE)
+
+
+def _iter_event_lines(recording_dir: Path, index: Dict, since: float = 0.0) -> Iterator[str]:
+    for seg in index.get("segments", []):
+        if seg.get("end", 0.0) < since:
+            continue
+        try:
+            with gzip.open(recording_dir / _segment_name(seg["seq"]), "rt", encoding="utf-8") as f:
+                yield from f
+        except OSError as e:
+            logger.debug(f"Skipping unreadable segment {seg['seq']} in {recording_dir.name}: {e}")
+    current = recording_dir / _CURRENT_SEGMENT
+    if current.exists():
+        with open(current, "r", encoding="utf-8") as f:
+            yield from f
+
+
+class SessionRecorder:
+    """Appends asciicast events for one SSH session into a ring of compressed segments.
+
+    Only segment metadata (start/end time and sizes) is kept in memory; event
+    data lives on disk in the active plain-text segment and rotated .gz files.
+    ``record_*`` only enqueue the event: a writer thread appends batches to disk
+    and compresses rotated segments, so the event loop relaying the session
+    never waits on file I/O. ``scrollback`` and ``close`` block and should be
+    called through ``asyncio.to_thread``.
+    """
+
+    def __init__(self, recording_dir: Path, width: int, height: int, title: str = ""):
+        self.recording_dir = recording_dir
+        self.recording_dir.mkdir(parents=True, exist_ok=True)
+        self.started_at = time.time()
+        self._index = {
+            "header": {
+                "version": 2,
+                "width": width,
+                "height": height,
+                "timestamp": int(self.started_at),
+                "title": title,
+                "env": {"TERM": "xterm-256color"},
+            },
+            "segments": [],
+            "completed": False,
+            "ended_at": None,
+        }
+        self._next_seq = 0
+        self._current = open(self.recording_dir / _CURRENT_SEGMENT, "ab")
+        self._current_bytes = 0
+        self._current_start: Optional[float] = None
+        self._current_end = 0.0
+        self._closed = False
+        self._state_lock = threading.Lock()
+        self._io_lock = threading.Lock()
+        self._queue: "queue.Queue[Optional[tuple]]" = queue.Queue()
+        self._write_index()
+        self._writer = threading.Thread(target=self._write_loop, name=f"ssh-recorder-{self.recording_id}",
+                                        daemon=True)
+        self._writer.start()
+
+    @property
+    def recording_id(self) -> str:
+        return self.recording_dir.name
+
+    def record_output(self, data: str) -> None:
+        self._write_event("o", data)
+
+    def record_resize(self, cols: int, rows: int) -> None:
+        self._write_event("r", f"{cols}x{rows}")
+
+    def _write_event(self, code: str, data: str) -> None:
+        if not data:
+            return
+        t = round(time.time() - self.started_at, 6)
+        with self._state_lock:
+            if not self._closed:
+                self._queue.put((t, code, data))
+
+    def _write_loop(self) -> None:
+        while True:
+            batch = [self._queue.get()]
+            while True:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                with self._io_lock:
+                    for event in batch:
+                        if event is not None:
+                            self._append(*event)
+                    if not self._current.closed:
+                        self._current.flush()
+            except OSError as e:
+                logger.warning(f"Failed to record SSH output for {self.recording_id}: {e}")
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+            if batch[-1] is None:
+                return
+
+    def _append(self, t: float, code: str, data: str) -> None:
+        line = (json.dumps([t, code, data]) + "\n").encode("utf-8")
+        self._current.write(line)
+        if self._current_start is None:
+            self._current_start = t
+        self._current_end = t
+        self._current_bytes += len(line)
+        if self._current_bytes >= SEGMENT_BYTES:
+            self._rotate()
+
+    def _rotate(self, final: bool = False) -> None:
+        self._current.close()
+        current_path = self.recording_dir / _CURRENT_SEGMENT
+        if self._current_bytes > 0:
+            seq = self._next_seq
+            self._next_seq += 1
+            segment_path = self.recording_dir / _segment_name(seq)
+            with open(current_path, "rb") as src, gzip.open(segment_path, "wb", compresslevel=6) as dst:
+                shutil.copyfileobj(src, dst)
+            self._index["segments"].append({
+                "seq": seq,
+                "start": self._current_start or 0.0,
+                "end": self._current_end,
+                "bytes": self._current_bytes,
+                "compressed_bytes": segment_path.stat().st_size,
+            })
+            while len(self._index["segments"]) > MAX_SEGMENTS:
+                dropped = self._index["segments"].pop(0)
+                (self.recording_dir / _segment_name(dropped["seq"])).unlink(missing_ok=True)
+            self._write_index()
+        current_path.unlink(missing_ok=True)
+        if not final:
+            self._current = open(current_path, "ab")
+        self._current_bytes = 0
+        self._current_start = None
+
+    def _write_index(self) -> None:
+        _write_index(self.recording_dir, self._index)
+
+    def flush(self) -> None:
+        """Block until every event recorded so far has been written."""
+        self._queue.join()
+
+    def scrollback(self, max_bytes: int = DEFAULT_SCROLLBACK_BYTES) -> str:
+        """Return roughly the last ``max_bytes`` of terminal output, newest segments first."""
+        if max_bytes <= 0:
+            return ""
+        self.flush()
+        chunks: List[str] = []
+        collected = 0
+
+        with self._io_lock:
+            current = self.recording_dir / _CURRENT_SEGMENT
+            sources = []
+            if current.exists():
+                sources.append(current)
+            for seg in reversed(self._index["segments"]):
+                sources.append(self.recording_dir / _segment_name(seg["seq"]))
+
+            for source in sources:
+                try:
+                    if source.suffix == ".gz":
+                        with gzip.open(source, "rt", encoding="utf-8") as f:
+                            lines = f.readlines()
+                    else:
+                        lines = source.read_text(encoding="utf-8").splitlines()
+                except OSError:
+                    continue
+                for line in reversed(lines):
+                    try:
+                        _, code, data = json.loads(line)
+                    except ValueError:
+                        continue
+                    if code != "o":
+                        continue
+                    chunks.append(data)
+                    collected += len(data.encode("utf-8"))
+                    if collected >= max_bytes:
+                        break
+                if collected >= max_bytes:
+                    break
+
+        text = "".join(reversed(chunks))
+        if len(text.encode("utf-8")) > max_bytes:
+            text = text.encode("utf-8")[-max_bytes:].decode("utf-8", errors="ignore")
+            newline = text.find("\n")
+            if 0 <= newline < len(text) - 1:
+                text = text[newline + 1:]
+        return text
+
+    def close(self) -> None:
+        with self._state_lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._queue.put(None)
+        self._writer.join()
+        with self._io_lock:
+            try:
+                self._rotate(final=True)
+            except OSError as e:
+                logger.warning(f"Failed to finalize SSH recording {self.recording_id}: {e}")
+            self._index["completed"] = True
+            self._index["ended_at"] = time.time()
+            self._write_index()
+        logger.info(f"SSH recording {self.recording_id} completed "
+                    f"({len(self._index['segments'])} segments)")
+
+
+def create_recorder(connection_id: str, hostname: str, username: str,
+                    width: int, height: int) -> Optional[SessionRecorder]:
+    safe_id = _SAFE_ID_RE.sub("-", connection_id)[:64] or "session"
+    recording_dir = SSH_RECORDING_DIR / f"{safe_id}-{int(time.time() * 1000)}"
+    try:
+        _prune_recordings()
+        return SessionRecorder(recording_dir, width, height, title=f"{username}@{hostname}")
+    except OSError as e:
+        logger.warning(f"SSH session recording disabled for {connection_id}: {e}")
+        return None
+
+
+def _prune_recordings() -> None:
+    if not SSH_RECORDING_DIR.exists():
+        return
+    completed = []
+    for d in SSH_RECORDING_DIR.iterdir():
+        if not d.is_dir():
+            continue
+        index = _read_index(d)
+        if index and index.get("completed"):
+            completed.append((index.get("ended_at") or 0, d))
+    completed.sort()
+    excess = len(completed) - (MAX_RECORDINGS - 1)
+    for _, d in completed[:max(0, excess)]:
+        shutil.rmtree(d, ignore_errors=True)
+        logger.debug(f"Pruned old SSH recording: {d.name}")
+
+
+def finalize_stale_recordings() -> int:
+    """Mark recordings left incomplete by a previous process as completed.
+
+    Recorders only live as long as the process, so at startup an incomplete
+    recording was cut off by a crash or restart; without this it would never
+    become eligible for pruning.
+    """
+    if not SSH_RECORDING_DIR.exists():
+        return 0
+    finalized = 0
+    for d in SSH_RECORDING_DIR.iterdir():
+        index = _read_index(d) if d.is_dir() else None
+        if not index or index.get("completed"):
+            continue
+        index["completed"] = True
+        index["ended_at"] = max((p.stat().st_mtime for p in d.iterdir()), default=time.time())
+        try:
+            _write_index(d, index)
+            finalized += 1
+        except OSError as e:
+            logger.warning(f"Failed to finalize stale SSH recording {d.name}: {e}")
+    if finalized:
+        logger.info(f"Finalized {finalized} SSH recordings left incomplete by a previous run")
+    return finalized
+
+
+def list_recordings() -> List[Dict]:
+    recordings = []
+    if not SSH_RECORDING_DIR.exists():
+        return recordings
+    for d in sorted(SSH_RECORDING_DIR.iterdir()):
+        index = _read_index(d) if d.is_dir() else None
+        if not index:
+            continue
+        segments = index.get("segments", [])
+        header = index.get("header", {})
+        recordings.append({
+            "id": d.name,
+            "title": header.get("title", ""),
+            "started_at": header.get("timestamp"),
+            "ended_at": index.get("ended_at"),
+            "completed": index.get("completed", False),
+            "duration": segments[-1]["end"] if segments else 0.0,
+            "compressed_bytes": sum(s.get("compressed_bytes", 0) for s in segments),
+        })
+    return recordings
+
+
+def get_recording_dir(recording_id: str) -> Optional[Path]:
+    if not recording_id or _SAFE_ID_RE.search(recording_id) or recording_id.startswith("."):
+        return None
+    recording_dir = SSH_RECORDING_DIR / recording_id
+    if not (recording_dir / _INDEX_FILE).exists():
+        return None
+    return recording_dir
+
+
+def iter_asciicast(recording_dir: Path, speed: float = 1.0, since: float = 0.0) -> Iterator[str]:
+    """Yield an asciicast v2 document with timestamps rebased to ``since`` and divided by ``speed``."""
+    index = _read_index(recording_dir) or {}
+    yield json.dumps(index.get("header", {"version": 2, "width": 80, "height": 24})) + "\n"
+
+    speed = speed if speed > 0 else 1.0
+    base: Optional[float] = None
+    for line in _iter_event_lines(recording_dir, index, since=since):
+        try:
+            t, code, data = json.loads(line)
+        except ValueError:
+            continue
+        if t < since:
+            continue
+        if base is None:
+            base = t
+        yield json.dumps([round((t - base) / speed, 6), code, data]) + "\n"
@@ -0,0 +1,254 @@
+"""
+SSM Parameter Store Gateway
+Batched, cached and de-duplicated access to Parameter Store shared by the
+config and key managers
+"""
+import logging
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Hashable, Iterable, List, Optional, Tuple
+
+from app.services.credential_manager import credential_manager
+
+logger = logging.getLogger(__name__)
+
+GET_PARAMETERS_BATCH = 10
+PARAMETER_CACHE_TTL = 300
+LISTING_CACHE_TTL = 60
+INFLIGHT_WAIT_TIMEOUT = 60
+
+
+@dataclass
+class _Entry:
+    parameter: Optional[Dict]
+    fetched_at: float = field(default_factory=time.time)
+
+    @property
+    def version(self) -> Optional[int]:
+        return self.parameter.get("Version") if self.parameter else None
+
+
+class ParameterCache:
+    """Process-wide cache of decrypted parameters and metadata listings.
+
+    Managers are created per request in several routes, so the cache lives at
+    module level and is keyed by region; in-flight lookups are tracked here as
+    well so concurrent callers share one API call.
+    """
+
+    def __init__(self, ttl: float = PARAMETER_CACHE_TTL, listing_ttl: float = LISTING_CACHE_TTL):
+        self.ttl = ttl
+        self.listing_ttl = listing_ttl
+        self.lock = threading.Lock()
+        self.entries: Dict[Tuple[str, str], _Entry] = {}
+        self.listings: Dict[Tuple[str, Hashable], Tuple[float, object]] = {}
+        self.inflight: Dict[Hashable, Future] = {}
+
+    def clear(self) -> None:
+        with self.lock:
+            self.entries.clear()
+            self.listings.clear()
+
+
+parameter_cache = ParameterCache()
+credential_manager.subscribe(parameter_cache.clear)
+
+
+def _filters_key(filters: List[Dict]) -> Hashable:
+    return tuple(
+        (f.get("Key"), f.get("Option", "Equals"), tuple(f.get("Values", [])))
+        for f in filters
+    )
+
+
+class SSMGateway:
+    """Thin Parameter Store client wrapper for one region.
+
+    - get_parameters fetches uncached names in batches of 10 and caches both hits
+      and misses for PARAMETER_CACHE_TTL
+    - metadata listings (describe_parameters / get_parameters_by_path) are cached
+      for LISTING_CACHE_TTL; a listed Version that differs from a cached value's
+      Version evicts that value
+    - writes go through put_parameter/delete_parameter so the cache stays coherent
+    """
+
+    def __init__(self, client_provider: Callable[[], object], region: str,
+                 cache: ParameterCache = parameter_cache):
+        self._client_provider = client_provider
+        self.region = region
+        self._cache = cache
+
+    @property
+    def client(self):
+        client = self._client_provider()
+        if client is None:
+            raise RuntimeError("SSM client not available")
+        return client
+
+    def _fresh(self, entry: Optional[_Entry], now: float) -> bool:
+        return entry is not None and now - entry.fetched_at < self._cache.ttl
+
+    def get_parameter(self, name: str) -> Optional[Dict]:
+        return self.get_parameters([name]).get(name)
+
+    def get_parameters(self, names: Iterable[str]) -> Dict[str, Dict]:
+        """Return decrypted parameters by name; names that do not exist are omitted."""
+        results: Dict[str, Dict] = {}
+        waits: Dict[str, Future] = {}
+        claimed: Dict[str, Future] = {}
+        now = time.time()
+
+        with self._cache.lock:
+            for name in dict.fromkeys(names):
+                key = (self.region, name)
+                entry = self._cache.entries.get(key)
+                if self._fresh(entry, now):
+                    if entry.parameter is not None:
+                        results[name] = entry.parameter
+                    continue
+                future = self._cache.inflight.get(key)
+                if future is not None:
+                    waits[name] = future
+                else:
+                    claimed[name] = self._cache.inflight[key] = Future()
+
+        if claimed:
+            self._fetch(claimed)
+            for name, future in claimed.items():
+                parameter = future.result()
+                if parameter is not None:
+                    results[name] = parameter
+
+        for name, future in waits.items():
+            parameter = future.result(timeout=INFLIGHT_WAIT_TIMEOUT)
+            if parameter is not None:
+                results[name] = parameter
+        return results
+
+    def _fetch(self, claimed: Dict[str, Future]) -> None:
+        names = list(claimed)
+        try:
+            for i in range(0, len(names), GET_PARAMETERS_BATCH):
+                batch = names[i:i + GET_PARAMETERS_BATCH]
+                response = self.client.get_parameters(Names=batch, WithDecryption=True)
+                found = {p["Name"]: p for p in response.get("Parameters", [])}
+                logger.debug(f"SSM get_parameters: {len(found)}/{len(batch)} found in {self.region}")
+                with self._cache.lock:
+                    for name in batch:
+                        self._cache.entries[(self.region, name)] = _Entry(found.get(name))
+                        self._cache.inflight.pop((self.region, name), None)
+                for name in batch:
+                    claimed[name].set_result(found.get(name))
+        except Exception as e:
+            with self._cache.lock:
+                for name, future in claimed.items():
+                    if not future.done():
+                        self._cache.inflight.pop((self.region, name), None)
+            for future in claimed.values():
+                if not future.done():
+                    future.set_exception(e)
+            raise
+
+    def _cached_listing(self, key: Hashable, loader: Callable[[], object]):
+        cache_key = (self.region, key)
+        with self._cache.lock:
+            cached = self._cache.listings.get(cache_key)
+            if cached and time.time() - cached[0] < self._cache.listing_ttl:
+                return cached[1]
+            future = self._cache.inflight.get(cache_key)
+            leader = future is None
+            if leader:
+                future = self._cache.inflight[cache_key] = Future()
+
+        if not leader:
+            return future.result(timeout=INFLIGHT_WAIT_TIMEOUT)
+
+        try:
+            value = loader()
+        except Exception as e:
+            with self._cache.lock:
+                self._cache.inflight.pop(cache_key, None)
+            future.set_exception(e)
+            raise
+        with self._cache.lock:
+            self._cache.listings[cache_key] = (time.time(), value)
+            self._cache.inflight.pop(cache_key, None)
+        future.set_result(value)
+        return value
+
+    def _check_versions(self, parameters: Iterable[Dict]) -> None:
+        with self._cache.lock:
+            for param in parameters:
+                key = (self.region, param["Name"])
+                entry = self._cache.entries.get(key)
+                if entry is None:
+                    continue
+                if entry.parameter is None or entry.version != param.get("Version"):
+                    del self._cache.entries[key]
+
+    def describe_parameters(self, filters: List[Dict]) -> List[Dict]:
+        """Return parameter metadata (no values) matching ParameterFilters."""
+        def _load():
+            params = []
+            paginator = self.client.get_paginator("describe_parameters")
+            for page in paginator.paginate(ParameterFilters=filters):
+                params.extend(page.get("Parameters", []))
+            logger.debug(f"SSM describe_parameters: {len(params)} parameters in {self.region}")
+            self._check_versions(params)
+            return params
+
+        return self._cached_listing(("describe", _filters_key(filters)), _load)
+
+    def get_parameters_by_path(self, path: str, recursive: bool = True) -> Dict[str, Dict]:
+        """Return decrypted parameters under a path, priming the per-name cache."""
+        def _load():
+            params = {}
+            paginator = self.client.get_paginator("get_parameters_by_path")
+            for page in paginator.paginate(Path=path, Recursive=recursive, WithDecryption=True):
+                for param in page.get("Parameters", []):
+                    params[param["Name"]] = param
+            now = time.time()
+            with self._cache.lock:
+                for name, param in params.items():
+                    self._cache.entries[(self.region, name)] = _Entry(param, now)
+            return params
+
+        return self._cached_listing(("path", path, recursive), _load)
+
+    def put_parameter(self, **kwargs) -> Dict:
+        response = self.client.put_parameter(**kwargs)
+        parameter = {
+            "Name": kwargs["Name"],
+            "Value": kwargs["Value"],
+            "Type": kwargs.get("Type", "String"),
+            "Version": response.get("Version"),
+        }
+        with self._cache.lock:
+            self._cache.entries[(self.region, kwargs["Name"])] = _Entry(parameter)
+            self._drop_listings()
+        return response
+
+    def delete_parameter(self, name: str) -> None:
+        try:
+            self.client.delete_parameter(Name=name)
+        finally:
+            with self._cache.lock:
+                self._cache.entries.pop((self.region, name), None)
+                self._drop_listings()
+        with self._cache.lock:
+            self._cache.entries[(self.region, name)] = _Entry(None)
+
+    def _drop_listings(self) -> None:
+        for key in [k for k in self._cache.listings if k[0] == self.region]:
+            del self._cache.listings[key]
+
+    def invalidate(self, name: Optional[str] = None) -> None:
+        with self._cache.lock:
+            if name is None:
+                for key in [k for k in self._cache.entries if k[0] == self.region]:
+                    del self._cache.entries[key]
+            else:
+                self._cache.entries.pop((self.region, name), None)
+            self._drop_listings()
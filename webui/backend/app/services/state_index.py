@@ -0,0 +1,471 @@
+"""
+State Index
+Local SQLite copy of every instance's remote terraform state (instances, resources,
+flattened attributes, outputs), refreshed only when the state object changes
+
+The S3 listing's ETag decides whether a state is downloaded at all, and the state's
+lineage/serial decides whether it is re-indexed. Status, outputs, security group
+rules and public IP lookups are then answered with indexed queries instead of
+downloading state JSON or running `terraform output`. Values of sensitive outputs
+are never written to the index; callers that need them run `terraform output`.
+"""
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from botocore.exceptions import ClientError
+
+logger = logging.getLogger(__name__)
+
+STATE_INDEX_PATH = Path(os.environ.get(
+    "STATE_INDEX_PATH",
+    str(Path(os.environ.get("TERRAFORM_DIR", "/app/terraform")) / ".tf-state-index.sqlite"),
+))
+STATE_KEY_PREFIX = "instances/"
+STATE_KEY_SUFFIX = "/terraform.tfstate"
+
+# Attribute paths checked when mapping a public IP back to its instance
+PUBLIC_IP_PATHS = ("public_ip", "public_dns", "association.0.public_ip")
+TAG_ATTRIBUTES = ("tags", "tags_all")
+SEARCH_LIMIT = 100
+# Sorts after every other character, so [prefix, prefix + PREFIX_END) is a prefix range
+PREFIX_END = "\U0010ffff"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS instances (
+    dir_name TEXT PRIMARY KEY,
+    resource_id TEXT NOT NULL,
+    s3_key TEXT NOT NULL,
+    etag TEXT,
+    lineage TEXT,
+    serial INTEGER,
+    terraform_version TEXT,
+    resource_count INTEGER NOT NULL DEFAULT 0,
+    indexed_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS resources (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    instance TEXT NOT NULL REFERENCES instances(dir_name) ON DELETE CASCADE,
+    address TEXT NOT NULL,
+    mode TEXT NOT NULL,
+    type TEXT NOT NULL,
+    name TEXT NOT NULL,
+    module TEXT,
+    index_key TEXT,
+    cloud_id TEXT,
+    attributes TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS attributes (
+    resource INTEGER NOT NULL REFERENCES resources(id) ON DELETE CASCADE,
+    path TEXT NOT NULL,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS outputs (
+    instance TEXT NOT NULL REFERENCES instances(dir_name) ON DELETE CASCADE,
+    name TEXT NOT NULL,
+    value TEXT,
+    type TEXT,
+    sensitive INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (instance, name)
+);
+CREATE INDEX IF NOT EXISTS resources_instance ON resources(instance);
+CREATE INDEX IF NOT EXISTS resources_type ON resources(type);
+CREATE INDEX IF NOT EXISTS resources_cloud_id ON resources(cloud_id);
+CREATE INDEX IF NOT EXISTS attributes_resource ON attributes(resource);
+CREATE INDEX IF NOT EXISTS attributes_path_value ON attributes(path, value);
+CREATE INDEX IF NOT EXISTS attributes_value ON attributes(value);
+"""
+
+
+def has_redacted_outputs(outputs: Dict) -> bool:
+    """True when indexed outputs include sensitive ones, whose values the index does not keep."""
+    return any(entry.get("sensitive") for entry in outputs.values())
+
+
+def _sensitive_keys(instance: Dict) -> set:
+    """Top-level attribute names marked sensitive in a state resource instance."""
+    keys = set()
+    for path in instance.get("sensitive_attributes") or []:
+        if path and isinstance(path[0], dict) and path[0].get("type") == "get_attr":
+            keys.add(path[0].get("value"))
+    return keys
+
+
+def flatten_attributes(value, prefix: str = "") -> Iterator[Tuple[str, str]]:
+    """Yield (dotted path, text value) for every scalar leaf; nulls and empty containers are skipped."""
+    if isinstance(value, dict):
+        for key, child in value.items():
+            yield from flatten_attributes(child, f"{prefix}.{key}" if prefix else str(key))
+    elif isinstance(value, list):
+        for i, child in enumerate(value):
+            yield from flatten_attributes(child, f"{prefix}.{i}" if prefix else str(i))
+    elif value is None:
+        return
+    elif isinstance(value, str):
+        yield prefix, value
+    else:
+        yield prefix, json.dumps(value)
+
+
+def _prefix_range(column: str, prefix: str) -> Tuple[str, List[str]]:
+    """Index-friendly ``column LIKE 'prefix%'`` (LIKE is case-insensitive and skips the index)."""
+    return f"({column} >= ? AND {column} < ?)", [prefix, prefix + PREFIX_END]
+
+
+def parse_tag(tag: str) -> Tuple[str, Optional[str]]:
+    """``Key`` or ``Key=Value``."""
+    key, sep, value = tag.partition("=")
+    return key, (value if sep else None)
+
+
+def resource_address(resource: Dict, index_key=None) -> str:
+    parts = []
+    if resource.get("module"):
+        parts.append(resource["module"])
+    if resource.get("mode") == "data":
+        parts.append("data")
+    parts.append(f"{resource.get('type')}.{resource.get('name')}")
+    address = ".".join(parts)
+    if index_key is not None:
+        address += f"[{json.dumps(index_key)}]"
+    return address
+
+
+class StateIndex:
+    """SQLite-backed index of remote states; safe to share between threads."""
+
+    def __init__(self, path: Path = STATE_INDEX_PATH):
+        self.path = Path(path)
+        self.version = 0
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.RLock()
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self.path), check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA foreign_keys = ON")
+            conn.execute("PRAGMA journal_mode = WAL")
+            self._drop_outdated_schema(conn)
+            conn.executescript(SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    @staticmethod
+    def _drop_outdated_schema(conn: sqlite3.Connection) -> None:
+        # Indexes written before sensitive outputs were redacted hold them in plaintext
+        # (outputs.value was NOT NULL). The index is only a cache: drop it and re-index.
+        columns = {row["name"]: row["notnull"] for row in conn.execute("PRAGMA table_info(outputs)")}
+        if columns.get("value"):
+            logger.info("Rebuilding state index to drop plaintext sensitive outputs")
+            with conn:
+                for table in ("attributes", "outputs", "resources", "instances"):
+                    conn.execute(f"DROP TABLE IF EXISTS {table}")
+            conn.execute("VACUUM")
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def _query(self, sql: str, params: Iterable = ()) -> List[sqlite3.Row]:
+        with self._lock:
+            if self._conn is None and not self.path.exists():
+                return []
+            return self._db().execute(sql, tuple(params)).fetchall()
+
+    # -- writes --
+
+    def index_state(self, dir_name: str, resource_id: str, s3_key: str, state: Dict,
+                    etag: Optional[str] = None) -> bool:
+        """Index ``state`` for ``dir_name``; returns False when lineage and serial are unchanged."""
+        lineage, serial = state.get("lineage"), state.get("serial")
+        with self._lock:
+            db = self._db()
+            current = db.execute("SELECT lineage, serial FROM instances WHERE dir_name = ?", (dir_name,)).fetchone()
+            if current is not None and serial is not None and \
+                    (current["lineage"], current["serial"]) == (lineage, serial):
+                db.execute("UPDATE instances SET etag = ?, s3_key = ? WHERE dir_name = ?", (etag, s3_key, dir_name))
+                db.commit()
+                return False
+
+            with db:
+                db.execute("DELETE FROM instances WHERE dir_name = ?", (dir_name,))
+                resources = state.get("resources") or []
+                db.execute(
+                    "INSERT INTO instances (dir_name, resource_id, s3_key, etag, lineage, serial, terraform_version,"
+                    " resource_count, indexed_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (dir_name, resource_id, s3_key, etag, lineage, serial, state.get("terraform_version"),
+                     sum(1 for r in resources if r.get("mode") != "data"), time.time()),
+                )
+                for resource in resources:
+                    self._insert_resource(db, dir_name, resource)
+                for name, output in (state.get("outputs") or {}).items():
+                    sensitive = bool(output.get("sensitive"))
+                    db.execute(
+                        "INSERT INTO outputs (instance, name, value, type, sensitive) VALUES (?, ?, ?, ?, ?)",
+                        (dir_name, name, None if sensitive else json.dumps(output.get("value")),
+                         json.dumps(output.get("type")), int(sensitive)),
+                    )
+            self.version += 1
+        logger.debug(f"Indexed state of {dir_name} (serial {serial}, {len(resources)} resources)")
+        return True
+
+    def _insert_resource(self, db: sqlite3.Connection, dir_name: str, resource: Dict) -> None:
+        for instance in resource.get("instances") or []:
+            index_key = instance.get("index_key")
+            sensitive = _sensitive_keys(instance)
+            attributes = {k: v for k, v in (instance.get("attributes") or {}).items() if k not in sensitive}
+            cursor = db.execute(
+                "INSERT INTO resources (instance, address, mode, type, name, module, index_key, cloud_id, attributes)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (dir_name, resource_address(resource, index_key), resource.get("mode", "managed"),
+                 resource.get("type", ""), resource.get("name", ""), resource.get("module"),
+                 None if index_key is None else json.dumps(index_key), attributes.get("id"),
+                 json.dumps(attributes)),
+            )
+            db.executemany(
+                "INSERT INTO attributes (resource, path, value) VALUES (?, ?, ?)",
+                [(cursor.lastrowid, path, value) for path, value in flatten_attributes(attributes)],
+            )
+
+    def remove(self, dir_name: str) -> bool:
+        with self._lock:
+            db = self._db()
+            with db:
+                removed = db.execute("DELETE FROM instances WHERE dir_name = ?", (dir_name,)).rowcount
+            if removed:
+                self.version += 1
+        return bool(removed)
+
+    # -- S3 sync --
+
+    def _download(self, s3_client, bucket: str, dir_name: str, resource_id: str, s3_key: str,
+                  etag: Optional[str]) -> bool:
+        response = s3_client.get_object(Bucket=bucket, Key=s3_key)
+        state = json.loads(response["Body"].read())
+        return self.index_state(dir_name, resource_id, s3_key, state, etag=response.get("ETag", etag))
+
+    def sync(self, s3_client, bucket: str, instances: Iterable[Tuple[str, str]]) -> Dict[str, int]:
+        """Bring the index in line with the bucket for ``instances`` ((dir_name, resource_id) pairs).
+
+        One list call finds every state object; only objects whose ETag differs from
+        the indexed one are downloaded. Raises the listing's ClientError so callers keep
+        their own error handling.
+        """
+        listed: Dict[str, Tuple[str, Optional[str]]] = {}
+        paginator = s3_client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=bucket, Prefix=STATE_KEY_PREFIX):
+            for obj in page.get("Contents", []):
+                key = obj["Key"]
+                parts = key.split("/")
+                if key.endswith(STATE_KEY_SUFFIX) and len(parts) == 3:
+                    listed[parts[1]] = (key, obj.get("ETag"))
+
+        etags = {row["dir_name"]: row["etag"] for row in self._query("SELECT dir_name, etag FROM instances")}
+        counts = {"indexed": 0, "unchanged": 0, "removed": 0, "failed": 0}
+        seen = set()
+        for dir_name, resource_id in instances:
+            seen.add(dir_name)
+            found = listed.get(resource_id) or listed.get(dir_name)
+            if not found:
+                counts["removed"] += self.remove(dir_name)
+                continue
+            s3_key, etag = found
+            if etag and etags.get(dir_name) == etag:
+                counts["unchanged"] += 1
+                continue
+            try:
+                counts["indexed" if self._download(s3_client, bucket, dir_name, resource_id, s3_key, etag)
+                       else "unchanged"] += 1
+            except Exception as e:
+                logger.debug(f"State index: failed to load {s3_key}: {e}")
+                counts["removed"] += self.remove(dir_name)
+                counts["failed"] += 1
+        for dir_name in set(etags) - seen:
+            counts["removed"] += self.remove(dir_name)
+        logger.debug(f"State index sync: {counts}")
+        return counts
+
+    def sync_one(self, s3_client, bucket: str, dir_name: str, resource_id: str) -> bool:
+        """Refresh one instance (after apply/destroy); returns whether it now has a state."""
+        indexed = self._query("SELECT etag FROM instances WHERE dir_name = ?", (dir_name,))
+        for key_name in (resource_id, dir_name):
+            s3_key = f"{STATE_KEY_PREFIX}{key_name}{STATE_KEY_SUFFIX}"
+            try:
+                head = s3_client.head_object(Bucket=bucket, Key=s3_key)
+            except ClientError as e:
+                if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                    continue
+                raise
+            if not (indexed and head.get("ETag") and indexed[0]["etag"] == head.get("ETag")):
+                self._download(s3_client, bucket, dir_name, resource_id, s3_key, head.get("ETag"))
+            return True
+        self.remove(dir_name)
+        return False
+
+    # -- queries --
+
+    def has_instance(self, dir_name: str) -> bool:
+        return bool(self._query("SELECT 1 FROM instances WHERE dir_name = ?", (dir_name,)))
+
+    def resource_counts(self) -> Dict[str, int]:
+        """Managed resource count per indexed instance directory."""
+        return {row["dir_name"]: row["resource_count"]
+                for row in self._query("SELECT dir_name, resource_count FROM instances")}
+
+    def instances(self) -> List[Dict]:
+        return [dict(row) for row in self._query(
+            "SELECT dir_name, resource_id, s3_key, lineage, serial, terraform_version, resource_count, indexed_at"
+            " FROM instances ORDER BY dir_name")]
+
+    def outputs(self, dir_name: str) -> Optional[Dict]:
+        """Outputs in `terraform output -json` shape, or None when the instance is not indexed.
+
+        Sensitive outputs are listed with a None value (see ``has_redacted_outputs``).
+        """
+        if not self.has_instance(dir_name):
+            return None
+        outputs = {}
+        for row in self._query("SELECT name, value, type, sensitive FROM outputs WHERE instance = ? ORDER BY name",
+                               (dir_name,)):
+            outputs[row["name"]] = {
+                "sensitive": bool(row["sensitive"]),
+                "type": json.loads(row["type"]) if row["type"] else None,
+                "value": json.loads(row["value"]) if row["value"] is not None else None,
+            }
+        return outputs
+
+    def resources(self, dir_name: str, resource_type: Optional[str] = None,
+                  module: Optional[str] = None) -> List[Dict]:
+        sql = "SELECT address, mode, type, name, module, index_key, cloud_id, attributes FROM resources WHERE instance = ?"
+        params: List = [dir_name]
+        if resource_type:
+            sql += " AND type = ?"
+            params.append(resource_type)
+        if module:
+            sql += " AND module = ?"
+            params.append(module)
+        rows = self._query(sql + " ORDER BY id", params)
+        return [{**dict(row), "attributes": json.loads(row["attributes"])} for row in rows]
+
+    def security_group_attributes(self, dir_name: str, module: str = "module.security_group",
+                                  names: Tuple[str, ...] = ("personal", "main")) -> Optional[Dict]:
+        for resource in self.resources(dir_name, "aws_security_group", module):
+            if resource["name"] in names:
+                return resource["attributes"]
+        return None
+
+    def find_by_ip(self, ip: str) -> List[Dict]:
+        """Resources whose public IP/DNS is ``ip`` (EC2 instances, EIPs, network interfaces)."""
+        placeholders = ", ".join("?" for _ in PUBLIC_IP_PATHS)
+        rows = self._query(
+            "SELECT DISTINCT i.dir_name, i.resource_id, r.address, r.type, r.cloud_id, a.path"
+            " FROM attributes a JOIN resources r ON r.id = a.resource JOIN instances i ON i.dir_name = r.instance"
+            f" WHERE a.value = ? AND a.path IN ({placeholders}) AND r.mode = 'managed'"
+            " ORDER BY i.dir_name, r.address",
+            [ip, *PUBLIC_IP_PATHS],
+        )
+        return [dict(row) for row in rows]
+
+    def public_ips(self) -> List[Dict]:
+        """Every indexed EC2 instance / EIP public IP with its owning instance directory."""
+        rows = self._query(
+            "SELECT i.dir_name, i.resource_id, r.address, r.type, r.cloud_id, a.value AS public_ip"
+            " FROM attributes a JOIN resources r ON r.id = a.resource JOIN instances i ON i.dir_name = r.instance"
+            " WHERE a.path = 'public_ip' AND a.value != '' AND r.type IN ('aws_instance', 'aws_eip')"
+            " AND r.mode = 'managed' ORDER BY i.dir_name, r.address"
+        )
+        return [dict(row) for row in rows]
+
+    def search(self, resource_type: Optional[str] = None, cloud_id: Optional[str] = None,
+               tags: Iterable[str] = (), attribute: Optional[str] = None, value: Optional[str] = None,
+               instance: Optional[str] = None, include_data: bool = False, limit: int = SEARCH_LIMIT) -> Dict:
+        """Resources across every indexed state matching all given filters.
+
+        ``cloud_id`` matches the resource id or ARN, ``tags`` are ``Key`` or ``Key=Value``,
+        ``attribute`` matches a flattened attribute path and everything below it
+        (``ingress`` covers ``ingress.0.from_port``), ``value`` is a value prefix.
+        """
+        where, params = [], []
+        if not include_data:
+            where.append("r.mode = 'managed'")
+        if resource_type:
+            where.append("r.type = ?")
+            params.append(resource_type)
+        if instance:
+            where.append("(i.dir_name = ? OR i.resource_id = ?)")
+            params += [instance, instance]
+        if cloud_id:
+            where.append("(r.cloud_id = ? OR r.id IN (SELECT resource FROM attributes WHERE path = 'arn' AND value = ?))")
+            params += [cloud_id, cloud_id]
+
+        # Attribute filters: each is one indexed lookup on attributes(path, value) / attributes(value)
+        attribute_filters: List[Tuple[str, List]] = []
+        for tag in tags:
+            key, tag_value = parse_tag(tag)
+            clause = "path IN (?, ?)"
+            clause_params: List = [f"{name}.{key}" for name in TAG_ATTRIBUTES]
+            if tag_value is not None:
+                clause += " AND value = ?"
+                clause_params.append(tag_value)
+            attribute_filters.append((clause, clause_params))
+        if attribute or value:
+            clauses, clause_params = [], []
+            if attribute:
+                below, below_params = _prefix_range("path", attribute + ".")
+                clauses.append(f"(path = ? OR {below})")
+                clause_params += [attribute, *below_params]
+            if value:
+                in_range, range_params = _prefix_range("value", value)
+                clauses.append(in_range)
+                clause_params += range_params
+            attribute_filters.append((" AND ".join(clauses), clause_params))
+        for clause, clause_params in attribute_filters:
+            where.append(f"r.id IN (SELECT resource FROM attributes WHERE {clause})")
+            params += clause_params
+
+        sql = ("SELECT r.id, i.dir_name, i.resource_id, r.address, r.mode, r.type, r.cloud_id"
+               " FROM resources r JOIN instances i ON i.dir_name = r.instance")
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY i.dir_name, r.id LIMIT ?"
+        rows = self._query(sql, params + [limit + 1])
+        truncated = len(rows) > limit
+        results = {row["id"]: {**dict(row), "matches": []} for row in rows[:limit]}
+
+        if results and attribute_filters:
+            ids = list(results)
+            placeholders = ", ".join("?" for _ in ids)
+            clause = " OR ".join(f"({c})" for c, _ in attribute_filters)
+            matched = self._query(
+                f"SELECT resource, path, value FROM attributes WHERE resource IN ({placeholders}) AND ({clause})"
+                " ORDER BY resource, path",
+                ids + [p for _, ps in attribute_filters for p in ps],
+            )
+            for row in matched:
+                results[row["resource"]]["matches"].append({"path": row["path"], "value": row["value"]})
+
+        for result in results.values():
+            del result["id"]
+        return {"results": list(results.values()), "truncated": truncated, "version": self.version}
+
+    def stats(self) -> Dict:
+        with self._lock:
+            if self._conn is None and not self.path.exists():
+                return {"path": str(self.path), "version": self.version,
+                        "instances": 0, "resources": 0, "attributes": 0, "outputs": 0}
+            db = self._db()
+            counts = {table: db.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+                      for table in ("instances", "resources", "attributes", "outputs")}
+        return {"path": str(self.path), "version": self.version, **counts}
+
+
+state_index = StateIndex()
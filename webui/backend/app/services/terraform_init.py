@@ -0,0 +1,287 @@
+"""
+Terraform Init Fingerprints and Init-All Job
+Tracks what each instance was initialized against and pre-warms `terraform init`
+across all instances in the background
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import re
+import time
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+FINGERPRINT_FILE = ".webui-init-fingerprint"
+LOCK_FILE = ".terraform.lock.hcl"
+DEFAULT_INIT_CONCURRENCY = 4
+
+STATUS_PENDING = "pending"
+STATUS_RUNNING = "running"
+STATUS_SKIPPED = "skipped"
+STATUS_SUCCEEDED = "succeeded"
+STATUS_FAILED = "failed"
+
+COMPONENT_BACKEND = "backend"
+COMPONENT_MODULES = "modules"
+COMPONENT_PROVIDERS = "providers"
+FINGERPRINT_COMPONENTS = (COMPONENT_BACKEND, COMPONENT_MODULES, COMPONENT_PROVIDERS)
+
+_BACKEND_RE = re.compile(r'\bbackend\s+"[^"]+"\s*\{')
+_REQUIRED_PROVIDERS_RE = re.compile(r'\brequired_providers\s*\{')
+_MODULE_RE = re.compile(r'^\s*module\s+"([^"]+)"\s*\{', re.MULTILINE)
+_ATTR_RE = r'^\s*{name}\s*=\s*"([^"]+)"'
+
+
+def _blocks(text: str, pattern: re.Pattern) -> List[str]:
+    """Return each block opened by ``pattern`` (which must end at its `{`) up to the matching `}`."""
+    blocks = []
+    for match in pattern.finditer(text):
+        depth, pos = 1, match.end()
+        while depth and pos < len(text):
+            if text[pos] == "{":
+                depth += 1
+            elif text[pos] == "}":
+                depth -= 1
+            pos += 1
+        blocks.append(text[match.start():pos])
+    return blocks
+
+
+def _normalize(block: str) -> str:
+    lines = (line.strip() for line in block.splitlines())
+    return " ".join(re.sub(r"\s+", " ", line) for line in lines if line and not line.startswith(("#", "//")))
+
+
+def _read_tf_files(resource_dir: Path) -> List[Tuple[str, str]]:
+    files = []
+    for tf_file in sorted(resource_dir.glob("*.tf")):
+        try:
+            files.append((tf_file.name, tf_file.read_text(encoding="utf-8")))
+        except OSError:
+            continue
+    return files
+
+
+def _module_calls(tf_files: List[Tuple[str, str]]) -> List[Tuple[str, str, str]]:
+    calls = []
+    for _, text in tf_files:
+        for block in _blocks(text, _MODULE_RE):
+            name = _MODULE_RE.match(block).group(1)
+            header_end = block.index("{") + 1
+            body = block[header_end:]
+            source = re.search(_ATTR_RE.format(name="source"), body, re.MULTILINE)
+            version = re.search(_ATTR_RE.format(name="version"), body, re.MULTILINE)
+            calls.append((name, source.group(1) if source else "", version.group(1) if version else ""))
+    return sorted(calls)
+
+
+def _hash_module_calls(digest, directory: Path, seen: set) -> None:
+    """Hash module sources and versions, following local sources into their own module calls."""
+    for name, source, version in _module_calls(_read_tf_files(directory)):
+        digest.update(f"\0module:{name}={source}@{version}".encode())
+        if not source.startswith(("./", "../")):
+            continue
+        module_dir = (directory / source).resolve()
+        if module_dir.is_dir() and module_dir not in seen:
+            seen.add(module_dir)
+            digest.update(b"\0nested:")
+            _hash_module_calls(digest, module_dir, seen)
+            digest.update(b"\0end")
+
+
+def compute_init_fingerprint(resource_dir: Path) -> Dict[str, str]:
+    """Hash the inputs `terraform init` depends on, one digest per component.
+
+    - backend: the `backend` block(s) of the configuration
+    - modules: module sources and versions; local sources (./, ../) are
+      referenced in place by init, so only their path counts, plus any
+      module calls nested inside them
+    - providers: the `required_providers` block(s) and the dependency lock file
+    """
+    tf_files = _read_tf_files(resource_dir)
+
+    backend = hashlib.sha256()
+    providers = hashlib.sha256()
+    for _, text in tf_files:
+        for block in _blocks(text, _BACKEND_RE):
+            backend.update(_normalize(block).encode())
+        for block in _blocks(text, _REQUIRED_PROVIDERS_RE):
+            providers.update(_normalize(block).encode())
+    lock_file = resource_dir / LOCK_FILE
+    providers.update(b"\0lock:")
+    providers.update(lock_file.read_bytes() if lock_file.exists() else b"<no-lock>")
+
+    modules = hashlib.sha256()
+    _hash_module_calls(modules, resource_dir, {resource_dir.resolve()})
+
+    return {
+        COMPONENT_BACKEND: backend.hexdigest(),
+        COMPONENT_MODULES: modules.hexdigest(),
+        COMPONENT_PROVIDERS: providers.hexdigest(),
+    }
+
+
+def _fingerprint_path(resource_dir: Path) -> Path:
+    return resource_dir / ".terraform" / FINGERPRINT_FILE
+
+
+def read_init_fingerprint(resource_dir: Path) -> Optional[Dict[str, str]]:
+    try:
+        recorded = json.loads(_fingerprint_path(resource_dir).read_text())
+    except (OSError, ValueError):
+        return None
+    return recorded if isinstance(recorded, dict) else None
+
+
+def write_init_fingerprint(resource_dir: Path, fingerprint: Optional[Dict[str, str]] = None) -> None:
+    path = _fingerprint_path(resource_dir)
+    if not path.parent.exists():
+        return
+    try:
+        path.write_text(json.dumps(fingerprint or compute_init_fingerprint(resource_dir), sort_keys=True))
+    except OSError as e:
+        logger.debug(f"Could not record init fingerprint for {resource_dir}: {e}")
+
+
+@dataclass(frozen=True)
+class InitCheck:
+    """Result of comparing an instance's init inputs with what it was last initialized against."""
+    initialized: bool
+    changed: Tuple[str, ...]
+    fingerprint: Dict[str, str]
+
+    @property
+    def current(self) -> bool:
+        return self.initialized and not self.changed
+
+    @property
+    def reconfigure(self) -> bool:
+        return self.initialized and COMPONENT_BACKEND in self.changed
+
+    def init_args(self) -> List[str]:
+        args = ["terraform", "init", "-no-color", "-input=false"]
+        if self.reconfigure:
+            args.append("-reconfigure")
+        return args
+
+
+def check_init(resource_dir: Path) -> InitCheck:
+    """Decide whether ``resource_dir`` needs `terraform init`, and whether the backend must be reconfigured.
+
+    A `.terraform` directory without a readable fingerprint (initialized
+    outside the web UI, or by an older version) counts as every component
+    having changed, so the next init also reconfigures the backend.
+    """
+    fingerprint = compute_init_fingerprint(resource_dir)
+    if not (resource_dir / ".terraform").exists():
+        return InitCheck(False, FINGERPRINT_COMPONENTS, fingerprint)
+    recorded = read_init_fingerprint(resource_dir) or {}
+    changed = tuple(c for c in FINGERPRINT_COMPONENTS if recorded.get(c) != fingerprint[c])
+    return InitCheck(True, changed, fingerprint)
+
+
+def is_init_current(resource_dir: Path) -> bool:
+    return check_init(resource_dir).current
+
+
+@dataclass
+class InstanceInitState:
+    resource_id: str
+    status: str = STATUS_PENDING
+    duration: float = 0.0
+    error: Optional[str] = None
+
+    def to_dict(self) -> Dict:
+        return asdict(self)
+
+
+InitFn = Callable[[Path], Awaitable[Tuple[bool, str]]]
+
+
+class InitAllJob:
+    """Runs `terraform init` for every instance with bounded parallelism.
+
+    Instances whose recorded fingerprint still matches are skipped; the rest
+    are initialized through ``init_fn`` (which is expected to take the
+    per-directory lock, re-check the fingerprint and wait for the provider
+    cache). Instances for which ``is_busy`` returns True (a plan/apply/destroy
+    is running) are skipped rather than re-initialized under the operation.
+    """
+
+    def __init__(self, instances: Dict[str, Path], init_fn: InitFn,
+                 max_concurrency: int = DEFAULT_INIT_CONCURRENCY,
+                 is_busy: Optional[Callable[[str], bool]] = None):
+        self.instances = instances
+        self.max_concurrency = max(1, max_concurrency)
+        self.states: Dict[str, InstanceInitState] = {rid: InstanceInitState(rid) for rid in instances}
+        self._init_fn = init_fn
+        self._is_busy = is_busy or (lambda resource_id: False)
+        self.started_at = 0.0
+        self.finished_at: Optional[float] = None
+
+    @property
+    def running(self) -> bool:
+        return self.started_at > 0 and self.finished_at is None
+
+    def counts(self) -> Dict[str, int]:
+        counts: Dict[str, int] = {}
+        for state in self.states.values():
+            counts[state.status] = counts.get(state.status, 0) + 1
+        return counts
+
+    def to_dict(self) -> Dict:
+        done = sum(1 for s in self.states.values() if s.status not in (STATUS_PENDING, STATUS_RUNNING))
+        end = self.finished_at or time.time()
+        return {
+            "running": self.running,
+            "total": len(self.states),
+            "completed": done,
+            "progress": int(done * 100 / len(self.states)) if self.states else 100,
+            "counts": self.counts(),
+            "duration": round(end - self.started_at, 1) if self.started_at else 0.0,
+            "instances": {rid: state.to_dict() for rid, state in sorted(self.states.items())},
+        }
+
+    async def _init_one(self, resource_id: str, semaphore: asyncio.Semaphore) -> None:
+        state = self.states[resource_id]
+        resource_dir = self.instances[resource_id]
+        if await asyncio.to_thread(is_init_current, resource_dir):
+            state.status = STATUS_SKIPPED
+            return
+        if self._is_busy(resource_id):
+            state.status, state.error = STATUS_SKIPPED, "operation in progress"
+            return
+        async with semaphore:
+            if self._is_busy(resource_id):
+                state.status, state.error = STATUS_SKIPPED, "operation in progress"
+                return
+            state.status = STATUS_RUNNING
+            started = time.time()
+            try:
+                ok, output = await self._init_fn(resource_dir)
+                state.status = STATUS_SUCCEEDED if ok else STATUS_FAILED
+                if not ok:
+                    state.error = output.strip().splitlines()[-1] if output.strip() else "terraform init failed"
+            except Exception as e:
+                state.status = STATUS_FAILED
+                state.error = str(e)
+            state.duration = round(time.time() - started, 1)
+
+    async def run(self) -> Dict:
+        self.started_at = time.time()
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        try:
+            await asyncio.gather(*(self._init_one(rid, semaphore) for rid in self.instances))
+        finally:
+            self.finished_at = time.time()
+        summary = self.to_dict()
+        logger.info(f"Init-all finished in {summary['duration']}s: {summary['counts']}")
+        return summary
+
+
+def instances_with_config(instances: Iterable[Tuple[str, Path]]) -> Dict[str, Path]:
+    return {rid: path for rid, path in instances if (path / "main.tf").exists()}
@@ -9,8 +9,16 @@ import boto3
 from botocore.exceptions import ClientError
 
 logger = logging.getLogger(__name__)
+
+# Files whose changes alter the resources/variables payloads of an instance directory
+INSTANCE_GENERATION_FILES = ("main.tf", "variables.tf", "terraform.tfvars", "terraform.tfstate")
 from app.models.schemas import TerraformResource, ResourceStatus, TerraformVariable
-from app.config import get_variable_names_for_resource, is_common_variable, is_excluded_variable, get_ordered_common_variables, get_resource_only_variable_names, get_root_allowed_variable_names
+from app.config import is_common_variable, get_ordered_common_variables, get_resource_only_variable_names, get_root_allowed_variable_names
+from app.services import metrics, tracing
+from app.services.event_bus import RESOURCE_STATUS, TFVARS_CHANGED, event_bus
+from app.services.http_cache import file_generation
+from app.services.state_index import state_index
+from app.services.variable_schema import DEFAULT_FROM_FILE, ResourceSchema, VariableSchemaCache
 from app.services.instance_discovery import (
     get_resource_id_for_instance,
     get_resource_type_from_dir,
@@ -26,6 +34,11 @@ class TerraformParser:
         self._s3_bucket_available: Optional[bool] = None
         self._cached_s3_manager = None
         self._s3_status_cache: Optional[Dict[str, ResourceStatus]] = None
+        self._s3_status_version = 0
+        self._write_generation = 0
+        self.state_index = state_index
+        self.variable_schemas = VariableSchemaCache(self.instances_dir)
+        self._tfvars_map_cache: Dict[str, tuple] = {}
 
     @property
     def config_manager(self):
@@ -154,11 +167,20 @@ class TerraformParser:
 
     def _fetch_all_s3_statuses(self) -> Dict[str, ResourceStatus]:
         if self._s3_status_cache is not None:
+            metrics.S3_STATUS_CACHE.inc(result="hit")
             logger.debug("S3 status cache hit (%d entries)", len(self._s3_status_cache))
             return self._s3_status_cache
+        metrics.S3_STATUS_CACHE.inc(result="miss")
         return self._force_fetch_all_s3_statuses()
 
     def _force_fetch_all_s3_statuses(self) -> Dict[str, ResourceStatus]:
+        with metrics.S3_STATUS_FETCH_DURATION.time(scope="all"), \
+                tracing.span("s3.status_fetch", resource="all") as span:
+            statuses = self._fetch_s3_statuses_uncached()
+            span.set_metric("s3.status_count", len(statuses))
+            return statuses
+
+    def _fetch_s3_statuses_uncached(self) -> Dict[str, ResourceStatus]:
         statuses: Dict[str, ResourceStatus] = {}
         if not self.instances_dir.exists():
             return statuses
@@ -175,16 +197,13 @@ class TerraformParser:
             logger.warning("Failed to create S3 client for status check: %s", e)
             return statuses
 
-        s3_state_keys: Dict[str, str] = {}
+        instances = [
+            (instance_dir.name, get_resource_id_for_instance(instance_dir))
+            for instance_dir in sorted(self.instances_dir.iterdir())
+            if instance_dir.is_dir() and (instance_dir / "main.tf").exists()
+        ]
         try:
-            paginator = s3_client.get_paginator("list_objects_v2")
-            for page in paginator.paginate(Bucket=bucket_name, Prefix="instances/"):
-                for obj in page.get("Contents", []):
-                    key = obj["Key"]
-                    if key.endswith("/terraform.tfstate"):
-                        parts = key.split("/")
-                        if len(parts) == 3:
-                            s3_state_keys[parts[1]] = key
+            self.state_index.sync(s3_client, bucket_name, instances)
         except ClientError as e:
             if e.response.get("Error", {}).get("Code") == "NoSuchBucket":
                 logger.debug("S3 bucket does not exist yet, skipping state check")
@@ -195,40 +214,20 @@ class TerraformParser:
             logger.warning("S3 status check failed (credentials expired?): %s", e)
             return statuses
 
-        logger.debug("S3 state files found: %s", list(s3_state_keys.keys()))
-
-        for instance_dir in sorted(self.instances_dir.iterdir()):
-            if not instance_dir.is_dir() or not (instance_dir / "main.tf").exists():
-                continue
-
-            dir_name = instance_dir.name
-            resource_id = get_resource_id_for_instance(instance_dir)
-
-            s3_key = s3_state_keys.get(resource_id) or s3_state_keys.get(dir_name)
-
-            if not s3_key:
-                statuses[dir_name] = ResourceStatus.DISABLED
-                logger.debug("S3 status: %s -> DISABLED (no state file)", dir_name)
-                continue
-
-            try:
-                response = s3_client.get_object(Bucket=bucket_name, Key=s3_key)
-                state_data = json.loads(response["Body"].read())
-                resources = state_data.get("resources", [])
-                actual_resources = [r for r in resources if r.get("mode") != "data"]
-                if actual_resources:
-                    statuses[dir_name] = ResourceStatus.ENABLED
-                    logger.debug("S3 status: %s -> ENABLED (%d resources)", dir_name, len(actual_resources))
-                else:
-                    statuses[dir_name] = ResourceStatus.DISABLED
-                    logger.debug("S3 status: %s -> DISABLED (empty state)", dir_name)
-            except Exception as e:
-                logger.debug("S3 status: %s -> DISABLED (error: %s)", dir_name, e)
-                statuses[dir_name] = ResourceStatus.DISABLED
+        resource_counts = self.state_index.resource_counts()
+        for dir_name, _ in instances:
+            count = resource_counts.get(dir_name, 0)
+            statuses[dir_name] = ResourceStatus.ENABLED if count else ResourceStatus.DISABLED
+            logger.debug("S3 status: %s -> %s (%d resources)", dir_name, statuses[dir_name].value, count)
 
         return statuses
 
     def _fetch_single_s3_status(self, dir_name: str) -> ResourceStatus:
+        with metrics.S3_STATUS_FETCH_DURATION.time(scope="single"), \
+                tracing.span("s3.status_fetch", resource="single", instance=dir_name):
+            return self._fetch_single_s3_status_uncached(dir_name)
+
+    def _fetch_single_s3_status_uncached(self, dir_name: str) -> ResourceStatus:
         bucket_name = self._resolve_s3_bucket_name()
         if not bucket_name:
             return ResourceStatus.DISABLED
@@ -242,20 +241,11 @@ class TerraformParser:
 
         try:
             s3_client = boto3.client("s3", region_name=region)
-            for key_name in (resource_id, dir_name):
-                s3_key = f"instances/{key_name}/terraform.tfstate"
-                try:
-                    response = s3_client.get_object(Bucket=bucket_name, Key=s3_key)
-                    state_data = json.loads(response["Body"].read())
-                    resources = state_data.get("resources", [])
-                    actual = [r for r in resources if r.get("mode") != "data"]
-                    status = ResourceStatus.ENABLED if actual else ResourceStatus.DISABLED
-                    logger.debug("S3 status refresh: %s -> %s", dir_name, status.value)
-                    return status
-                except ClientError as e:
-                    if e.response.get("Error", {}).get("Code") == "NoSuchKey":
-                        continue
-                    raise
+            if self.state_index.sync_one(s3_client, bucket_name, dir_name, resource_id):
+                count = self.state_index.resource_counts().get(dir_name, 0)
+                status = ResourceStatus.ENABLED if count else ResourceStatus.DISABLED
+                logger.debug("S3 status refresh: %s -> %s", dir_name, status.value)
+                return status
         except Exception as e:
             logger.debug("S3 status refresh failed for %s: %s", dir_name, e)
 
@@ -263,7 +253,11 @@ class TerraformParser:
 
     def build_s3_status_cache(self) -> None:
         logger.info("Building S3 status cache...")
+        previous = self._s3_status_cache
         self._s3_status_cache = self._force_fetch_all_s3_statuses()
+        self._s3_status_version += 1
+        if previous is not None:
+            self._publish_status_changes(previous, self._s3_status_cache)
         logger.info("S3 status cache built: %d entries", len(self._s3_status_cache))
 
     def invalidate_s3_status(self, dir_name: Optional[str] = None) -> None:
@@ -274,10 +268,59 @@ class TerraformParser:
         logger.debug("Invalidating S3 status cache for: %s", dir_name)
         new_status = self._fetch_single_s3_status(dir_name)
         if self._s3_status_cache is not None:
+            previous = {dir_name: self._s3_status_cache.get(dir_name)}
             self._s3_status_cache[dir_name] = new_status
+            self._s3_status_version += 1
+            self._publish_status_changes(previous, {dir_name: new_status})
         else:
             self.build_s3_status_cache()
 
+    def _publish_status_changes(self, previous: Dict[str, Optional[ResourceStatus]],
+                                current: Dict[str, ResourceStatus]) -> None:
+        if len(event_bus) == 0:
+            return
+        for dir_name in sorted(set(previous) | set(current)):
+            old, new = previous.get(dir_name), current.get(dir_name)
+            if old == new:
+                continue
+            event_bus.publish(
+                RESOURCE_STATUS, get_resource_id_for_instance(self.instances_dir / dir_name),
+                dir_name=dir_name,
+                status=new.value if new else None,
+                previous=old.value if old else None,
+            )
+
+    def _publish_tfvars_changed(self, tfvars_path: Path, **data) -> None:
+        if len(event_bus) == 0:
+            return
+        if tfvars_path.parent.resolve() == self.terraform_dir.resolve():
+            event_bus.publish(TFVARS_CHANGED, scope="root", **data)
+        else:
+            instance_dir = tfvars_path.parent
+            event_bus.publish(TFVARS_CHANGED, get_resource_id_for_instance(instance_dir),
+                              scope="instance", dir_name=instance_dir.name, **data)
+
+    def instances_generation(self) -> tuple:
+        """Stat-only fingerprint of the instance directories (no file is read)."""
+        if not self.instances_dir.exists():
+            return ()
+        entries = []
+        with os.scandir(self.instances_dir) as it:
+            for entry in it:
+                if entry.is_dir():
+                    path = Path(entry.path)
+                    entries.append((entry.name,) + tuple(file_generation(path / f) for f in INSTANCE_GENERATION_FILES))
+        return tuple(sorted(entries))
+
+    def variables_generation(self) -> tuple:
+        return self._write_generation, file_generation(self._root_tfvars_path())
+
+    def resources_generation(self) -> Optional[tuple]:
+        """None until the S3 status cache exists, since uncached statuses can change at any time."""
+        if self._s3_status_cache is None:
+            return None
+        return self._s3_status_version, self._write_generation, self.instances_generation()
+
     def _check_resource_status_local(self, instance_dir: Path) -> ResourceStatus:
         tfstate_path = instance_dir / "terraform.tfstate"
 
@@ -366,6 +409,7 @@ class TerraformParser:
         file_map = {}
         tfvars_path = self._root_tfvars_path()
         if tfvars_path.exists():
+            metrics.TFVARS_PARSE.inc(scope="root")
             try:
                 with open(tfvars_path, 'r', encoding='utf-8') as f:
                     for line in f:
@@ -436,61 +480,22 @@ class TerraformParser:
                 return resource
         return None
     
+    def variable_schema(self, resource_id: str) -> Optional[ResourceSchema]:
+        """Compiled variable schema of an instance (recompiled only when its files change)."""
+        if self.variable_schemas.instances_dir != self.instances_dir:
+            self.variable_schemas = VariableSchemaCache(self.instances_dir)
+        return self.variable_schemas.get(resource_id)
+
     def get_resource_variables(self, resource_id: str) -> List[str]:
         """Get variables used by a specific resource"""
-        resource = self.get_resource_by_id(resource_id)
-        if not resource:
-            return []
-        
-        configured_vars = get_variable_names_for_resource(resource.type.value, resource.id)
-        
-        # Parse variables.tf in the instance directory
-        instance_dir_name = resource.file_path.split('/')[1]  # Extract dir name from path
-        instance_dir = self.instances_dir / instance_dir_name
-        variables_tf = instance_dir / "variables.tf"
-        
-        actual_vars = set()
-        if variables_tf.exists():
-            with open(variables_tf, 'r', encoding='utf-8') as f:
-                content = f.read()
-            
-            var_pattern = re.compile(r'^variable\s+"(\w+)"\s*\{', re.MULTILINE)
-            for match in var_pattern.finditer(content):
-                var_name = match.group(1)
-                if not is_excluded_variable(var_name):
-                    actual_vars.add(var_name)
-        
-        all_vars = configured_vars | actual_vars
-        
-        return list(all_vars)
-    
+        schema = self.variable_schema(resource_id)
+        return schema.names if schema else []
+
     def parse_instance_variable_defaults(self, resource_id: str) -> Dict[str, str]:
-        instance_dir = self._get_instance_dir(resource_id)
-        if not instance_dir:
+        schema = self.variable_schema(resource_id)
+        if not schema:
             return {}
-        variables_tf = instance_dir / "variables.tf"
-        if not variables_tf.exists():
-            return {}
-        defaults: Dict[str, str] = {}
-        content = variables_tf.read_text(encoding="utf-8")
-        blocks = re.split(r'(?=^variable\s+")', content, flags=re.MULTILINE)
-        for block in blocks:
-            name_match = re.match(r'variable\s+"(\w+)"', block)
-            if not name_match:
-                continue
-            var_name = name_match.group(1)
-            default_match = re.search(r'default\s*=\s*"([^"]*)"', block)
-            if default_match:
-                defaults[var_name] = default_match.group(1)
-                continue
-            default_match = re.search(r'default\s*=\s*(true|false)\b', block)
-            if default_match:
-                defaults[var_name] = default_match.group(1)
-                continue
-            default_match = re.search(r'default\s*=\s*(\d+(?:\.\d+)?)\b', block)
-            if default_match:
-                defaults[var_name] = default_match.group(1)
-        return defaults
+        return {spec.name: spec.default_display for spec in schema.variables if spec.default_source == DEFAULT_FROM_FILE}
 
     def _escape_tfvars_value(self, s: str) -> str:
         return s.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n").replace("\r", "\\r")
@@ -515,9 +520,20 @@ class TerraformParser:
         return None
 
     def _read_tfvars_to_map(self, tfvars_path: Path) -> Dict[str, str]:
+        generation = file_generation(tfvars_path)
+        if generation is None:
+            return {}
+        key = str(tfvars_path)
+        cached = self._tfvars_map_cache.get(key)
+        if cached is not None and cached[0] == (generation, self._write_generation):
+            return dict(cached[1])
+        out = self._parse_tfvars_file(tfvars_path)
+        self._tfvars_map_cache[key] = ((generation, self._write_generation), out)
+        return dict(out)
+
+    def _parse_tfvars_file(self, tfvars_path: Path) -> Dict[str, str]:
         out = {}
-        if not tfvars_path.exists():
-            return out
+        metrics.TFVARS_PARSE.inc(scope="instance")
         with open(tfvars_path, "r", encoding="utf-8") as f:
             for line in f:
                 line = line.strip()
@@ -573,6 +589,7 @@ class TerraformParser:
             logger.debug("Removing variable %s from root terraform.tfvars", var_name)
             with open(path, 'w', encoding='utf-8') as f:
                 f.writelines(new_lines)
+            self._write_generation += 1
 
     def remove_non_common_from_root(self, var_name: str) -> None:
         if not is_common_variable(var_name):
@@ -582,11 +599,13 @@ class TerraformParser:
         logger.debug("_write_tfvars_line: var=%s target=%s", var_name, tfvars_path.resolve())
         escaped = self._escape_tfvars_value(var_value)
         line_content = f'{var_name} = "{escaped}"\n'
+        self._write_generation += 1
         if not line_content.endswith('\n'):
             line_content += '\n'
         if not tfvars_path.exists():
             with open(tfvars_path, 'w', encoding='utf-8') as f:
                 f.write(line_content)
+            self._publish_tfvars_changed(tfvars_path, variable=var_name)
             return True
         with open(tfvars_path, 'r', encoding='utf-8') as f:
             lines = f.readlines()
@@ -604,6 +623,7 @@ class TerraformParser:
             lines.append(line_content)
         with open(tfvars_path, 'w', encoding='utf-8') as f:
             f.writelines(lines)
+        self._publish_tfvars_changed(tfvars_path, variable=var_name)
         return True
 
     def write_root_tfvars(self, var_name: str, var_value: str) -> bool:
@@ -693,9 +713,7 @@ class TerraformParser:
         content = self._filter_common_only_lines(raw_content)
         dir_map = get_resource_directory_map(self.instances_dir)
         ok = False
-
-        # Sync root tfvars to S3 first
-        self._sync_root_tfvars_to_s3()
+        self._write_generation += 1
 
         for _resource_id, dir_name in dir_map.items():
             instance_dir = self.instances_dir / dir_name
@@ -704,11 +722,13 @@ class TerraformParser:
             dst = instance_dir / "terraform.tfvars"
             try:
                 dst.write_text(content, encoding="utf-8")
+                self._publish_tfvars_changed(dst, source="root")
                 ok = True
-                # Sync each instance tfvars to S3
-                self._sync_instance_tfvars_to_s3(_resource_id, dst)
             except OSError:
                 pass
+
+        # Push root and all changed instance tfvars in one parallel round
+        self.sync_config_with_s3(direction="push")
         return ok
 
     def copy_root_tfvars_to_resource(self, resource_id: str) -> bool:
@@ -716,11 +736,13 @@ class TerraformParser:
         instance_dir = self._get_instance_dir(resource_id)
         if not instance_dir:
             return False
+        self._write_generation += 1
         if root_tfvars.exists():
             try:
                 raw_content = root_tfvars.read_text(encoding="utf-8")
                 content = self._filter_common_only_lines(raw_content)
                 (instance_dir / "terraform.tfvars").write_text(content, encoding="utf-8")
+                self._publish_tfvars_changed(instance_dir / "terraform.tfvars", source="root")
                 return True
             except OSError:
                 return False
@@ -740,6 +762,7 @@ class TerraformParser:
         tfvars_path = instance_dir / "terraform.tfvars"
         if not tfvars_path.exists():
             return True
+        self._write_generation += 1
         try:
             tfvars_path.unlink()
             return True
@@ -783,6 +806,23 @@ class TerraformParser:
             logger.warning(f"Failed to sync root tfvars to S3: {e}")
             return False
 
+    def sync_config_with_s3(self, direction: str = "both", dry_run: bool = False) -> Optional[Dict]:
+        if self._s3_bucket_available is False and not dry_run:
+            return None
+        try:
+            s3_manager = self._get_s3_manager()
+            if not s3_manager:
+                return None
+            stats = s3_manager.sync_config(self.terraform_dir, direction=direction, dry_run=dry_run)
+            if stats.transferred > 0 and stats.failed == 0:
+                self._s3_bucket_available = True
+            elif stats.failed > 0 and stats.transferred == 0 and self._s3_bucket_available is None:
+                self._s3_bucket_available = False
+            return stats.to_dict()
+        except Exception as e:
+            logger.warning(f"Failed to sync tfvars with S3: {e}")
+            return None
+
     def _sync_instance_tfvars_to_s3(self, resource_id: str, tfvars_path: Path) -> bool:
         if self._s3_bucket_available is False:
             return False
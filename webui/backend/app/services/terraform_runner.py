@@ -1,15 +1,62 @@
 import asyncio
+import re
 import shutil
 import os
-from typing import Optional, AsyncIterator, Dict, List
+import time
+from contextlib import asynccontextmanager
+from typing import Optional, AsyncIterator, Callable, Dict, List
 from pathlib import Path
 import logging
 
 logger = logging.getLogger(__name__)
 
 EXIT_SENTINEL_PREFIX = "__TF_EXIT__:"
+DRIFT_OPERATION = "drift"
 
+from app.services import metrics, tracing
 from app.services.instance_discovery import get_resource_directory_map
+from app.services.process_monitor import ProcessMonitor, ProcessUsage, usage_store
+from app.services.terraform_init import (
+    DEFAULT_INIT_CONCURRENCY,
+    InitAllJob,
+    check_init,
+    instances_with_config,
+    write_init_fingerprint,
+)
+
+INIT_ALL_CONCURRENCY = int(os.environ.get("TF_INIT_ALL_CONCURRENCY", DEFAULT_INIT_CONCURRENCY))
+
+_ADDR_NAME = r'[A-Za-z_][A-Za-z0-9_-]*'
+_ADDR_KEY = r'(?:\[(?:\d+|"[^"\\]*")\])?'
+_ADDR_MODULE = rf'module\.{_ADDR_NAME}{_ADDR_KEY}'
+_ADDR_RESOURCE = rf'(?:data\.)?{_ADDR_NAME}\.{_ADDR_NAME}{_ADDR_KEY}'
+RESOURCE_ADDRESS_RE = re.compile(rf'^(?:{_ADDR_MODULE}\.)*(?:{_ADDR_MODULE}|{_ADDR_RESOURCE})$')
+
+
+def scope_args(targets: Optional[List[str]] = None, refresh: bool = True) -> List[str]:
+    """`-target`/`-refresh=false` arguments for a partial plan or apply.
+
+    Raises ValueError for anything that isn't a resource or module address, so
+    user input can never smuggle in other flags.
+    """
+    args = []
+    for target in targets or []:
+        if not RESOURCE_ADDRESS_RE.match(target):
+            raise ValueError(f"Invalid resource address: {target}")
+        args.append(f"-target={target}")
+    if not refresh:
+        args.append("-refresh=false")
+    return args
+
+
+def module_addresses(addresses: List[str]) -> List[str]:
+    """Every module path that appears in ``addresses`` (targeting one covers all its resources)."""
+    modules = set()
+    for address in addresses:
+        parts = re.findall(rf'{_ADDR_MODULE}', address)
+        for i in range(1, len(parts) + 1):
+            modules.add(".".join(parts[:i]))
+    return sorted(modules)
 
 _TF_WARMUP_CONFIG = (
     'terraform {\n'
@@ -31,6 +78,11 @@ class TerraformRunner:
         self._cache_warmup_started = False
         self._warmup_progress = 0
         self._warmup_message = ""
+        self._init_locks: Dict[str, asyncio.Lock] = {}
+        self._init_all_job: Optional[InitAllJob] = None
+        self._init_all_task: Optional[asyncio.Task] = None
+        self.usage_store = usage_store
+        self._running_usage: Dict[int, ProcessUsage] = {}
 
     def _is_provider_cached(self) -> bool:
         cache_dir = Path(os.environ.get("TF_PLUGIN_CACHE_DIR", ""))
@@ -44,8 +96,16 @@ class TerraformRunner:
             "ready": self._cache_ready.is_set(),
             "progress": self._warmup_progress,
             "message": self._warmup_message,
+            "init_all": self._init_all_job.to_dict() if self._init_all_job else None,
         }
 
+    def init_all_pending(self) -> int:
+        job = self._init_all_job
+        if job is None or not job.running:
+            return 0
+        summary = job.to_dict()
+        return summary["total"] - summary["completed"]
+
     def _parse_warmup_line(self, line: str):
         text = line.strip()
         if "Initializing provider plugins" in text:
@@ -119,6 +179,47 @@ class TerraformRunner:
             return
         await self._cache_ready.wait()
 
+    def _get_init_lock(self, resource_dir: Path) -> asyncio.Lock:
+        key = str(resource_dir)
+        if key not in self._init_locks:
+            self._init_locks[key] = asyncio.Lock()
+        return self._init_locks[key]
+
+    def start_init_all(self, env_extra: Optional[Dict[str, str]] = None,
+                       max_concurrency: int = INIT_ALL_CONCURRENCY,
+                       is_busy: Optional[Callable[[str], bool]] = None) -> InitAllJob:
+        """Start (or return the running) background job that pre-initializes every instance.
+
+        Instances are initialized only when ``check_init`` (re-run under the
+        per-directory init lock) finds them out of date; ``is_busy`` lets the
+        caller exclude instances with a running operation.
+        """
+        if self._init_all_job is not None and self._init_all_job.running:
+            return self._init_all_job
+
+        instances = instances_with_config(
+            (resource_id, self.instances_dir / dir_name)
+            for resource_id, dir_name in self._get_resource_dir_map().items()
+        )
+        resource_ids = {path: resource_id for resource_id, path in instances.items()}
+        job = InitAllJob(
+            instances,
+            lambda resource_dir: self.ensure_terraform_init(
+                resource_dir, env_extra=env_extra, resource_id=resource_ids.get(resource_dir)),
+            max_concurrency=max_concurrency,
+            is_busy=is_busy,
+        )
+        self._init_all_job = job
+
+        async def _run():
+            await self.wait_for_cache()
+            await job.run()
+
+        job.started_at = time.time()
+        self._init_all_task = asyncio.create_task(_run())
+        logger.info(f"Init-all started for {len(instances)} instances (concurrency {job.max_concurrency})")
+        return job
+
     def _get_resource_dir_map(self) -> Dict[str, str]:
         if self._resource_dir_map is None:
             self._resource_dir_map = get_resource_directory_map(self.instances_dir)
@@ -144,6 +245,70 @@ class TerraformRunner:
             return None
         return {**os.environ, **env_extra}
 
+    def get_running_usage(self) -> List[Dict]:
+        return [usage.to_dict() for usage in self._running_usage.values()]
+
+    @asynccontextmanager
+    async def _monitored(self, process, cmd: List[str], resource_id: Optional[str] = None,
+                         on_usage: Optional[Callable[[ProcessUsage], None]] = None,
+                         operation: Optional[str] = None):
+        """Sample ``process``'s tree while the block runs, then persist the totals for ``resource_id``.
+
+        ``operation`` defaults to the terraform subcommand in ``cmd``.
+        """
+        operation = operation or (cmd[1] if len(cmd) > 1 else cmd[0])
+        monitor = ProcessMonitor(process.pid, operation, resource_id=resource_id,
+                                 command=" ".join(cmd[:2])).start()
+        self._running_usage[process.pid] = monitor.usage
+        if on_usage:
+            on_usage(monitor.usage)
+        with tracing.span("terraform.command", resource=f"terraform {operation}", span_type="worker",
+                          activate=False, resource_id=resource_id, pid=process.pid) as span:
+            try:
+                yield monitor
+            finally:
+                usage = await monitor.stop(exit_code=process.returncode)
+                self._running_usage.pop(process.pid, None)
+                metrics.TERRAFORM_COMMAND_DURATION.observe(
+                    usage.wall_seconds, command=operation, exit_code=str(process.returncode))
+                span.set_tag("terraform.exit_code", process.returncode)
+                span.set_metric("terraform.cpu_seconds", usage.cpu_seconds)
+                span.set_metric("terraform.peak_rss_bytes", usage.peak_rss_bytes)
+                if process.returncode:
+                    tracing.mark_error(span, f"terraform {operation} exited with {process.returncode}")
+            if resource_id:
+                await asyncio.to_thread(self.usage_store.record, usage)
+            logger.debug(
+                f"terraform {operation} ({resource_id or '-'}): {usage.wall_seconds:.1f}s wall, "
+                f"{usage.cpu_seconds:.1f}s cpu, peak {usage.peak_rss_bytes // (1024 * 1024)}MB"
+            )
+
+    async def _stream_process(self, cmd: List[str], cwd: Path, env_extra: Optional[Dict[str, str]] = None,
+                              resource_id: Optional[str] = None,
+                              on_usage: Optional[Callable[[ProcessUsage], None]] = None) -> AsyncIterator[str]:
+        """Run ``cmd`` in ``cwd``, yielding its combined output and finally the exit sentinel."""
+        env = self._build_env(env_extra)
+        try:
+            process = await asyncio.create_subprocess_exec(
+                *cmd,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.STDOUT,
+                cwd=str(cwd),
+                env=env
+            )
+            async with self._monitored(process, cmd, resource_id, on_usage):
+                while True:
+                    line = await process.stdout.readline()
+                    if not line:
+                        break
+                    yield line.decode()
+                code = (await process.wait()) or 0
+            yield f"{EXIT_SENTINEL_PREFIX}{0 if code == 0 else 1}\n"
+        except Exception as e:
+            logger.error(f"Error streaming terraform {cmd[1] if len(cmd) > 1 else cmd[0]}: {e}")
+            yield f"Error: {str(e)}\n"
+            yield f"{EXIT_SENTINEL_PREFIX}1\n"
+
     async def _run_command(self, cmd: list[str], cwd: Optional[Path] = None, env_extra: Optional[Dict[str, str]] = None) -> tuple[bool, str]:
         if cwd is None:
             cwd = self.terraform_dir
@@ -157,7 +322,16 @@ class TerraformRunner:
                 env=env
             )
             
-            stdout, stderr = await process.communicate()
+            operation = cmd[1] if len(cmd) > 1 else cmd[0]
+            started = time.monotonic()
+            with tracing.span("terraform.command", resource=f"terraform {operation}", span_type="worker",
+                              pid=process.pid) as span:
+                stdout, stderr = await process.communicate()
+                span.set_tag("terraform.exit_code", process.returncode)
+                if process.returncode:
+                    tracing.mark_error(span, f"terraform {operation} exited with {process.returncode}")
+            metrics.TERRAFORM_COMMAND_DURATION.observe(
+                time.monotonic() - started, command=operation, exit_code=str(process.returncode))
             
             output = stdout.decode() if stdout else ""
             error = stderr.decode() if stderr else ""
@@ -172,48 +346,60 @@ class TerraformRunner:
             logger.error(f"Error running terraform command: {e}")
             return False, str(e)
     
-    async def ensure_terraform_init(self, resource_dir: Path, env_extra: Optional[Dict[str, str]] = None) -> tuple[bool, str]:
-        tf_dir = resource_dir / ".terraform"
-        if tf_dir.exists():
-            logger.debug(f"Terraform already initialized in {resource_dir}, skipping init")
+    async def ensure_terraform_init(self, resource_dir: Path, env_extra: Optional[Dict[str, str]] = None,
+                                    force: bool = False, resource_id: Optional[str] = None) -> tuple[bool, str]:
+        check = await asyncio.to_thread(check_init, resource_dir)
+        if not force and check.current:
+            logger.debug(f"Terraform init is current in {resource_dir}, skipping init")
             return True, "Already initialized"
 
-        await self.wait_for_cache()
-        env = self._build_env(env_extra)
-        try:
-            logger.debug(f"Running terraform init in {resource_dir}")
-            process = await asyncio.create_subprocess_exec(
-                "terraform", "init", "-no-color", "-input=false",
-                stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.STDOUT,
-                cwd=str(resource_dir),
-                env=env
-            )
-
-            lines = []
-            while True:
-                line = await process.stdout.readline()
-                if not line:
-                    break
-                lines.append(line.decode())
-
-            await process.wait()
-            output = "".join(lines)
-
-            if process.returncode == 0:
-                logger.info(f"Successfully initialized terraform in {resource_dir}")
-                return True, output
-            else:
-                logger.error(f"Failed to initialize terraform in {resource_dir}: {output}")
-                return False, output
-
-        except Exception as e:
-            logger.error(f"Error running terraform init: {e}")
-            return False, str(e)
-
-    async def stream_init(self, resource_dir: Path, env_extra: Optional[Dict[str, str]] = None) -> AsyncIterator[str]:
-        tf_dir = resource_dir / ".terraform"
-        if tf_dir.exists():
+        async with self._get_init_lock(resource_dir):
+            check = await asyncio.to_thread(check_init, resource_dir)
+            if not force and check.current:
+                return True, "Already initialized"
+
+            await self.wait_for_cache()
+            env = self._build_env(env_extra)
+            try:
+                if check.initialized and check.changed:
+                    logger.info(f"Re-initializing terraform in {resource_dir} ({', '.join(check.changed)} changed)")
+                else:
+                    logger.debug(f"Running terraform init in {resource_dir}")
+                process = await asyncio.create_subprocess_exec(
+                    *check.init_args(),
+                    stdout=asyncio.subprocess.PIPE,
+                    stderr=asyncio.subprocess.STDOUT,
+                    cwd=str(resource_dir),
+                    env=env
+                )
+
+                lines = []
+                async with self._monitored(process, ["terraform", "init"], resource_id):
+                    while True:
+                        line = await process.stdout.readline()
+                        if not line:
+                            break
+                        lines.append(line.decode())
+
+                    await process.wait()
+                output = "".join(lines)
+
+                if process.returncode == 0:
+                    await asyncio.to_thread(write_init_fingerprint, resource_dir)
+                    logger.info(f"Successfully initialized terraform in {resource_dir}")
+                    return True, output
+                else:
+                    logger.error(f"Failed to initialize terraform in {resource_dir}: {output}")
+                    return False, output
+
+            except Exception as e:
+                logger.error(f"Error running terraform init: {e}")
+                return False, str(e)
+
+    async def stream_init(self, resource_dir: Path, env_extra: Optional[Dict[str, str]] = None,
+                          resource_id: Optional[str] = None,
+                          on_usage: Optional[Callable[[ProcessUsage], None]] = None) -> AsyncIterator[str]:
+        if (await asyncio.to_thread(check_init, resource_dir)).current:
             yield "Already initialized\n"
             return
 
@@ -230,31 +416,27 @@ class TerraformRunner:
                     pass
             yield "Provider cache ready.\n\n"
 
-        env = self._build_env(env_extra)
-        try:
-            process = await asyncio.create_subprocess_exec(
-                "terraform", "init", "-no-color", "-input=false",
-                stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.STDOUT,
-                cwd=str(resource_dir),
-                env=env
-            )
-
-            while True:
-                line = await process.stdout.readline()
-                if not line:
-                    break
-                yield line.decode()
+        lock = self._get_init_lock(resource_dir)
+        if lock.locked():
+            yield "Waiting for background terraform init...\n"
+        async with lock:
+            check = await asyncio.to_thread(check_init, resource_dir)
+            if check.current:
+                yield "Already initialized\n"
+                return
+            if check.initialized:
+                reason = ", ".join(check.changed)
+                yield f"Init inputs changed ({reason}), re-initializing{' with -reconfigure' if check.reconfigure else ''}...\n"
+
+            async for line in self._stream_process(check.init_args(), resource_dir, env_extra, resource_id, on_usage):
+                if line.strip() == f"{EXIT_SENTINEL_PREFIX}0":
+                    await asyncio.to_thread(write_init_fingerprint, resource_dir)
+                    continue
+                yield line
 
-            code = (await process.wait()) or 0
-            if code != 0:
-                yield f"{EXIT_SENTINEL_PREFIX}1\n"
-        except Exception as e:
-            logger.error(f"Error streaming terraform init: {e}")
-            yield f"Error: {str(e)}\n"
-            yield f"{EXIT_SENTINEL_PREFIX}1\n"
-    
-    async def stream_apply(self, resource_id: str, auto_approve: bool = False, var_files: Optional[List[str]] = None, env_extra: Optional[Dict[str, str]] = None) -> AsyncIterator[str]:
+    async def stream_apply(self, resource_id: str, auto_approve: bool = False, var_files: Optional[List[str]] = None, env_extra: Optional[Dict[str, str]] = None, on_usage: Optional[Callable[[ProcessUsage], None]] = None,
+                           targets: Optional[List[str]] = None, refresh: bool = True) -> AsyncIterator[str]:
+        scope = scope_args(targets, refresh)
         resource_dir = self.get_resource_directory(resource_id)
         
         if not resource_dir:
@@ -268,7 +450,7 @@ class TerraformRunner:
             return
 
         init_failed = False
-        async for line in self.stream_init(resource_dir, env_extra=env_extra):
+        async for line in self.stream_init(resource_dir, env_extra=env_extra, resource_id=resource_id, on_usage=on_usage):
             if line.startswith(EXIT_SENTINEL_PREFIX):
                 init_failed = True
             yield line
@@ -282,32 +464,13 @@ class TerraformRunner:
                 cmd.extend(["-var-file", f])
         if auto_approve:
             cmd.append("-auto-approve")
+        cmd.extend(scope)
 
-        env = self._build_env(env_extra)
-        try:
-            yield f"Applying terraform in: {resource_dir}\n"
-            process = await asyncio.create_subprocess_exec(
-                *cmd,
-                stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.STDOUT,
-                cwd=str(resource_dir),
-                env=env
-            )
-
-            while True:
-                line = await process.stdout.readline()
-                if not line:
-                    break
-                yield line.decode()
-
-            code = (await process.wait()) or 0
-            yield f"{EXIT_SENTINEL_PREFIX}{0 if code == 0 else 1}\n"
-        except Exception as e:
-            logger.error(f"Error streaming terraform apply: {e}")
-            yield f"Error: {str(e)}\n"
-            yield f"{EXIT_SENTINEL_PREFIX}1\n"
+        yield f"Applying terraform in: {resource_dir}{_describe_scope(targets, refresh)}\n"
+        async for line in self._stream_process(cmd, resource_dir, env_extra, resource_id, on_usage):
+            yield line
     
-    async def stream_destroy(self, resource_id: str, auto_approve: bool = False, var_files: Optional[List[str]] = None, env_extra: Optional[Dict[str, str]] = None) -> AsyncIterator[str]:
+    async def stream_destroy(self, resource_id: str, auto_approve: bool = False, var_files: Optional[List[str]] = None, env_extra: Optional[Dict[str, str]] = None, on_usage: Optional[Callable[[ProcessUsage], None]] = None) -> AsyncIterator[str]:
         resource_dir = self.get_resource_directory(resource_id)
         
         if not resource_dir:
@@ -321,7 +484,7 @@ class TerraformRunner:
             return
 
         init_failed = False
-        async for line in self.stream_init(resource_dir, env_extra=env_extra):
+        async for line in self.stream_init(resource_dir, env_extra=env_extra, resource_id=resource_id, on_usage=on_usage):
             if line.startswith(EXIT_SENTINEL_PREFIX):
                 init_failed = True
             yield line
@@ -336,35 +499,15 @@ class TerraformRunner:
         if auto_approve:
             cmd.append("-auto-approve")
 
-        env = self._build_env(env_extra)
-        try:
-            yield f"Destroying terraform in: {resource_dir}\n"
-            process = await asyncio.create_subprocess_exec(
-                *cmd,
-                stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.STDOUT,
-                cwd=str(resource_dir),
-                env=env
-            )
-
-            while True:
-                line = await process.stdout.readline()
-                if not line:
-                    break
-                yield line.decode()
-
-            code = (await process.wait()) or 0
-            yield f"{EXIT_SENTINEL_PREFIX}{0 if code == 0 else 1}\n"
-        except Exception as e:
-            logger.error(f"Error streaming terraform destroy: {e}")
-            yield f"Error: {str(e)}\n"
-            yield f"{EXIT_SENTINEL_PREFIX}1\n"
+        yield f"Destroying terraform in: {resource_dir}\n"
+        async for line in self._stream_process(cmd, resource_dir, env_extra, resource_id, on_usage):
+            yield line
 
     async def force_unlock(self, resource_id: str, lock_id: str, env_extra: Optional[Dict[str, str]] = None) -> tuple[bool, str]:
         resource_dir = self.get_resource_directory(resource_id)
         if not resource_dir or not resource_dir.exists():
             return False, f"Resource directory not found: {resource_id}"
-        init_ok, init_out = await self.ensure_terraform_init(resource_dir, env_extra=env_extra)
+        init_ok, init_out = await self.ensure_terraform_init(resource_dir, env_extra=env_extra, resource_id=resource_id)
         if not init_ok:
             return False, f"Terraform init failed: {init_out}"
         return await self._run_command(
@@ -373,7 +516,55 @@ class TerraformRunner:
             env_extra=env_extra,
         )
 
-    async def stream_plan(self, resource_id: str, var_files: Optional[List[str]] = None, env_extra: Optional[Dict[str, str]] = None) -> AsyncIterator[str]:
+    async def state_addresses(self, resource_id: str, env_extra: Optional[Dict[str, str]] = None) -> tuple[bool, List[str]]:
+        """Resource addresses in the instance's state (`terraform state list`), for picking targets."""
+        resource_dir = self.get_resource_directory(resource_id)
+        if not resource_dir or not resource_dir.exists():
+            return False, [f"Resource directory not found: {resource_id}"]
+        init_ok, init_out = await self.ensure_terraform_init(resource_dir, env_extra=env_extra, resource_id=resource_id)
+        if not init_ok:
+            return False, [f"Terraform init failed: {init_out}"]
+        success, output = await self._run_command(["terraform", "state", "list"], cwd=resource_dir, env_extra=env_extra)
+        if not success:
+            return False, [output.strip()]
+        return True, [line.strip() for line in output.splitlines() if line.strip()]
+
+    async def plan_refresh_only(self, resource_id: str, var_files: Optional[List[str]] = None,
+                                env_extra: Optional[Dict[str, str]] = None) -> tuple[int, str]:
+        """Lock-free `plan -refresh-only -detailed-exitcode -json`; returns (exit code, output).
+
+        Exit code 0 means no drift, 2 means drift, anything else is an error.
+        """
+        resource_dir = self.get_resource_directory(resource_id)
+        if not resource_dir or not resource_dir.exists():
+            return 1, f"Resource directory not found: {resource_id}"
+        init_ok, init_out = await self.ensure_terraform_init(resource_dir, env_extra=env_extra, resource_id=resource_id)
+        if not init_ok:
+            return 1, f"Terraform init failed: {init_out}"
+
+        cmd = ["terraform", "plan", "-refresh-only", "-detailed-exitcode", "-lock=false",
+               "-input=false", "-no-color", "-json"]
+        for f in var_files or []:
+            cmd.extend(["-var-file", f])
+        try:
+            process = await asyncio.create_subprocess_exec(
+                *cmd,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.STDOUT,
+                cwd=str(resource_dir),
+                env=self._build_env(env_extra)
+            )
+            # Recorded as "drift" so background scans don't skew the user's plan history
+            async with self._monitored(process, cmd, resource_id, operation=DRIFT_OPERATION):
+                stdout, _ = await process.communicate()
+            return process.returncode, stdout.decode(errors="replace") if stdout else ""
+        except Exception as e:
+            logger.error(f"Error running refresh-only plan for {resource_id}: {e}")
+            return 1, str(e)
+
+    async def stream_plan(self, resource_id: str, var_files: Optional[List[str]] = None, env_extra: Optional[Dict[str, str]] = None, on_usage: Optional[Callable[[ProcessUsage], None]] = None,
+                          targets: Optional[List[str]] = None, refresh: bool = True) -> AsyncIterator[str]:
+        scope = scope_args(targets, refresh)
         resource_dir = self.get_resource_directory(resource_id)
 
         if not resource_dir:
@@ -387,7 +578,7 @@ class TerraformRunner:
             return
 
         init_failed = False
-        async for line in self.stream_init(resource_dir, env_extra=env_extra):
+        async for line in self.stream_init(resource_dir, env_extra=env_extra, resource_id=resource_id, on_usage=on_usage):
             if line.startswith(EXIT_SENTINEL_PREFIX):
                 init_failed = True
             yield line
@@ -399,27 +590,17 @@ class TerraformRunner:
         if var_files:
             for f in var_files:
                 cmd.extend(["-var-file", f])
+        cmd.extend(scope)
 
-        env = self._build_env(env_extra)
-        try:
-            yield f"Planning terraform in: {resource_dir}\n"
-            process = await asyncio.create_subprocess_exec(
-                *cmd,
-                stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.STDOUT,
-                cwd=str(resource_dir),
-                env=env
-            )
+        yield f"Planning terraform in: {resource_dir}{_describe_scope(targets, refresh)}\n"
+        async for line in self._stream_process(cmd, resource_dir, env_extra, resource_id, on_usage):
+            yield line
 
-            while True:
-                line = await process.stdout.readline()
-                if not line:
-                    break
-                yield line.decode()
 
-            code = (await process.wait()) or 0
-            yield f"{EXIT_SENTINEL_PREFIX}{0 if code == 0 else 1}\n"
-        except Exception as e:
-            logger.error(f"Error streaming terraform plan: {e}")
-            yield f"Error: {str(e)}\n"
-            yield f"{EXIT_SENTINEL_PREFIX}1\n"
+def _describe_scope(targets: Optional[List[str]], refresh: bool) -> str:
+    notes = []
+    if targets:
+        notes.append(f"targets: {', '.join(targets)}")
+    if not refresh:
+        notes.append("refresh disabled")
+    return f" ({'; '.join(notes)})" if notes else ""
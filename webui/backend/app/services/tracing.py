@@ -0,0 +1,137 @@
+"""
+Tracing
+Datadog APM spans for the backend's own hot paths (routes, boto3, terraform
+subprocesses, SSH relay, kubeconfig setup)
+
+Spans are only emitted when ddtrace is installed, TRACING_ENABLED is not "false",
+and a trace agent answers at startup; otherwise every helper here is a no-op.
+"""
+import logging
+import os
+import sys
+import urllib.error
+import urllib.request
+from contextlib import contextmanager
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+TRACING_ENABLED = os.environ.get("TRACING_ENABLED", "true").lower() == "true"
+SERVICE = os.environ.get("DD_SERVICE", "dogstac-backend")
+AGENT_PROBE_TIMEOUT = float(os.environ.get("TRACING_AGENT_PROBE_TIMEOUT", 1.0))
+
+_tracer = None
+
+
+class _NoopSpan:
+    def set_tag(self, key, value=None) -> None:
+        pass
+
+    def set_metric(self, key, value) -> None:
+        pass
+
+    def set_exc_info(self, exc_type, exc_val, exc_tb) -> None:
+        pass
+
+    def finish(self) -> None:
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+def agent_url() -> str:
+    url = os.environ.get("DD_TRACE_AGENT_URL", "").strip()
+    if url:
+        return url.rstrip("/")
+    host = os.environ.get("DD_AGENT_HOST", "").strip() or "localhost"
+    port = os.environ.get("DD_TRACE_AGENT_PORT", "").strip() or "8126"
+    return f"http://{host}:{port}"
+
+
+def probe_agent(url: str, timeout: float = AGENT_PROBE_TIMEOUT) -> bool:
+    """Return True if something answers HTTP at the agent URL (any status counts)."""
+    try:
+        with urllib.request.urlopen(f"{url}/info", timeout=timeout):
+            return True
+    except urllib.error.HTTPError:
+        return True
+    except (urllib.error.URLError, OSError, ValueError) as e:
+        logger.debug(f"Trace agent probe to {url} failed: {e}")
+        return False
+
+
+def configure_tracing() -> bool:
+    """Enable ddtrace integrations if possible. Must run before the FastAPI app is created."""
+    global _tracer
+    if not TRACING_ENABLED:
+        return False
+    try:
+        import ddtrace
+    except ImportError:
+        logger.debug("ddtrace not installed, tracing disabled")
+        return False
+
+    url = agent_url()
+    if not probe_agent(url):
+        logger.info(f"No trace agent reachable at {url}, tracing disabled")
+        return False
+
+    # Route handlers plus every boto3 call (S3 status, SSM, STS) come from the integrations
+    ddtrace.patch(fastapi=True, botocore=True, requests=True)
+    try:
+        from ddtrace.runtime import RuntimeMetrics
+        RuntimeMetrics.enable()
+    except Exception as e:
+        logger.debug(f"Runtime metrics unavailable: {e}")
+    _tracer = ddtrace.tracer
+    logger.info(f"Tracing enabled for service {SERVICE} via {url}")
+    return True
+
+
+def use_tracer(tracer) -> None:
+    """Install a tracer with ddtrace's trace/start_span/current_span API (or None to disable)."""
+    global _tracer
+    _tracer = tracer
+
+
+def is_enabled() -> bool:
+    return _tracer is not None
+
+
+@contextmanager
+def span(name: str, resource: Optional[str] = None, span_type: Optional[str] = None,
+         activate: bool = True, **tags):
+    """Trace the enclosed block as ``name``; ``tags`` with a None value are skipped.
+
+    Use ``activate=False`` for spans held open across yields of an async
+    generator, so the consumer's own spans don't become its children.
+    """
+    tracer = _tracer
+    if tracer is None:
+        yield NOOP_SPAN
+        return
+    if activate:
+        current = tracer.trace(name, service=SERVICE, resource=resource, span_type=span_type)
+    else:
+        current = tracer.start_span(name, child_of=tracer.current_span(), service=SERVICE,
+                                    resource=resource, span_type=span_type, activate=False)
+    for key, value in tags.items():
+        if value is not None:
+            current.set_tag(key, value)
+    try:
+        yield current
+    except Exception:
+        current.set_exc_info(*sys.exc_info())
+        raise
+    finally:
+        current.finish()
+
+
+def mark_error(current, message: str) -> None:
+    """Flag ``current`` as failed without an exception (e.g. a non-zero exit code)."""
+    if current is NOOP_SPAN:
+        return
+    current.error = 1
+    current.set_tag("error.message", message)
+
@@ -0,0 +1,242 @@
+"""
+Variable Schema
+Per-resource variable schema compiled from each instance's variables.tf (parsed as
+HCL, so list/map/object and heredoc defaults survive) merged with RESOURCE_VARIABLE_CONFIGS
+
+Schemas are cached per instance directory and recompiled only when main.tf,
+variables.tf or .resource_id change (mtime/size), so serving the variables panel
+costs a directory stat instead of parsing HCL.
+"""
+import json
+import logging
+import os
+import re
+import threading
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import hcl2
+
+from app.config import (
+    get_resource_type_for_variables,
+    get_resource_variables,
+    is_common_variable,
+    is_excluded_variable,
+)
+from app.services import metrics
+from app.services.http_cache import file_generation
+from app.services.instance_discovery import get_resource_id_for_instance, get_resource_type_from_dir
+
+logger = logging.getLogger(__name__)
+
+SCHEMA_FILES = ("main.tf", "variables.tf", ".resource_id")
+SENSITIVE_MARKERS = ("password", "key", "secret", "token")
+DEFAULT_FROM_FILE = "variables.tf"
+DEFAULT_FROM_CONFIG = "config"
+
+_IDENTIFIER_RE = re.compile(r"^[A-Za-z_][A-Za-z0-9_-]*$")
+_QUOTED_TYPE_RE = re.compile(r"'\$\{([^}]*)\}'")
+_QUOTED_KEY_RE = re.compile(r"'([A-Za-z_][A-Za-z0-9_]*)'")
+_VARIABLE_NAME_RE = re.compile(r'^variable\s+"(\w+)"\s*\{', re.MULTILINE)
+
+
+def is_sensitive_name(name: str) -> bool:
+    return any(marker in name.lower() for marker in SENSITIVE_MARKERS)
+
+
+def _unescape(value: str) -> str:
+    # python-hcl2 keeps HCL escape sequences in quoted strings
+    return value.replace('\\"', '"').replace("\\n", "\n").replace("\\\\", "\\")
+
+
+def _type_expression(raw) -> Optional[str]:
+    """``${list(object({'name': '${string}'}))}`` -> ``list(object({name: string}))``."""
+    if not isinstance(raw, str):
+        return None
+    if raw.startswith("${") and raw.endswith("}"):
+        raw = raw[2:-1]
+    return _QUOTED_KEY_RE.sub(r"\1", _QUOTED_TYPE_RE.sub(r"\1", raw))
+
+
+def hcl_literal(value: Any, top_level: bool = True) -> str:
+    """Render a parsed default the way it is shown and written back in tfvars.
+
+    Top-level strings are returned bare (the panel edits the string itself);
+    nested values use HCL syntax.
+    """
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if value is None:
+        return "" if top_level else "null"
+    if isinstance(value, (int, float)):
+        return str(value)
+    if isinstance(value, str):
+        return value if top_level else json.dumps(value)
+    if isinstance(value, list):
+        return "[" + ", ".join(hcl_literal(v, top_level=False) for v in value) + "]"
+    if isinstance(value, dict):
+        if not value:
+            return "{}"
+        items = ", ".join(
+            f"{k if _IDENTIFIER_RE.match(str(k)) else json.dumps(str(k))} = {hcl_literal(v, top_level=False)}"
+            for k, v in value.items()
+        )
+        return "{ " + items + " }"
+    return str(value)
+
+
+def _clean(value: Any) -> Any:
+    if isinstance(value, str):
+        return _unescape(value)
+    if isinstance(value, list):
+        return [_clean(v) for v in value]
+    if isinstance(value, dict):
+        return {k: _clean(v) for k, v in value.items()}
+    return value
+
+
+@dataclass
+class VariableSpec:
+    name: str
+    type: Optional[str] = None
+    default: Any = None
+    default_source: Optional[str] = None  # DEFAULT_FROM_FILE or DEFAULT_FROM_CONFIG
+    description: str = ""
+    sensitive: bool = False
+    declared: bool = False
+    configured: bool = False
+
+    @property
+    def has_default(self) -> bool:
+        return self.default_source is not None
+
+    @property
+    def default_display(self) -> str:
+        return hcl_literal(self.default) if self.has_default else ""
+
+
+def parse_variables_tf(path: Path) -> Dict[str, VariableSpec]:
+    """Declared variables of one variables.tf, in file order.
+
+    Falls back to names only when the file is not valid HCL, so a half-edited
+    file still lists its variables.
+    """
+    try:
+        content = path.read_text(encoding="utf-8")
+    except OSError:
+        return {}
+    try:
+        blocks = hcl2.loads(content).get("variable", [])
+    except Exception as e:
+        logger.warning(f"Could not parse {path} as HCL, reading variable names only: {e}")
+        return {name: VariableSpec(name=name, declared=True, sensitive=is_sensitive_name(name))
+                for name in _VARIABLE_NAME_RE.findall(content)}
+
+    specs: Dict[str, VariableSpec] = {}
+    for block in blocks:
+        for name, body in block.items():
+            body = body or {}
+            default = _clean(body.get("default"))
+            specs[name] = VariableSpec(
+                name=name,
+                type=_type_expression(body.get("type")),
+                default=default,
+                default_source=DEFAULT_FROM_FILE if default is not None else None,
+                description=_clean(body.get("description") or ""),
+                sensitive=bool(body.get("sensitive")) or is_sensitive_name(name),
+                declared=True,
+            )
+    return specs
+
+
+@dataclass
+class ResourceSchema:
+    resource_id: str
+    dir_name: str
+    resource_type: str
+    variables: List[VariableSpec] = field(default_factory=list)
+    generation: Tuple = ()
+
+    def get(self, name: str) -> Optional[VariableSpec]:
+        for spec in self.variables:
+            if spec.name == name:
+                return spec
+        return None
+
+    @property
+    def names(self) -> List[str]:
+        return [spec.name for spec in self.variables]
+
+
+def compile_schema(instance_dir: Path, generation: Tuple = ()) -> ResourceSchema:
+    """Merge the instance's declared variables with its RESOURCE_VARIABLE_CONFIGS entries.
+
+    Common and excluded variables are left out (they belong to the root config).
+    Declared-only variables come first in name order, then configured ones in
+    config order; a variables.tf default wins over the config default.
+    """
+    resource_id = get_resource_id_for_instance(instance_dir)
+    resource_type = get_resource_type_from_dir(instance_dir.name).value
+    declared = parse_variables_tf(instance_dir / "variables.tf")
+    configs = get_resource_variables(get_resource_type_for_variables(resource_type, resource_id))
+    configured_names = {config.name for config in configs}
+
+    def _keep(name: str) -> bool:
+        return not is_excluded_variable(name) and not is_common_variable(name)
+
+    variables = [spec for name, spec in sorted(declared.items())
+                 if name not in configured_names and _keep(name)]
+    for config in configs:
+        if not _keep(config.name):
+            continue
+        spec = declared.get(config.name) or VariableSpec(name=config.name, sensitive=is_sensitive_name(config.name))
+        spec.configured = True
+        spec.description = config.description or spec.description
+        if not spec.has_default and config.default_value is not None:
+            spec.default, spec.default_source = config.default_value, DEFAULT_FROM_CONFIG
+        variables.append(spec)
+
+    metrics.VARIABLE_SCHEMA_COMPILE.inc()
+    return ResourceSchema(resource_id=resource_id, dir_name=instance_dir.name, resource_type=resource_type,
+                          variables=variables, generation=generation)
+
+
+class VariableSchemaCache:
+    """Compiled schemas for every instance directory, refreshed by stat."""
+
+    def __init__(self, instances_dir: Path):
+        self.instances_dir = Path(instances_dir)
+        self._by_dir: Dict[str, ResourceSchema] = {}
+        self._lock = threading.Lock()
+
+    def _refresh(self) -> Dict[str, ResourceSchema]:
+        current: Dict[str, ResourceSchema] = {}
+        if not self.instances_dir.exists():
+            self._by_dir = current
+            return current
+        with os.scandir(self.instances_dir) as it:
+            entries = sorted((entry.name, Path(entry.path)) for entry in it if entry.is_dir())
+        for dir_name, instance_dir in entries:
+            generation = tuple(file_generation(instance_dir / f) for f in SCHEMA_FILES)
+            if generation[0] is None:
+                continue
+            schema = self._by_dir.get(dir_name)
+            if schema is None or schema.generation != generation:
+                schema = compile_schema(instance_dir, generation)
+                logger.debug(f"Compiled variable schema for {dir_name} ({len(schema.variables)} variables)")
+            current[dir_name] = schema
+        self._by_dir = current
+        return current
+
+    def all(self) -> Dict[str, ResourceSchema]:
+        with self._lock:
+            return dict(self._refresh())
+
+    def get(self, resource_id: str) -> Optional[ResourceSchema]:
+        """Look up by resource id, then by instance directory name."""
+        schemas = self.all()
+        for schema in schemas.values():
+            if schema.resource_id == resource_id:
+                return schema
+        return schemas.get(resource_id)
@@ -0,0 +1,93 @@
+import asyncio
+import os
+import stat
+import sys
+from pathlib import Path
+
+import boto3
+import pytest
+
+from synthetic import build_tree, upload_states
+
+REGION = "us-east-1"
+FAKE_TERRAFORM = Path(__file__).parent / "fake_terraform.py"
+
+
+@pytest.fixture
+def aws(monkeypatch):
+    moto = pytest.importorskip("moto")
+    for key, value in {
+        "AWS_ACCESS_KEY_ID": "testing",
+        "AWS_SECRET_ACCESS_KEY": "testing",
+        "AWS_SESSION_TOKEN": "testing",
+        "AWS_REGION": REGION,
+        "AWS_DEFAULT_REGION": REGION,
+        "DOGSTAC_SALT": "bench",
+    }.items():
+        monkeypatch.setenv(key, value)
+    monkeypatch.delenv("AWS_PROFILE", raising=False)
+    with moto.mock_aws():
+        yield boto3.client("s3", region_name=REGION)
+
+
+@pytest.fixture
+def fake_terraform(tmp_path_factory, monkeypatch):
+    """Put a `terraform` executable backed by fake_terraform.py first on PATH."""
+    bin_dir = tmp_path_factory.mktemp("bin")
+    exe = bin_dir / "terraform"
+    exe.write_text(f"#!{sys.executable}\n" + FAKE_TERRAFORM.read_text())
+    exe.chmod(exe.stat().st_mode | stat.S_IEXEC)
+    monkeypatch.setenv("PATH", f"{bin_dir}{os.pathsep}{os.environ.get('PATH', '')}")
+    monkeypatch.setenv("FAKE_TF_RESOURCES", os.environ.get("FAKE_TF_RESOURCES", "40"))
+    monkeypatch.setenv("FAKE_TF_LINE_DELAY", os.environ.get("FAKE_TF_LINE_DELAY", "0.002"))
+    monkeypatch.delenv("TF_PLUGIN_CACHE_DIR", raising=False)
+    return exe
+
+
+@pytest.fixture
+def make_tree(tmp_path_factory, aws):
+    """Build a synthetic TERRAFORM_DIR with state objects in the mocked bucket."""
+    from app.services.config_manager import ConfigManager
+
+    def _make(instances: int, **kwargs):
+        root = tmp_path_factory.mktemp(f"tf{instances}")
+        ConfigManager._identity_hash_cache = None
+        bucket = ConfigManager(terraform_dir=str(root)).generate_bucket_name("bench")
+        tree = build_tree(root, instances, bucket, REGION, **kwargs)
+        upload_states(aws, tree)
+        return tree
+
+    return _make
+
+
+@pytest.fixture
+def bench_app(monkeypatch, tmp_path):
+    """Point the route modules' parser and runner at a synthetic tree."""
+    from app.routes import danger_zone, terraform
+    from app.services.process_monitor import UsageStore
+    from app.services.state_index import StateIndex
+    from app.services.terraform_parser import TerraformParser
+    from app.services.terraform_runner import TerraformRunner
+
+    def _use(tree):
+        runner = TerraformRunner(str(tree.root))
+        runner.usage_store = UsageStore(tmp_path / "usage")
+        state_index = StateIndex(tmp_path / "state-index.sqlite")
+        for module in (terraform, danger_zone):
+            parser = TerraformParser(str(tree.root))
+            parser.state_index = state_index
+            monkeypatch.setattr(module, "TERRAFORM_DIR", str(tree.root))
+            monkeypatch.setattr(module, "parser", parser)
+            monkeypatch.setattr(module, "runner", runner)
+        terraform.active_operations.clear()
+        return terraform, danger_zone
+
+    return _use
+
+
+@pytest.fixture
+def bench_loop():
+    loop = asyncio.new_event_loop()
+    yield loop
+    loop.close()
+
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Fake terraform executable for benchmarks
+Emits output shaped like terraform's for init/plan/apply/destroy/output with
+configurable size and pacing, without touching any cloud provider
+
+Environment:
+  FAKE_TF_RESOURCES   resources reported per instance (default 20)
+  FAKE_TF_LINE_DELAY  seconds to sleep between output lines (default 0)
+  FAKE_TF_EXIT_CODE   exit code for plan/apply/destroy (default 0)
+"""
+import os
+import sys
+import time
+from pathlib import Path
+
+RESOURCES = int(os.environ.get("FAKE_TF_RESOURCES", 20))
+LINE_DELAY = float(os.environ.get("FAKE_TF_LINE_DELAY", 0))
+EXIT_CODE = int(os.environ.get("FAKE_TF_EXIT_CODE", 0))
+
+
+def emit(line: str = "") -> None:
+    sys.stdout.write(line + "\n")
+    sys.stdout.flush()
+    if LINE_DELAY:
+        time.sleep(LINE_DELAY)
+
+
+def addresses():
+    module = Path.cwd().name.replace("-", "_")
+    kinds = ("aws_instance.this", "aws_security_group.this", "aws_iam_role.this", "aws_eip.this")
+    for i in range(RESOURCES):
+        yield f"module.{module}.{kinds[i % len(kinds)]}[{i}]"
+
+
+def init() -> int:
+    emit("Initializing the backend...")
+    emit()
+    emit('Successfully configured the backend "s3"! Terraform will automatically')
+    emit("use this backend unless the backend configuration changes.")
+    emit("Initializing modules...")
+    emit("Initializing provider plugins...")
+    emit('- Reusing previous version of hashicorp/aws from the dependency lock file')
+    emit("- Using hashicorp/aws v5.31.0 from the shared cache directory")
+    (Path.cwd() / ".terraform").mkdir(exist_ok=True)
+    emit()
+    emit("Terraform has been successfully initialized!")
+    return 0
+
+
+def plan() -> int:
+    for address in addresses():
+        emit(f"{address}: Refreshing state... [id=i-{abs(hash(address)) % 10**12:012x}]")
+    emit()
+    emit("Terraform used the selected providers to generate the following execution plan.")
+    emit("No changes. Your infrastructure matches the configuration.")
+    return EXIT_CODE
+
+
+def apply(verb: str) -> int:
+    for address in addresses():
+        emit(f"{address}: {verb.capitalize()}ing...")
+        emit(f"{address}: {verb.capitalize()} complete after 1s")
+    noun = "destroyed" if verb == "destroy" else "added"
+    emit()
+    emit(f"{'Destroy' if verb == 'destroy' else 'Apply'} complete! Resources: {RESOURCES} {noun}.")
+    return EXIT_CODE
+
+
+def main(argv) -> int:
+    command = argv[1] if len(argv) > 1 else "version"
+    if command == "init":
+        return init()
+    if command == "plan":
+        return plan()
+    if command == "apply":
+        return apply("creat")
+    if command == "destroy":
+        return apply("destroy")
+    if command == "output":
+        emit("{}")
+        return 0
+    if command == "version":
+        emit("Terraform v1.7.0")
+        return 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
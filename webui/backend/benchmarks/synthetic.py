@@ -0,0 +1,100 @@
+"""
+Synthetic TERRAFORM_DIR trees for benchmarks
+Builds N instance directories with backend config, large tfvars, and (optionally)
+matching state objects in S3
+"""
+import json
+from dataclasses import dataclass
+from pathlib import Path
+from typing import List
+
+PREFIXES = ("ec2", "eks", "ecs", "lambda", "dbm")
+
+MAIN_TF = """module "{module}" {{
+  source = "../../modules/{prefix}"
+
+  name_prefix = var.name_prefix
+  region      = var.region
+}}
+
+# {description}
+"""
+
+BACKEND_TF = """terraform {{
+  backend "s3" {{
+    bucket         = "{bucket}"
+    key            = "instances/{module}/terraform.tfstate"
+    region         = "{region}"
+    dynamodb_table = "{bucket}-locks"
+  }}
+}}
+"""
+
+
+@dataclass
+class SyntheticTree:
+    root: Path
+    bucket: str
+    region: str
+    resource_ids: List[str]
+    enabled_ids: List[str]
+
+
+def tfvars_body(variables: int, value_size: int = 64) -> str:
+    lines = ['name_prefix = "bench"', 'region = "us-east-1"', 'creator = "bench"', 'team = "perf"']
+    for i in range(variables):
+        lines.append(f'bench_var_{i:04d} = "{("v" * value_size)}"')
+    return "\n".join(lines) + "\n"
+
+
+def state_body(module: str, resources: int, attribute_bytes: int = 512) -> bytes:
+    blob = "x" * attribute_bytes
+    return json.dumps({
+        "version": 4,
+        "terraform_version": "1.7.0",
+        "serial": 1,
+        "resources": [
+            {
+                "module": f"module.{module}",
+                "mode": "managed",
+                "type": "aws_instance",
+                "name": f"r{i}",
+                "provider": 'provider["registry.terraform.io/hashicorp/aws"]',
+                "instances": [{"attributes": {"id": f"i-{i:012d}", "user_data": blob}}],
+            }
+            for i in range(resources)
+        ],
+    }).encode()
+
+
+def build_tree(root: Path, instances: int, bucket: str, region: str = "us-east-1",
+               tfvars_variables: int = 200, instance_variables: int = 50,
+               enabled_every: int = 10) -> SyntheticTree:
+    """Create ``instances`` instance directories under ``root``; every ``enabled_every``-th one is "enabled"."""
+    (root / "instances").mkdir(parents=True, exist_ok=True)
+    (root / "terraform.tfvars").write_text(tfvars_body(tfvars_variables))
+    resource_ids, enabled = [], []
+    for i in range(instances):
+        prefix = PREFIXES[i % len(PREFIXES)]
+        dir_name = f"{prefix}-bench-{i:04d}"
+        module = dir_name.replace("-", "_")
+        instance_dir = root / "instances" / dir_name
+        instance_dir.mkdir()
+        (instance_dir / "main.tf").write_text(MAIN_TF.format(module=module, prefix=prefix,
+                                                             description=f"Synthetic {prefix} instance {i}"))
+        (instance_dir / "backend.tf").write_text(BACKEND_TF.format(bucket=bucket, module=module, region=region))
+        (instance_dir / "terraform.tfvars").write_text(tfvars_body(instance_variables))
+        resource_ids.append(module)
+        if enabled_every and i % enabled_every == 0:
+            enabled.append(module)
+    return SyntheticTree(root=root, bucket=bucket, region=region, resource_ids=resource_ids, enabled_ids=enabled)
+
+
+def upload_states(s3_client, tree: SyntheticTree, resources_per_state: int = 50) -> None:
+    s3_client.create_bucket(Bucket=tree.bucket)
+    for module in tree.enabled_ids:
+        s3_client.put_object(
+            Bucket=tree.bucket,
+            Key=f"instances/{module}/terraform.tfstate",
+            Body=state_body(module, resources_per_state),
+        )
@@ -0,0 +1,131 @@
+"""
+Route-level benchmarks against synthetic trees of 10/100/1000 instances
+
+Handlers are awaited directly (no HTTP server), S3/SSM are served by moto and
+terraform is the fake executable from fake_terraform.py.
+"""
+import asyncio
+
+import pytest
+from fastapi import Request, Response
+
+SIZES = [10, 100, 1000]
+
+
+def _get():
+    return Request({"type": "http", "method": "GET", "headers": []}), Response()
+
+
+async def drain(response) -> int:
+    chunks = 0
+    async for _ in response.body_iterator:
+        chunks += 1
+    return chunks
+
+
+@pytest.fixture(params=SIZES, ids=lambda n: f"{n}-instances")
+def routes(request, make_tree, bench_app):
+    tree = make_tree(request.param)
+    terraform, danger_zone = bench_app(tree)
+    return tree, terraform, danger_zone
+
+
+def test_resources_cold(benchmark, bench_loop, routes):
+    tree, terraform, _ = routes
+
+    def _reset():
+        terraform.parser._s3_status_cache = None
+
+    result = benchmark.pedantic(lambda: bench_loop.run_until_complete(terraform.get_resources(*_get())),
+                                setup=_reset, rounds=5, iterations=1)
+    assert len(result) == len(tree.resource_ids)
+
+
+def test_resources_warm(benchmark, bench_loop, routes):
+    tree, terraform, _ = routes
+    terraform.parser.build_s3_status_cache()
+
+    result = benchmark(lambda: bench_loop.run_until_complete(terraform.get_resources(*_get())))
+    assert sum(1 for r in result if r.status.value == "enabled") == len(tree.enabled_ids)
+
+
+def test_state(benchmark, bench_loop, routes):
+    tree, terraform, _ = routes
+    terraform.parser.build_s3_status_cache()
+
+    state = benchmark(lambda: bench_loop.run_until_complete(terraform.get_state(*_get())))
+    assert len(state.resources) == len(tree.resource_ids)
+
+
+def test_instance_variable_write(benchmark, bench_loop, routes):
+    tree, terraform, _ = routes
+    resource_id = tree.resource_ids[len(tree.resource_ids) // 2]
+    counter = iter(range(10 ** 9))
+
+    def _write():
+        payload = {"value": f"value-{next(counter)}"}
+        return bench_loop.run_until_complete(
+            terraform.update_instance_variable(resource_id, "bench_var_0001", payload))
+
+    assert benchmark(_write)["success"]
+
+
+def test_root_variable_write(benchmark, bench_loop, routes):
+    _, terraform, _ = routes
+    counter = iter(range(10 ** 9))
+
+    def _write():
+        return bench_loop.run_until_complete(
+            terraform.update_root_variable("creator", {"value": f"bench-{next(counter)}"}))
+
+    assert benchmark(_write)["success"]
+
+
+def test_status_refresh(benchmark, bench_loop, routes):
+    tree, terraform, _ = routes
+    terraform.parser.build_s3_status_cache()
+    resource_id = tree.enabled_ids[0]
+
+    result = benchmark(lambda: bench_loop.run_until_complete(terraform.refresh_resource_status(resource_id)))
+    assert result["status"] == "enabled"
+
+
+def test_search(benchmark, bench_loop, routes):
+    tree, terraform, _ = routes
+    terraform.parser.build_s3_status_cache()
+
+    result = benchmark(lambda: bench_loop.run_until_complete(
+        terraform.search_resources(type="aws_instance", id="i-000000000007", tag=[], attr=None, value=None,
+                                   instance=None, limit=1000)))
+    assert result["count"] == len(tree.enabled_ids)
+
+
+@pytest.mark.parametrize("fan_out", [1, 5, 20])
+def test_plan_stream_fan_out(benchmark, bench_loop, fake_terraform, make_tree, bench_app, fan_out):
+    tree = make_tree(max(fan_out, 10))
+    terraform, _ = bench_app(tree)
+    targets = tree.resource_ids[:fan_out]
+
+    async def _plans():
+        # Called directly, so the Query() defaults of the route must be passed explicitly
+        responses = [await terraform.terraform_plan_stream_resource(rid, target=[], refresh=True)
+                     for rid in targets]
+        return await asyncio.gather(*(drain(r) for r in responses))
+
+    # Warm-up round runs the one-off `terraform init` in every target
+    bench_loop.run_until_complete(_plans())
+    chunks = benchmark.pedantic(lambda: bench_loop.run_until_complete(_plans()), rounds=3, iterations=1)
+    assert all(c > 0 for c in chunks)
+
+
+@pytest.mark.parametrize("instances", [10, 100])
+def test_destroy_all(benchmark, bench_loop, fake_terraform, make_tree, bench_app, instances):
+    tree = make_tree(instances)
+    _, danger_zone = bench_app(tree)
+
+    async def _destroy_all():
+        response = await danger_zone.destroy_all_resources_stream()
+        return await drain(response)
+
+    chunks = benchmark.pedantic(lambda: bench_loop.run_until_complete(_destroy_all()), rounds=2, iterations=1)
+    assert chunks > len(tree.enabled_ids)
@@ -0,0 +1,112 @@
+import json
+import os
+import time
+
+import pytest
+
+from app.services import aws_profile_resolver as resolver_module
+from app.services.aws_profile_resolver import AWSProfileResolver, SSOConfig
+
+
+AWS_CONFIG = """
+[profile sandbox]
+sso_session = corp
+sso_account_id = 123456789012
+sso_role_name = Admin
+region = us-east-1
+
+[sso-session corp]
+sso_start_url = https://corp.awsapps.com/start
+sso_region = us-east-1
+
+[profile static]
+region = us-west-2
+"""
+
+
+@pytest.fixture
+def resolver(tmp_path):
+    config_path = tmp_path / "config"
+    config_path.write_text(AWS_CONFIG)
+    return AWSProfileResolver(config_path=config_path, sso_cache_dir=tmp_path / "sso-cache")
+
+
+def _count_reads(monkeypatch):
+    reads = []
+    original = resolver_module.configparser.ConfigParser.read
+
+    def _read(self, filenames, encoding=None):
+        reads.append(filenames)
+        return original(self, filenames, encoding)
+
+    monkeypatch.setattr(resolver_module.configparser.ConfigParser, "read", _read)
+    return reads
+
+
+def test_sso_config_resolves_sso_session_section(resolver):
+    config = resolver.get_sso_config("sandbox")
+
+    assert config == SSOConfig(
+        start_url="https://corp.awsapps.com/start", sso_region="us-east-1",
+        account_id="123456789012", role_name="Admin", session_name="corp",
+    )
+    assert resolver.get_sso_config("static") is None
+    assert resolver.get_sso_config("missing") is None
+
+
+def test_config_is_parsed_once_until_file_changes(resolver, monkeypatch):
+    reads = _count_reads(monkeypatch)
+
+    for _ in range(5):
+        resolver.get_sso_config("sandbox")
+    assert len(reads) == 1
+
+    resolver.config_path.write_text(AWS_CONFIG.replace("Admin", "ReadOnly") + "\n")
+    stat = resolver.config_path.stat()
+    os.utime(resolver.config_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+
+    assert resolver.get_sso_config("sandbox").role_name == "ReadOnly"
+    assert len(reads) == 2
+
+
+def test_profile_defaults_to_aws_profile_env(resolver, monkeypatch):
+    monkeypatch.setenv("AWS_PROFILE", "sandbox")
+    assert resolver.get_sso_config().account_id == "123456789012"
+
+    monkeypatch.delenv("AWS_PROFILE")
+    assert resolver.get_sso_config() is None
+
+
+def test_written_token_is_served_from_cache(resolver, monkeypatch):
+    sso_config = resolver.get_sso_config("sandbox")
+    resolver.write_sso_token(sso_config, "token-1", expires_in=3600)
+
+    def _fail_open(*args, **kwargs):
+        raise AssertionError("token file should not be re-read")
+
+    monkeypatch.setattr(resolver_module, "open", _fail_open, raising=False)
+    token = resolver.read_sso_token(sso_config)
+
+    assert token.access_token == "token-1"
+    assert 3500 < token.expires_in() <= 3600
+
+
+def test_token_file_changes_and_expiry_are_detected(resolver):
+    sso_config = resolver.get_sso_config("sandbox")
+    cache_path = resolver.get_sso_cache_path(sso_config)
+    cache_path.parent.mkdir(parents=True)
+    cache_path.write_text(json.dumps({"accessToken": "cli-token", "expiresAt": "2099-01-01T00:00:00Z"}))
+
+    assert resolver.read_sso_token(sso_config).access_token == "cli-token"
+
+    cache_path.write_text(json.dumps({"accessToken": "old-token", "expiresAt": "2000-01-01T00:00:00UTC"}))
+    stat = cache_path.stat()
+    os.utime(cache_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+
+    assert resolver.read_sso_token(sso_config) is None
+    expired = resolver.read_sso_token(sso_config, include_expired=True)
+    assert expired.access_token == "old-token"
+    assert expired.expires_at < time.time()
+
+    cache_path.unlink()
+    assert resolver.read_sso_token(sso_config, include_expired=True) is None
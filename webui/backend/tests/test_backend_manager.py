@@ -0,0 +1,134 @@
+import threading
+import time
+from unittest.mock import patch
+
+import pytest
+from botocore.exceptions import ClientError
+
+from app.services.backend_manager import BackendManager, render_backend_config, write_backend_files
+
+
+def _not_found(operation):
+    return ClientError({"Error": {"Code": "404", "Message": "Not Found"}}, operation)
+
+
+class FakeWaiter:
+    def __init__(self, calls, name):
+        self.calls = calls
+        self.name = name
+
+    def wait(self, **kwargs):
+        self.calls.append(("wait", self.name, kwargs.get("WaiterConfig")))
+
+
+class FakeS3:
+    def __init__(self):
+        self.calls = []
+        self.in_flight = 0
+        self.peak = 0
+        self.aborts = 1
+        self._lock = threading.Lock()
+
+    def head_bucket(self, Bucket):
+        raise _not_found("HeadBucket")
+
+    def create_bucket(self, **kwargs):
+        self.calls.append(("create_bucket", kwargs))
+
+    def get_waiter(self, name):
+        return FakeWaiter(self.calls, name)
+
+    def _setting(self, name):
+        def call(**kwargs):
+            with self._lock:
+                self.in_flight += 1
+                self.peak = max(self.peak, self.in_flight)
+                abort = name == "put_bucket_tagging" and self.aborts > 0
+                if abort:
+                    self.aborts -= 1
+            time.sleep(0.05)
+            with self._lock:
+                self.in_flight -= 1
+                self.calls.append((name, kwargs["Bucket"]))
+            if abort:
+                raise ClientError({"Error": {"Code": "OperationAborted", "Message": "conflict"}}, name)
+        return call
+
+    def __getattr__(self, name):
+        if name.startswith("put_"):
+            return self._setting(name)
+        raise AttributeError(name)
+
+
+class FakeDynamo:
+    def __init__(self):
+        self.calls = []
+
+    def describe_table(self, TableName):
+        raise _not_found("DescribeTable")
+
+    def create_table(self, **kwargs):
+        self.calls.append(("create_table", kwargs["TableName"]))
+
+    def get_waiter(self, name):
+        return FakeWaiter(self.calls, name)
+
+
+@pytest.fixture
+def manager():
+    s3, dynamo = FakeS3(), FakeDynamo()
+    with patch("app.services.backend_manager.boto3") as mock_boto3:
+        mock_boto3.client.side_effect = lambda service, **kw: s3 if service == "s3" else dynamo
+        mgr = BackendManager(region="us-west-2")
+    return mgr
+
+
+def test_setup_applies_bucket_settings_concurrently_and_records_timings(manager):
+    result = manager.setup_backend_infrastructure("state-bucket", "locks")
+
+    assert result["success"]
+    assert result["bucket"]["created"] and result["dynamodb"]["created"]
+    assert manager.s3_client.peak > 1
+    applied = {c[0] for c in manager.s3_client.calls if c[0].startswith("put_")}
+    assert applied == {"put_bucket_versioning", "put_bucket_encryption", "put_public_access_block",
+                       "put_bucket_lifecycle_configuration", "put_bucket_tagging"}
+    assert ("wait", "bucket_exists", {"Delay": 1, "MaxAttempts": 30}) in manager.s3_client.calls
+    assert ("wait", "table_exists", {"Delay": 2, "MaxAttempts": 60}) in manager.dynamodb_client.calls
+    assert {"bucket.create", "bucket.tagging", "table.create", "table.wait", "total"} <= set(result["timings"])
+
+
+def test_setup_reports_errors_from_either_resource(manager):
+    def _fail(**kwargs):
+        raise ClientError({"Error": {"Code": "AccessDenied", "Message": "denied"}}, "CreateTable")
+
+    manager.dynamodb_client.create_table = _fail
+
+    result = manager.setup_backend_infrastructure("state-bucket", "locks")
+
+    assert not result["success"]
+    assert result["bucket"]["created"]
+    assert result["errors"] == ["DynamoDB error: An error occurred (AccessDenied) when calling the CreateTable operation: denied"]
+
+
+def test_render_matches_backend_layout():
+    content = render_backend_config("bucket-a", "ec2-basic", "ap-northeast-2", "locks")
+
+    assert 'bucket         = "bucket-a"' in content
+    assert 'key            = "instances/ec2-basic/terraform.tfstate"' in content
+    assert 'region         = "ap-northeast-2"' in content
+    assert 'dynamodb_table = "locks"' in content
+
+
+def test_write_backend_files_only_fills_missing(tmp_terraform_dir):
+    instances = tmp_terraform_dir / "instances"
+    for name in ("a", "b", "not-an-instance"):
+        (instances / name).mkdir()
+    (instances / "a" / "main.tf").write_text("")
+    (instances / "b" / "main.tf").write_text("")
+    (instances / "b" / "backend.tf").write_text("# existing\n")
+
+    written = write_backend_files(instances, "bucket-a", "locks", "us-east-1", lambda d: f"id-{d.name}")
+
+    assert written == ["a"]
+    assert "instances/id-a/terraform.tfstate" in (instances / "a" / "backend.tf").read_text()
+    assert (instances / "b" / "backend.tf").read_text() == "# existing\n"
@@ -0,0 +1,137 @@
+import gc
+import threading
+import time
+
+import pytest
+
+from app.services import credential_manager as cm
+from app.services.credential_manager import CredentialManager
+
+
+class _FakeSTS:
+    def __init__(self, calls, fail=False):
+        self._calls = calls
+        self._fail = fail
+
+    def get_caller_identity(self):
+        self._calls.append(1)
+        if self._fail:
+            raise RuntimeError("ExpiredToken")
+        return {"Account": "123456789012", "Arn": "arn:aws:iam::123456789012:user/test"}
+
+
+@pytest.fixture
+def manager(monkeypatch):
+    monkeypatch.delenv("AWS_ACCESS_KEY_ID", raising=False)
+    monkeypatch.delenv("AWS_SECRET_ACCESS_KEY", raising=False)
+    monkeypatch.delenv("AWS_SESSION_TOKEN", raising=False)
+    mgr = CredentialManager()
+    mgr.sts_calls = []
+    monkeypatch.setattr(mgr, "_build_sts_client", lambda: _FakeSTS(mgr.sts_calls))
+    monkeypatch.setattr(mgr, "_session_credentials_expiry", lambda: None)
+    return mgr
+
+
+def test_identity_is_cached_until_ttl(manager, monkeypatch):
+    first = manager.get_identity()
+    second = manager.get_identity()
+
+    assert first == second
+    assert len(manager.sts_calls) == 1
+    assert manager.state == cm.STATE_VALID
+
+    manager._identity_checked_at -= cm.IDENTITY_CACHE_TTL + 1
+    manager.get_identity()
+    assert len(manager.sts_calls) == 2
+
+
+def test_failed_identity_check_marks_expired(manager, monkeypatch):
+    monkeypatch.setattr(manager, "_build_sts_client", lambda: _FakeSTS(manager.sts_calls, fail=True))
+
+    with pytest.raises(RuntimeError):
+        manager.get_identity()
+    assert manager.state == cm.STATE_EXPIRED
+    assert manager.get_credential_health()["status"] == cm.STATE_EXPIRED
+
+
+def test_refresh_is_single_flight(manager, monkeypatch):
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def _slow_refresh():
+        calls.append(1)
+        started.set()
+        release.wait(timeout=5)
+        return True
+
+    monkeypatch.setattr(manager, "_refresh_credentials", _slow_refresh)
+    results = []
+    leader = threading.Thread(target=lambda: results.append(manager.try_refresh_credentials()))
+    leader.start()
+    started.wait(timeout=5)
+    assert manager.state == cm.STATE_REFRESHING
+
+    followers = [threading.Thread(target=lambda: results.append(manager.try_refresh_credentials()))
+                 for _ in range(5)]
+    for t in followers:
+        t.start()
+    time.sleep(0.05)
+    release.set()
+    for t in [leader] + followers:
+        t.join(timeout=5)
+
+    assert calls == [1]
+    assert results == [True] * 6
+
+
+def test_applying_credentials_notifies_subscribers_and_resets_identity(manager, monkeypatch):
+    notified = []
+
+    class Holder:
+        def on_change(self):
+            notified.append("holder")
+
+    holder = Holder()
+    manager.subscribe(holder.on_change)
+    manager.subscribe(lambda: notified.append("fn"))
+    manager.get_identity()
+
+    expiry_ms = int((time.time() + 3600) * 1000)
+    manager._apply_role_credentials({
+        "accessKeyId": "AKIA", "secretAccessKey": "secret", "sessionToken": "token", "expiration": expiry_ms,
+    })
+
+    assert notified == ["holder", "fn"]
+    assert manager.generation == 1
+    assert manager.credentials_expire_at == pytest.approx(expiry_ms / 1000)
+    manager.get_identity()
+    assert len(manager.sts_calls) == 2
+
+
+def test_bound_method_subscribers_are_weak(manager):
+    notified = []
+
+    class Holder:
+        def on_change(self):
+            notified.append(1)
+
+    holder = Holder()
+    manager.subscribe(holder.on_change)
+    del holder
+    gc.collect()
+
+    manager._publish_credentials_changed()
+
+    assert notified == []
+    assert manager._subscribers == []
+
+
+def test_health_reports_expiring_soon(manager):
+    manager.get_identity()
+    manager._credentials_expire_at = time.time() + cm.CREDENTIAL_EXPIRY_BUFFER / 2
+
+    health = manager.get_credential_health()
+
+    assert health["status"] == cm.STATE_EXPIRING
+    assert 0 < health["credentials_expire_in"] <= cm.CREDENTIAL_EXPIRY_BUFFER
@@ -0,0 +1,132 @@
+import asyncio
+import json
+import os
+import stat
+
+from fastapi import Request, Response
+
+from app.models.schemas import ResourceStatus
+from app.routes import terraform as terraform_routes
+from app.services.drift_scanner import (
+    DRIFT_CLEAN, DRIFT_DRIFTED, DRIFT_ERROR, DRIFT_SKIPPED, DriftResult, DriftScanner, DriftStore,
+    parse_refresh_plan,
+)
+from app.services.event_bus import RESOURCE_DRIFT, event_bus
+from app.services.process_monitor import UsageStore
+from app.services.terraform_parser import TerraformParser
+from app.services.terraform_runner import TerraformRunner
+
+DRIFT_LINES = "\n".join(json.dumps(m) for m in [
+    {"@level": "info", "type": "version", "terraform": "1.7.5"},
+    {"type": "resource_drift", "change": {
+        "resource": {"addr": "module.ec2.aws_instance.this", "resource_type": "aws_instance"}, "action": "update"}},
+    {"type": "resource_drift", "change": {
+        "resource": {"addr": "module.ec2.aws_eip.this", "resource_type": "aws_eip"}, "action": "delete"}},
+    {"type": "change_summary", "changes": {"operation": "plan"}},
+])
+
+
+def test_parse_refresh_plan_exit_codes():
+    assert parse_refresh_plan(0, DRIFT_LINES) == (DRIFT_CLEAN, [], None)
+
+    status, changes, error = parse_refresh_plan(2, DRIFT_LINES)
+    assert status == DRIFT_DRIFTED and error is None
+    assert changes == [
+        {"address": "module.ec2.aws_instance.this", "resource_type": "aws_instance", "action": "update"},
+        {"address": "module.ec2.aws_eip.this", "resource_type": "aws_eip", "action": "delete"},
+    ]
+
+    diagnostic = json.dumps({"type": "diagnostic", "diagnostic": {"severity": "error", "summary": "No valid credential sources found"}})
+    assert parse_refresh_plan(1, diagnostic) == (DRIFT_ERROR, [], "No valid credential sources found")
+    assert parse_refresh_plan(1, "panic: boom\n")[2] == "panic: boom"
+
+
+async def test_scan_bounds_concurrency_and_skips_busy_instances(tmp_path):
+    running, peak = 0, 0
+
+    async def _check(resource_id):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+        return (2, DRIFT_LINES) if resource_id == "ec2_basic" else (0, "")
+
+    scanner = DriftScanner(_check, lambda: [], is_busy=lambda rid: rid == "eks_cluster",
+                           store=DriftStore(tmp_path / "drift.json"), max_concurrency=2)
+    counts = await scanner.scan(["ec2_basic", "rds_postgres", "ecs_fargate", "lambda_fn", "eks_cluster"])
+
+    assert counts == {DRIFT_DRIFTED: 1, DRIFT_CLEAN: 3, DRIFT_SKIPPED: 1}
+    assert peak == 2
+    assert scanner.store.drifted("ec2_basic") is True
+    assert scanner.store.drifted("rds_postgres") is False
+    assert scanner.store.get("eks_cluster") is None
+
+    reloaded = DriftStore(tmp_path / "drift.json")
+    assert len(reloaded.get("ec2_basic").changes) == 2
+
+
+async def test_drift_flag_changes_are_published(tmp_path):
+    outcomes = iter([(2, DRIFT_LINES), (2, DRIFT_LINES), (0, "")])
+
+    async def _check(resource_id):
+        return next(outcomes)
+
+    scanner = DriftScanner(_check, lambda: ["ec2_basic"], store=DriftStore(tmp_path / "drift.json"))
+    subscription = event_bus.subscribe(types=[RESOURCE_DRIFT])
+    try:
+        for _ in range(3):
+            await scanner.scan()
+    finally:
+        event_bus.unsubscribe(subscription)
+
+    flags = [subscription.queue.get_nowait().data["drifted"] for _ in range(subscription.queue.qsize())]
+    assert flags == [True, False]
+
+
+async def test_plan_refresh_only_reports_detailed_exit_code(tmp_terraform_dir, tmp_path, monkeypatch):
+    bin_dir = tmp_path / "bin"
+    bin_dir.mkdir()
+    fake = bin_dir / "terraform"
+    fake.write_text("#!/bin/sh\necho \"$@\" > args.txt\nexit 2\n")
+    fake.chmod(fake.stat().st_mode | stat.S_IEXEC)
+    monkeypatch.setenv("PATH", f"{bin_dir}{os.pathsep}{os.environ['PATH']}")
+
+    instance = tmp_terraform_dir / "instances" / "ec2-basic"
+    instance.mkdir()
+    (instance / "main.tf").write_text('module "ec2_basic" {\n}\n')
+    runner = TerraformRunner(str(tmp_terraform_dir))
+    runner.usage_store = UsageStore(tmp_path / "usage")
+
+    async def _initialized(*args, **kwargs):
+        return True, "Already initialized"
+
+    monkeypatch.setattr(runner, "ensure_terraform_init", _initialized)
+    exit_code, _ = await runner.plan_refresh_only("ec2_basic", var_files=["terraform.tfvars"])
+
+    args = (instance / "args.txt").read_text().split()
+    assert exit_code == 2
+    assert args[:2] == ["plan", "-refresh-only"]
+    assert {"-detailed-exitcode", "-lock=false", "-json"} <= set(args)
+    assert args[-2:] == ["-var-file", "terraform.tfvars"]
+    assert [r["operation"] for r in runner.usage_store.history("ec2_basic")] == ["drift"]
+
+
+def _get():
+    return Request({"type": "http", "method": "GET", "headers": []}), Response()
+
+
+async def test_resources_carry_drift_flag(tmp_terraform_dir, tmp_path, monkeypatch):
+    instance = tmp_terraform_dir / "instances" / "ec2-basic"
+    instance.mkdir()
+    (instance / "main.tf").write_text('module "ec2_basic" {\n}\n')
+    parser = TerraformParser(str(tmp_terraform_dir))
+    monkeypatch.setattr(parser, "_fetch_s3_statuses_uncached", lambda: {"ec2-basic": ResourceStatus.ENABLED})
+    monkeypatch.setattr(terraform_routes, "parser", parser)
+    monkeypatch.setattr(terraform_routes.drift_scanner, "store", DriftStore(tmp_path / "drift.json"))
+
+    assert terraform_routes._drift_targets() == ["ec2_basic"]
+    assert (await terraform_routes.get_resources(*_get()))[0].drifted is None
+
+    terraform_routes.drift_scanner.store.record(DriftResult("ec2_basic", DRIFT_DRIFTED))
+    assert (await terraform_routes.get_resources(*_get()))[0].drifted is True
@@ -196,3 +196,14 @@ def test_sync_layout_removes_deleted(manager):
     assert not any(n.get("id") == "also-deleted" for n in synced)
     assert any(n.get("id") == "agent-datadog-operator" or
                ("children" in n and "agent-datadog-operator" in n["children"]) for n in synced)
+
+
+def test_mark_deployed_records_run_metadata(manager):
+    run = {"run_id": "abc123", "status": "partial"}
+    manager.mark_deployed_many(["agent-helm", "agent-datadog-operator"], run)
+    manager.mark_deployed("agent-helm")
+
+    deployments = manager.get_deployments()
+    assert deployments["agent-datadog-operator"]["run"] == run
+    assert "run" not in deployments["agent-helm"]
+    assert "deployed_at" in deployments["agent-helm"]
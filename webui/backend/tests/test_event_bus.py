@@ -0,0 +1,152 @@
+import asyncio
+import json
+import threading
+
+from fastapi import FastAPI
+
+from app.models.schemas import ResourceStatus
+from app.routes import events
+from app.services.event_bus import (
+    CREDENTIAL_HEALTH, OPERATION_FINISHED, RESOURCE_STATUS, TFVARS_CHANGED, EventBus, event_bus,
+)
+from app.services.terraform_parser import TerraformParser
+
+
+async def test_subscriptions_filter_by_type_and_resource():
+    bus = EventBus()
+    everything = bus.subscribe()
+    ec2_only = bus.subscribe(resources=["ec2_basic"])
+    credentials = bus.subscribe(types=[CREDENTIAL_HEALTH])
+
+    bus.publish(RESOURCE_STATUS, "ec2_basic", status="enabled")
+    bus.publish(RESOURCE_STATUS, "rds_postgres", status="enabled")
+    bus.publish(CREDENTIAL_HEALTH, state="expired")
+
+    assert everything.queue.qsize() == 3
+    assert [(await ec2_only.get()).resource_id for _ in range(2)] == ["ec2_basic", None]
+    assert credentials.queue.qsize() == 1
+
+    bus.unsubscribe(everything)
+    assert len(bus) == 2
+
+
+async def test_publish_from_worker_thread_and_overflow():
+    bus = EventBus()
+    subscription = bus.subscribe()
+    subscription.queue = asyncio.Queue(maxsize=2)
+
+    def _publish():
+        for i in range(3):
+            bus.publish(TFVARS_CHANGED, variable=f"v{i}")
+
+    worker = threading.Thread(target=_publish)
+    worker.start()
+    worker.join()
+    await asyncio.sleep(0)
+
+    assert subscription.take_dropped() == 1
+    assert [(await subscription.get()).data["variable"] for _ in range(2)] == ["v1", "v2"]
+
+
+def test_publish_without_subscribers_is_free():
+    bus = EventBus()
+    bus.publish(RESOURCE_STATUS, "ec2_basic")
+    assert next(bus._seq) == 1
+
+
+async def test_parser_publishes_status_and_tfvars_changes(tmp_terraform_dir, monkeypatch):
+    instance = tmp_terraform_dir / "instances" / "ec2-basic"
+    instance.mkdir()
+    (instance / "main.tf").write_text('module "ec2_basic" {\n}\n')
+    parser = TerraformParser(str(tmp_terraform_dir))
+    monkeypatch.setattr(parser, "_fetch_s3_statuses_uncached", lambda: {"ec2-basic": ResourceStatus.DISABLED})
+    monkeypatch.setattr(parser, "_fetch_single_s3_status_uncached", lambda dir_name: ResourceStatus.ENABLED)
+    parser.build_s3_status_cache()
+
+    subscription = event_bus.subscribe()
+    try:
+        parser.invalidate_s3_status("ec2-basic")
+        parser.invalidate_s3_status("ec2-basic")
+        parser.write_tfvars_to_path(instance / "terraform.tfvars", "instance_type", "t3.small")
+
+        status = await subscription.get()
+        tfvars = await subscription.get()
+        assert subscription.queue.empty()
+    finally:
+        event_bus.unsubscribe(subscription)
+
+    assert (status.type, status.resource_id) == (RESOURCE_STATUS, "ec2_basic")
+    assert status.data == {"dir_name": "ec2-basic", "status": "enabled", "previous": "disabled"}
+    assert (tfvars.type, tfvars.resource_id) == (TFVARS_CHANGED, "ec2_basic")
+    assert tfvars.data["variable"] == "instance_type" and tfvars.data["scope"] == "instance"
+
+
+async def _websocket(app, query, incoming):
+    sent = []
+    inbox = asyncio.Queue()
+    for message in [{"type": "websocket.connect"}] + incoming:
+        inbox.put_nowait(message)
+
+    async def _send(message):
+        sent.append(message)
+
+    scope = {"type": "websocket", "path": "/api/events/ws", "raw_path": b"/api/events/ws", "root_path": "",
+             "query_string": query, "headers": [], "scheme": "ws", "server": ("test", 80), "subprotocols": []}
+    task = asyncio.create_task(app(scope, inbox.get, _send))
+    return task, inbox, sent
+
+
+def _texts(sent):
+    return [json.loads(m["text"]) for m in sent if m["type"] == "websocket.send"]
+
+
+async def test_websocket_pushes_filtered_events():
+    app = FastAPI()
+    app.include_router(events.router)
+    task, inbox, sent = await _websocket(app, b"types=operation.finished", [])
+    while not sent[1:]:
+        await asyncio.sleep(0.01)
+
+    event_bus.publish(RESOURCE_STATUS, "ec2_basic", status="enabled")
+    event_bus.publish(OPERATION_FINISHED, "ec2_basic", operation="apply", status="completed", exit_code=0)
+    inbox.put_nowait({"type": "websocket.receive", "text": json.dumps({"type": "subscribe", "types": ["bogus"]})})
+    while len(_texts(sent)) < 3:
+        await asyncio.sleep(0.01)
+    inbox.put_nowait({"type": "websocket.disconnect", "code": 1000})
+    await asyncio.wait_for(task, 1)
+
+    subscribed, finished, error = _texts(sent)
+    assert subscribed == {"type": "subscribed", "types": ["operation.finished"], "resources": []}
+    assert finished["type"] == OPERATION_FINISHED and finished["data"]["status"] == "completed"
+    assert error["type"] == "error" and "bogus" in error["data"]
+    assert len(event_bus) == 0
+
+
+async def test_websocket_rejects_unknown_types():
+    app = FastAPI()
+    app.include_router(events.router)
+    task, _, sent = await _websocket(app, b"types=nope", [])
+    await asyncio.wait_for(task, 1)
+
+    assert _texts(sent)[0]["type"] == "error"
+    assert sent[-1]["type"] == "websocket.close" and sent[-1]["code"] == 1008
+
+
+async def test_websocket_survives_malformed_messages():
+    app = FastAPI()
+    app.include_router(events.router)
+    task, inbox, sent = await _websocket(app, b"", [])
+    while not sent[1:]:
+        await asyncio.sleep(0.01)
+
+    for text in ("not json", "[1, 2]", json.dumps({"type": "subscribe", "types": 5})):
+        inbox.put_nowait({"type": "websocket.receive", "text": text})
+    inbox.put_nowait({"type": "websocket.receive", "text": json.dumps({"type": "subscribe", "types": ["operation.finished"]})})
+    while len(_texts(sent)) < 5:
+        await asyncio.sleep(0.01)
+    inbox.put_nowait({"type": "websocket.disconnect", "code": 1000})
+    await asyncio.wait_for(task, 1)
+
+    replies = _texts(sent)
+    assert [r["type"] for r in replies] == ["subscribed", "error", "error", "error", "subscribed"]
+    assert replies[-1]["types"] == ["operation.finished"]
@@ -0,0 +1,121 @@
+from fastapi import FastAPI
+
+from app.models.schemas import ResourceStatus
+from app.routes import eks_manage, terraform as terraform_routes
+from app.services import http_cache
+from app.services.eks_preset_manager import EKSPresetManager
+from app.services.terraform_parser import TerraformParser
+
+
+async def _get(app, path, headers=()):
+    sent = []
+
+    async def _receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def _send(message):
+        sent.append(message)
+
+    scope = {"type": "http", "method": "GET", "path": path, "raw_path": path.encode(), "root_path": "",
+             "query_string": b"", "headers": list(headers), "scheme": "http", "server": ("test", 80)}
+    await app(scope, _receive, _send)
+    body = b"".join(m.get("body", b"") for m in sent[1:])
+    return sent[0]["status"], dict(sent[0]["headers"]), body
+
+
+def _parser(tmp_terraform_dir, monkeypatch):
+    parser = TerraformParser(str(tmp_terraform_dir))
+    parser._s3_bucket_available = False
+    monkeypatch.setattr(parser, "_fetch_s3_statuses_uncached", lambda: {})
+    monkeypatch.setattr(parser, "_fetch_single_s3_status_uncached", lambda dir_name: ResourceStatus.ENABLED)
+    monkeypatch.setattr(terraform_routes, "parser", parser)
+    return parser
+
+
+def _instance(tmp_terraform_dir, name):
+    instance = tmp_terraform_dir / "instances" / name
+    instance.mkdir()
+    (instance / "main.tf").write_text(f"# {name}\n")
+    return instance
+
+
+def test_if_none_match_parsing():
+    etag = http_cache.etag_for((1, 2))
+    assert http_cache._matches(etag, etag)
+    assert http_cache._matches(f'"other", W/{etag}', etag)
+    assert http_cache._matches("*", etag)
+    assert not http_cache._matches('"other"', etag)
+
+
+async def test_variables_revalidate_until_tfvars_change(tmp_terraform_dir, root_tfvars, monkeypatch):
+    parser = _parser(tmp_terraform_dir, monkeypatch)
+    root_tfvars.write_text('region = "us-east-1"\n')
+    app = FastAPI()
+    app.include_router(terraform_routes.router)
+
+    status, headers, body = await _get(app, "/api/terraform/variables")
+    etag = headers[b"etag"]
+    assert status == 200 and body
+    assert headers[b"cache-control"] == http_cache.CACHE_CONTROL.encode()
+
+    status, headers, body = await _get(app, "/api/terraform/variables", [(b"if-none-match", etag)])
+    assert status == 304 and body == b"" and headers[b"etag"] == etag
+
+    assert parser.write_root_tfvars("region", "eu-west-1")
+    status, headers, body = await _get(app, "/api/terraform/variables", [(b"if-none-match", etag)])
+    assert status == 200 and b"eu-west-1" in body and headers[b"etag"] != etag
+
+
+async def test_resources_etag_follows_status_cache(tmp_terraform_dir, monkeypatch):
+    parser = _parser(tmp_terraform_dir, monkeypatch)
+    _instance(tmp_terraform_dir, "ec2-basic")
+    app = FastAPI()
+    app.include_router(terraform_routes.router)
+
+    status, headers, _ = await _get(app, "/api/terraform/resources")
+    assert status == 200 and b"etag" not in headers
+
+    parser.build_s3_status_cache()
+    _, headers, _ = await _get(app, "/api/terraform/resources")
+    etag = headers[b"etag"]
+    status, _, _ = await _get(app, "/api/terraform/resources", [(b"if-none-match", etag)])
+    assert status == 304
+
+    parser.invalidate_s3_status("ec2-basic")
+    status, _, _ = await _get(app, "/api/terraform/resources", [(b"if-none-match", etag)])
+    assert status == 200
+
+    before = parser.resources_generation()
+    _instance(tmp_terraform_dir, "rds-postgres")
+    assert parser.resources_generation() != before
+
+
+def test_instances_generation_tracks_instance_tfvars(tmp_terraform_dir, monkeypatch):
+    parser = _parser(tmp_terraform_dir, monkeypatch)
+    instance = _instance(tmp_terraform_dir, "ec2-basic")
+    before = parser.instances_generation()
+
+    (instance / "terraform.tfvars").write_text('instance_type = "t3.small"\n')
+    assert parser.instances_generation() != before
+
+
+async def test_preset_index_generation(tmp_path, monkeypatch):
+    manager = EKSPresetManager(str(tmp_path))
+    monkeypatch.setattr(manager, "_get_s3_manager", lambda: None)
+    monkeypatch.setattr(eks_manage, "preset_manager", manager)
+    app = FastAPI()
+    app.include_router(eks_manage.router)
+
+    assert manager.index_generation() is None
+    manager.initialize_local_cache()
+    manager.save_preset("nginx", {"name": "nginx", "description": "", "type": "kubectl"})
+
+    _, headers, body = await _get(app, "/api/terraform/eks/manage/presets")
+    etag = headers[b"etag"]
+    assert b"nginx" in body
+    status, _, _ = await _get(app, "/api/terraform/eks/manage/presets", [(b"if-none-match", etag)])
+    assert status == 304
+
+    manager.delete_preset("nginx")
+    status, _, body = await _get(app, "/api/terraform/eks/manage/presets", [(b"if-none-match", etag)])
+    assert status == 200 and b"nginx" not in body
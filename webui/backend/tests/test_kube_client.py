@@ -0,0 +1,153 @@
+import pytest
+
+from app.services import kube_client as kc
+from app.services.kube_client import KubeClient, KubeClientUnavailable, format_table, parse_kubectl_command
+
+
+@pytest.mark.parametrize("command, expected", [
+    ("kubectl get pods", {"verb": "get", "resource": "pods", "name": None, "namespace": "default"}),
+    ("kubectl get deploy/web -n shop", {"resource": "deploy", "name": "web", "namespace": "shop"}),
+    ("kubectl get pods -A -o wide", {"all_namespaces": True, "wide": True}),
+    ("kubectl get po -l app=web --watch", {"selector": "app=web", "watch": True}),
+])
+def test_parse_supported_commands(command, expected):
+    plan = parse_kubectl_command(command)
+
+    assert plan is not None
+    for key, value in expected.items():
+        assert getattr(plan, key) == value
+
+
+@pytest.mark.parametrize("command", [
+    "kubectl apply -f app.yaml",
+    "kubectl get pods -o yaml",
+    "kubectl get pods,svc",
+    "kubectl describe pods",
+    "kubectl describe pod web-0 --namespace=shop",
+    "kubectl get pods --sort-by=.metadata.name",
+    "helm list",
+])
+def test_parse_falls_back_for_unsupported_commands(command):
+    assert parse_kubectl_command(command) is None
+
+
+def _pod_table(rows):
+    return {
+        "kind": "Table",
+        "metadata": {"resourceVersion": "42"},
+        "columnDefinitions": [
+            {"name": "Name", "priority": 0},
+            {"name": "Ready", "priority": 0},
+            {"name": "Status", "priority": 0},
+            {"name": "IP", "priority": 1},
+        ],
+        "rows": [
+            {"cells": cells, "object": {"metadata": {"namespace": ns}}}
+            for ns, cells in rows
+        ],
+    }
+
+
+def test_format_table_aligns_columns_like_kubectl():
+    table = _pod_table([("default", ["web-0", "1/1", "Running", "10.0.0.1"]),
+                        ("kube-system", ["coredns-abcdef", "1/1", "Running", "10.0.0.2"])])
+
+    lines, _ = format_table(table)
+    wide_lines, _ = format_table(table, wide=True, with_namespace=True)
+
+    assert lines == [
+        "NAME             READY   STATUS\n",
+        "web-0            1/1     Running\n",
+        "coredns-abcdef   1/1     Running\n",
+    ]
+    assert wide_lines[0].split() == ["NAMESPACE", "NAME", "READY", "STATUS", "IP"]
+    assert wide_lines[2].split()[0] == "kube-system"
+
+
+class _FakeResponse:
+    def __init__(self, payload):
+        self._payload = payload
+
+    def json(self):
+        return self._payload
+
+
+@pytest.fixture
+def client(monkeypatch):
+    client = KubeClient()
+    calls = []
+    responses = {
+        "/apis": {"groups": [{"preferredVersion": {"groupVersion": "apps/v1"}}]},
+        "/api/v1": {"resources": [
+            {"name": "pods", "singularName": "pod", "kind": "Pod", "namespaced": True,
+             "verbs": ["get", "list", "watch"], "shortNames": ["po"]},
+            {"name": "pods/log", "kind": "Pod", "namespaced": True, "verbs": ["get"]},
+        ]},
+        "/apis/apps/v1": {"resources": [
+            {"name": "deployments", "singularName": "deployment", "kind": "Deployment", "namespaced": True,
+             "verbs": ["get", "list"], "shortNames": ["deploy"]},
+        ]},
+        "/api/v1/namespaces/default/pods": _pod_table([("default", ["web-0", "1/1", "Running", "10.0.0.1"])]),
+        "/apis/apps/v1/namespaces/shop/deployments": _pod_table([]),
+    }
+
+    def _request(path, params=None, accept="application/json", stream=False, timeout=None):
+        calls.append(path)
+        return _FakeResponse(responses[path])
+
+    monkeypatch.setattr(client, "_request", _request)
+    client.calls = calls
+    return client
+
+
+def test_resolve_caches_discovery(client):
+    assert client.resolve("po").plural == "pods"
+    assert client.resolve("pod").plural == "pods"
+    assert client.resolve("deploy").group_version == "apps/v1"
+
+    assert client.calls == ["/apis", "/api/v1", "/apis/apps/v1"]
+
+
+def test_discovery_requests_run_outside_the_cache_lock(client, monkeypatch):
+    request = client._request
+    held = []
+
+    def _request(path, **kwargs):
+        held.append(client._discovery_lock.locked())
+        return request(path, **kwargs)
+
+    monkeypatch.setattr(client, "_request", _request)
+
+    assert client.resolve("deploy").plural == "deployments"
+    assert held == [False, False, False]
+    client._discovery_expires_at = 0
+    assert client.resolve("po").plural == "pods"
+    assert client.calls[3:] == ["/apis", "/api/v1"]
+
+
+async def test_run_get_streams_table_and_exit_code(client):
+    output = [line async for line in client.run(parse_kubectl_command("kubectl get po"))]
+
+    assert output[0].split() == ["NAME", "READY", "STATUS"]
+    assert output[1].split() == ["web-0", "1/1", "Running"]
+    assert output[-1] == f"{kc.EXIT_SENTINEL_PREFIX}0\n"
+
+
+async def test_run_reports_empty_namespace(client):
+    output = [line async for line in client.run(parse_kubectl_command("kubectl get deploy -n shop"))]
+
+    assert output == ["No resources found in shop namespace.\n", f"{kc.EXIT_SENTINEL_PREFIX}0\n"]
+
+
+async def test_run_unknown_resource_type_exits_nonzero(client):
+    output = [line async for line in client.run(parse_kubectl_command("kubectl get widgets"))]
+
+    assert 'doesn\'t have a resource type "widgets"' in output[0]
+    assert output[-1] == f"{kc.EXIT_SENTINEL_PREFIX}1\n"
+
+
+async def test_run_without_cached_token_requests_fallback(monkeypatch):
+    monkeypatch.setattr(kc.kubeconfig_manager, "get_connection", lambda: None)
+
+    with pytest.raises(KubeClientUnavailable):
+        [line async for line in KubeClient().run(parse_kubectl_command("kubectl get pods"))]
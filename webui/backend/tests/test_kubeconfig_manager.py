@@ -0,0 +1,122 @@
+import json
+
+import pytest
+
+from app.services import kubeconfig_manager as km
+from app.services.kubeconfig_manager import KubeconfigManager
+
+
+@pytest.fixture
+def aws_calls(monkeypatch):
+    calls = {"describe": 0, "token": 0}
+
+    def _describe(cluster_name, region):
+        calls["describe"] += 1
+        return f"https://{cluster_name}.eks.example.com", "Q0EtREFUQQ=="
+
+    def _token(cluster_name, region):
+        calls["token"] += 1
+        return f"k8s-aws-v1.token-{calls['token']}"
+
+    monkeypatch.setattr(km, "describe_cluster_endpoint", _describe)
+    monkeypatch.setattr(km, "generate_eks_token", _token)
+    return calls
+
+
+@pytest.fixture
+def manager(tmp_path):
+    return KubeconfigManager(kubeconfig_path=tmp_path / ".kube" / "config")
+
+
+def _loader(counter):
+    async def _load(resource_id, resource_dir):
+        counter.append(resource_id)
+        return {"cluster_name": "sandbox", "region": "ap-northeast-2"}
+    return _load
+
+
+async def test_ensure_writes_kubeconfig_and_caches_token(manager, aws_calls, tmp_path):
+    loads = []
+
+    ok, lines = await manager.ensure("eks_custom", tmp_path, _loader(loads))
+    ok_again, lines_again = await manager.ensure("eks_custom", tmp_path, _loader(loads))
+
+    config = json.loads(manager.kubeconfig_path.read_text())
+    assert ok and ok_again
+    assert lines_again == []
+    assert loads == ["eks_custom"]
+    assert aws_calls == {"describe": 1, "token": 1}
+    assert config["users"][0]["user"]["token"] == "k8s-aws-v1.token-1"
+    assert config["clusters"][0]["cluster"]["server"] == "https://sandbox.eks.example.com"
+    manager._refresh_task.cancel()
+
+
+async def test_expired_token_reuses_cached_endpoint(manager, aws_calls, tmp_path):
+    loads = []
+    await manager.ensure("eks_custom", tmp_path, _loader(loads))
+    manager._token_expires_at = 0.0
+
+    ok, lines = await manager.ensure("eks_custom", tmp_path, _loader(loads))
+
+    assert ok
+    assert "Resolving EKS cluster info from Terraform outputs...\n" not in lines
+    assert loads == ["eks_custom"]
+    assert aws_calls == {"describe": 1, "token": 2}
+    manager._refresh_task.cancel()
+
+
+async def test_invalidate_forces_cluster_lookup(manager, aws_calls, tmp_path):
+    loads = []
+    await manager.ensure("eks_custom", tmp_path, _loader(loads))
+
+    manager.invalidate("other_resource")
+    assert not manager.is_fresh()
+    await manager.ensure("eks_custom", tmp_path, _loader(loads))
+    assert loads == ["eks_custom"]
+    assert aws_calls == {"describe": 1, "token": 2}
+
+    manager.invalidate("eks_custom")
+    assert not manager.is_fresh()
+    await manager.ensure("eks_custom", tmp_path, _loader(loads))
+
+    assert loads == ["eks_custom", "eks_custom"]
+    assert aws_calls["describe"] == 2
+    manager._refresh_task.cancel()
+
+
+async def test_missing_cluster_name_falls_back_to_existing_kubeconfig(manager, aws_calls, tmp_path):
+    async def _empty(resource_id, resource_dir):
+        return {}
+
+    ok, lines = await manager.ensure("eks_custom", tmp_path, _empty)
+
+    assert ok
+    assert lines[-1].startswith("Warning: Could not resolve cluster name")
+    assert aws_calls == {"describe": 0, "token": 0}
+
+
+async def test_configure_failure_reports_exit_sentinel(manager, monkeypatch, tmp_path):
+    def _fail(cluster_name, region):
+        raise RuntimeError("AccessDenied")
+
+    monkeypatch.setattr(km, "describe_cluster_endpoint", _fail)
+
+    ok, lines = await manager.ensure("eks_custom", tmp_path, _loader([]))
+
+    assert not ok
+    assert lines[-1] == f"{km.EXIT_SENTINEL_PREFIX}1\n"
+    assert not manager.is_fresh()
+
+
+def test_only_eks_operations_invalidate_the_token(monkeypatch):
+    from app.routes import terraform as terraform_routes
+
+    invalidated = []
+    monkeypatch.setattr(terraform_routes.kubeconfig_manager, "invalidate", invalidated.append)
+
+    terraform_routes._invalidate_kubeconfig("ec2_basic", "ec2-basic")
+    terraform_routes._invalidate_kubeconfig("rds_postgres", "rds-postgres")
+    terraform_routes._invalidate_kubeconfig("gone", None)
+    terraform_routes._invalidate_kubeconfig("eks_custom", "eks-custom")
+
+    assert invalidated == ["eks_custom"]
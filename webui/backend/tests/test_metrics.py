@@ -0,0 +1,81 @@
+import threading
+
+from fastapi import FastAPI
+
+from app.services import metrics
+from app.services.metrics import Registry
+
+
+def test_counter_sums_writes_from_all_threads():
+    registry = Registry()
+    counter = registry.counter("jobs", "Jobs run", ("kind",))
+
+    def _work():
+        for _ in range(1000):
+            counter.inc(kind="plan")
+
+    threads = [threading.Thread(target=_work) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    counter.inc(2, kind="apply")
+
+    assert counter.values() == {("plan",): 4000.0, ("apply",): 2.0}
+    assert 'jobs_total{kind="plan"} 4000' in registry.render()
+
+
+def test_histogram_renders_cumulative_buckets():
+    registry = Registry()
+    histogram = registry.histogram("op_seconds", "Op time", ("command",), buckets=(1.0, 5.0))
+    for value in (0.5, 1.0, 3.0, 30.0):
+        histogram.observe(value, command="plan")
+
+    lines = registry.render().splitlines()
+
+    assert "# TYPE op_seconds histogram" in lines
+    assert 'op_seconds_bucket{command="plan",le="1"} 2' in lines
+    assert 'op_seconds_bucket{command="plan",le="5"} 3' in lines
+    assert 'op_seconds_bucket{command="plan",le="+Inf"} 4' in lines
+    assert 'op_seconds_count{command="plan"} 4' in lines
+    assert 'op_seconds_sum{command="plan"} 34.5' in lines
+
+
+def test_gauge_callbacks_are_evaluated_at_scrape_time():
+    registry = Registry()
+    gauge = registry.gauge("depth", "Queue depth", ("queue",))
+    items = []
+    gauge.set_function(lambda: len(items), queue="ops")
+    gauge.set_function(lambda: 1 / 0, queue="broken")
+
+    items.extend([1, 2, 3])
+
+    assert gauge.values() == {("ops",): 3.0}
+    assert 'depth{queue="ops"} 3' in registry.render()
+
+
+async def test_middleware_labels_requests_by_route_template():
+    app = FastAPI()
+
+    @app.get("/api/items/{item_id}")
+    async def get_item(item_id: str):
+        return {"id": item_id}
+
+    wrapped = metrics.MetricsMiddleware(app)
+    sent = []
+
+    async def _receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def _send(message):
+        sent.append(message)
+
+    for path in ("/api/items/a", "/api/items/b", "/missing"):
+        scope = {"type": "http", "method": "GET", "path": path, "raw_path": path.encode(), "root_path": "",
+                 "query_string": b"", "headers": [], "scheme": "http", "server": ("test", 80)}
+        await wrapped(scope, _receive, _send)
+
+    observed = metrics.HTTP_REQUEST_DURATION.snapshot()
+    counts, _ = observed[("GET", "/api/items/{item_id}", "200")]
+    assert sum(counts) == 2
+    assert ("GET", "unmatched", "404") in observed
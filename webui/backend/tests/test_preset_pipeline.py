@@ -0,0 +1,104 @@
+import asyncio
+
+import pytest
+
+from app.services.preset_pipeline import (
+    EXIT_SENTINEL_PREFIX,
+    DeployPipeline,
+    resolve_deploy_graph,
+    topological_order,
+)
+
+
+PRESETS = {
+    "agent-datadog-operator": {"name": "agent-datadog-operator"},
+    "istio": {"name": "istio"},
+    "spring-boot": {"name": "spring-boot", "depends_on": ["agent-datadog-operator", "istio"]},
+}
+
+
+def test_resolve_pulls_in_undeployed_dependencies():
+    graph = resolve_deploy_graph(["spring-boot"], PRESETS)
+
+    assert graph == {
+        "spring-boot": ["agent-datadog-operator", "istio"],
+        "istio": [],
+        "agent-datadog-operator": [],
+    }
+
+
+def test_resolve_treats_deployed_dependencies_as_satisfied():
+    graph = resolve_deploy_graph(["spring-boot"], PRESETS, deployed=["istio"])
+
+    assert graph["spring-boot"] == ["agent-datadog-operator"]
+    assert "istio" not in graph
+
+
+def test_resolve_rejects_cycles_and_unknown_presets():
+    cyclic = {"a": {"name": "a", "depends_on": ["b"]}, "b": {"name": "b", "depends_on": ["a"]}}
+
+    with pytest.raises(ValueError, match="cycle"):
+        resolve_deploy_graph(["a"], cyclic)
+    with pytest.raises(ValueError, match="not found"):
+        resolve_deploy_graph(["missing"], PRESETS)
+
+
+def test_topological_order_is_deterministic():
+    assert topological_order({"c": ["a"], "b": [], "a": []}) == ["a", "b", "c"]
+
+
+def _runner(delays, failures=(), events=None):
+    async def _run(name):
+        if events is not None:
+            events.append(("start", name))
+        await asyncio.sleep(delays.get(name, 0))
+        yield f"\n$ deploy {name}\n"
+        if events is not None:
+            events.append(("end", name))
+        yield f"{EXIT_SENTINEL_PREFIX}{1 if name in failures else 0}\n"
+    return _run
+
+
+async def test_independent_presets_run_concurrently():
+    graph = resolve_deploy_graph(["spring-boot"], PRESETS)
+    events = []
+    pipeline = DeployPipeline(graph, _runner({"istio": 0.05, "agent-datadog-operator": 0.05}, events=events))
+
+    output = [line async for line in pipeline.stream()]
+
+    assert events[:2] == [("start", "agent-datadog-operator"), ("start", "istio")]
+    assert events.index(("start", "spring-boot")) > events.index(("end", "istio"))
+    assert "[istio] $ deploy istio\n" in output
+    assert pipeline.status == "succeeded"
+    assert output[-1] == f"{EXIT_SENTINEL_PREFIX}0\n"
+
+
+async def test_concurrency_cap_is_respected():
+    graph = {name: [] for name in ("a", "b", "c", "d")}
+    running = {"now": 0, "peak": 0}
+
+    async def _run(name):
+        running["now"] += 1
+        running["peak"] = max(running["peak"], running["now"])
+        await asyncio.sleep(0.01)
+        running["now"] -= 1
+        yield f"{EXIT_SENTINEL_PREFIX}0\n"
+
+    pipeline = DeployPipeline(graph, _run, max_concurrency=2)
+    [line async for line in pipeline.stream()]
+
+    assert running["peak"] == 2
+
+
+async def test_failed_dependency_skips_dependents():
+    graph = resolve_deploy_graph(["spring-boot"], PRESETS)
+    pipeline = DeployPipeline(graph, _runner({}, failures={"istio"}))
+
+    output = [line async for line in pipeline.stream()]
+    summary = pipeline.summary()
+
+    assert summary["presets"]["istio"]["status"] == "failed"
+    assert summary["presets"]["agent-datadog-operator"]["status"] == "succeeded"
+    assert summary["presets"]["spring-boot"]["status"] == "skipped"
+    assert summary["status"] == "partial"
+    assert output[-1] == f"{EXIT_SENTINEL_PREFIX}1\n"
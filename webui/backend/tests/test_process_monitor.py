@@ -0,0 +1,70 @@
+import asyncio
+import sys
+
+import pytest
+
+from app.services.process_monitor import ProcessMonitor, ProcessUsage, UsageStore, proc_available
+from app.services.terraform_runner import EXIT_SENTINEL_PREFIX, TerraformRunner
+
+needs_proc = pytest.mark.skipif(not proc_available(), reason="requires /proc")
+
+_CHILD_SCRIPT = (
+    "import subprocess, time\n"
+    "child = subprocess.Popen(['sleep', '1'])\n"
+    "block = bytearray(48 * 1024 * 1024)\n"
+    "time.sleep(0.5)\n"
+    "child.kill()\n"
+)
+
+
+@needs_proc
+async def test_monitor_samples_process_tree():
+    process = await asyncio.create_subprocess_exec(sys.executable, "-c", _CHILD_SCRIPT)
+    monitor = ProcessMonitor(process.pid, "plan", resource_id="ec2_basic", interval=0.05).start()
+    await process.wait()
+    usage = await monitor.stop(exit_code=process.returncode)
+
+    assert usage.samples > 0
+    assert usage.peak_rss_bytes >= 48 * 1024 * 1024
+    assert usage.peak_processes >= 2
+    assert "sleep" in usage.children
+    assert usage.wall_seconds >= 0.5
+    assert not usage.running and usage.exit_code == 0
+
+
+def _usage(operation, wall, peak_mb, exit_code=0):
+    return ProcessUsage(
+        resource_id="eks_cluster", operation=operation, pid=1, command=f"terraform {operation}",
+        finished_at=1.0, wall_seconds=wall, peak_rss_bytes=peak_mb * 1024 * 1024, exit_code=exit_code,
+    )
+
+
+def test_store_keeps_recent_records_and_summarizes(tmp_path):
+    store = UsageStore(tmp_path, max_records=3)
+    for wall, peak in ((100, 500), (240, 900), (200, 700), (220, 800)):
+        store.record(_usage("plan", wall, peak))
+    store.record(_usage("apply", 600, 1200, exit_code=1))
+
+    assert [r["wall_seconds"] for r in store.history("eks_cluster", operation="plan")] == [200, 220]
+    summary = store.summary("eks_cluster")
+    assert summary["plan"]["count"] == 2
+    assert summary["plan"]["max_peak_rss_mb"] == 800.0
+    assert summary["apply"]["failed"] == 1
+    assert store.history("unknown") == []
+
+
+@needs_proc
+async def test_runner_attaches_and_persists_usage(tmp_terraform_dir, tmp_path):
+    runner = TerraformRunner(str(tmp_terraform_dir))
+    runner.usage_store = UsageStore(tmp_path)
+    attached = []
+
+    cmd = [sys.executable, "-c", "import time; print('working'); time.sleep(0.2)"]
+    lines = [line async for line in runner._stream_process(cmd, tmp_path, resource_id="ec2_basic",
+                                                              on_usage=attached.append)]
+
+    assert lines == ["working\n", f"{EXIT_SENTINEL_PREFIX}0\n"]
+    assert len(attached) == 1 and attached[0].exit_code == 0
+    assert runner.get_running_usage() == []
+    history = runner.usage_store.history("ec2_basic")
+    assert len(history) == 1 and history[0]["operation"] == "-c"
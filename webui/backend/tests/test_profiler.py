@@ -0,0 +1,115 @@
+import asyncio
+import threading
+import time
+
+import pytest
+from fastapi import FastAPI, HTTPException
+
+from app.services import profiler
+from app.services.profiler import ProfileRecord, ProfileStore, ProfilingMiddleware, StackSampler
+
+
+def _spin_in_parse(stop):
+    while not stop.is_set():
+        sum(i * i for i in range(1000))
+
+
+def test_sampler_collapses_stacks_from_worker_threads():
+    stop = threading.Event()
+    worker = threading.Thread(target=_spin_in_parse, args=(stop,), name="worker")
+    sampler = StackSampler(interval=0.001).start()
+    worker.start()
+    time.sleep(0.1)
+    sampler.stop()
+    stop.set()
+    worker.join()
+
+    assert sampler.samples > 10
+    worker_lines = [line for line in sampler.collapsed().splitlines() if line.startswith("worker;")]
+    assert worker_lines and any("_spin_in_parse" in line for line in worker_lines)
+    assert all(line.rsplit(" ", 1)[1].isdigit() for line in worker_lines)
+
+
+def _record(duration):
+    return ProfileRecord(method="GET", path="/x", duration=duration, status=200, samples=1, collapsed="a;b 1\n")
+
+
+def test_store_keeps_slowest_recent_profiles():
+    store = ProfileStore(keep=2, max_age=60)
+    fast, slow, slower = _record(0.1), _record(0.5), _record(0.9)
+
+    assert store.add(fast) and store.add(slow)
+    assert store.add(slower)
+    assert not store.add(_record(0.05))
+    assert [r.duration for r in store.list()] == [0.9, 0.5]
+    assert store.get(fast.id) is None
+
+    slower.started_at = time.time() - 120
+    assert [r.duration for r in store.list()] == [0.5]
+    assert store.add(_record(0.2))
+
+
+def _app():
+    app = FastAPI()
+
+    @app.get("/api/resources/{resource_id}/variables")
+    async def variables(resource_id: str):
+        await asyncio.to_thread(time.sleep, 0.02)
+        return {"id": resource_id}
+
+    return app
+
+
+async def _call(app, query=b"", headers=()):
+    sent = []
+
+    async def _receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def _send(message):
+        sent.append(message)
+
+    path = "/api/resources/ec2/variables"
+    scope = {"type": "http", "method": "GET", "path": path, "raw_path": path.encode(), "root_path": "",
+             "query_string": query, "headers": list(headers), "scheme": "http", "server": ("test", 80)}
+    await app(scope, _receive, _send)
+    return dict(sent[0]["headers"])
+
+
+async def test_middleware_profiles_only_flagged_requests():
+    store = ProfileStore(keep=5)
+    app = ProfilingMiddleware(_app(), store=store, interval=0.001)
+
+    plain = await _call(app)
+    flagged = await _call(app, query=b"profile=1")
+    by_header = await _call(app, headers=[(b"x-profile", b"1")])
+
+    assert b"x-profile-id" not in plain
+    records = store.list()
+    assert {r.id.encode() for r in records} == {flagged[b"x-profile-id"], by_header[b"x-profile-id"]}
+    assert records[0].route == "/api/resources/{resource_id}/variables"
+    assert records[0].status == 200 and records[0].samples > 0
+
+
+async def test_middleware_requires_token_when_configured(monkeypatch):
+    monkeypatch.setattr(profiler, "PROFILING_TOKEN", "s3cret")
+    store = ProfileStore(keep=5)
+    app = ProfilingMiddleware(_app(), store=store, interval=0.001)
+
+    await _call(app, query=b"profile=1")
+    await _call(app, query=b"profile=1", headers=[(b"x-profile-token", b"s3cret")])
+
+    assert len(store.list()) == 1
+
+
+async def test_admin_profile_endpoints_require_token(monkeypatch):
+    from app.routes import admin
+
+    monkeypatch.setattr(profiler, "PROFILING_TOKEN", "s3cret")
+
+    for token in (None, "wrong"):
+        with pytest.raises(HTTPException) as exc:
+            await admin.require_profile_token(token)
+        assert exc.value.status_code == 403
+    await admin.require_profile_token("s3cret")
+    assert any(dep.dependency is admin.require_profile_token for dep in admin.router.dependencies)
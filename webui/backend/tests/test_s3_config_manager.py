@@ -0,0 +1,120 @@
+import hashlib
+
+import pytest
+from botocore.exceptions import ClientError
+
+from app.services.s3_config_manager import MD5_METADATA_KEY, S3ConfigManager
+from app.services.s3_sync import S3ListingError
+
+
+class FakeS3Client:
+    def __init__(self):
+        self.objects = {}
+        self.fail_after = None
+        self.upload_kwargs = None
+
+    def upload_fileobj(self, fileobj, bucket, key, ExtraArgs=None, Config=None):
+        self.upload_kwargs = {"ExtraArgs": ExtraArgs, "Config": Config}
+        body = b"".join(iter(lambda: fileobj.read(4), b""))
+        etag = hashlib.md5(body).hexdigest()
+        self.objects[key] = {"Body": body, "ETag": f'"{etag}"', "Metadata": (ExtraArgs or {}).get("Metadata", {})}
+
+    def download_fileobj(self, bucket, key, fileobj, Config=None):
+        if key not in self.objects:
+            raise ClientError({"Error": {"Code": "404", "Message": "Not Found"}}, "HeadObject")
+        body = self.objects[key]["Body"]
+        for i in range(0, len(body), 4):
+            if self.fail_after is not None and i >= self.fail_after:
+                raise ConnectionError("connection reset")
+            fileobj.write(body[i:i + 4])
+
+    def head_object(self, Bucket, Key):
+        obj = self.objects[Key]
+        return {"ETag": obj["ETag"], "Metadata": obj["Metadata"]}
+
+
+@pytest.fixture
+def client():
+    return FakeS3Client()
+
+
+@pytest.fixture
+def manager(client):
+    mgr = S3ConfigManager("test-bucket", verify_md5=True)
+    mgr._s3_client = client
+    return mgr
+
+
+def test_upload_streams_with_transfer_config_and_md5_metadata(manager, client, tmp_path):
+    path = tmp_path / "bundle.tar"
+    path.write_bytes(b"x" * 100)
+
+    assert manager.upload_file(path, "apps/bundle.tar")
+
+    assert client.objects["apps/bundle.tar"]["Body"] == b"x" * 100
+    assert client.upload_kwargs["Config"] is manager.transfer_config
+    assert client.upload_kwargs["ExtraArgs"]["Metadata"][MD5_METADATA_KEY] == hashlib.md5(b"x" * 100).hexdigest()
+
+
+def test_upload_to_missing_bucket_returns_false(manager, client, tmp_path, caplog):
+    path = tmp_path / "terraform.tfvars"
+    path.write_text('region = "us-east-1"\n')
+
+    def _upload_fileobj(*args, **kwargs):
+        raise ClientError({"Error": {"Code": "NoSuchBucket", "Message": "The specified bucket does not exist"}},
+                          "PutObject")
+
+    client.upload_fileobj = _upload_fileobj
+    with caplog.at_level("DEBUG", logger="app.services.s3_config_manager"):
+        assert not manager.upload_file(path, "config/terraform.tfvars")
+    assert not [r for r in caplog.records if r.levelname == "ERROR"]
+
+
+def test_download_round_trip_is_verified(manager, client, tmp_path):
+    src = tmp_path / "src.tfvars"
+    src.write_bytes(b'region = "us-east-1"\n')
+    manager.upload_file(src, "config/terraform.tfvars")
+
+    dest = tmp_path / "out" / "terraform.tfvars"
+    assert manager.download_file("config/terraform.tfvars", dest)
+    assert dest.read_bytes() == src.read_bytes()
+    assert list(dest.parent.iterdir()) == [dest]
+
+
+def test_interrupted_download_keeps_existing_file(manager, client, tmp_path):
+    client.objects["k"] = {"Body": b"new content", "ETag": '"x"', "Metadata": {}}
+    client.fail_after = 4
+    dest = tmp_path / "file"
+    dest.write_bytes(b"old")
+
+    assert not manager.download_file("k", dest)
+    assert dest.read_bytes() == b"old"
+    assert list(tmp_path.iterdir()) == [dest]
+
+
+def test_md5_mismatch_rejects_download(manager, client, tmp_path):
+    client.objects["k"] = {"Body": b"tampered", "ETag": '"abc-2"', "Metadata": {MD5_METADATA_KEY: "0" * 32}}
+    dest = tmp_path / "file"
+
+    assert not manager.download_file("k", dest)
+    assert not dest.exists()
+
+
+def test_missing_key_returns_false(manager, tmp_path):
+    assert not manager.download_file("missing", tmp_path / "file")
+
+
+def test_failed_listing_raises_instead_of_returning_empty(manager, client):
+    class _Exceptions:
+        NoSuchBucket = type("NoSuchBucket", (ClientError,), {})
+
+    def _get_paginator(name):
+        raise ClientError({"Error": {"Code": "SlowDown", "Message": "Please reduce your request rate"}},
+                          "ListObjectsV2")
+
+    client.exceptions = _Exceptions
+    client.get_paginator = _get_paginator
+
+    with pytest.raises(S3ListingError):
+        manager.list_objects("eks-presets/")
+    assert manager.list_files("eks-presets/") == []
@@ -0,0 +1,247 @@
+import hashlib
+import threading
+from pathlib import Path
+
+import pytest
+
+from app.services.s3_sync import S3ListingError, S3SyncEngine
+
+
+class FakeS3Manager:
+    def __init__(self, bucket_name="test-bucket"):
+        self.bucket_name = bucket_name
+        self.objects = {}
+        self.downloads = []
+        self.uploads = []
+        self._lock = threading.Lock()
+
+    def put(self, key, body: bytes):
+        self.objects[key] = body
+
+    def list_objects(self, prefix):
+        return [
+            {"key": k, "etag": hashlib.md5(v).hexdigest(), "size": len(v)}
+            for k, v in sorted(self.objects.items()) if k.startswith(prefix)
+        ]
+
+    def download_file(self, key, local_path: Path):
+        with self._lock:
+            self.downloads.append(key)
+        local_path.parent.mkdir(parents=True, exist_ok=True)
+        local_path.write_bytes(self.objects[key])
+        return True
+
+    def upload_file(self, local_path: Path, key):
+        with self._lock:
+            self.uploads.append(key)
+            self.objects[key] = local_path.read_bytes()
+        return True
+
+
+@pytest.fixture
+def s3():
+    fake = FakeS3Manager()
+    fake.put("eks-presets/agent-helm/manifest.json", b'{"name": "agent-helm"}')
+    fake.put("eks-presets/agent-helm/values.yaml", b"site: datadoghq.com\n")
+    fake.put("eks-presets/istio/manifest.json", b'{"name": "istio"}')
+    return fake
+
+
+@pytest.fixture
+def engine(s3, tmp_path):
+    return S3SyncEngine(s3, tmp_path / "eks" / "_sync_index.json", max_workers=4)
+
+
+def test_pull_downloads_everything_once(engine, s3, tmp_path):
+    local = tmp_path / "eks"
+
+    first = engine.pull("eks-presets/", local)
+    second = engine.pull("eks-presets/", local)
+
+    assert first.transferred == 3
+    assert first.bytes_transferred == sum(len(v) for v in s3.objects.values())
+    assert second.transferred == 0
+    assert second.skipped == 3
+    assert (local / "agent-helm" / "values.yaml").read_text() == "site: datadoghq.com\n"
+
+
+def test_pull_transfers_only_changed_objects(engine, s3, tmp_path):
+    local = tmp_path / "eks"
+    engine.pull("eks-presets/", local)
+    s3.downloads.clear()
+
+    s3.put("eks-presets/agent-helm/values.yaml", b"site: us5.datadoghq.com\n")
+    stats = engine.pull("eks-presets/", local)
+
+    assert s3.downloads == ["eks-presets/agent-helm/values.yaml"]
+    assert stats.transferred == 1
+    assert "us5" in (local / "agent-helm" / "values.yaml").read_text()
+
+
+def test_index_survives_new_engine_instance(s3, tmp_path):
+    local = tmp_path / "eks"
+    S3SyncEngine(s3, local / "_sync_index.json").pull("eks-presets/", local)
+    s3.downloads.clear()
+
+    stats = S3SyncEngine(s3, local / "_sync_index.json").pull("eks-presets/", local)
+
+    assert stats.transferred == 0
+    assert s3.downloads == []
+
+
+def test_pull_delete_missing_only_removes_synced_files(engine, s3, tmp_path):
+    local = tmp_path / "eks"
+    engine.pull("eks-presets/", local)
+    (local / "local-only").mkdir()
+    (local / "local-only" / "manifest.json").write_text("{}")
+
+    del s3.objects["eks-presets/istio/manifest.json"]
+    stats = engine.pull("eks-presets/", local, delete_missing=True)
+
+    assert stats.deleted == 1
+    assert not (local / "istio" / "manifest.json").exists()
+    assert (local / "local-only" / "manifest.json").exists()
+
+
+def test_failed_listing_never_deletes_or_pushes(engine, s3, tmp_path, monkeypatch):
+    local = tmp_path / "eks"
+    engine.pull("eks-presets/", local)
+    (local / "new-preset").mkdir()
+    (local / "new-preset" / "manifest.json").write_text("{}")
+
+    def _fail(prefix):
+        raise S3ListingError("throttled")
+
+    monkeypatch.setattr(s3, "list_objects", _fail)
+    pulled = engine.pull("eks-presets/", local, delete_missing=True)
+    synced = engine.sync("eks-presets/", local)
+    pushed = engine.push(local / "new-preset", "eks-presets/new-preset/")
+
+    for stats in (pulled, synced, pushed):
+        assert stats.failed == 1 and stats.error == "throttled"
+    assert (local / "istio" / "manifest.json").exists()
+    assert s3.uploads == []
+
+
+def test_pull_respects_include_filter(engine, s3, tmp_path):
+    s3.put("eks-presets/_deployments.json", b"{}")
+
+    engine.pull("eks-presets/", tmp_path / "eks", include=lambda rel: not rel.startswith("_"))
+
+    assert "eks-presets/_deployments.json" not in s3.downloads
+
+
+def test_push_uploads_only_changed_files(engine, s3, tmp_path):
+    local = tmp_path / "eks"
+    engine.pull("eks-presets/", local)
+
+    unchanged = engine.push(local / "agent-helm", "eks-presets/agent-helm/")
+    (local / "agent-helm" / "values.yaml").write_text("site: datadoghq.eu\n")
+    (local / "agent-helm" / "extra.yaml").write_text("kind: ConfigMap\n")
+    changed = engine.push(local / "agent-helm", "eks-presets/agent-helm/")
+    again = engine.push(local / "agent-helm", "eks-presets/agent-helm/")
+
+    assert unchanged.transferred == 0
+    assert sorted(s3.uploads) == ["eks-presets/agent-helm/extra.yaml", "eks-presets/agent-helm/values.yaml"]
+    assert changed.transferred == 2
+    assert again.transferred == 0
+    assert s3.objects["eks-presets/agent-helm/values.yaml"] == b"site: datadoghq.eu\n"
+
+
+def test_push_then_pull_does_not_redownload(engine, s3, tmp_path):
+    local = tmp_path / "eks"
+    preset = local / "my-preset"
+    preset.mkdir(parents=True)
+    (preset / "app.yaml").write_text("kind: Pod\n")
+
+    engine.push(preset, "eks-presets/my-preset/")
+    stats = engine.pull("eks-presets/", local)
+
+    assert "eks-presets/my-preset/app.yaml" not in s3.downloads
+    assert stats.transferred == 3
+
+
+def test_sync_pushes_local_edits_and_pulls_remote_edits_in_one_round(engine, s3, tmp_path):
+    local = tmp_path / "eks"
+    engine.pull("eks-presets/", local)
+    (local / "istio" / "manifest.json").write_text('{"name": "istio", "v": 2}')
+    s3.put("eks-presets/agent-helm/values.yaml", b"site: us5.datadoghq.com\n")
+    s3.downloads.clear()
+
+    stats = engine.sync("eks-presets/", local)
+
+    assert s3.downloads == ["eks-presets/agent-helm/values.yaml"]
+    assert s3.uploads == ["eks-presets/istio/manifest.json"]
+    assert stats.transferred == 2 and stats.skipped == 1
+    assert engine.sync("eks-presets/", local).transferred == 0
+
+
+def test_sync_dry_run_plans_without_transferring(engine, s3, tmp_path):
+    local = tmp_path / "eks"
+    (local / "new-preset").mkdir(parents=True)
+    (local / "new-preset" / "manifest.json").write_text('{"name": "new-preset"}')
+
+    stats = engine.sync("eks-presets/", local, dry_run=True)
+
+    assert stats.dry_run
+    assert {(a["action"], a["key"]) for a in stats.actions} == {
+        ("download", "eks-presets/agent-helm/manifest.json"),
+        ("download", "eks-presets/agent-helm/values.yaml"),
+        ("download", "eks-presets/istio/manifest.json"),
+        ("upload", "eks-presets/new-preset/manifest.json"),
+    }
+    assert s3.downloads == [] and s3.uploads == []
+    assert not (local / "istio").exists()
+
+
+def test_sync_dry_run_leaves_index_untouched(engine, s3, tmp_path):
+    local = tmp_path / "eks"
+    (local / "istio").mkdir(parents=True)
+    (local / "istio" / "manifest.json").write_bytes(s3.objects["eks-presets/istio/manifest.json"])
+
+    stats = engine.sync("eks-presets/", local, dry_run=True)
+
+    assert stats.skipped == 1
+    assert engine._load_index() == {}
+    assert not engine.index_path.exists()
+
+
+def test_sync_conflict_follows_direction_and_preference(engine, s3, tmp_path):
+    local = tmp_path / "eks"
+    engine.pull("eks-presets/", local)
+    (local / "istio" / "manifest.json").write_text('{"name": "istio", "local": true}')
+    s3.put("eks-presets/istio/manifest.json", b'{"name": "istio", "remote": true}')
+
+    engine.sync("eks-presets/", local, direction="pull")
+
+    assert (local / "istio" / "manifest.json").read_bytes() == b'{"name": "istio", "remote": true}'
+    (local / "istio" / "manifest.json").write_text('{"name": "istio", "local": 2}')
+    s3.put("eks-presets/istio/manifest.json", b'{"name": "istio", "remote": 2}')
+
+    engine.sync("eks-presets/", local, prefer="push")
+
+    assert s3.objects["eks-presets/istio/manifest.json"] == b'{"name": "istio", "local": 2}'
+
+
+def test_config_sync_limits_to_tfvars_of_existing_instances(s3, tmp_terraform_dir, monkeypatch):
+    from app.services.s3_config_manager import S3ConfigManager
+
+    s3.put("config/terraform.tfvars", b'region = "us-east-1"\n')
+    s3.put("config/instances/ec2-basic/terraform.tfvars", b'instance_type = "t3.micro"\n')
+    s3.put("config/instances/removed/terraform.tfvars", b"x = 1\n")
+    s3.put("config/notes.txt", b"ignored")
+    (tmp_terraform_dir / "instances" / "ec2-basic").mkdir()
+    (tmp_terraform_dir / "instances" / "eks-cluster").mkdir()
+    (tmp_terraform_dir / "instances" / "eks-cluster" / "terraform.tfvars").write_text('cluster = "a"\n')
+
+    manager = S3ConfigManager(s3.bucket_name)
+    for name in ("list_objects", "download_file", "upload_file"):
+        monkeypatch.setattr(manager, name, getattr(s3, name))
+
+    stats = manager.sync_config(tmp_terraform_dir)
+
+    assert sorted(s3.downloads) == ["config/instances/ec2-basic/terraform.tfvars", "config/terraform.tfvars"]
+    assert s3.uploads == ["config/instances/eks-cluster/terraform.tfvars"]
+    assert not (tmp_terraform_dir / "instances" / "removed").exists()
+    assert stats.failed == 0
+    assert manager.sync_config(tmp_terraform_dir, direction="pull").transferred == 0
@@ -0,0 +1,133 @@
+import json
+
+import pytest
+
+from app.services import session_recorder
+from app.services.session_recorder import SessionRecorder
+
+
+@pytest.fixture
+def recording_root(tmp_path, monkeypatch):
+    root = tmp_path / ".ssh-recordings"
+    monkeypatch.setattr(session_recorder, "SSH_RECORDING_DIR", root)
+    return root
+
+
+def test_scrollback_returns_tail_of_output(recording_root):
+    recorder = SessionRecorder(recording_root / "conn-1", 80, 24)
+    for i in range(100):
+        recorder.record_output(f"line {i}\n")
+
+    tail = recorder.scrollback(64)
+
+    assert tail.endswith("line 99\n")
+    assert "line 0\n" not in tail
+    assert len(tail.encode("utf-8")) <= 64
+
+
+def test_segments_rotate_compress_and_stay_bounded(recording_root, monkeypatch):
+    monkeypatch.setattr(session_recorder, "SEGMENT_BYTES", 200)
+    monkeypatch.setattr(session_recorder, "MAX_SEGMENTS", 3)
+    recorder = SessionRecorder(recording_root / "conn-1", 80, 24)
+    for i in range(200):
+        recorder.record_output(f"output chunk {i}\n")
+    recorder.flush()
+
+    segments = sorted(p.name for p in recorder.recording_dir.glob("*.cast.gz"))
+    index = json.loads((recorder.recording_dir / "index.json").read_text())
+
+    assert len(segments) == 3
+    assert [s["seq"] for s in index["segments"]] == [int(n.split(".")[0]) for n in segments]
+    assert recorder.scrollback(30).endswith("output chunk 199\n")
+
+
+def test_scrollback_spans_compressed_segments(recording_root, monkeypatch):
+    monkeypatch.setattr(session_recorder, "SEGMENT_BYTES", 100)
+    recorder = SessionRecorder(recording_root / "conn-1", 80, 24)
+    for i in range(20):
+        recorder.record_output(f"row {i:02d}\n")
+
+    tail = recorder.scrollback(10_000)
+
+    assert tail == "".join(f"row {i:02d}\n" for i in range(20))
+
+
+def test_replay_emits_asciicast_with_scaled_timestamps(recording_root, monkeypatch):
+    clock = iter([1000.0, 1001.0, 1003.0, 1005.0])
+    monkeypatch.setattr(session_recorder.time, "time", lambda: next(clock))
+    recorder = SessionRecorder(recording_root / "conn-1", 120, 40, title="ec2-user@host")
+    recorder.record_output("a")
+    recorder.record_resize(100, 30)
+    recorder.record_output("b")
+    monkeypatch.setattr(session_recorder.time, "time", lambda: 1010.0)
+    recorder.close()
+
+    lines = list(session_recorder.iter_asciicast(recorder.recording_dir, speed=2.0))
+    header = json.loads(lines[0])
+    events = [json.loads(line) for line in lines[1:]]
+
+    assert header["version"] == 2
+    assert header["width"] == 120
+    assert events == [[0.0, "o", "a"], [1.0, "r", "100x30"], [2.0, "o", "b"]]
+
+
+def test_list_and_lookup_recordings(recording_root):
+    recorder = session_recorder.create_recorder("conn/1", "10.0.0.1", "ec2-user", 80, 24)
+    recorder.record_output("hello\n")
+    recorder.close()
+
+    recordings = session_recorder.list_recordings()
+
+    assert len(recordings) == 1
+    assert recordings[0]["completed"] is True
+    assert recordings[0]["title"] == "ec2-user@10.0.0.1"
+    assert session_recorder.get_recording_dir(recordings[0]["id"]) == recorder.recording_dir
+    assert session_recorder.get_recording_dir("../etc") is None
+
+
+def test_old_completed_recordings_are_pruned(recording_root, monkeypatch):
+    monkeypatch.setattr(session_recorder, "MAX_RECORDINGS", 2)
+    for i in range(4):
+        recorder = session_recorder.create_recorder(f"conn-{i}", "host", "user", 80, 24)
+        recorder.record_output("x")
+        recorder.close()
+
+    remaining = session_recorder.list_recordings()
+
+    assert len(remaining) == 2
+
+
+def test_stale_incomplete_recordings_are_finalized_and_pruned(recording_root, monkeypatch):
+    monkeypatch.setattr(session_recorder, "MAX_RECORDINGS", 2)
+    for i in range(3):
+        recorder = session_recorder.create_recorder(f"crashed-{i}", "host", "user", 80, 24)
+        recorder.record_output(f"session {i}\n")
+
+    assert session_recorder.finalize_stale_recordings() == 3
+    assert session_recorder.finalize_stale_recordings() == 0
+    recordings = session_recorder.list_recordings()
+    assert all(r["completed"] and r["ended_at"] for r in recordings)
+    replay = "".join(session_recorder.iter_asciicast(recording_root / recordings[0]["id"]))
+    assert "session" in replay
+
+    session_recorder.create_recorder("new", "host", "user", 80, 24)
+    assert len(session_recorder.list_recordings()) == 2
+
+
+def test_scrollback_size_is_validated_and_clamped():
+    assert session_recorder.scrollback_bytes(None) == session_recorder.DEFAULT_SCROLLBACK_BYTES
+    assert session_recorder.scrollback_bytes("lots") == session_recorder.DEFAULT_SCROLLBACK_BYTES
+    assert session_recorder.scrollback_bytes("16") == 16 * 1024
+    assert session_recorder.scrollback_bytes(-5) == 0
+    assert session_recorder.scrollback_bytes(10 ** 9) == session_recorder.MAX_SCROLLBACK_BYTES
+
+
+def test_recording_does_not_block_on_disk_io(recording_root):
+    recorder = SessionRecorder(recording_root / "conn-1", 80, 24)
+    with recorder._io_lock:
+        # The writer thread is stuck behind the lock; recording must still return at once
+        for i in range(50):
+            recorder.record_output(f"line {i}\n")
+        assert not (recorder.recording_dir / "current.cast").read_text()
+    assert recorder.scrollback(10_000).endswith("line 49\n")
+    recorder.close()
@@ -0,0 +1,148 @@
+import threading
+
+import pytest
+
+from app.services.ssm_gateway import ParameterCache, SSMGateway
+
+
+class FakePaginator:
+    def __init__(self, client, operation):
+        self.client = client
+        self.operation = operation
+
+    def paginate(self, **kwargs):
+        self.client.calls.append((self.operation, kwargs))
+        params = [p for p in self.client.params.values() if self.client.matches(p, self.operation, kwargs)]
+        yield {"Parameters": [{k: v for k, v in p.items() if k != "Value" or self.operation != "describe_parameters"}
+                              for p in params]}
+
+
+class FakeSSM:
+    def __init__(self, params=None):
+        self.params = {name: {"Name": name, "Value": value, "Type": "SecureString", "Version": 1}
+                       for name, value in (params or {}).items()}
+        self.calls = []
+        self.gate = None
+
+    def matches(self, param, operation, kwargs):
+        if operation == "get_parameters_by_path":
+            return param["Name"].startswith(kwargs["Path"])
+        f = kwargs["ParameterFilters"][0]
+        if f["Option"] == "Contains":
+            return f["Values"][0] in param["Name"]
+        return param["Name"].startswith(f["Values"][0])
+
+    def get_parameters(self, Names, WithDecryption):
+        self.calls.append(("get_parameters", Names))
+        if self.gate:
+            self.gate.wait(timeout=5)
+        assert len(Names) <= 10
+        found = [dict(self.params[n]) for n in Names if n in self.params]
+        return {"Parameters": found, "InvalidParameters": [n for n in Names if n not in self.params]}
+
+    def get_paginator(self, operation):
+        return FakePaginator(self, operation)
+
+    def put_parameter(self, **kwargs):
+        self.calls.append(("put_parameter", kwargs["Name"]))
+        version = self.params.get(kwargs["Name"], {}).get("Version", 0) + 1
+        self.params[kwargs["Name"]] = {"Name": kwargs["Name"], "Value": kwargs["Value"],
+                                       "Type": kwargs.get("Type"), "Version": version}
+        return {"Version": version}
+
+    def delete_parameter(self, Name):
+        self.calls.append(("delete_parameter", Name))
+        del self.params[Name]
+
+
+@pytest.fixture
+def client():
+    return FakeSSM({f"/app/p{i}": f"v{i}" for i in range(25)})
+
+
+@pytest.fixture
+def gateway(client):
+    return SSMGateway(lambda: client, "us-east-1", cache=ParameterCache())
+
+
+def _count(client, operation):
+    return sum(1 for call in client.calls if call[0] == operation)
+
+
+def test_get_parameters_batches_and_caches_hits_and_misses(gateway, client):
+    names = [f"/app/p{i}" for i in range(25)] + ["/app/missing"]
+
+    first = gateway.get_parameters(names)
+    second = gateway.get_parameters(names)
+
+    assert len(first) == 25 and first == second
+    assert first["/app/p3"]["Value"] == "v3"
+    assert _count(client, "get_parameters") == 3
+    assert gateway.get_parameter("/app/missing") is None
+    assert _count(client, "get_parameters") == 3
+
+
+def test_concurrent_lookups_share_one_call(gateway, client):
+    client.gate = threading.Event()
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(gateway.get_parameter("/app/p1")))
+               for _ in range(5)]
+    for t in threads:
+        t.start()
+    client.gate.set()
+    for t in threads:
+        t.join(timeout=5)
+
+    assert [r["Value"] for r in results] == ["v1"] * 5
+    assert _count(client, "get_parameters") == 1
+
+
+def test_put_updates_cache_and_listing_version_evicts_stale_values(gateway, client):
+    gateway.put_parameter(Name="/app/p1", Value="new", Type="SecureString", Overwrite=True)
+    assert gateway.get_parameter("/app/p1")["Value"] == "new"
+    assert _count(client, "get_parameters") == 0
+
+    client.params["/app/p1"].update(Value="external", Version=5)
+    listing = gateway.describe_parameters([{"Key": "Name", "Option": "BeginsWith", "Values": ["/app/"]}])
+
+    assert "Value" not in listing[0]
+    assert gateway.get_parameter("/app/p1")["Value"] == "external"
+    gateway.describe_parameters([{"Key": "Name", "Option": "BeginsWith", "Values": ["/app/"]}])
+    assert _count(client, "describe_parameters") == 1
+
+
+def test_delete_invalidates_value_and_listings(gateway, client):
+    prefix_filter = [{"Key": "Name", "Option": "BeginsWith", "Values": ["/app/p2"]}]
+    assert "/app/p2" in [p["Name"] for p in gateway.describe_parameters(prefix_filter)]
+    gateway.get_parameter("/app/p2")
+
+    gateway.delete_parameter("/app/p2")
+
+    assert gateway.get_parameter("/app/p2") is None
+    assert "/app/p2" not in [p["Name"] for p in gateway.describe_parameters(prefix_filter)]
+
+
+def test_get_parameters_by_path_primes_value_cache(gateway, client):
+    params = gateway.get_parameters_by_path("/app/")
+
+    assert len(params) == 25
+    assert gateway.get_parameter("/app/p7")["Value"] == "v7"
+    assert _count(client, "get_parameters") == 0
+
+
+def test_config_discovery_uses_contains_filter(tmp_terraform_dir, monkeypatch):
+    from app.services.config_manager import ConfigManager
+
+    monkeypatch.setattr(ConfigManager, "_identity_hash_cache", "abc123")
+    client = FakeSSM({
+        "/dogstac-team/abc123/config/variables": '{"region": "us-east-1"}',
+        "/dogstac-other/zzz999/config/variables": '{"region": "eu-west-1"}',
+    })
+    manager = ConfigManager(terraform_dir=str(tmp_terraform_dir))
+    manager._boto3_client = client
+    manager._ssm_gateway = SSMGateway(lambda: client, "us-east-1", cache=ParameterCache())
+
+    assert manager.load_config() == {"region": "us-east-1"}
+    describe_calls = [c for c in client.calls if c[0] == "describe_parameters"]
+    assert describe_calls[0][1]["ParameterFilters"][0]["Option"] == "Contains"
+    assert client.calls[-1] == ("get_parameters", ["/dogstac-team/abc123/config/variables"])
@@ -0,0 +1,264 @@
+import hashlib
+import io
+import json
+import time
+
+import pytest
+from botocore.exceptions import ClientError
+from fastapi import HTTPException
+
+from app.models.schemas import ResourceStatus
+from app.routes import terraform as terraform_routes
+from app.services.state_index import StateIndex, flatten_attributes, has_redacted_outputs
+from app.services.terraform_parser import TerraformParser
+
+
+def _state(serial, public_ip="3.35.10.20", lineage="lin-1"):
+    return {
+        "version": 4, "terraform_version": "1.7.5", "serial": serial, "lineage": lineage,
+        "outputs": {
+            "public_ip": {"value": public_ip, "type": "string"},
+            "db_password": {"value": "hunter2", "type": "string", "sensitive": True},
+        },
+        "resources": [
+            {"mode": "data", "type": "aws_ami", "name": "al2023", "instances": [{"attributes": {"id": "ami-1"}}]},
+            {"module": "module.ec2", "mode": "managed", "type": "aws_instance", "name": "this", "instances": [{
+                "attributes": {"id": "i-0abc", "public_ip": public_ip, "tags": {"Owner": "sandbox"},
+                               "user_data": "secret"},
+                "sensitive_attributes": [[{"type": "get_attr", "value": "user_data"}]],
+            }]},
+            {"module": "module.security_group", "mode": "managed", "type": "aws_security_group", "name": "main",
+             "instances": [{"attributes": {
+                 "id": "sg-1",
+                 "ingress": [{"description": "web", "from_port": 443, "to_port": 443, "protocol": "tcp",
+                              "cidr_blocks": ["10.0.0.0/8"]}],
+                 "egress": [{"description": "", "from_port": 0, "to_port": 0, "protocol": "-1",
+                             "cidr_blocks": ["0.0.0.0/0"]}],
+             }}]},
+        ],
+    }
+
+
+class FakeS3:
+    def __init__(self, objects):
+        self.objects = {key: json.dumps(body).encode() for key, body in objects.items()}
+        self.downloads = []
+
+    def _etag(self, key):
+        return '"' + hashlib.md5(self.objects[key]).hexdigest() + '"'
+
+    def get_paginator(self, name):
+        fake = self
+
+        class _Paginator:
+            def paginate(self, Bucket, Prefix):
+                yield {"Contents": [{"Key": k, "ETag": fake._etag(k)} for k in sorted(fake.objects)
+                                    if k.startswith(Prefix)]}
+
+        return _Paginator()
+
+    def head_object(self, Bucket, Key):
+        if Key not in self.objects:
+            raise ClientError({"Error": {"Code": "404"}}, "HeadObject")
+        return {"ETag": self._etag(Key)}
+
+    def get_object(self, Bucket, Key):
+        self.downloads.append(Key)
+        return {"Body": io.BytesIO(self.objects[Key]), "ETag": self._etag(Key)}
+
+
+def test_flatten_attributes():
+    assert list(flatten_attributes({"a": {"b": [1, "x", None]}, "c": True, "d": []})) == [
+        ("a.b.0", "1"), ("a.b.1", "x"), ("c", "true")]
+
+
+def test_sync_downloads_only_changed_states(tmp_path):
+    s3 = FakeS3({"instances/ec2_basic/terraform.tfstate": _state(1),
+                 "instances/rds/terraform.tfstate": {"serial": 1, "lineage": "l", "resources": []}})
+    index = StateIndex(tmp_path / "index.sqlite")
+    instances = [("ec2-basic", "ec2_basic"), ("rds", "rds"), ("eks", "eks")]
+
+    assert index.sync(s3, "bucket", instances) == {"indexed": 2, "unchanged": 0, "removed": 0, "failed": 0}
+    assert index.resource_counts() == {"ec2-basic": 2, "rds": 0}
+
+    s3.downloads.clear()
+    assert index.sync(s3, "bucket", instances)["unchanged"] == 2
+    assert s3.downloads == []
+
+    s3.objects["instances/ec2_basic/terraform.tfstate"] = json.dumps(_state(2, "3.35.10.99")).encode()
+    del s3.objects["instances/rds/terraform.tfstate"]
+    assert index.sync(s3, "bucket", instances) == {"indexed": 1, "unchanged": 0, "removed": 1, "failed": 0}
+    assert s3.downloads == ["instances/ec2_basic/terraform.tfstate"]
+    assert index.find_by_ip("3.35.10.20") == []
+    assert index.find_by_ip("3.35.10.99")[0]["resource_id"] == "ec2_basic"
+
+
+def test_queries(tmp_path):
+    index = StateIndex(tmp_path / "index.sqlite")
+    assert index.outputs("ec2-basic") is None
+    assert not (tmp_path / "index.sqlite").exists()
+
+    assert index.index_state("ec2-basic", "ec2_basic", "instances/ec2_basic/terraform.tfstate", _state(1))
+    assert not index.index_state("ec2-basic", "ec2_basic", "instances/ec2_basic/terraform.tfstate", _state(1))
+
+    outputs = index.outputs("ec2-basic")
+    assert outputs["public_ip"] == {"sensitive": False, "type": "string", "value": "3.35.10.20"}
+    assert outputs["db_password"] == {"sensitive": True, "type": "string", "value": None}
+    assert has_redacted_outputs(outputs)
+    raw = index._query("SELECT value FROM outputs WHERE name = 'db_password'")
+    assert raw[0]["value"] is None
+
+    [match] = index.find_by_ip("3.35.10.20")
+    assert match == {"dir_name": "ec2-basic", "resource_id": "ec2_basic", "address": "module.ec2.aws_instance.this",
+                     "type": "aws_instance", "cloud_id": "i-0abc", "path": "public_ip"}
+    assert [r["public_ip"] for r in index.public_ips()] == ["3.35.10.20"]
+
+    [instance] = index.resources("ec2-basic", "aws_instance")
+    assert "user_data" not in instance["attributes"]
+    assert index.security_group_attributes("ec2-basic")["ingress"][0]["from_port"] == 443
+    assert index.stats()["resources"] == 3
+
+
+def test_parser_statuses_come_from_index(tmp_terraform_dir, tmp_path, monkeypatch):
+    for dir_name in ("ec2-basic", "rds"):
+        (tmp_terraform_dir / "instances" / dir_name).mkdir()
+        (tmp_terraform_dir / "instances" / dir_name / "main.tf").write_text(f'module "{dir_name}" {{\n}}\n')
+    s3 = FakeS3({"instances/ec2-basic/terraform.tfstate": _state(1)})
+    monkeypatch.setattr("app.services.terraform_parser.boto3.client", lambda *args, **kwargs: s3)
+    parser = TerraformParser(str(tmp_terraform_dir))
+    parser.state_index = StateIndex(tmp_path / "index.sqlite")
+    monkeypatch.setattr(parser, "_resolve_s3_bucket_name", lambda: "bucket")
+
+    assert parser._fetch_s3_statuses_uncached() == {"ec2-basic": ResourceStatus.ENABLED, "rds": ResourceStatus.DISABLED}
+
+    s3.objects["instances/rds/terraform.tfstate"] = json.dumps(_state(1, "3.35.10.30")).encode()
+    s3.downloads.clear()
+    assert parser._fetch_single_s3_status_uncached("rds") == ResourceStatus.ENABLED
+    assert parser._fetch_single_s3_status_uncached("ec2-basic") == ResourceStatus.ENABLED
+    assert s3.downloads == ["instances/rds/terraform.tfstate"]
+
+
+async def test_routes_answer_from_index(tmp_terraform_dir, tmp_path, monkeypatch):
+    instance = tmp_terraform_dir / "instances" / "security-group"
+    instance.mkdir()
+    index = StateIndex(tmp_path / "index.sqlite")
+    index.index_state("security-group", "security_group", "instances/security_group/terraform.tfstate", _state(1))
+    monkeypatch.setattr(terraform_routes.parser, "state_index", index)
+    monkeypatch.setattr(terraform_routes.runner, "get_resource_directory", lambda resource_id: instance)
+
+    rules = await terraform_routes.get_security_group_rules()
+    assert {r["from_port"] for r in rules["ingress_rules"]} >= {22, 443}
+    assert rules["egress_rules"][0]["protocol"] == "-1"
+
+    outputs = await terraform_routes.get_resource_outputs("security_group")
+    assert outputs["outputs"]["db_password"]["value"] is None
+    assert (await terraform_routes.lookup_ip("3.35.10.20"))["matches"][0]["dir_name"] == "security-group"
+
+    summary = await terraform_routes.get_state_index()
+    assert summary["instances"] == 1
+    assert summary["indexed_instances"][0]["dir_name"] == "security-group"
+    assert (await terraform_routes.get_resource_addresses("security_group"))["addresses"][1] == \
+        "module.ec2.aws_instance.this"
+
+
+
+def test_index_with_plaintext_sensitive_outputs_is_rebuilt(tmp_path):
+    import sqlite3
+
+    path = tmp_path / "index.sqlite"
+    conn = sqlite3.connect(str(path))
+    conn.executescript(
+        "CREATE TABLE instances (dir_name TEXT PRIMARY KEY, resource_id TEXT NOT NULL, s3_key TEXT NOT NULL,"
+        " etag TEXT, lineage TEXT, serial INTEGER, terraform_version TEXT,"
+        " resource_count INTEGER NOT NULL DEFAULT 0, indexed_at REAL NOT NULL);"
+        "CREATE TABLE outputs (instance TEXT NOT NULL, name TEXT NOT NULL, value TEXT NOT NULL, type TEXT,"
+        " sensitive INTEGER NOT NULL DEFAULT 0, PRIMARY KEY (instance, name));"
+        "INSERT INTO instances VALUES ('ec2-basic', 'ec2_basic', 'k', 'e', 'lin', 1, '1.6', 0, 0);"
+        "INSERT INTO outputs VALUES ('ec2-basic', 'db_password', '\"hunter2\"', '\"string\"', 1);"
+    )
+    conn.commit()
+    conn.close()
+
+    index = StateIndex(path)
+    assert index.stats()["instances"] == 0
+    assert index.index_state("ec2-basic", "ec2_basic", "instances/ec2_basic/terraform.tfstate", _state(1))
+    assert index.outputs("ec2-basic")["db_password"]["value"] is None
+    index.close()
+    assert b"hunter2" not in path.read_bytes()
+
+
+def _fleet_state(n, resources=50):
+    return {"serial": 1, "lineage": f"lin-{n}", "resources": [
+        {"module": "module.ec2", "mode": "managed", "type": "aws_instance" if i % 2 else "aws_ebs_volume",
+         "name": f"r{i}", "instances": [{"attributes": {
+             "id": f"i-{n:04d}{i:04d}", "arn": f"arn:aws:ec2:ap-northeast-2:123:instance/i-{n:04d}{i:04d}",
+             "public_ip": f"3.{n % 250}.{i}.1", "tags": {"Owner": f"team-{n % 3}", "Name": f"bench-{n}-{i}"},
+             "ingress": [{"cidr_blocks": ["10.0.0.0/8"], "from_port": 22}],
+         }}]}
+        for i in range(resources)
+    ]}
+
+
+def test_search_filters(tmp_path):
+    index = StateIndex(tmp_path / "index.sqlite")
+    index.index_state("ec2-basic", "ec2_basic", "k1", _state(1))
+    index.index_state("fleet", "fleet", "k2", _fleet_state(7, resources=4))
+
+    assert [r["dir_name"] for r in index.search(cloud_id="i-0abc")["results"]] == ["ec2-basic"]
+    arn = "arn:aws:ec2:ap-northeast-2:123:instance/i-00070003"
+    assert index.search(cloud_id=arn)["results"][0]["address"] == "module.ec2.aws_instance.r3"
+
+    assert len(index.search(resource_type="aws_instance")["results"]) == 3
+    assert len(index.search(resource_type="aws_instance", instance="fleet")["results"]) == 2
+    assert index.search(resource_type="aws_ami")["results"] == []
+    assert len(index.search(resource_type="aws_ami", include_data=True)["results"]) == 1
+
+    [owner] = index.search(tags=["Owner=sandbox"])["results"]
+    assert owner["matches"] == [{"path": "tags.Owner", "value": "sandbox"}]
+    assert len(index.search(tags=["Owner"])["results"]) == 5
+    assert len(index.search(tags=["Owner=team-1", "Name=bench-7-2"])["results"]) == 1
+
+    by_prefix = index.search(attribute="public_ip", value="3.7.")
+    assert [m["value"] for r in by_prefix["results"] for m in r["matches"]] == ["3.7.0.1", "3.7.1.1", "3.7.2.1", "3.7.3.1"]
+    ingress = index.search(attribute="ingress", instance="fleet", limit=3)
+    assert ingress["truncated"] and len(ingress["results"]) == 3
+    assert {m["path"] for m in ingress["results"][0]["matches"]} == {"ingress.0.cidr_blocks.0", "ingress.0.from_port"}
+    assert index.search(attribute="ingres")["results"] == []
+
+
+def test_search_reindexes_only_changed_instances(tmp_path):
+    index = StateIndex(tmp_path / "index.sqlite")
+    for n in range(200):
+        index.index_state(f"fleet-{n}", f"fleet_{n}", f"k{n}", _fleet_state(n))
+    assert index.stats()["resources"] == 10000
+
+    changed = _fleet_state(5)
+    changed["serial"] = 2
+    changed["resources"] = changed["resources"][:1]
+    assert index.index_state("fleet-5", "fleet_5", "k5", changed)
+    assert not index.index_state("fleet-6", "fleet_6", "k6", _fleet_state(6))
+    assert index.stats()["resources"] == 9951
+
+    started = time.perf_counter()
+    found = index.search(cloud_id="i-01230042")
+    public = index.search(attribute="public_ip", value="3.123.", limit=1000)
+    tagged = index.search(resource_type="aws_instance", tags=["Owner=team-2"], limit=1000)
+    elapsed = time.perf_counter() - started
+
+    assert found["results"][0]["dir_name"] == "fleet-123"
+    assert len(public["results"]) == 50
+    assert len(tagged["results"]) == 1000 and tagged["truncated"]
+    assert elapsed < 1.0
+
+
+async def test_search_route(tmp_path, monkeypatch):
+    index = StateIndex(tmp_path / "index.sqlite")
+    index.index_state("ec2-basic", "ec2_basic", "k1", _state(1))
+    monkeypatch.setattr(terraform_routes.parser, "state_index", index)
+
+    result = await terraform_routes.search_resources(type="aws_instance", tag=["Owner=sandbox"], id=None,
+                                                     attr=None, value=None, instance=None, limit=100)
+    assert result["count"] == 1 and result["results"][0]["cloud_id"] == "i-0abc"
+    with pytest.raises(HTTPException) as exc:
+        await terraform_routes.search_resources(type=None, id=None, tag=[], attr=None, value=None, instance=None)
+    assert exc.value.status_code == 400
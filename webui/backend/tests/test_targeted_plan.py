@@ -0,0 +1,82 @@
+import os
+import stat
+
+import pytest
+from fastapi import HTTPException
+
+from app.routes import terraform as terraform_routes
+from app.services.process_monitor import UsageStore
+from app.services.terraform_runner import TerraformRunner, module_addresses, scope_args
+
+NODE_GROUP = 'module.eks.module.node_group["default"].aws_eks_node_group.this'
+
+
+def test_scope_args_accepts_only_addresses():
+    assert scope_args() == []
+    assert scope_args([NODE_GROUP, "aws_instance.web[0]", "module.eks", "data.aws_ami.al2023"], refresh=False) == [
+        f"-target={NODE_GROUP}", "-target=aws_instance.web[0]", "-target=module.eks",
+        "-target=data.aws_ami.al2023", "-refresh=false",
+    ]
+    for bad in ["-destroy", "aws_instance", "module.eks.-lock=false", 'aws_instance.web["a" ]x']:
+        with pytest.raises(ValueError):
+            scope_args([bad])
+
+
+def test_module_addresses_lists_every_module_path():
+    addresses = [NODE_GROUP, "module.eks.aws_iam_role.cluster", "aws_security_group.this"]
+    assert module_addresses(addresses) == ["module.eks", 'module.eks.module.node_group["default"]']
+
+
+@pytest.fixture
+def fake_terraform(tmp_terraform_dir, tmp_path, monkeypatch):
+    bin_dir = tmp_path / "bin"
+    bin_dir.mkdir()
+    fake = bin_dir / "terraform"
+    fake.write_text('#!/bin/sh\necho "$@" > args.txt\n'
+                    'if [ "$1" = "state" ]; then printf "aws_security_group.this\\n%s\\n" \'' + NODE_GROUP + '\'; fi\n')
+    fake.chmod(fake.stat().st_mode | stat.S_IEXEC)
+    monkeypatch.setenv("PATH", f"{bin_dir}{os.pathsep}{os.environ['PATH']}")
+
+    instance = tmp_terraform_dir / "instances" / "eks-cluster"
+    instance.mkdir()
+    (instance / "main.tf").write_text('module "eks_cluster" {\n}\n')
+    runner = TerraformRunner(str(tmp_terraform_dir))
+    runner.usage_store = UsageStore(tmp_path / "usage")
+
+    async def _initialized(*args, **kwargs):
+        return True, "Already initialized"
+
+    monkeypatch.setattr(runner, "ensure_terraform_init", _initialized)
+    monkeypatch.setattr(runner, "stream_init", lambda *args, **kwargs: _no_lines())
+    return runner, instance
+
+
+async def _no_lines():
+    return
+    yield
+
+
+async def test_targeted_fast_plan_passes_scope_to_terraform(fake_terraform):
+    runner, instance = fake_terraform
+    lines = [line async for line in runner.stream_plan("eks_cluster", targets=[NODE_GROUP], refresh=False)]
+
+    assert f"targets: {NODE_GROUP}; refresh disabled" in lines[0]
+    assert lines[-1] == "__TF_EXIT__:0\n"
+    args = (instance / "args.txt").read_text().split()
+    assert args[0] == "plan"
+    assert args[-2:] == [f"-target={NODE_GROUP}", "-refresh=false"]
+
+
+async def test_state_addresses(fake_terraform):
+    runner, _ = fake_terraform
+    assert await runner.state_addresses("eks_cluster") == (True, ["aws_security_group.this", NODE_GROUP])
+
+
+async def test_stream_endpoints_reject_invalid_targets():
+    with pytest.raises(HTTPException) as exc:
+        await terraform_routes.terraform_plan_stream_resource("ec2_basic", target=["-destroy"], refresh=True)
+    assert exc.value.status_code == 400
+
+    with pytest.raises(HTTPException) as exc:
+        await terraform_routes.terraform_apply_stream_resource("ec2_basic", target=["aws_instance.web; rm"])
+    assert exc.value.status_code == 400
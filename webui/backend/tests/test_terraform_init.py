@@ -0,0 +1,266 @@
+import asyncio
+
+from app.routes import terraform as terraform_routes
+from app.services import terraform_runner as runner_module
+from app.services.terraform_init import (
+    FINGERPRINT_FILE,
+    InitAllJob,
+    check_init,
+    compute_init_fingerprint,
+    is_init_current,
+    write_init_fingerprint,
+)
+from app.services.terraform_runner import TerraformRunner
+
+BACKEND_TF = """terraform {{
+  backend "s3" {{
+    bucket = "{bucket}"
+    key    = "instances/ec2-basic/terraform.tfstate"
+  }}
+}}
+"""
+
+PROVIDERS_TF = """terraform {{
+  required_providers {{
+    aws = {{
+      source  = "hashicorp/aws"
+      version = "{version}"
+    }}
+  }}
+}}
+"""
+
+
+def _make_instance(root, name, module_source="../../modules/vpc"):
+    instance = root / "instances" / name
+    instance.mkdir(parents=True)
+    (instance / "main.tf").write_text(f'module "vpc" {{\n  source = "{module_source}"\n}}\n')
+    (instance / ".terraform.lock.hcl").write_text('provider "registry.terraform.io/hashicorp/aws" {}\n')
+    return instance
+
+
+def test_fingerprint_tracks_lock_file_and_nested_module_sources(tmp_terraform_dir):
+    modules = tmp_terraform_dir / "modules" / "vpc"
+    modules.mkdir(parents=True)
+    (modules / "main.tf").write_text('resource "aws_vpc" "this" {}\n')
+    instance = _make_instance(tmp_terraform_dir, "ec2-basic")
+
+    base = compute_init_fingerprint(instance)
+    assert compute_init_fingerprint(instance) == base
+
+    (modules / "main.tf").write_text('resource "aws_vpc" "this" { cidr_block = "10.0.0.0/16" }\n')
+    assert compute_init_fingerprint(instance) == base
+
+    (modules / "flow_logs.tf").write_text('module "logs" {\n  source  = "terraform-aws-modules/s3-bucket/aws"\n  version = "4.1.0"\n}\n')
+    after_module = compute_init_fingerprint(instance)
+    assert after_module["modules"] != base["modules"]
+
+    (instance / ".terraform.lock.hcl").write_text("# upgraded\n")
+    after_lock = compute_init_fingerprint(instance)
+    assert after_lock["providers"] != after_module["providers"]
+    assert after_lock["modules"] == after_module["modules"]
+
+
+def test_check_init_reports_changed_components(tmp_terraform_dir):
+    instance = _make_instance(tmp_terraform_dir, "ec2-basic", "registry/mod")
+    (instance / "backend.tf").write_text(BACKEND_TF.format(bucket="state-a"))
+    (instance / "versions.tf").write_text(PROVIDERS_TF.format(version="~> 5.0"))
+    (instance / ".terraform").mkdir()
+    write_init_fingerprint(instance)
+    assert check_init(instance).current
+
+    (instance / "versions.tf").write_text(PROVIDERS_TF.format(version="~> 6.0"))
+    check = check_init(instance)
+    assert check.changed == ("providers",)
+    assert "-reconfigure" not in check.init_args()
+
+    (instance / "backend.tf").write_text(BACKEND_TF.format(bucket="state-b"))
+    check = check_init(instance)
+    assert check.changed == ("backend", "providers")
+    assert check.init_args()[-1] == "-reconfigure"
+
+
+def test_comments_and_whitespace_do_not_change_backend(tmp_terraform_dir):
+    instance = _make_instance(tmp_terraform_dir, "ec2-basic", "registry/mod")
+    (instance / "backend.tf").write_text(BACKEND_TF.format(bucket="state-a"))
+    before = compute_init_fingerprint(instance)
+
+    (instance / "backend.tf").write_text("# generated\n" + BACKEND_TF.format(bucket="state-a").replace("  ", "    "))
+
+    assert compute_init_fingerprint(instance) == before
+
+
+def test_unrecorded_init_reconfigures_and_fresh_dir_does_not(tmp_terraform_dir):
+    instance = _make_instance(tmp_terraform_dir, "ec2-basic", "registry/mod")
+    assert check_init(instance).init_args()[-1] == "-input=false"
+
+    (instance / ".terraform").mkdir()
+    (instance / ".terraform" / FINGERPRINT_FILE).write_text("0123abcd")
+
+    check = check_init(instance)
+    assert not check.current and check.reconfigure
+
+
+def test_init_is_current_only_with_matching_recorded_fingerprint(tmp_terraform_dir):
+    instance = _make_instance(tmp_terraform_dir, "ec2-basic", "terraform-aws-modules/vpc/aws")
+
+    assert not is_init_current(instance)
+    (instance / ".terraform").mkdir()
+    assert not is_init_current(instance)
+
+    write_init_fingerprint(instance)
+    assert is_init_current(instance)
+
+    (instance / "main.tf").write_text('module "vpc" {\n  source = "terraform-aws-modules/eks/aws"\n}\n')
+    assert not is_init_current(instance)
+
+
+async def test_init_all_skips_current_instances_and_bounds_concurrency(tmp_terraform_dir):
+    instances = {f"r{i}": _make_instance(tmp_terraform_dir, f"dir-{i}", "registry/mod") for i in range(5)}
+    (instances["r0"] / ".terraform").mkdir()
+    write_init_fingerprint(instances["r0"])
+    running = {"now": 0, "peak": 0}
+    inits = []
+
+    async def _init(resource_dir):
+        inits.append(resource_dir.name)
+        running["now"] += 1
+        running["peak"] = max(running["peak"], running["now"])
+        await asyncio.sleep(0.01)
+        running["now"] -= 1
+        return resource_dir.name != "dir-4", "Error: backend unreachable\n"
+
+    job = InitAllJob(instances, _init, max_concurrency=2)
+    summary = await job.run()
+
+    assert sorted(inits) == ["dir-1", "dir-2", "dir-3", "dir-4"]
+    assert running["peak"] == 2
+    assert summary["counts"] == {"skipped": 1, "succeeded": 3, "failed": 1}
+    assert summary["progress"] == 100 and not summary["running"]
+    assert summary["instances"]["r4"]["error"] == "Error: backend unreachable"
+
+
+
+async def test_init_all_skips_busy_instances(tmp_terraform_dir):
+    instances = {f"r{i}": _make_instance(tmp_terraform_dir, f"dir-{i}", "registry/mod") for i in range(3)}
+    inits = []
+
+    async def _init(resource_dir):
+        inits.append(resource_dir.name)
+        return True, ""
+
+    job = InitAllJob(instances, _init, is_busy=lambda resource_id: resource_id == "r1")
+    summary = await job.run()
+
+    assert sorted(inits) == ["dir-0", "dir-2"]
+    assert summary["instances"]["r1"]["status"] == "skipped"
+    assert summary["instances"]["r1"]["error"] == "operation in progress"
+
+async def test_runner_reports_init_all_progress(tmp_terraform_dir, monkeypatch):
+    _make_instance(tmp_terraform_dir, "ec2-basic", "registry/mod")
+    runner = TerraformRunner(str(tmp_terraform_dir))
+    monkeypatch.setattr(runner, "_get_resource_dir_map", lambda: {"ec2-basic": "ec2-basic"})
+    calls = []
+
+    async def _ensure(resource_dir, env_extra=None, force=False, resource_id=None):
+        calls.append((resource_id, env_extra, force))
+        return True, ""
+
+    monkeypatch.setattr(runner, "ensure_terraform_init", _ensure)
+
+    job = runner.start_init_all(env_extra={"AWS_REGION": "us-east-1"})
+    assert runner.start_init_all() is job
+    assert runner.get_cache_status()["init_all"]["running"]
+    await runner._init_all_task
+
+    assert calls == [("ec2-basic", {"AWS_REGION": "us-east-1"}, False)]
+    assert runner.get_cache_status()["init_all"]["counts"] == {"succeeded": 1}
+
+
+class FakeProcess:
+    pid = -1
+
+    def __init__(self, returncode=0):
+        self.returncode = returncode
+        self.stdout = self
+
+    async def readline(self):
+        return b""
+
+    async def wait(self):
+        return self.returncode
+
+
+async def test_ensure_init_reruns_only_when_inputs_change(tmp_terraform_dir, monkeypatch):
+    instance = _make_instance(tmp_terraform_dir, "ec2-basic", "registry/mod")
+    (instance / "backend.tf").write_text(BACKEND_TF.format(bucket="state-a"))
+    runner = TerraformRunner(str(tmp_terraform_dir))
+    commands = []
+
+    async def _exec(*args, **kwargs):
+        commands.append(args)
+        (instance / ".terraform").mkdir(exist_ok=True)
+        return FakeProcess()
+
+    monkeypatch.setattr(runner_module.asyncio, "create_subprocess_exec", _exec)
+
+    assert (await runner.ensure_terraform_init(instance))[0]
+    assert await runner.ensure_terraform_init(instance) == (True, "Already initialized")
+    (instance / "backend.tf").write_text(BACKEND_TF.format(bucket="state-b"))
+    assert (await runner.ensure_terraform_init(instance))[0]
+
+    assert commands == [
+        ("terraform", "init", "-no-color", "-input=false"),
+        ("terraform", "init", "-no-color", "-input=false", "-reconfigure"),
+    ]
+    assert is_init_current(instance)
+
+
+async def test_init_records_fingerprint_of_rewritten_lock_file(tmp_terraform_dir, monkeypatch):
+    instance = _make_instance(tmp_terraform_dir, "ec2-basic", "registry/mod")
+    runner = TerraformRunner(str(tmp_terraform_dir))
+    inits = []
+
+    async def _exec(*args, **kwargs):
+        inits.append(args)
+        (instance / ".terraform").mkdir(exist_ok=True)
+        (instance / ".terraform.lock.hcl").write_text(
+            f'provider "registry.terraform.io/hashicorp/aws" {{\n  version = "5.{len(inits)}.0"\n}}\n')
+        return FakeProcess()
+
+    monkeypatch.setattr(runner_module.asyncio, "create_subprocess_exec", _exec)
+
+    assert (await runner.ensure_terraform_init(instance))[0]
+    check = check_init(instance)
+    assert check.current and not check.changed
+    assert await runner.ensure_terraform_init(instance) == (True, "Already initialized")
+
+    (instance / ".terraform.lock.hcl").write_text('provider "registry.terraform.io/hashicorp/aws" {}\n')
+    assert (await runner.ensure_terraform_init(instance, force=True))[0]
+    assert check_init(instance).current
+    assert len(inits) == 2
+
+
+async def test_manual_init_route_waits_for_init_lock(tmp_terraform_dir, monkeypatch):
+    instance = _make_instance(tmp_terraform_dir, "ec2-basic", "registry/mod")
+    runner = TerraformRunner(str(tmp_terraform_dir))
+    monkeypatch.setattr(runner, "_get_resource_dir_map", lambda: {"ec2-basic": "ec2-basic"})
+    monkeypatch.setattr(terraform_routes, "runner", runner)
+    monkeypatch.setattr(terraform_routes.parser, "get_aws_env", lambda: {})
+
+    async def _exec(*args, **kwargs):
+        (instance / ".terraform").mkdir(exist_ok=True)
+        (instance / ".terraform.lock.hcl").write_text('provider "registry.terraform.io/hashicorp/aws" {\n}\n')
+        return FakeProcess()
+
+    monkeypatch.setattr(runner_module.asyncio, "create_subprocess_exec", _exec)
+
+    lock = runner._get_init_lock(instance)
+    await lock.acquire()
+    task = asyncio.create_task(terraform_routes.terraform_init_resource("ec2-basic"))
+    await asyncio.sleep(0.01)
+    assert not task.done()
+    lock.release()
+
+    assert (await task)["success"]
+    assert check_init(instance).current
@@ -0,0 +1,120 @@
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import pytest
+
+from app.services import tracing
+from app.services.terraform_runner import TerraformRunner
+
+
+class _AgentStandIn(BaseHTTPRequestHandler):
+    def do_GET(self):
+        body = b'{"endpoints": ["/v0.4/traces"]}' if self.path == "/info" else b""
+        self.send_response(200 if body else 404)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def agent():
+    server = HTTPServer(("127.0.0.1", 0), _AgentStandIn)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_port}"
+    server.shutdown()
+    server.server_close()
+
+
+class RecordedSpan:
+    def __init__(self, name, **kwargs):
+        self.name = name
+        self.resource = kwargs.get("resource")
+        self.activated = kwargs.get("activate", True)
+        self.tags, self.metrics = {}, {}
+        self.error = 0
+        self.finished = False
+
+    def set_tag(self, key, value=None):
+        self.tags[key] = value
+
+    def set_metric(self, key, value):
+        self.metrics[key] = value
+
+    def set_exc_info(self, exc_type, exc_val, exc_tb):
+        self.error = 1
+        self.tags["error.type"] = exc_type.__name__
+
+    def finish(self):
+        self.finished = True
+
+
+class RecordingTracer:
+    def __init__(self):
+        self.spans = []
+
+    def trace(self, name, **kwargs):
+        self.spans.append(RecordedSpan(name, **kwargs))
+        return self.spans[-1]
+
+    def start_span(self, name, child_of=None, **kwargs):
+        return self.trace(name, **kwargs)
+
+    def current_span(self):
+        return None
+
+
+@pytest.fixture
+def recorder():
+    tracer = RecordingTracer()
+    tracing.use_tracer(tracer)
+    yield tracer
+    tracing.use_tracer(None)
+
+
+def test_probe_detects_agent_stand_in(agent, monkeypatch):
+    assert tracing.probe_agent(agent)
+    assert not tracing.probe_agent("http://127.0.0.1:9", timeout=0.2)
+
+    monkeypatch.setenv("DD_AGENT_HOST", "datadog-agent")
+    monkeypatch.delenv("DD_TRACE_AGENT_URL", raising=False)
+    assert tracing.agent_url() == "http://datadog-agent:8126"
+
+
+def test_tracing_is_noop_without_ddtrace(monkeypatch):
+    monkeypatch.setitem(sys.modules, "ddtrace", None)
+
+    assert not tracing.configure_tracing()
+    assert not tracing.is_enabled()
+    with tracing.span("anything", tag="value") as span:
+        span.set_metric("m", 1)
+    assert span is tracing.NOOP_SPAN
+
+
+def test_span_records_exceptions(recorder):
+    with pytest.raises(ValueError):
+        with tracing.span("s3.status_fetch", resource="all", instance=None):
+            raise ValueError("boom")
+
+    span = recorder.spans[0]
+    assert span.finished and span.error == 1
+    assert span.tags == {"error.type": "ValueError"}
+
+
+async def test_terraform_subprocess_spans(recorder, tmp_terraform_dir, tmp_path):
+    runner = TerraformRunner(str(tmp_terraform_dir))
+    ok = [sys.executable, "-c", "print('ok')"]
+    failing = [sys.executable, "-c", "import sys; sys.exit(3)"]
+
+    [line async for line in runner._stream_process(ok, tmp_path)]
+    [line async for line in runner._stream_process(failing, tmp_path)]
+
+    first, second = recorder.spans
+    assert first.name == second.name == "terraform.command"
+    assert not first.activated and first.finished
+    assert first.tags["terraform.exit_code"] == 0 and first.error == 0
+    assert "terraform.peak_rss_bytes" in first.metrics
+    assert second.tags["terraform.exit_code"] == 3 and second.error == 1
@@ -0,0 +1,158 @@
+from fastapi import Request, Response
+
+from app.routes import terraform as terraform_routes
+from app.services import variable_schema
+from app.services.terraform_parser import TerraformParser
+from app.services.variable_schema import (
+    DEFAULT_FROM_CONFIG, DEFAULT_FROM_FILE, VariableSchemaCache, hcl_literal, parse_variables_tf,
+)
+
+VARIABLES_TF = r'''
+variable "vpc_id" {
+  type = string
+}
+
+variable "ec2_instance_type" {
+  type    = string
+  default = "t3.small"
+}
+
+variable "ec2_root_volume_size" {
+  type = number
+}
+
+variable "ingress_rules" {
+  description = "Extra ingress rules"
+  type = list(object({
+    port = number
+    cidr = string
+  }))
+  default = [
+    { port = 443, cidr = "10.0.0.0/8" },
+  ]
+}
+
+variable "extra_tags" {
+  type = map(string)
+  default = {
+    Owner                = "sandbox"
+    "kubernetes.io/role" = "elb"
+  }
+}
+
+variable "user_data" {
+  type    = string
+  default = <<-EOT
+    #!/bin/bash
+    echo "hello"
+  EOT
+}
+
+variable "agent_config" {
+  type      = string
+  default   = "say \"hi\""
+  sensitive = true
+
+  validation {
+    condition     = length(var.agent_config) > 0
+    error_message = "default = \"bogus\""
+  }
+}
+'''
+
+
+def test_parse_variables_tf_handles_hcl_values(tmp_path):
+    path = tmp_path / "variables.tf"
+    path.write_text(VARIABLES_TF)
+    specs = parse_variables_tf(path)
+
+    assert list(specs) == ["vpc_id", "ec2_instance_type", "ec2_root_volume_size", "ingress_rules",
+                           "extra_tags", "user_data", "agent_config"]
+    assert not specs["vpc_id"].has_default
+    assert specs["ingress_rules"].type == "list(object({port: number, cidr: string}))"
+    assert specs["ingress_rules"].default_display == '[{ port = 443, cidr = "10.0.0.0/8" }]'
+    assert specs["ingress_rules"].description == "Extra ingress rules"
+    assert specs["extra_tags"].default_display == '{ Owner = "sandbox", "kubernetes.io/role" = "elb" }'
+    assert specs["user_data"].default == '#!/bin/bash\necho "hello"'
+    assert specs["agent_config"].default == 'say "hi"' and specs["agent_config"].sensitive
+
+
+def test_parse_variables_tf_falls_back_to_names(tmp_path):
+    path = tmp_path / "variables.tf"
+    path.write_text('variable "lambda_runtime" {\n  default = "python3.11"\n')
+    assert list(parse_variables_tf(path)) == ["lambda_runtime"]
+
+
+def test_hcl_literal():
+    assert hcl_literal(True) == "true"
+    assert hcl_literal(2.5) == "2.5"
+    assert hcl_literal("t3.micro") == "t3.micro"
+    assert hcl_literal(["a", None, {}]) == '["a", null, {}]'
+
+
+def _instance(tmp_terraform_dir, dir_name="ec2-basic", module="ec2_basic"):
+    instance = tmp_terraform_dir / "instances" / dir_name
+    instance.mkdir()
+    (instance / "main.tf").write_text(f'module "{module}" {{\n}}\n')
+    (instance / "variables.tf").write_text(VARIABLES_TF)
+    return instance
+
+
+def test_schema_merges_resource_configs_and_recompiles_on_change(tmp_terraform_dir, monkeypatch):
+    instance = _instance(tmp_terraform_dir)
+    compiled = []
+    compile_schema = variable_schema.compile_schema
+    monkeypatch.setattr(variable_schema, "compile_schema",
+                        lambda *args: compiled.append(args[0].name) or compile_schema(*args))
+    cache = VariableSchemaCache(tmp_terraform_dir / "instances")
+
+    schema = cache.get("ec2_basic")
+    assert schema.dir_name == "ec2-basic" and cache.get("ec2-basic") is schema
+    assert schema.names[:5] == ["agent_config", "extra_tags", "ingress_rules", "user_data", "ec2_instance_type"]
+    assert "vpc_id" not in schema.names
+    instance_type = schema.get("ec2_instance_type")
+    assert (instance_type.default, instance_type.default_source) == ("t3.small", DEFAULT_FROM_FILE)
+    assert instance_type.description.startswith("EC2 instance type")
+    volume = schema.get("ec2_root_volume_size")
+    assert (volume.default, volume.default_source, volume.declared) == (20, DEFAULT_FROM_CONFIG, True)
+    assert not schema.get("ec2_associate_public_ip").declared
+
+    cache.get("ec2_basic")
+    assert compiled == ["ec2-basic"]
+    (instance / "variables.tf").write_text(VARIABLES_TF + 'variable "ec2_extra" {\n  default = 1\n}\n')
+    assert "ec2_extra" in cache.get("ec2_basic").names
+    assert compiled == ["ec2-basic", "ec2-basic"]
+
+
+def _get():
+    return Request({"type": "http", "method": "GET", "headers": []}), Response()
+
+
+async def test_route_serves_variables_without_parsing(tmp_terraform_dir, root_tfvars, monkeypatch):
+    instance = _instance(tmp_terraform_dir)
+    root_tfvars.write_text('region = "ap-northeast-2"\nagent_config = "x"\nextra_tags = "{}"\n')
+    (instance / "terraform.tfvars").write_text('ec2_root_volume_type = "io2"\nuser_data = "echo hi"\n')
+    parser = TerraformParser(str(tmp_terraform_dir))
+    monkeypatch.setattr(terraform_routes, "parser", parser)
+
+    variables = {v.name: v for v in await terraform_routes.get_resource_variables("ec2_basic", *_get())}
+    assert list(variables)[:3] == ["agent_config", "extra_tags", "ec2_instance_type"]
+    assert "user_data" not in variables and "ingress_rules" not in variables
+    assert variables["agent_config"].value == "***"
+    assert variables["extra_tags"].value == '{ Owner = "sandbox", "kubernetes.io/role" = "elb" }'
+    assert variables["ec2_instance_type"].value == "t3.small"
+    assert variables["ec2_root_volume_type"].value == "io2"
+    assert variables["ec2_associate_public_ip"].value == "true"
+
+    def _no_parsing(*args, **kwargs):
+        raise AssertionError("file parsed on the request path")
+
+    monkeypatch.setattr(variable_schema.hcl2, "loads", _no_parsing)
+    monkeypatch.setattr(parser, "_parse_tfvars_file", _no_parsing)
+    assert len(await terraform_routes.get_resource_variables("ec2_basic", *_get())) == len(variables)
+
+    monkeypatch.undo()
+    monkeypatch.setattr(terraform_routes, "parser", parser)
+    parser.write_tfvars_to_path(instance / "terraform.tfvars", "ec2_instance_type", "t3.large")
+    variables = {v.name: v for v in await terraform_routes.get_resource_variables("ec2_basic", *_get())}
+    assert variables["ec2_instance_type"].value == "t3.large"